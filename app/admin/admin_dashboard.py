@@ -10,12 +10,35 @@ from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify, render_template_string
 
 from app.models.database import execute_db_query
+from app.models.read_replica import read_heavy
 from app.services.auth_service import get_current_user_id
 from app.events.event_dispatcher import event_dispatcher
 from app.config.telegram_config import AppConfig
+from app.utils.pagination import KeysetPaginator
 
 logger = logging.getLogger(__name__)
 
+# Списки админ-панели: новые записи первыми, id различает записи с одинаковым временем
+_USERS_PAGINATOR = KeysetPaginator(
+    'admin_users', ("COALESCE(created_at, '')", 'id'),
+    indexes=("CREATE INDEX IF NOT EXISTS idx_users_created_keyset ON users(COALESCE(created_at, ''), id)",)
+)
+_CHANNELS_PAGINATOR = KeysetPaginator(
+    'admin_channels', ("COALESCE(c.created_at, '')", 'c.id'),
+    indexes=("CREATE INDEX IF NOT EXISTS idx_channels_created_keyset ON channels(COALESCE(created_at, ''), id)",)
+)
+_OFFERS_PAGINATOR = KeysetPaginator(
+    'admin_offers', ("COALESCE(o.created_at, '')", 'o.id'),
+    indexes=(
+        "CREATE INDEX IF NOT EXISTS idx_offers_created_keyset ON offers(COALESCE(created_at, ''), id)",
+        "CREATE INDEX IF NOT EXISTS idx_offers_status_created_keyset ON offers(status, COALESCE(created_at, ''), id)",
+    )
+)
+_PAYMENTS_PAGINATOR = KeysetPaginator(
+    'admin_payments', ("COALESCE(p.created_at, '')", 'p.id'),
+    indexes=("CREATE INDEX IF NOT EXISTS idx_payments_created_keyset ON payments(COALESCE(created_at, ''), id)",)
+)
+
 class AdminDashboard:
     """Главная админ-панель"""
     
@@ -53,8 +76,9 @@ class AdminDashboard:
             page = request.args.get('page', 1, type=int)
             limit = request.args.get('limit', 50, type=int)
             search = request.args.get('search', '')
+            cursor = request.args.get('cursor')
             
-            return jsonify(self.get_users_list(page, limit, search))
+            return jsonify(self.get_users_list(page, limit, search, cursor))
         
         @self.admin_blueprint.route('/api/users/<int:user_id>/ban', methods=['POST'])
         def ban_user(user_id):
@@ -70,8 +94,9 @@ class AdminDashboard:
             status = request.args.get('status', 'all')
             page = request.args.get('page', 1, type=int)
             limit = request.args.get('limit', 50, type=int)
+            cursor = request.args.get('cursor')
             
-            return jsonify(self.get_channels_list(status, page, limit))
+            return jsonify(self.get_channels_list(status, page, limit, cursor))
         
         @self.admin_blueprint.route('/api/channels/<int:channel_id>/verify', methods=['POST'])
         def verify_channel(channel_id):
@@ -84,8 +109,9 @@ class AdminDashboard:
             status = request.args.get('status', 'all')
             page = request.args.get('page', 1, type=int)
             limit = request.args.get('limit', 50, type=int)
+            cursor = request.args.get('cursor')
             
-            return jsonify(self.get_offers_list(status, page, limit))
+            return jsonify(self.get_offers_list(status, page, limit, cursor))
         
         @self.admin_blueprint.route('/api/payments')
         def get_payments():
@@ -93,8 +119,9 @@ class AdminDashboard:
             status = request.args.get('status', 'all')
             page = request.args.get('page', 1, type=int)
             limit = request.args.get('limit', 50, type=int)
+            cursor = request.args.get('cursor')
             
-            return jsonify(self.get_payments_list(status, page, limit))
+            return jsonify(self.get_payments_list(status, page, limit, cursor))
         
         @self.admin_blueprint.route('/api/payments/<int:payment_id>/approve', methods=['POST'])
         def approve_payment(payment_id):
@@ -111,6 +138,7 @@ class AdminDashboard:
             
             return jsonify(self.set_maintenance_mode(enabled, message))
     
+    @read_heavy()
     def get_system_stats(self) -> Dict[str, Any]:
         """Получение общей статистики системы"""
         try:
@@ -185,54 +213,36 @@ class AdminDashboard:
             logger.error(f"❌ Ошибка получения статистики: {e}")
             return {'success': False, 'error': str(e)}
     
-    def get_users_list(self, page: int = 1, limit: int = 50, search: str = '') -> Dict[str, Any]:
-        """Получение списка пользователей с пагинацией"""
+    def get_users_list(self, page: int = 1, limit: int = 50, search: str = '', cursor: str = None) -> Dict[str, Any]:
+        """Получение списка пользователей с пагинацией (номер страницы или курсор next_cursor)"""
         try:
-            offset = (page - 1) * limit
-            
             # Подготавливаем условие поиска
-            search_condition = ""
+            conditions = []
             search_params = []
             
             if search:
-                search_condition = """
-                    WHERE username LIKE ? OR first_name LIKE ? OR last_name LIKE ? 
-                    OR CAST(telegram_id as TEXT) LIKE ?
-                """
+                conditions.append("""(username LIKE ? OR first_name LIKE ? OR last_name LIKE ? 
+                    OR CAST(telegram_id as TEXT) LIKE ?)""")
                 search_term = f"%{search}%"
                 search_params = [search_term, search_term, search_term, search_term]
             
-            # Получаем пользователей
-            users = execute_db_query(
-                f"""SELECT id, telegram_id, username, first_name, last_name, 
-                           balance, is_admin, is_active, created_at, last_login
-                    FROM users 
-                    {search_condition}
-                    ORDER BY created_at DESC 
-                    LIMIT ? OFFSET ?""",
-                search_params + [limit, offset]
-            )
-            
-            # Получаем общее количество
-            total_count = execute_db_query(
-                f"SELECT COUNT(*) as count FROM users {search_condition}",
-                search_params,
-                fetch_one=True
+            result = _USERS_PAGINATOR.paginate(
+                """id, telegram_id, username, first_name, last_name, 
+                   balance, is_admin, is_active, created_at, last_login""",
+                "users", conditions, search_params,
+                limit=limit, cursor=cursor, page=page, with_total=True
             )
             
             return {
                 'success': True,
                 'data': {
-                    'users': [dict(user) for user in users],
-                    'pagination': {
-                        'page': page,
-                        'limit': limit,
-                        'total': total_count['count'] if total_count else 0,
-                        'pages': ((total_count['count'] if total_count else 0) + limit - 1) // limit
-                    }
+                    'users': result.items,
+                    'pagination': result.pagination()
                 }
             }
             
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
         except Exception as e:
             logger.error(f"❌ Ошибка получения списка пользователей: {e}")
             return {'success': False, 'error': str(e)}
@@ -269,55 +279,38 @@ class AdminDashboard:
             logger.error(f"❌ Ошибка блокировки пользователя: {e}")
             return {'success': False, 'error': str(e)}
     
-    def get_channels_list(self, status: str = 'all', page: int = 1, limit: int = 50) -> Dict[str, Any]:
-        """Получение списка каналов"""
+    def get_channels_list(self, status: str = 'all', page: int = 1, limit: int = 50,
+                          cursor: str = None) -> Dict[str, Any]:
+        """Получение списка каналов (номер страницы или курсор next_cursor)"""
         try:
-            offset = (page - 1) * limit
-            
             # Подготавливаем условие фильтрации
-            status_condition = ""
-            status_params = []
+            conditions = []
             
             if status == 'verified':
-                status_condition = "WHERE is_verified = 1"
+                conditions.append("c.is_verified = 1")
             elif status == 'pending':
-                status_condition = "WHERE is_verified = 0 AND verification_code IS NOT NULL"
+                conditions.append("c.is_verified = 0 AND c.verification_code IS NOT NULL")
             elif status == 'unverified':
-                status_condition = "WHERE is_verified = 0 AND verification_code IS NULL"
-            
-            # Получаем каналы
-            channels = execute_db_query(
-                f"""SELECT c.id, c.username, c.title, c.subscriber_count, c.is_verified, 
-                           c.is_active, c.created_at, c.verification_code,
-                           u.first_name as owner_name, u.telegram_id as owner_telegram_id
-                    FROM channels c
-                    JOIN users u ON c.owner_id = u.id
-                    {status_condition}
-                    ORDER BY c.created_at DESC 
-                    LIMIT ? OFFSET ?""",
-                status_params + [limit, offset]
-            )
-            
-            # Получаем общее количество
-            total_count = execute_db_query(
-                f"SELECT COUNT(*) as count FROM channels c {status_condition}",
-                status_params,
-                fetch_one=True
+                conditions.append("c.is_verified = 0 AND c.verification_code IS NULL")
+            
+            result = _CHANNELS_PAGINATOR.paginate(
+                """c.id, c.username, c.title, c.subscriber_count, c.is_verified, 
+                   c.is_active, c.created_at, c.verification_code,
+                   u.first_name as owner_name, u.telegram_id as owner_telegram_id""",
+                "channels c JOIN users u ON c.owner_id = u.id", conditions,
+                limit=limit, cursor=cursor, page=page, with_total=True, count_from="channels c"
             )
             
             return {
                 'success': True,
                 'data': {
-                    'channels': [dict(channel) for channel in channels],
-                    'pagination': {
-                        'page': page,
-                        'limit': limit,
-                        'total': total_count['count'] if total_count else 0,
-                        'pages': ((total_count['count'] if total_count else 0) + limit - 1) // limit
-                    }
+                    'channels': result.items,
+                    'pagination': result.pagination()
                 }
             }
             
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
         except Exception as e:
             logger.error(f"❌ Ошибка получения списка каналов: {e}")
             return {'success': False, 'error': str(e)}
@@ -364,79 +357,72 @@ class AdminDashboard:
             logger.error(f"❌ Ошибка верификации канала: {e}")
             return {'success': False, 'error': str(e)}
     
-    def get_offers_list(self, status: str = 'all', page: int = 1, limit: int = 50) -> Dict[str, Any]:
-        """Получение списка офферов"""
+    def get_offers_list(self, status: str = 'all', page: int = 1, limit: int = 50,
+                        cursor: str = None) -> Dict[str, Any]:
+        """Получение списка офферов (номер страницы или курсор next_cursor)"""
         try:
-            offset = (page - 1) * limit
-            
             # Подготавливаем условие фильтрации
-            status_condition = ""
+            conditions = []
             status_params = []
             
             if status != 'all':
-                status_condition = "WHERE o.status = ?"
+                conditions.append("o.status = ?")
                 status_params = [status]
             
-            # Получаем офферы
-            offers = execute_db_query(
-                f"""SELECT o.id, o.title, o.status, COALESCE(o.budget_total, o.price) as budget,
-                           o.created_at, o.expires_at,
-                           u.first_name as creator_name, u.telegram_id as creator_telegram_id,
-                           COUNT(r.id) as responses_count
-                    FROM offers o
-                    JOIN users u ON o.created_by = u.id
-                    LEFT JOIN offer_responses r ON o.id = r.offer_id
-                    {status_condition}
-                    GROUP BY o.id
-                    ORDER BY o.created_at DESC 
-                    LIMIT ? OFFSET ?""",
-                status_params + [limit, offset]
+            # Отклики считаются только для офферов страницы
+            result = _OFFERS_PAGINATOR.paginate(
+                """o.id, o.title, o.status, COALESCE(o.budget_total, o.price) as budget,
+                   o.created_at, o.expires_at,
+                   u.first_name as creator_name, u.telegram_id as creator_telegram_id,
+                   (SELECT COUNT(*) FROM offer_responses r WHERE r.offer_id = o.id) as responses_count""",
+                "offers o JOIN users u ON o.created_by = u.id", conditions, status_params,
+                limit=limit, cursor=cursor, page=page
             )
             
             return {
                 'success': True,
                 'data': {
-                    'offers': [dict(offer) for offer in offers]
+                    'offers': result.items,
+                    'pagination': result.pagination()
                 }
             }
             
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
         except Exception as e:
             logger.error(f"❌ Ошибка получения списка офферов: {e}")
             return {'success': False, 'error': str(e)}
     
-    def get_payments_list(self, status: str = 'all', page: int = 1, limit: int = 50) -> Dict[str, Any]:
-        """Получение списка платежей"""
+    def get_payments_list(self, status: str = 'all', page: int = 1, limit: int = 50,
+                          cursor: str = None) -> Dict[str, Any]:
+        """Получение списка платежей (номер страницы или курсор next_cursor)"""
         try:
-            offset = (page - 1) * limit
-            
             # Подготавливаем условие фильтрации
-            status_condition = ""
+            conditions = []
             status_params = []
             
             if status != 'all':
-                status_condition = "WHERE p.status = ?"
+                conditions.append("p.status = ?")
                 status_params = [status]
             
-            # Получаем платежи
-            payments = execute_db_query(
-                f"""SELECT p.id, p.amount, p.currency, p.payment_type, p.status, p.provider,
-                           p.description, p.created_at, p.processed_at,
-                           u.first_name as user_name, u.telegram_id as user_telegram_id
-                    FROM payments p
-                    JOIN users u ON p.user_id = u.id
-                    {status_condition}
-                    ORDER BY p.created_at DESC 
-                    LIMIT ? OFFSET ?""",
-                status_params + [limit, offset]
+            result = _PAYMENTS_PAGINATOR.paginate(
+                """p.id, p.amount, p.currency, p.payment_type, p.status, p.provider,
+                   p.description, p.created_at, p.processed_at,
+                   u.first_name as user_name, u.telegram_id as user_telegram_id""",
+                "payments p JOIN users u ON p.user_id = u.id", conditions, status_params,
+                limit=limit, cursor=cursor, page=page
             )
             
             return {
                 'success': True,
                 'data': {
-                    'payments': [dict(payment) for payment in payments]
+                    'payments': result.items,
+                    'pagination': result.pagination()
                 }
             }
             
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
         except Exception as e:
             logger.error(f"❌ Ошибка получения списка платежей: {e}")
             return {'success': False, 'error': str(e)}
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Отчеты по снимку БД
+Агрегации OfferAnalytics и ReportGenerator над AnalyticsSnapshot:
+векторно по массивам NumPy, без NumPy - SQL по файлу снимка. Рабочая
+БД в отчетах не читается
+"""
+
+import calendar
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from app.analytics.snapshot import AnalyticsSnapshot, np, nan_sum, nan_mean, group_counts
+
+
+def _cutoff(days: int) -> datetime:
+    return datetime.now() - timedelta(days=days)
+
+
+def _epoch(moment: datetime) -> float:
+    """Секунды для сравнения с created_at снимка (время без часового пояса)"""
+    return float(calendar.timegm(moment.timetuple()))
+
+
+def _rate(part: Optional[float], total: Optional[float]) -> float:
+    return (part / total * 100) if total else 0
+
+
+# ===== СТАТИСТИКА ОФФЕРОВ ПЛАТФОРМЫ =====
+
+def platform_offer_stats(snapshot: AnalyticsSnapshot) -> Dict[str, Any]:
+    """Общая статистика офферов, бюджетов, откликов и топ категорий"""
+    if snapshot.vectorized:
+        offers = snapshot.frame('offers')
+        responses = snapshot.frame('offer_responses')
+
+        status = offers['status']
+        live = (status == 'active') | (status == 'completed')
+        budgets = offers['budget'][live]
+        present = budgets[~np.isnan(budgets)]
+
+        with_category = live & (offers['category'] != '')
+        categories = group_counts(offers['category'][with_category], offers['budget'][with_category])
+        categories.sort(key=lambda item: (-item[1], item[0]))
+
+        totals = {
+            'total': int(status.size),
+            'active': int(np.count_nonzero(status == 'active')),
+            'completed': int(np.count_nonzero(status == 'completed')),
+            'budget_total': nan_sum(budgets),
+            'budget_avg': nan_mean(budgets),
+            'budget_max': float(present.max()) if present.size else None,
+            'budget_min': float(present.min()) if present.size else None,
+            'responses': int(responses['status'].size),
+            'accepted': int(np.count_nonzero(responses['status'] == 'accepted')),
+            'rejected': int(np.count_nonzero(responses['status'] == 'rejected')),
+            'pending': int(np.count_nonzero(responses['status'] == 'pending')),
+        }
+        top_categories = categories[:5]
+    else:
+        totals = snapshot.query("""
+            SELECT COUNT(*) as total,
+                   COUNT(CASE WHEN status = 'active' THEN 1 END) as active,
+                   COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed,
+                   SUM(CASE WHEN status IN ('active', 'completed') THEN budget END) as budget_total,
+                   AVG(CASE WHEN status IN ('active', 'completed') THEN budget END) as budget_avg,
+                   MAX(CASE WHEN status IN ('active', 'completed') THEN budget END) as budget_max,
+                   MIN(CASE WHEN status IN ('active', 'completed') THEN budget END) as budget_min,
+                   (SELECT COUNT(*) FROM offer_responses) as responses,
+                   (SELECT COUNT(*) FROM offer_responses WHERE status = 'accepted') as accepted,
+                   (SELECT COUNT(*) FROM offer_responses WHERE status = 'rejected') as rejected,
+                   (SELECT COUNT(*) FROM offer_responses WHERE status = 'pending') as pending
+            FROM offers
+        """, fetch_one=True)
+        top_categories = [
+            (row['category'], row['count'], row['avg_budget'])
+            for row in snapshot.query("""
+                SELECT category, COUNT(*) as count, AVG(budget) as avg_budget
+                FROM offers
+                WHERE status IN ('active', 'completed') AND category IS NOT NULL AND category != ''
+                GROUP BY category
+                ORDER BY count DESC, category
+                LIMIT 5
+            """)
+        ]
+
+    return {
+        'offers': {
+            'total': totals['total'],
+            'active': totals['active'],
+            'completed': totals['completed'],
+            'completion_rate': _rate(totals['completed'], totals['total'])
+        },
+        'budget': {
+            'total': float(totals['budget_total'] or 0),
+            'average': round(float(totals['budget_avg'] or 0), 2),
+            'maximum': float(totals['budget_max'] or 0),
+            'minimum': float(totals['budget_min'] or 0)
+        },
+        'responses': {
+            'total': totals['responses'],
+            'accepted': totals['accepted'],
+            'rejected': totals['rejected'],
+            'pending': totals['pending'],
+            'acceptance_rate': _rate(totals['accepted'], totals['responses'])
+        },
+        'top_categories': [
+            {
+                'category': category,
+                'count': count,
+                'avg_budget': round(float(avg_budget or 0), 2)
+            }
+            for category, count, avg_budget in top_categories
+        ]
+    }
+
+
+# ===== ПРОИЗВОДИТЕЛЬНОСТЬ РЕКЛАМОДАТЕЛЯ =====
+
+def advertiser_performance(snapshot: AnalyticsSnapshot, advertiser_id: int, days: int = 30) -> Dict[str, Any]:
+    """Офферы рекламодателя и отклики на них за период"""
+    cutoff = _cutoff(days)
+
+    if snapshot.vectorized:
+        offers = snapshot.frame('offers')
+        responses = snapshot.frame('offer_responses')
+        since = _epoch(cutoff)
+
+        owned = offers['advertiser_id'] == advertiser_id
+        recent = owned & (offers['created_at'] >= since)
+        budgets = offers['budget'][recent]
+
+        # Отклики на любые офферы рекламодателя, полученные за период;
+        # цена отклика - цена оффера
+        owned_ids = offers['id'][owned]
+        order = np.argsort(owned_ids)
+        owned_ids = owned_ids[order]
+        owned_prices = offers['price'][owned][order]
+
+        matched = np.isin(responses['offer_id'], owned_ids) & (responses['created_at'] >= since)
+        prices = owned_prices[np.searchsorted(owned_ids, responses['offer_id'][matched])]
+
+        offer_row = {
+            'total_offers': int(np.count_nonzero(recent)),
+            'total_budget': nan_sum(budgets),
+            'avg_budget': nan_mean(budgets),
+            'completed_offers': int(np.count_nonzero(recent & (offers['status'] == 'completed'))),
+        }
+        response_row = {
+            'total_responses': int(np.count_nonzero(matched)),
+            'accepted_responses': int(np.count_nonzero(responses['status'][matched] == 'accepted')),
+            'avg_response_price': nan_mean(prices),
+        }
+    else:
+        cutoff_date = cutoff.strftime('%Y-%m-%d %H:%M:%S')
+        offer_row = snapshot.query("""
+            SELECT COUNT(*) as total_offers,
+                   SUM(budget) as total_budget,
+                   AVG(budget) as avg_budget,
+                   COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed_offers
+            FROM offers
+            WHERE COALESCE(advertiser_id, created_by) = ? AND created_at >= ?
+        """, (advertiser_id, cutoff_date), fetch_one=True)
+        response_row = snapshot.query("""
+            SELECT COUNT(r.id) as total_responses,
+                   COUNT(CASE WHEN r.status = 'accepted' THEN 1 END) as accepted_responses,
+                   AVG(o.price) as avg_response_price
+            FROM offer_responses r
+            JOIN offers o ON r.offer_id = o.id
+            WHERE COALESCE(o.advertiser_id, o.created_by) = ? AND r.created_at >= ?
+        """, (advertiser_id, cutoff_date), fetch_one=True)
+
+    return {
+        'period_days': days,
+        'offers': {
+            'total': offer_row['total_offers'],
+            'completed': offer_row['completed_offers'],
+            'completion_rate': _rate(offer_row['completed_offers'], offer_row['total_offers'])
+        },
+        'budget': {
+            'total_allocated': float(offer_row['total_budget'] or 0),
+            'average_per_offer': round(float(offer_row['avg_budget'] or 0), 2)
+        },
+        'responses': {
+            'total_received': response_row['total_responses'],
+            'accepted': response_row['accepted_responses'],
+            'acceptance_rate': _rate(response_row['accepted_responses'], response_row['total_responses']),
+            'avg_price': round(float(response_row['avg_response_price'] or 0), 2)
+        }
+    }
+
+
+# ===== ОТЧЕТЫ ReportGenerator =====
+
+def channel_placements(snapshot: AnalyticsSnapshot, channel_id: int, period_days: int = 30) -> Dict[str, Any]:
+    """Размещения канала за период: количество, просмотры, клики, средний CTR"""
+    start_date = _cutoff(period_days)
+
+    if snapshot.vectorized:
+        proposals = snapshot.frame('offer_proposals')
+        placements = snapshot.frame('offer_placements')
+
+        channel_proposals = proposals['id'][proposals['channel_id'] == channel_id]
+        selected = (np.isin(placements['proposal_id'], channel_proposals)
+                    & (placements['created_at'] >= _epoch(start_date)))
+        views = placements['views_count'][selected]
+        clicks = placements['clicks_count'][selected]
+
+        with_views = ~np.isnan(views) & ~np.isnan(clicks) & (views != 0)
+        ctr = clicks[with_views] / views[with_views]
+
+        return {
+            'total_placements': int(np.count_nonzero(selected)),
+            'total_views': nan_sum(views),
+            'total_clicks': nan_sum(clicks),
+            'avg_ctr': float(ctr.mean()) if ctr.size else None
+        }
+
+    return snapshot.query("""
+        SELECT COUNT(*) as total_placements,
+               SUM(pl.views_count) as total_views,
+               SUM(pl.clicks_count) as total_clicks,
+               AVG(CAST(pl.clicks_count AS FLOAT) / NULLIF(pl.views_count, 0)) as avg_ctr
+        FROM offer_placements pl
+        JOIN offer_proposals p ON pl.proposal_id = p.id
+        WHERE p.channel_id = ? AND pl.created_at >= ?
+    """, (channel_id, start_date.strftime('%Y-%m-%d %H:%M:%S')), fetch_one=True)
+
+
+def advertiser_offers(snapshot: AnalyticsSnapshot, user_id: int, period_days: int = 30) -> Dict[str, Any]:
+    """Офферы пользователя за период: количество, бюджет, активные"""
+    start_date = _cutoff(period_days)
+
+    if snapshot.vectorized:
+        offers = snapshot.frame('offers')
+        selected = (offers['created_by'] == user_id) & (offers['created_at'] >= _epoch(start_date))
+
+        return {
+            'total_offers': int(np.count_nonzero(selected)),
+            'total_budget': nan_sum(offers['budget_total'][selected]),
+            'active_offers': int(np.count_nonzero(selected & (offers['status'] == 'active')))
+        }
+
+    return snapshot.query("""
+        SELECT COUNT(*) as total_offers,
+               SUM(budget_total) as total_budget,
+               COUNT(CASE WHEN status = 'active' THEN 1 END) as active_offers
+        FROM offers
+        WHERE created_by = ? AND created_at >= ?
+    """, (user_id, start_date.strftime('%Y-%m-%d %H:%M:%S')), fetch_one=True)
@@ -2,6 +2,7 @@
 """
 Генератор отчетов
 Создание различных типов аналитических отчетов
+Отчеты строятся по снимку БД (AnalyticsSnapshot) и не читают рабочую базу
 """
 
 import logging
@@ -9,7 +10,8 @@ from typing import Dict, Any, List
 from datetime import datetime, timedelta
 import json
 
-from app.models.database import execute_db_query
+from app.analytics.snapshot import analytics_snapshot
+from app.analytics.offline_reports import channel_placements, advertiser_offers
 
 logger = logging.getLogger(__name__)
 
@@ -22,10 +24,10 @@ class ReportGenerator:
     def generate_channel_performance_report(self, channel_id: int, period_days: int = 30) -> Dict[str, Any]:
         """Генерация отчета о производительности канала"""
         try:
-            start_date = datetime.now() - timedelta(days=period_days)
+            snapshot = analytics_snapshot.get()
             
             # Получаем данные канала
-            channel_data = execute_db_query(
+            channel_data = snapshot.query(
                 """SELECT * FROM channels WHERE id = ?""",
                 (channel_id,),
                 fetch_one=True
@@ -34,24 +36,16 @@ class ReportGenerator:
             if not channel_data:
                 return {'success': False, 'error': 'Канал не найден'}
             
-            # Статистика размещений
-            placements_stats = execute_db_query(
-                """SELECT COUNT(*) as total_placements,
-                          SUM(views_count) as total_views,
-                          SUM(clicks_count) as total_clicks,
-                          AVG(CAST(clicks_count AS FLOAT) / NULLIF(views_count, 0)) as avg_ctr
-                   FROM offer_placements 
-                   WHERE channel_id = ? AND created_at >= ?""",
-                (channel_id, start_date),
-                fetch_one=True
-            )
+            # Статистика размещений (канал размещения - через предложение)
+            placements_stats = channel_placements(snapshot, channel_id, period_days)
             
             return {
                 'success': True,
                 'data': {
-                    'channel': dict(channel_data),
+                    'channel': channel_data,
                     'period_days': period_days,
-                    'placements': dict(placements_stats) if placements_stats else {},
+                    'placements': placements_stats or {},
+                    'data_as_of': datetime.fromtimestamp(snapshot.created_at).isoformat(),
                     'generated_at': datetime.now().isoformat()
                 }
             }
@@ -63,25 +57,18 @@ class ReportGenerator:
     def generate_advertiser_report(self, user_id: int, period_days: int = 30) -> Dict[str, Any]:
         """Генерация отчета для рекламодателя"""
         try:
-            start_date = datetime.now() - timedelta(days=period_days)
+            snapshot = analytics_snapshot.get()
             
             # Статистика офферов
-            offers_stats = execute_db_query(
-                """SELECT COUNT(*) as total_offers,
-                          SUM(budget_total) as total_budget,
-                          COUNT(CASE WHEN status = 'active' THEN 1 END) as active_offers
-                   FROM offers 
-                   WHERE created_by = ? AND created_at >= ?""",
-                (user_id, start_date),
-                fetch_one=True
-            )
+            offers_stats = advertiser_offers(snapshot, user_id, period_days)
             
             return {
                 'success': True,
                 'data': {
                     'user_id': user_id,
                     'period_days': period_days,
-                    'offers': dict(offers_stats) if offers_stats else {},
+                    'offers': offers_stats or {},
+                    'data_as_of': datetime.fromtimestamp(snapshot.created_at).isoformat(),
                     'generated_at': datetime.now().isoformat()
                 }
             }
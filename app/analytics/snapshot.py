@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Снимок базы данных для аналитических отчетов
+Планировщик периодически копирует рабочую БД в отдельный файл через
+backup API SQLite (порциями страниц, писатели не блокируются), отчеты
+читают только снимок. Нужные отчетам столбцы загружаются из снимка в
+массивы NumPy один раз на снимок, агрегации считаются векторно; без
+NumPy отчеты выполняют SQL по снимку
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Опциональный импорт NumPy
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+from app.models.read_replica import backup_database, read_snapshot_time
+from app.config.telegram_config import (
+    AppConfig, ANALYTICS_SNAPSHOT_PATH, ANALYTICS_SNAPSHOT_MAX_AGE_MINUTES, ANALYTICS_SNAPSHOT_BACKUP_PAGES
+)
+
+logger = logging.getLogger(__name__)
+
+# Время строки в секундах (строка даты трактуется как есть, без часового пояса)
+_EPOCH = "(julianday({column}) - 2440587.5) * 86400.0"
+
+# Разделитель строковых значений при выгрузке столбца одной строкой
+_STR_SEPARATOR = '\x1f'
+
+# Таблица -> столбцы для отчетов: (имя в массиве, выражение SQL, тип)
+# int - целые (NULL -> -1), float - числа (NULL -> nan), str - строки (NULL -> '')
+SNAPSHOT_FRAMES = {
+    'offers': (
+        ('id', 'id', 'int'),
+        ('advertiser_id', 'COALESCE(advertiser_id, created_by)', 'int'),
+        ('created_by', 'created_by', 'int'),
+        ('status', 'status', 'str'),
+        ('category', 'category', 'str'),
+        ('price', 'price', 'float'),
+        ('budget', 'budget', 'float'),
+        ('budget_total', 'budget_total', 'float'),
+        ('created_at', _EPOCH.format(column='created_at'), 'float'),
+    ),
+    'offer_responses': (
+        ('id', 'id', 'int'),
+        ('offer_id', 'offer_id', 'int'),
+        ('status', 'status', 'str'),
+        ('created_at', _EPOCH.format(column='created_at'), 'float'),
+    ),
+    'offer_proposals': (
+        ('id', 'id', 'int'),
+        ('channel_id', 'channel_id', 'int'),
+    ),
+    'offer_placements': (
+        ('id', 'id', 'int'),
+        ('proposal_id', 'proposal_id', 'int'),
+        ('views_count', 'views_count', 'float'),
+        ('clicks_count', 'clicks_count', 'float'),
+        ('created_at', _EPOCH.format(column='created_at'), 'float'),
+    ),
+}
+
+
+def _column_sql(expression: str, kind: str) -> str:
+    """Агрегат, выгружающий столбец одной строкой (без создания объекта на каждую строку)"""
+    if kind == 'int':
+        return f"group_concat(COALESCE(CAST({expression} AS INTEGER), -1))"
+    if kind == 'str':
+        return f"group_concat(COALESCE({expression}, ''), char(31))"
+    return f"group_concat(COALESCE(CAST({expression} AS REAL), 'nan'))"
+
+
+class AnalyticsSnapshot:
+    """Файл снимка и загруженные из него столбцы"""
+
+    def __init__(self, path: str, created_at: float):
+        self.path = path
+        self.created_at = created_at
+        self._frames: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def vectorized(self) -> bool:
+        """Агрегации считаются на массивах NumPy"""
+        return NUMPY_AVAILABLE
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.created_at
+
+    def connect(self) -> sqlite3.Connection:
+        """Соединение только для чтения"""
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def query(self, query: str, params: tuple = (), fetch_one: bool = False) -> Any:
+        """SQL по снимку: одна строка (dict) или список строк"""
+        conn = self.connect()
+        try:
+            cursor = conn.execute(query, params)
+            if fetch_one:
+                row = cursor.fetchone()
+                return dict(row) if row else None
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def frame(self, table: str) -> Dict[str, Any]:
+        """Столбцы таблицы из SNAPSHOT_FRAMES как массивы NumPy (загружаются один раз)"""
+        with self._lock:
+            frame = self._frames.get(table)
+            if frame is None:
+                frame = self._load_frame(table)
+                self._frames[table] = frame
+            return frame
+
+    def preload(self):
+        """Загружает все столбцы SNAPSHOT_FRAMES заранее, чтобы отчеты не ждали загрузки"""
+        if self.vectorized:
+            for table in SNAPSHOT_FRAMES:
+                self.frame(table)
+
+    def _load_frame(self, table: str) -> Dict[str, Any]:
+        columns = SNAPSHOT_FRAMES[table]
+        select = ', '.join(_column_sql(expression, kind) for _, expression, kind in columns)
+
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30)
+        try:
+            # Все столбцы одним проходом по таблице - порядок строк в них совпадает
+            values = conn.execute(f"SELECT {select} FROM {table}").fetchone()
+        finally:
+            conn.close()
+
+        frame = {}
+        for (name, _, kind), text in zip(columns, values):
+            if kind == 'str':
+                frame[name] = np.array(text.split(_STR_SEPARATOR) if text is not None else [], dtype=str)
+            else:
+                dtype = np.int64 if kind == 'int' else np.float64
+                frame[name] = np.fromstring(text, dtype=dtype, sep=',') if text else np.array([], dtype=dtype)
+        return frame
+
+
+class AnalyticsSnapshotManager:
+    """
+    Создание и выдача снимка БД для отчетов
+
+    Снимок пишется во временный файл и атомарно заменяет предыдущий, так
+    что открытые соединения отчетов дочитывают старую версию. Если снимок
+    старше допустимого возраста (например, планировщик работает на другом
+    экземпляре), он обновляется при запросе отчета.
+    """
+
+    def __init__(self, snapshot_path: str = ANALYTICS_SNAPSHOT_PATH,
+                 max_age_seconds: int = ANALYTICS_SNAPSHOT_MAX_AGE_MINUTES * 60,
+                 pages: int = ANALYTICS_SNAPSHOT_BACKUP_PAGES, db_path: str = None):
+        self.snapshot_path = snapshot_path
+        self.max_age_seconds = max_age_seconds
+        self.pages = pages
+        self.db_path = db_path
+        self._snapshot: Optional[AnalyticsSnapshot] = None
+        self._lock = threading.Lock()
+        self.stats = {'refreshes': 0, 'failures': 0, 'last_duration_ms': 0}
+
+    def _source_path(self) -> str:
+        return self.db_path or AppConfig.DATABASE_PATH
+
+    def refresh(self) -> AnalyticsSnapshot:
+        """Копирует рабочую БД в новый снимок"""
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> AnalyticsSnapshot:
+        started = time.time()
+        try:
+            snapshot_at = backup_database(self._source_path(), self.snapshot_path, self.pages)
+        except Exception:
+            self.stats['failures'] += 1
+            raise
+
+        self._snapshot = AnalyticsSnapshot(self.snapshot_path, snapshot_at)
+
+        self.stats['refreshes'] += 1
+        self.stats['last_duration_ms'] = int((time.time() - started) * 1000)
+        logger.info(f"📸 Снимок БД для аналитики обновлен за {self.stats['last_duration_ms']} мс")
+        return self._snapshot
+
+    def _adopt_existing(self) -> Optional[AnalyticsSnapshot]:
+        """Снимок, оставшийся от прошлого запуска"""
+        snapshot_at = read_snapshot_time(self.snapshot_path)
+        if snapshot_at is None:
+            return None
+        return AnalyticsSnapshot(self.snapshot_path, snapshot_at)
+
+    def get(self, max_age_seconds: int = None) -> AnalyticsSnapshot:
+        """
+        Актуальный снимок; устаревший или отсутствующий создается заново
+
+        Если обновить снимок не удалось, возвращается предыдущий (с
+        предупреждением в логе) - отчеты не переключаются на рабочую БД.
+        """
+        max_age = self.max_age_seconds if max_age_seconds is None else max_age_seconds
+
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.age_seconds <= max_age:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = self._adopt_existing()
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.age_seconds <= max_age:
+                return snapshot
+
+            try:
+                return self._refresh()
+            except Exception as e:
+                if snapshot is None:
+                    raise
+                logger.warning(f"⚠️ Не удалось обновить снимок БД, используется снимок "
+                               f"{int(snapshot.age_seconds)} с давности: {e}")
+                return snapshot
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return dict(
+            self.stats,
+            age_seconds=int(snapshot.age_seconds) if snapshot else None,
+            vectorized=NUMPY_AVAILABLE
+        )
+
+
+# Глобальный экземпляр
+analytics_snapshot = AnalyticsSnapshotManager()
+
+
+# ===== ВЕКТОРНЫЕ АГРЕГАЦИИ =====
+
+def nan_sum(values) -> Optional[float]:
+    """SUM как в SQL: None, если значений нет"""
+    values = values[~np.isnan(values)]
+    return float(values.sum()) if values.size else None
+
+
+def nan_mean(values) -> Optional[float]:
+    """AVG как в SQL: NULL не учитываются, None, если значений нет"""
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if values.size else None
+
+
+def group_counts(keys, values=None) -> List[tuple]:
+    """[(ключ, количество, среднее values без NULL или None)] для каждого ключа"""
+    if keys.size == 0:
+        return []
+
+    unique, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, minlength=unique.size)
+    if values is None:
+        return [(key, int(count), None) for key, count in zip(unique.tolist(), counts)]
+
+    present = ~np.isnan(values)
+    sums = np.bincount(inverse, weights=np.where(present, values, 0), minlength=unique.size)
+    filled = np.bincount(inverse, weights=present, minlength=unique.size)
+    return [
+        (key, int(count), float(total / n) if n else None)
+        for key, count, total, n in zip(unique.tolist(), counts, sums, filled)
+    ]
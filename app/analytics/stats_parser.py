@@ -5,26 +5,127 @@
 """
 
 import re
+import time
 import logging
 import asyncio
 import aiohttp
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional
 from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
 import json
 
 from app.models.database import execute_db_query
 from app.events.event_dispatcher import event_dispatcher
-from app.config.telegram_config import AppConfig, CHANNEL_STATS_UPDATE_INTERVAL_HOURS
+from app.config.telegram_config import (
+    AppConfig, CHANNEL_STATS_UPDATE_INTERVAL_HOURS, CHANNEL_STATS_CONCURRENCY,
+    STATS_SOURCE_RATE_PER_SECOND, STATS_SOURCE_HEDGE_DELAY_SECONDS
+)
+from app.telegram.telegram_html_parser import parse_html, first_class_text, parse_count, parse_percentage
 
 logger = logging.getLogger(__name__)
 
+# Источник с таким числом неудач подряд выводится из ротации на cooldown
+SOURCE_FAILURE_THRESHOLD = 3
+SOURCE_COOLDOWN_SECONDS = 60
+SOURCE_MAX_COOLDOWN_SECONDS = 1800
+# Ответ медленнее этого порога считается неудачным для оценки здоровья
+SOURCE_SLOW_RESPONSE_SECONDS = 10.0
+_HEALTH_EWMA_ALPHA = 0.2
+
+
+class SourceHealth:
+    """Оценка здоровья источника статистики (скользящие задержка и доля успехов)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latency_ewma: Optional[float] = None
+        self.success_ewma = 1.0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def record(self, success: bool, latency: float):
+        """Учет результата запроса к источнику"""
+        self.requests += 1
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += _HEALTH_EWMA_ALPHA * (latency - self.latency_ewma)
+
+        healthy = success and latency <= SOURCE_SLOW_RESPONSE_SECONDS
+        self.success_ewma += _HEALTH_EWMA_ALPHA * ((1.0 if healthy else 0.0) - self.success_ewma)
+
+        if healthy:
+            self.consecutive_failures = 0
+            return
+
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= SOURCE_FAILURE_THRESHOLD:
+            # Экспоненциально растущий cooldown, после него источник снова пробуется
+            cooldown = min(
+                SOURCE_COOLDOWN_SECONDS * 2 ** (self.consecutive_failures - SOURCE_FAILURE_THRESHOLD),
+                SOURCE_MAX_COOLDOWN_SECONDS
+            )
+            self.cooldown_until = time.monotonic() + cooldown
+            logger.warning(f"⚠️ Источник {self.name} отключен на {cooldown} с "
+                           f"({self.consecutive_failures} неудач подряд)")
+
+    def is_available(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def score(self) -> float:
+        """Чем выше, тем раньше источник опрашивается"""
+        return self.success_ewma / max(self.latency_ewma or 1.0, 0.05)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'available': self.is_available(),
+            'score': round(self.score(), 3),
+            'latency_ewma': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            'success_rate': round(self.success_ewma, 3),
+            'consecutive_failures': self.consecutive_failures,
+            'requests': self.requests,
+            'failures': self.failures
+        }
+
+
+# Здоровье источников общее для процесса и переживает отдельные запуски обновления
+source_health: Dict[str, SourceHealth] = {}
+
+
+def get_source_health(source_name: str) -> SourceHealth:
+    if source_name not in source_health:
+        source_health[source_name] = SourceHealth(source_name)
+    return source_health[source_name]
+
+
+class SourceRateLimiter:
+    """Ограничение частоты запросов к одному источнику (равномерные интервалы)"""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
 class TelegramStatsParser:
     """Парсер статистики Telegram каналов"""
     
     def __init__(self):
         self.session = None
         self.update_interval = CHANNEL_STATS_UPDATE_INTERVAL_HOURS
+        self.max_concurrent_channels = CHANNEL_STATS_CONCURRENCY
+        self.hedge_delay = STATS_SOURCE_HEDGE_DELAY_SECONDS
+        self.rate_limiters: Dict[str, SourceRateLimiter] = {}
         self.user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         
         # Источники данных для парсинга
@@ -42,6 +143,11 @@ class TelegramStatsParser:
                 timeout=timeout,
                 headers={'User-Agent': self.user_agent}
             )
+            # Лимитеры привязаны к текущему event loop, поэтому создаются вместе с сессией
+            self.rate_limiters = {
+                source_name: SourceRateLimiter(STATS_SOURCE_RATE_PER_SECOND)
+                for source_name in self.data_sources
+            }
     
     async def close_session(self):
         """Закрытие HTTP сессии"""
@@ -53,6 +159,7 @@ class TelegramStatsParser:
         """Обновление статистики всех активных каналов"""
         try:
             await self.init_session()
+            started_at = time.monotonic()
             
             # Получаем все активные верифицированные каналы
             channels = execute_db_query(
@@ -63,40 +170,29 @@ class TelegramStatsParser:
                 fetch_all=True
             )
             
-            updated_count = 0
-            errors = []
-            
-            for channel in channels:
-                try:
-                    # Проверяем, нужно ли обновлять статистику
-                    if self._should_update_stats(channel['last_stats_update']):
-                        stats = await self.get_channel_stats(channel['username'])
-                        
-                        if stats['success']:
-                            await self._save_channel_stats(channel['id'], stats['data'])
-                            updated_count += 1
-                            
-                            # Отправляем событие об обновлении
-                            event_dispatcher.channel_stats_updated(
-                                channel_id=channel['id'],
-                                owner_id=0,  # Получим из БД если нужно
-                                old_subscriber_count=channel['subscriber_count'],
-                                new_subscriber_count=stats['data']['subscriber_count']
-                            )
-                        else:
-                            errors.append(f"Канал @{channel['username']}: {stats['error']}")
-                    
-                    # Небольшая задержка между запросами
-                    await asyncio.sleep(2)
-                    
-                except Exception as e:
-                    errors.append(f"Канал @{channel['username']}: {str(e)}")
-                    logger.error(f"❌ Ошибка обновления статистики канала @{channel['username']}: {e}")
+            # Проверяем, нужно ли обновлять статистику
+            due_channels = [c for c in channels if self._should_update_stats(c['last_stats_update'])]
+            
+            # Каналы обрабатываются параллельно, темп задают лимиты источников
+            semaphore = asyncio.Semaphore(self.max_concurrent_channels)
+            outcomes = await asyncio.gather(*[
+                self._update_channel_stats(channel, semaphore) for channel in due_channels
+            ])
+            
+            updated_count = len([error for error in outcomes if error is None])
+            errors = [error for error in outcomes if error is not None]
+            duration = time.monotonic() - started_at
+            
+            if duration > self.update_interval * 3600:
+                logger.warning(f"⚠️ Обновление {len(due_channels)} каналов заняло {duration:.0f} с - "
+                               f"больше интервала {self.update_interval} ч")
             
             return {
                 'success': True,
                 'updated_count': updated_count,
                 'total_channels': len(channels),
+                'duration_seconds': round(duration, 1),
+                'sources': self.get_sources_health(),
                 'errors': errors
             }
             
@@ -106,29 +202,178 @@ class TelegramStatsParser:
         finally:
             await self.close_session()
     
+    async def _update_channel_stats(self, channel: Dict[str, Any], semaphore: asyncio.Semaphore) -> Optional[str]:
+        """Обновление одного канала, возвращает текст ошибки или None"""
+        async with semaphore:
+            try:
+                stats = await self.get_channel_stats(channel['username'])
+                
+                if not stats['success']:
+                    return f"Канал @{channel['username']}: {stats['error']}"
+                
+                await self._save_channel_stats(channel['id'], stats['data'])
+                
+                # Отправляем событие об обновлении
+                event_dispatcher.channel_stats_updated(
+                    channel_id=channel['id'],
+                    owner_id=0,  # Получим из БД если нужно
+                    old_subscriber_count=channel['subscriber_count'],
+                    new_subscriber_count=stats['data']['subscriber_count']
+                )
+                return None
+                
+            except Exception as e:
+                logger.error(f"❌ Ошибка обновления статистики канала @{channel['username']}: {e}")
+                return f"Канал @{channel['username']}: {str(e)}"
+    
     async def get_channel_stats(self, channel_username: str) -> Dict[str, Any]:
         """Получение статистики конкретного канала"""
         try:
             username = channel_username.lstrip('@')
             
-            # Пробуем получить данные из разных источников
-            for source_name, base_url in self.data_sources.items():
-                try:
-                    stats = await self._parse_from_source(source_name, base_url, username)
-                    if stats['success']:
-                        logger.info(f"✅ Статистика канала @{username} получена из {source_name}")
-                        return stats
-                except Exception as e:
-                    logger.warning(f"⚠️ Не удалось получить данные из {source_name}: {e}")
-                    continue
+            # Опрашиваем источники с подстраховкой: побеждает первый полезный ответ
+            stats = await self._get_stats_hedged(username)
+            if stats and self._has_useful_stats(stats):
+                return stats
             
             # Если не удалось получить из внешних источников, используем Telegram API
-            return await self._get_stats_from_telegram_api(username)
+            api_stats = await self._get_stats_from_telegram_api(username)
+            if api_stats.get('success') or not stats:
+                return api_stats
+            return stats
             
         except Exception as e:
             logger.error(f"❌ Ошибка получения статистики канала @{channel_username}: {e}")
             return {'success': False, 'error': str(e)}
     
+    def _ranked_sources(self) -> List[str]:
+        """Доступные источники по убыванию оценки здоровья"""
+        available = [name for name in self.data_sources if get_source_health(name).is_available()]
+        return sorted(available, key=lambda name: get_source_health(name).score(), reverse=True)
+    
+    @staticmethod
+    def _has_useful_stats(stats: Dict[str, Any]) -> bool:
+        return bool(stats.get('success')) and stats.get('data', {}).get('subscriber_count', 0) > 0
+    
+    def _hedge_delay_for(self, source_name: str) -> float:
+        """Сколько ждать источник, прежде чем параллельно спросить следующий"""
+        latency = get_source_health(source_name).latency_ewma
+        if latency is None:
+            return self.hedge_delay
+        return min(max(latency * 1.5, 0.5), self.hedge_delay * 2)
+    
+    async def _get_stats_hedged(self, username: str) -> Optional[Dict[str, Any]]:
+        """
+        Запрос к источникам с подстраховкой (hedged requests)
+        
+        Лучший источник запрашивается первым; если он не ответил за время
+        подстраховки или ответил неудачно, запускается следующий. Время
+        подстраховки отсчитывается с начала запроса, а не с постановки в
+        очередь лимита частоты. Первый ответ с данными побеждает, остальные
+        запросы отменяются; источники, запущенные раньше победителя,
+        учитываются как неудачные (медленные).
+        """
+        remaining = self._ranked_sources()
+        if not remaining:
+            return None
+        
+        pending = {}
+        launched: List[str] = []
+        started_at: Dict[str, float] = {}
+        started: Dict[str, asyncio.Event] = {}
+        fallback = None
+        
+        def launch_next():
+            source_name = remaining.pop(0)
+            launched.append(source_name)
+            started[source_name] = asyncio.Event()
+            
+            def on_start():
+                started_at[source_name] = time.monotonic()
+                started[source_name].set()
+            
+            task = asyncio.ensure_future(self._timed_parse(source_name, username, on_start))
+            pending[task] = source_name
+            return source_name
+        
+        async def hedge_timer(source_name: str):
+            await started[source_name].wait()
+            await asyncio.sleep(self._hedge_delay_for(source_name))
+        
+        leader = launch_next()
+        timer = None
+        try:
+            while pending:
+                if remaining and timer is None:
+                    timer = asyncio.ensure_future(hedge_timer(leader))
+                done, _ = await asyncio.wait(list(pending) + ([timer] if timer else []),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                
+                if timer in done:
+                    done.discard(timer)
+                    timer = None
+                    if not done:
+                        leader = launch_next()
+                        continue
+                
+                for task in done:
+                    source_name = pending.pop(task)
+                    stats = task.result()
+                    if self._has_useful_stats(stats):
+                        logger.info(f"✅ Статистика канала @{username} получена из {source_name}")
+                        self._record_outrun(launched[:launched.index(source_name)], pending, started_at)
+                        return stats
+                    if stats.get('success') and fallback is None:
+                        fallback = stats
+                
+                if not pending and remaining:
+                    if timer is not None:
+                        timer.cancel()
+                        timer = None
+                    leader = launch_next()
+            
+            return fallback
+        finally:
+            if timer is not None:
+                timer.cancel()
+            for task in pending:
+                task.cancel()
+    
+    @staticmethod
+    def _record_outrun(earlier: List[str], pending: Dict[asyncio.Future, str], started_at: Dict[str, float]):
+        """Неудача для источников, которые начали раньше победителя и еще не ответили"""
+        now = time.monotonic()
+        for source_name in pending.values():
+            if source_name in earlier and source_name in started_at:
+                get_source_health(source_name).record(False, now - started_at[source_name])
+    
+    async def _timed_parse(self, source_name: str, username: str,
+                           on_start: Callable[[], None] = None) -> Dict[str, Any]:
+        """
+        Запрос к источнику с учетом лимита частоты и записью здоровья
+
+        on_start вызывается после ожидания в лимите частоты, перед запросом.
+        Отмененный запрос здоровье не меняет: проигрыш подстраховке
+        учитывает _get_stats_hedged.
+        """
+        await self.rate_limiters[source_name].acquire()
+        if on_start:
+            on_start()
+        
+        started_at = time.monotonic()
+        try:
+            stats = await self._parse_from_source(source_name, self.data_sources[source_name], username)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось получить данные из {source_name}: {e}")
+            stats = {'success': False, 'error': str(e)}
+        
+        get_source_health(source_name).record(bool(stats.get('success')), time.monotonic() - started_at)
+        return stats
+    
+    def get_sources_health(self) -> Dict[str, Dict[str, Any]]:
+        """Состояние источников статистики"""
+        return {name: get_source_health(name).to_dict() for name in self.data_sources}
+    
     async def get_post_statistics(self, channel_username: str, post_id: int) -> Dict[str, Any]:
         """Получение статистики конкретного поста"""
         try:
@@ -219,15 +464,15 @@ class TelegramStatsParser:
                     return {'success': False, 'error': f'HTTP {response.status}'}
                 
                 html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
+                tree = parse_html(html)
                 
                 # Парсинг в зависимости от источника
                 if source_name == 'tgstat':
-                    return self._parse_tgstat(soup, username)
+                    return self._parse_tgstat(tree, username)
                 elif source_name == 'telemetr':
-                    return self._parse_telemetr(soup, username)
+                    return self._parse_telemetr(tree, username)
                 elif source_name == 'telegram_analytics':
-                    return self._parse_telegram_analytics(soup, username)
+                    return self._parse_telegram_analytics(tree, username)
                 else:
                     return {'success': False, 'error': 'Неизвестный источник'}
                     
@@ -235,31 +480,13 @@ class TelegramStatsParser:
             logger.error(f"❌ Ошибка парсинга из {source_name}: {e}")
             return {'success': False, 'error': str(e)}
     
-    def _parse_tgstat(self, soup: BeautifulSoup, username: str) -> Dict[str, Any]:
+    def _parse_tgstat(self, tree, username: str) -> Dict[str, Any]:
         """Парсинг данных с TGStat"""
         try:
-            # Ищем основные метрики
-            subscriber_count = 0
-            avg_views = 0
-            engagement_rate = 0
-            
-            # Поиск подписчиков
-            subscriber_elem = soup.find('div', class_='subscribers-count')
-            if subscriber_elem:
-                subscriber_text = subscriber_elem.get_text().strip()
-                subscriber_count = self._extract_number(subscriber_text)
-            
-            # Поиск средних просмотров
-            views_elem = soup.find('div', class_='avg-views')
-            if views_elem:
-                views_text = views_elem.get_text().strip()
-                avg_views = self._extract_number(views_text)
-            
-            # Поиск engagement rate
-            engagement_elem = soup.find('div', class_='engagement-rate')
-            if engagement_elem:
-                engagement_text = engagement_elem.get_text().strip()
-                engagement_rate = self._extract_percentage(engagement_text)
+            # Ищем основные метрики (XPath-выражения скомпилированы один раз)
+            subscriber_count = self._extract_number(first_class_text(tree, 'subscribers-count'))
+            avg_views = self._extract_number(first_class_text(tree, 'avg-views'))
+            engagement_rate = self._extract_percentage(first_class_text(tree, 'engagement-rate'))
             
             return {
                 'success': True,
@@ -275,7 +502,7 @@ class TelegramStatsParser:
         except Exception as e:
             return {'success': False, 'error': f'Ошибка парсинга TGStat: {str(e)}'}
     
-    def _parse_telemetr(self, soup: BeautifulSoup, username: str) -> Dict[str, Any]:
+    def _parse_telemetr(self, tree, username: str) -> Dict[str, Any]:
         """Парсинг данных с Telemetr"""
         try:
             # Аналогично TGStat, но с другими селекторами
@@ -299,7 +526,7 @@ class TelegramStatsParser:
         except Exception as e:
             return {'success': False, 'error': f'Ошибка парсинга Telemetr: {str(e)}'}
     
-    def _parse_telegram_analytics(self, soup: BeautifulSoup, username: str) -> Dict[str, Any]:
+    def _parse_telegram_analytics(self, tree, username: str) -> Dict[str, Any]:
         """Парсинг данных с Telegram Analytics"""
         try:
             # Специфичная логика для Telegram Analytics
@@ -433,31 +660,11 @@ class TelegramStatsParser:
     
     def _extract_number(self, text: str) -> int:
         """Извлечение числа из текста (поддержка K, M суффиксов)"""
-        try:
-            # Удаляем все кроме цифр, точек и букв K, M
-            clean_text = re.sub(r'[^\d.,KMkm]', '', text.upper())
-            
-            if 'K' in clean_text:
-                number = float(clean_text.replace('K', '')) * 1000
-            elif 'M' in clean_text:
-                number = float(clean_text.replace('M', '')) * 1000000
-            else:
-                number = float(clean_text.replace(',', ''))
-            
-            return int(number)
-        except:
-            return 0
+        return parse_count(text)
     
     def _extract_percentage(self, text: str) -> float:
         """Извлечение процента из текста"""
-        try:
-            # Ищем число с знаком процента
-            match = re.search(r'(\d+\.?\d*)%', text)
-            if match:
-                return float(match.group(1))
-            return 0.0
-        except:
-            return 0.0
+        return parse_percentage(text)
     
     def _extract_post_id_from_url(self, post_url: str) -> Optional[int]:
         """Извлечение ID поста из URL"""
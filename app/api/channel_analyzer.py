@@ -11,6 +11,8 @@ import requests
 from flask import Blueprint, request, jsonify, current_app
 import os
 
+from app.telegram.telegram_web_fetcher import get_web_fetcher
+
 logger = logging.getLogger(__name__)
 
 # Blueprint для анализатора каналов
@@ -162,21 +164,19 @@ class TelegramChannelAnalyzer:
                 logger.info(f"🔍 Пробуем: {url}")
                 
                 try:
-                    # Добавляем задержку и retry
-                    import time
-                    time.sleep(1)  # Небольшая задержка
+                    fetcher = get_web_fetcher()
+                    
+                    # Задержка нужна только перед реальным сетевым запросом
+                    if not fetcher.has_fresh(url):
+                        import time
+                        time.sleep(1)  # Небольшая задержка
                     
-                    response = self.session.get(
-                        url, 
-                        headers=headers, 
-                        timeout=15,
-                        allow_redirects=True,
-                        verify=True
-                    )
+                    # Страница берется из общего кэша t.me
+                    response = fetcher.fetch(url, headers=headers, timeout=15)
                     
-                    logger.info(f"📡 Статус {url}: {response.status_code}")
+                    logger.info(f"📡 Статус {url}: {response.status}{' (кэш)' if response.from_cache else ''}")
                     
-                    if response.status_code == 200:
+                    if response.status == 200:
                         content = response.text
                         
                         # Проверяем что это страница канала
@@ -244,11 +244,11 @@ class TelegramChannelAnalyzer:
                         else:
                             logger.warning(f"⚠️ Это не страница канала")
                             
-                    elif response.status_code == 404:
+                    elif response.status == 404:
                         logger.warning(f"❌ Канал не найден (404)")
                         return None
                     else:
-                        logger.warning(f"⚠️ HTTP {response.status_code}")
+                        logger.warning(f"⚠️ HTTP {response.status}")
                         
                 except requests.exceptions.ConnectionError as e:
                     logger.warning(f"❌ Ошибка соединения с {url}: {e}")
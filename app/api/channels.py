@@ -13,6 +13,7 @@ from datetime import datetime
 from app.config.telegram_config import AppConfig
 from app.models.database import execute_db_query
 from app.services.telegram_verification import TelegramVerificationService
+from app.utils.pagination import KeysetPaginator
 
 
 # Настройка логирования
@@ -24,6 +25,13 @@ channels_bp = Blueprint('channels', __name__)
 # Путь к базе данных
 DATABASE_PATH = AppConfig.DATABASE_PATH
 
+# Каталог каналов: крупные каналы первыми, id различает каналы с одинаковым числом подписчиков
+_CHANNELS_PAGINATOR = KeysetPaginator(
+    'channels', ('COALESCE(c.subscriber_count, 0)', 'c.id'),
+    indexes=("CREATE INDEX IF NOT EXISTS idx_channels_active_subscribers_keyset "
+             "ON channels(is_active, COALESCE(subscriber_count, 0), id)",)
+)
+
 # Добавьте этот эндпоинт в channels.py
 
 class ChannelValidator:
@@ -78,10 +86,10 @@ def get_channels():
     ИСПРАВЛЕНО: убран SQLAlchemy, исправлены имена полей
     """
     try:
-        # Параметры пагинации
+        # Параметры пагинации: номер страницы или курсор next_cursor предыдущей страницы
         page = max(int(request.args.get('page', 1)), 1)
         limit = min(int(request.args.get('limit', 20)), 100)
-        offset = (page - 1) * limit
+        page_cursor = request.args.get('cursor')
 
         # Фильтры
         category = request.args.get('category')
@@ -90,56 +98,38 @@ def get_channels():
         verified_only = request.args.get('verified_only', '').lower() == 'true'
         search = request.args.get('search', '').strip()
 
-        # ✅ ИСПРАВЛЕНО: Чистый SQLite вместо SQLAlchemy
-        conn = sqlite3.connect(AppConfig.DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        # Базовый запрос
-        sql = """
-            SELECT c.id, c.telegram_id, c.title, c.username, c.subscriber_count, 
-                   c.category, c.is_verified, c.created_at, c.owner_id,
-                   u.username as owner_username, u.first_name as owner_name
-            FROM channels c 
-            JOIN users u ON c.owner_id = u.id 
-            WHERE c.is_active = 1
-        """
-        count_sql = "SELECT COUNT(*) as total FROM channels c WHERE c.is_active = 1"
+        conditions = ["c.is_active = 1"]
         params = []
 
         # Применяем фильтры
         if verified_only:
-            sql += " AND c.is_verified = 1"
-            count_sql += " AND c.is_verified = 1"
+            conditions.append("c.is_verified = 1")
 
         if category:
-            sql += " AND c.category = ?"
-            count_sql += " AND c.category = ?"
+            conditions.append("c.category = ?")
             params.append(category)
 
         if min_subscribers:
-            sql += " AND c.subscriber_count >= ?"
-            count_sql += " AND c.subscriber_count >= ?"
+            conditions.append("c.subscriber_count >= ?")
             params.append(min_subscribers)
 
         if search:
-            sql += " AND (c.title LIKE ? OR c.username LIKE ?)"
-            count_sql += " AND (c.title LIKE ? OR c.username LIKE ?)"
+            conditions.append("(c.title LIKE ? OR c.username LIKE ?)")
             search_term = f'%{search}%'
             params.extend([search_term, search_term])
 
-        # Получаем общее количество
-        cursor.execute(count_sql, params)
-        total_count = cursor.fetchone()['total']
-
-        # Добавляем сортировку и пагинацию
         # ✅ ИСПРАВЛЕНО: subscriber_count вместо subscribers_count
-        sql += " ORDER BY c.subscriber_count DESC LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
-
-        cursor.execute(sql, params)
-        channels = cursor.fetchall()
-        conn.close()
+        try:
+            result = _CHANNELS_PAGINATOR.paginate(
+                """c.id, c.telegram_id, c.title, c.username, c.subscriber_count, 
+                   c.category, c.is_verified, c.created_at, c.owner_id,
+                   u.username as owner_username, u.first_name as owner_name""",
+                "channels c JOIN users u ON c.owner_id = u.id", conditions, params,
+                limit=limit, cursor=page_cursor, page=page, with_total=True, count_from="channels c"
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        channels = result.items
 
         # Формируем ответ
         channels_data = []
@@ -163,14 +153,7 @@ def get_channels():
 
         return jsonify({
             'channels': channels_data,
-            'pagination': {
-                'page': page,
-                'limit': limit,
-                'total': total_count,
-                'pages': (total_count + limit - 1) // limit,
-                'has_next': offset + limit < total_count,
-                'has_prev': page > 1
-            },
+            'pagination': result.pagination(has_prev=bool(page_cursor) or page > 1),
             'filters_applied': {
                 'category': category,
                 'min_subscribers': min_subscribers,
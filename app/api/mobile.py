@@ -10,6 +10,7 @@ from flask import Blueprint, request, jsonify, g
 from functools import wraps
 from app.models.database import execute_db_query
 from app.config.telegram_config import AppConfig
+from app.services.user_counters import get_user_counters
 
 logger = logging.getLogger(__name__)
 
@@ -82,27 +83,18 @@ def get_mobile_summary():
         if not user_id:
             return jsonify({'success': False, 'error': 'Auth required'}), 401
 
-        # Минимальный набор данных для мобильного
-        summary_data = execute_db_query("""
-            SELECT 
-                u.balance,
-                (SELECT COUNT(*) FROM channels WHERE owner_id = ? AND is_active = 1) as channels,
-                (SELECT COUNT(*) FROM offers WHERE created_by = ? AND status = 'active') as active_offers,
-                (SELECT COUNT(*) FROM offer_proposals op 
-                 JOIN channels c ON op.channel_id = c.id 
-                 WHERE c.owner_id = ? AND op.status = 'sent') as pending_proposals
-            FROM users u WHERE u.id = ?
-        """, (user_id, user_id, user_id, user_id), fetch_one=True)
-
-        if not summary_data:
+        # Минимальный набор данных для мобильного: баланс и счетчики одним поиском по ключу
+        counters = get_user_counters(user_id)
+
+        if not counters:
             return jsonify({'success': False, 'error': 'User not found'}), 404
 
         # Компактный ответ для мобильного
         mobile_summary = {
-            'balance': float(summary_data.get('balance', 0)),
-            'channels': summary_data.get('channels', 0),
-            'offers': summary_data.get('active_offers', 0),
-            'pending': summary_data.get('pending_proposals', 0),
+            'balance': float(counters['balance']),
+            'channels': counters['channels_active'],
+            'offers': counters['offers_active'],
+            'pending': counters['proposals_sent'],
             'timestamp': int(datetime.now().timestamp())
         }
 
@@ -278,27 +270,25 @@ def get_mobile_mini_stats():
             return jsonify({'success': False, 'error': 'Auth required'}), 401
 
         # Только самые важные метрики для мобильного
-        stats = execute_db_query("""
-            SELECT 
-                u.balance,
-                (SELECT COUNT(*) FROM channels WHERE owner_id = ? AND is_active = 1) as channels,
-                (SELECT COUNT(*) FROM offers WHERE created_by = ? AND status = 'active') as offers,
-                (SELECT COALESCE(SUM(views_count), 0) FROM placement_statistics ps
-                 JOIN offer_placements op ON ps.placement_id = op.id
-                 JOIN offer_proposals opr ON op.proposal_id = opr.id
-                 JOIN channels c ON opr.channel_id = c.id
-                 WHERE c.owner_id = ? AND ps.collected_at > datetime('now', '-7 days')) as week_views
-            FROM users u WHERE u.id = ?
-        """, (user_id, user_id, user_id, user_id), fetch_one=True)
-
-        if not stats:
+        counters = get_user_counters(user_id)
+
+        if not counters:
             return jsonify({'success': False, 'error': 'User not found'}), 404
 
+        # Просмотры за неделю - оконная выборка, в счетчиках ее нет
+        week_views = execute_db_query("""
+            SELECT COALESCE(SUM(views_count), 0) as week_views FROM placement_statistics ps
+            JOIN offer_placements op ON ps.placement_id = op.id
+            JOIN offer_proposals opr ON op.proposal_id = opr.id
+            JOIN channels c ON opr.channel_id = c.id
+            WHERE c.owner_id = ? AND ps.collected_at > datetime('now', '-7 days')
+        """, (user_id,), fetch_one=True)
+
         mini_stats = {
-            'balance': float(stats.get('balance', 0)),
-            'channels': stats.get('channels', 0),
-            'offers': stats.get('offers', 0),
-            'views': stats.get('week_views', 0)
+            'balance': float(counters['balance']),
+            'channels': counters['channels_active'],
+            'offers': counters['offers_active'],
+            'views': week_views['week_views'] if week_views else 0
         }
 
         return jsonify({
@@ -13,6 +13,7 @@ from typing import Dict, List, Optional, Any, Tuple
 from flask import Blueprint, request, jsonify, current_app
 from app.models.database import get_user_id_from_request, execute_db_query
 from app.config.telegram_config import AppConfig
+from app.models.read_replica import connect_routed, read_heavy
 import logging
 
 # Настройка логирования
@@ -28,7 +29,8 @@ monitoring_statistics_bp = Blueprint('monitoring_statistics', __name__, url_pref
 def get_db_connection():
     """Получение соединения с базой данных"""
     try:
-        conn = sqlite3.connect(AppConfig.DATABASE_PATH)
+        # Внутри @read_heavy - реплика только для чтения
+        conn = connect_routed() or sqlite3.connect(AppConfig.DATABASE_PATH)
         conn.row_factory = sqlite3.Row
         return conn
     except Exception as e:
@@ -277,7 +279,7 @@ def save_placement_check(placement_id: int, check_result: Dict[str, Any]) -> boo
         return False
 
 def get_placement_history(placement_id: int, limit: int = 20) -> List[Dict]:
-    """Получение истории проверок размещения"""
+    """Получение последних проверок размещения (сырые проверки хранятся STATS_RAW_TTL_DAYS дней)"""
     try:
         conn = get_db_connection()
         if not conn:
@@ -303,8 +305,25 @@ def get_placement_history(placement_id: int, limit: int = 20) -> List[Dict]:
         logger.error(f"Ошибка получения истории проверок: {e}")
         return []
 
-def get_offer_detailed_statistics(offer_id: int) -> Dict[str, Any]:
-    """Получение детальной статистики по офферу"""
+def get_placement_views_history(placement_id: int, range_hours: float) -> Dict[str, Any]:
+    """
+    История просмотров размещения для графика за последние range_hours часов
+
+    Разрешение (сырые проверки, часы или дни) выбирается по длине периода.
+    """
+    from app.services.stats_rollup import get_placement_series, SOURCE_CHECKS
+    
+    try:
+        return get_placement_series(placement_id, range_hours, source=SOURCE_CHECKS)
+    except Exception as e:
+        logger.error(f"Ошибка получения истории просмотров: {e}")
+        return {}
+
+@read_heavy()
+def get_offer_detailed_statistics(offer_id: int, range_hours: Optional[float] = None) -> Dict[str, Any]:
+    """Получение детальной статистики по офферу (range_hours - период графика просмотров)"""
+    from app.services.stats_rollup import get_check_status_totals, get_placements_views_series, SOURCE_CHECKS
+    
     try:
         conn = get_db_connection()
         if not conn:
@@ -381,23 +400,21 @@ def get_offer_detailed_statistics(offer_id: int) -> Dict[str, Any]:
         
         channels_details = cursor.fetchall()
         
-        # Статистика проверок
+        # Размещения оффера для статистики проверок и графика
         cursor.execute("""
-            SELECT 
-                pc.check_status,
-                COUNT(*) as count,
-                AVG(pc.views_count) as avg_views
-            FROM placement_checks pc
-            JOIN offer_placements opl ON pc.placement_id = opl.id
+            SELECT opl.id
+            FROM offer_placements opl
             JOIN offer_proposals op ON opl.proposal_id = op.id
             WHERE op.offer_id = ?
-            GROUP BY pc.check_status
         """, (offer_id,))
         
-        check_stats = cursor.fetchall()
+        placement_ids = [row['id'] for row in cursor.fetchall()]
         
         conn.close()
         
+        # Статистика проверок: свернутые счетчики + еще не свернутые проверки
+        check_statistics = get_check_status_totals(placement_ids)
+        
         # Формируем результат
         result = {
             'offer': dict(offer),
@@ -419,15 +436,12 @@ def get_offer_detailed_statistics(offer_id: int) -> Dict[str, Any]:
                 for row in placement_stats
             },
             'channels_details': [dict(row) for row in channels_details],
-            'check_statistics': {
-                row['check_status']: {
-                    'count': row['count'],
-                    'avg_views': round(row['avg_views'], 2) if row['avg_views'] else 0
-                }
-                for row in check_stats
-            }
+            'check_statistics': check_statistics
         }
         
+        if range_hours:
+            result['views_history'] = get_placements_views_series(placement_ids, range_hours, source=SOURCE_CHECKS)
+        
         # Добавляем сводную статистику
         total_proposals = sum(stats['count'] for stats in result['proposal_statistics'].values())
         total_views = sum(stats['total_views'] for stats in result['placement_statistics'].values())
@@ -464,6 +478,7 @@ def get_placement_status(placement_id: int):
     Query Parameters:
     - include_history: включить историю проверок (true/false)
     - history_limit: количество записей истории (по умолчанию 10)
+    - history_range_hours: период графика просмотров в часах (вместе с include_history)
     """
     try:
         # Получаем ID пользователя из запроса
@@ -492,6 +507,7 @@ def get_placement_status(placement_id: int):
         # Получаем параметры
         include_history = request.args.get('include_history', 'false').lower() == 'true'
         history_limit = request.args.get('history_limit', 10, type=int)
+        history_range_hours = request.args.get('history_range_hours', type=float)
         
         # Формируем ответ
         response = {
@@ -533,6 +549,9 @@ def get_placement_status(placement_id: int):
         if include_history:
             history = get_placement_history(placement_id, history_limit)
             response['check_history'] = history
+            
+            if history_range_hours:
+                response['views_history'] = get_placement_views_history(placement_id, history_range_hours)
         
         # Рассчитываем дополнительные метрики
         if placement['placement_start'] and placement['expected_duration']:
@@ -677,6 +696,7 @@ def get_offer_statistics(offer_id: int):
     Query Parameters:
     - include_channels: включить детали по каналам (true/false)
     - include_checks: включить статистику проверок (true/false)
+    - views_range_hours: период графика прироста просмотров в часах
     """
     try:
         # Получаем ID пользователя из запроса
@@ -718,9 +738,10 @@ def get_offer_statistics(offer_id: int):
         # Получаем параметры
         include_channels = request.args.get('include_channels', 'true').lower() == 'true'
         include_checks = request.args.get('include_checks', 'true').lower() == 'true'
+        views_range_hours = request.args.get('views_range_hours', type=float)
         
         # Получаем детальную статистику
-        statistics = get_offer_detailed_statistics(offer_id)
+        statistics = get_offer_detailed_statistics(offer_id, views_range_hours)
         
         if not statistics:
             return jsonify({
@@ -746,6 +767,9 @@ def get_offer_statistics(offer_id: int):
         if include_checks:
             response['check_statistics'] = statistics['check_statistics']
         
+        if 'views_history' in statistics:
+            response['views_history'] = statistics['views_history']
+        
         # Добавляем дополнительную аналитику
         response['analytics'] = {
             'campaign_duration': None,
@@ -826,116 +850,13 @@ def get_dashboard_statistics():
                 'message': 'Требуется авторизация'
             }), 401
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({
-                'error': 'Internal Server Error',
-                'message': 'Ошибка подключения к базе данных'
-            }), 500
-        
-        cursor = conn.cursor()
-        
-        # Статистика офферов пользователя
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_offers,
-                SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed_offers,
-                SUM(CASE WHEN status = 'in_progress' THEN 1 ELSE 0 END) as active_offers,
-                SUM(budget) as total_budget
-            FROM offers
-            WHERE created_by = ?
-        """, (user_id,))
-        
-        offers_stats = cursor.fetchone()
+        from app.services.dashboard_snapshot import get_user_dashboard
         
-        # Статистика предложений
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_proposals,
-                SUM(CASE WHEN op.status = 'accepted' THEN 1 ELSE 0 END) as accepted_proposals,
-                SUM(CASE WHEN op.status = 'rejected' THEN 1 ELSE 0 END) as rejected_proposals
-            FROM offer_proposals op
-            JOIN offers o ON op.offer_id = o.id
-            WHERE o.created_by = ?
-        """, (user_id,))
-        
-        proposals_stats = cursor.fetchone()
-        
-        # Статистика размещений
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_placements,
-                SUM(CASE WHEN opl.status = 'completed' THEN 1 ELSE 0 END) as completed_placements,
-                SUM(opl.final_views_count) as total_views
-            FROM offer_placements opl
-            JOIN offer_proposals op ON opl.proposal_id = op.id
-            JOIN offers o ON op.offer_id = o.id
-            WHERE o.created_by = ?
-        """, (user_id,))
-        
-        placements_stats = cursor.fetchone()
-        
-        # Статистика каналов пользователя (если он владелец каналов)
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_channels,
-                SUM(CASE WHEN is_verified = 1 THEN 1 ELSE 0 END) as verified_channels,
-                SUM(subscriber_count) as total_subscribers
-            FROM channels
-            WHERE owner_id = ?
-        """, (user_id,))
-        
-        channels_stats = cursor.fetchone()
-        
-        # Входящие предложения (для владельца каналов)
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_incoming,
-                SUM(CASE WHEN op.status = 'sent' THEN 1 ELSE 0 END) as pending_proposals
-            FROM offer_proposals op
-            JOIN channels c ON op.channel_id = c.id
-            WHERE c.owner_id = ?
-        """, (user_id,))
-        
-        incoming_stats = cursor.fetchone()
-        
-        conn.close()
-        
-        # Формируем ответ
+        # Снимок пересобирается планировщиком каждые 5 минут
         response = {
             'success': True,
             'user_id': user_id,
-            'offers': {
-                'total': offers_stats['total_offers'],
-                'completed': offers_stats['completed_offers'],
-                'active': offers_stats['active_offers'],
-                'total_budget': offers_stats['total_budget'] or 0
-            },
-            'proposals': {
-                'total': proposals_stats['total_proposals'],
-                'accepted': proposals_stats['accepted_proposals'],
-                'rejected': proposals_stats['rejected_proposals'],
-                'acceptance_rate': round(
-                    (proposals_stats['accepted_proposals'] / max(proposals_stats['total_proposals'], 1) * 100), 2
-                )
-            },
-            'placements': {
-                'total': placements_stats['total_placements'],
-                'completed': placements_stats['completed_placements'],
-                'total_views': placements_stats['total_views'] or 0,
-                'completion_rate': round(
-                    (placements_stats['completed_placements'] / max(placements_stats['total_placements'], 1) * 100), 2
-                )
-            },
-            'channels': {
-                'total': channels_stats['total_channels'],
-                'verified': channels_stats['verified_channels'],
-                'total_subscribers': channels_stats['total_subscribers'] or 0
-            },
-            'incoming': {
-                'total': incoming_stats['total_incoming'],
-                'pending': incoming_stats['pending_proposals']
-            }
+            **get_user_dashboard(user_id)
         }
         
         logger.info(f"Получена статистика дашборда для пользователя {user_id}")
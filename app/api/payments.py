@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from app.services.auth_service import AuthService
+from app.services.auth_service import auth_service
 from app.utils.decorators import require_telegram_auth
 from app.models.database import db_manager
 from app.config.telegram_config import AppConfig
@@ -72,7 +72,7 @@ def get_payment_stats():
 def get_current_user_for_payments():
     """Получение текущего пользователя для платежей"""
     try:
-        telegram_id = AuthService.get_current_user_id()
+        telegram_id = auth_service.get_current_user_id()
         if telegram_id:
             return telegram_id
     except Exception as e:
@@ -205,7 +205,7 @@ def request_withdraw():
         if not AppConfig.PAYMENTS_SYSTEM_ENABLED:
             return jsonify({'success': False, 'error': 'Система платежей отключена'}), 503
 
-        telegram_id = AuthService.get_current_user_id()
+        telegram_id = auth_service.get_current_user_id()
         data = request.get_json()
 
         amount = float(data.get('amount', 0))
@@ -274,7 +274,7 @@ def create_escrow():
         if not AppConfig.PAYMENTS_SYSTEM_ENABLED:
             return jsonify({'success': False, 'error': 'Система платежей отключена'}), 503
 
-        telegram_id = AuthService.get_current_user_id()
+        telegram_id = auth_service.get_current_user_id()
         data = request.get_json()
 
         offer_id = data.get('offer_id')
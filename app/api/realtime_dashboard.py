@@ -20,6 +20,7 @@ def get_placement_stats(placement_id: int):
     """Получает статистику конкретного размещения"""
     try:
         from app.services.ereit_integration import EREITIntegration
+        from app.services.placement_latest_stats import get_latest_stats
         from app.models.database import execute_db_query
         
         # Получаем основную информацию о размещении
@@ -40,19 +41,7 @@ def get_placement_stats(placement_id: int):
             return jsonify({'error': 'Размещение не найдено'}), 404
         
         # Получаем последнюю статистику из разных источников
-        telegram_stats = execute_db_query("""
-            SELECT * FROM placement_statistics 
-            WHERE placement_id = ? 
-            ORDER BY collected_at DESC 
-            LIMIT 1
-        """, (placement_id,), fetch_one=True)
-        
-        ereit_stats = execute_db_query("""
-            SELECT * FROM ereit_statistics 
-            WHERE placement_id = ? 
-            ORDER BY collected_at DESC 
-            LIMIT 1
-        """, (placement_id,), fetch_one=True)
+        telegram_stats, ereit_stats = get_latest_stats(placement_id)
         
         # Формируем ответ
         response_data = {
@@ -100,66 +89,14 @@ def get_placement_stats(placement_id: int):
 def get_overview_stats():
     """Получает общую статистику по всем размещениям"""
     try:
-        from app.models.database import execute_db_query
-        
-        # Получаем общую статистику
-        overview = execute_db_query("""
-            SELECT 
-                COUNT(*) as total_placements,
-                COUNT(CASE WHEN status = 'active' THEN 1 END) as active_placements,
-                COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed_placements,
-                COUNT(CASE WHEN status = 'expired' THEN 1 END) as expired_placements,
-                SUM(CASE WHEN status IN ('active', 'completed') THEN funds_reserved ELSE 0 END) as total_revenue
-            FROM offer_placements
-            WHERE created_at >= datetime('now', '-30 days')
-        """, fetch_one=True)
-        
-        # Статистика по периодам
-        period_stats = get_period_statistics()
+        from app.services.dashboard_snapshot import get_snapshot, compute_overview, OVERVIEW_KEY
         
-        # Топ каналы
-        top_channels = execute_db_query("""
-            SELECT 
-                r.channel_title,
-                r.channel_username,
-                COUNT(*) as placements_count,
-                AVG(COALESCE(ps.views_count, 0)) as avg_views,
-                AVG(COALESCE(es.clicks, 0)) as avg_clicks
-            FROM offer_placements p
-            JOIN offer_responses r ON p.response_id = r.id
-            LEFT JOIN placement_statistics ps ON p.id = ps.placement_id
-            LEFT JOIN ereit_statistics es ON p.id = es.placement_id
-            WHERE p.status IN ('active', 'completed')
-            AND p.created_at >= datetime('now', '-30 days')
-            GROUP BY r.channel_id
-            ORDER BY placements_count DESC, avg_views DESC
-            LIMIT 10
-        """, fetch_all=True)
-        
-        response_data = {
-            'overview': {
-                'total_placements': overview['total_placements'] or 0,
-                'active_placements': overview['active_placements'] or 0,
-                'completed_placements': overview['completed_placements'] or 0,
-                'expired_placements': overview['expired_placements'] or 0,
-                'total_revenue': overview['total_revenue'] or 0,
-                'success_rate': round((overview['completed_placements'] or 0) / max(overview['total_placements'] or 1, 1) * 100, 2)
-            },
-            'period_stats': period_stats,
-            'top_channels': [
-                {
-                    'title': channel['channel_title'],
-                    'username': channel['channel_username'],
-                    'placements_count': channel['placements_count'],
-                    'avg_views': round(channel['avg_views'] or 0),
-                    'avg_clicks': round(channel['avg_clicks'] or 0)
-                }
-                for channel in top_channels
-            ],
-            'updated_at': datetime.now().isoformat()
-        }
+        # Снимок пересобирается планировщиком каждые 5 минут
+        snapshot = get_snapshot(OVERVIEW_KEY)
+        if snapshot:
+            return jsonify({**snapshot['data'], 'updated_at': snapshot['built_at']})
         
-        return jsonify(response_data)
+        return jsonify({**compute_overview(), 'updated_at': datetime.now().isoformat()})
         
     except Exception as e:
         logger.error(f"❌ Ошибка получения общей статистики: {e}")
@@ -215,65 +152,23 @@ def get_period_stats():
 def get_live_active_placements():
     """Получает список активных размещений в реальном времени"""
     try:
-        from app.models.database import execute_db_query
+        from app.services.dashboard_snapshot import (
+            get_snapshot, compute_live_active_placements, apply_urgency, LIVE_PLACEMENTS_KEY
+        )
         
-        active_placements = execute_db_query("""
-            SELECT 
-                p.id,
-                p.status,
-                p.post_url,
-                p.placement_start,
-                p.deadline,
-                o.title as offer_title,
-                r.channel_title,
-                r.channel_username,
-                COALESCE(ps.views_count, 0) as current_views,
-                COALESCE(es.clicks, 0) as current_clicks,
-                CASE 
-                    WHEN p.deadline < CURRENT_TIMESTAMP THEN 'overdue'
-                    WHEN p.deadline < datetime('now', '+2 hours') THEN 'urgent'
-                    ELSE 'normal'
-                END as urgency
-            FROM offer_placements p
-            JOIN offer_responses r ON p.response_id = r.id
-            JOIN offers o ON r.offer_id = o.id
-            LEFT JOIN placement_statistics ps ON p.id = ps.placement_id 
-                AND ps.id = (SELECT MAX(id) FROM placement_statistics WHERE placement_id = p.id)
-            LEFT JOIN ereit_statistics es ON p.id = es.placement_id 
-                AND es.id = (SELECT MAX(id) FROM ereit_statistics WHERE placement_id = p.id)
-            WHERE p.status IN ('pending_placement', 'active')
-            ORDER BY 
-                CASE urgency 
-                    WHEN 'overdue' THEN 1 
-                    WHEN 'urgent' THEN 2 
-                    ELSE 3 
-                END,
-                p.deadline ASC
-        """, fetch_all=True)
+        snapshot = get_snapshot(LIVE_PLACEMENTS_KEY)
+        if snapshot:
+            placements, updated_at = snapshot['data'], snapshot['built_at']
+        else:
+            placements, updated_at = compute_live_active_placements(), datetime.now().isoformat()
+        
+        # Срочность зависит от текущего времени, поэтому считается при чтении
+        active_placements = apply_urgency(placements)
         
         response_data = {
-            'active_placements': [
-                {
-                    'id': placement['id'],
-                    'status': placement['status'],
-                    'title': placement['offer_title'],
-                    'channel': {
-                        'title': placement['channel_title'],
-                        'username': placement['channel_username']
-                    },
-                    'post_url': placement['post_url'],
-                    'placement_start': placement['placement_start'],
-                    'deadline': placement['deadline'],
-                    'urgency': placement['urgency'],
-                    'stats': {
-                        'views': placement['current_views'],
-                        'clicks': placement['current_clicks']
-                    }
-                }
-                for placement in active_placements
-            ],
+            'active_placements': active_placements,
             'total_count': len(active_placements),
-            'updated_at': datetime.now().isoformat()
+            'updated_at': updated_at
         }
         
         return jsonify(response_data)
@@ -324,37 +219,9 @@ def calculate_performance_metrics(placement: Dict, telegram_stats: Optional[Dict
 
 def get_period_statistics() -> List[Dict]:
     """Получает статистику по периодам (7, 30 дней)"""
-    from app.models.database import execute_db_query
-    
-    periods = [
-        ('7_days', 7),
-        ('30_days', 30)
-    ]
-    
-    result = {}
-    
-    for period_name, days in periods:
-        stats = execute_db_query("""
-            SELECT 
-                COUNT(*) as total,
-                COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed,
-                AVG(COALESCE(ps.views_count, 0)) as avg_views,
-                AVG(COALESCE(es.clicks, 0)) as avg_clicks
-            FROM offer_placements p
-            LEFT JOIN placement_statistics ps ON p.id = ps.placement_id
-            LEFT JOIN ereit_statistics es ON p.id = es.placement_id
-            WHERE p.created_at >= datetime('now', '-{} days')
-        """.format(days), fetch_one=True)
-        
-        result[period_name] = {
-            'total_placements': stats['total'] or 0,
-            'completed_placements': stats['completed'] or 0,
-            'avg_views': round(stats['avg_views'] or 0),
-            'avg_clicks': round(stats['avg_clicks'] or 0),
-            'success_rate': round((stats['completed'] or 0) / max(stats['total'] or 1, 1) * 100, 2)
-        }
+    from app.services.dashboard_snapshot import compute_period_statistics
     
-    return result
+    return compute_period_statistics()
 
 
 # Регистрируем Blueprint в главном приложении
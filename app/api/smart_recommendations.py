@@ -8,7 +8,7 @@ import math
 from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify
 from app.models.database import execute_db_query
-from app.services.auth_service import AuthService
+from app.services.auth_service import auth_service
 
 logger = logging.getLogger(__name__)
 smart_recommendations_bp = Blueprint('smart_recommendations', __name__)
@@ -304,7 +304,7 @@ def get_smart_recommendations():
         
         # Получаем ID текущего пользователя
         try:
-            user_id = AuthService.get_current_user_id()
+            user_id = auth_service.get_current_user_id()
         except:
             # Fallback для тестирования
             user_id = 1
@@ -326,6 +326,9 @@ def update_user_profile():
             WHERE id = ?
         """, values)
         
+        from app.services.auth_service import invalidate_user_identity
+        invalidate_user_identity(user_db_id=user_id)
+        
         logger.info(f"Профиль пользователя {user_id} обновлен: {list(updates.keys())}")
         
         return jsonify({
@@ -356,56 +359,34 @@ def get_user_stats():
         stats = {}
         
         try:
-            # Статистика каналов
-            channels_stats = execute_db_query("""
-                SELECT 
-                    COUNT(*) as total_channels,
-                    COUNT(CASE WHEN is_verified = 1 THEN 1 END) as verified_channels,
-                    COALESCE(SUM(subscribers), 0) as total_subscribers
-                FROM channels 
-                WHERE owner_id = ? AND is_active = 1
-            """, (user_id,), fetch_one=True)
-            
-            # Статистика офферов
-            offers_stats = execute_db_query("""
-                SELECT 
-                    COUNT(*) as total_offers,
-                    COUNT(CASE WHEN status = 'active' THEN 1 END) as active_offers,
-                    COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed_offers,
-                    COALESCE(SUM(CASE WHEN price > 0 THEN price ELSE budget_total END), 0) as total_budget
-                FROM offers 
-                WHERE created_by = ?
-            """, (user_id,), fetch_all=True)
-            
-            # Статистика предложений
-            proposals_stats = execute_db_query("""
-                SELECT 
-                    COUNT(*) as total_proposals,
-                    COUNT(CASE WHEN op.status = 'accepted' THEN 1 END) as accepted,
-                    COUNT(CASE WHEN op.status = 'rejected' THEN 1 END) as rejected,
-                    COUNT(CASE WHEN op.status = 'sent' THEN 1 END) as pending
-                FROM offer_proposals op
-                JOIN channels c ON op.channel_id = c.id
-                WHERE c.owner_id = ?
-            """, (user_id,), fetch_one=True)
-            
-            # Статистика просмотров
-            views_stats = execute_db_query("""
-                SELECT 
-                    COALESCE(SUM(ps.views_count), 0) as total_views,
-                    COALESCE(SUM(ps.reactions_count), 0) as total_reactions
-                FROM placement_statistics ps
-                JOIN offer_placements op ON ps.placement_id = op.id
-                JOIN offer_proposals opr ON op.proposal_id = opr.id
-                JOIN channels c ON opr.channel_id = c.id
-                WHERE c.owner_id = ?
-            """, (user_id,), fetch_one=True)
-            
+            # Счетчики поддерживаются триггерами - один поиск по ключу вместо агрегатов
+            from app.services.user_counters import get_user_counters
+            counters = get_user_counters(user_id)
+            if not counters:
+                raise ValueError(f"пользователь {user_id} не найден")
+
             stats = {
-                'channels': dict(channels_stats) if channels_stats else {},
-                'offers': dict(offers_stats[0]) if offers_stats else {},
-                'proposals': dict(proposals_stats) if proposals_stats else {},
-                'views': dict(views_stats) if views_stats else {}
+                'channels': {
+                    'total_channels': counters['channels_active'],
+                    'verified_channels': counters['channels_verified'],
+                    'total_subscribers': counters['subscribers_total']
+                },
+                'offers': {
+                    'total_offers': counters['offers_total'],
+                    'active_offers': counters['offers_active'],
+                    'completed_offers': counters['offers_completed'],
+                    'total_budget': counters['offers_budget_total']
+                },
+                'proposals': {
+                    'total_proposals': counters['proposals_total'],
+                    'accepted': counters['proposals_accepted'],
+                    'rejected': counters['proposals_rejected'],
+                    'pending': counters['proposals_sent']
+                },
+                'views': {
+                    'total_views': counters['views_total'],
+                    'total_reactions': counters['reactions_total']
+                }
             }
             
         except Exception as e:
@@ -58,6 +58,9 @@ MIN_SUBSCRIBERS_COUNT: int = int(os.environ.get('MIN_SUBSCRIBERS_COUNT', '100'))
 MAX_PRICE_PER_POST: float = float(os.environ.get('MAX_PRICE_PER_POST', '100000.0'))
 VERIFICATION_CODE_LENGTH: int = int(os.environ.get('VERIFICATION_CODE_LENGTH', '6'))
 CHANNEL_STATS_UPDATE_INTERVAL_HOURS: int = int(os.environ.get('CHANNEL_STATS_UPDATE_INTERVAL_HOURS', '24'))
+CHANNEL_STATS_CONCURRENCY: int = int(os.environ.get('CHANNEL_STATS_CONCURRENCY', '20'))
+STATS_SOURCE_RATE_PER_SECOND: float = float(os.environ.get('STATS_SOURCE_RATE_PER_SECOND', '3.0'))
+STATS_SOURCE_HEDGE_DELAY_SECONDS: float = float(os.environ.get('STATS_SOURCE_HEDGE_DELAY_SECONDS', '2.0'))
 MAX_CHANNELS_PER_USER: int = int(os.environ.get('MAX_CHANNELS_PER_USER', '10'))
 TELEGRAM_API_TIMEOUT: int = int(os.environ.get('TELEGRAM_API_TIMEOUT', '30'))
 
@@ -114,10 +117,85 @@ DEFAULT_LANGUAGE: str = os.environ.get('DEFAULT_LANGUAGE', 'ru')
 CACHE_TTL_SECONDS: int = int(os.environ.get('CACHE_TTL_SECONDS', '300'))
 REDIS_TTL_HOURS: int = int(os.environ.get('REDIS_TTL_HOURS', '24'))
 
+# Кэш страниц t.me (общий для парсеров, мониторов и сбора статистики)
+TME_PAGE_CACHE_TTL_SECONDS: int = int(os.environ.get('TME_PAGE_CACHE_TTL_SECONDS', '120'))
+TME_PAGE_CACHE_PATH: str = os.environ.get('TME_PAGE_CACHE_PATH', os.path.join(PROJECT_ROOT, 'tme_page_cache.db'))
+
+# Адаптивное расписание проверок размещений (статистика и удаление постов)
+PLACEMENT_CHECK_TICK_MINUTES: int = int(os.environ.get('PLACEMENT_CHECK_TICK_MINUTES', '5'))
+PLACEMENT_CHECK_MIN_INTERVAL_MINUTES: int = int(os.environ.get('PLACEMENT_CHECK_MIN_INTERVAL_MINUTES', '10'))
+PLACEMENT_CHECK_MAX_INTERVAL_MINUTES: int = int(os.environ.get('PLACEMENT_CHECK_MAX_INTERVAL_MINUTES', '360'))
+PLACEMENT_CHECK_MAX_PER_TICK: int = int(os.environ.get('PLACEMENT_CHECK_MAX_PER_TICK', '500'))
+
+# Снимки дашбордов (пересобираются планировщиком, читаются API)
+DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS: int = int(os.environ.get('DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS', '900'))
+DASHBOARD_SNAPSHOT_FULL_REBUILD_MINUTES: int = int(os.environ.get('DASHBOARD_SNAPSHOT_FULL_REBUILD_MINUTES', '60'))
+
+# Завершение размещений пакетами: размер пакета и параллельный сбор финальной статистики
+COMPLETION_BATCH_SIZE: int = int(os.environ.get('COMPLETION_BATCH_SIZE', '50'))
+COMPLETION_STATS_CONCURRENCY: int = int(os.environ.get('COMPLETION_STATS_CONCURRENCY', '10'))
+
+# Outbox исходящих уведомлений
+NOTIFICATION_OUTBOX_BATCH_SIZE: int = int(os.environ.get('NOTIFICATION_OUTBOX_BATCH_SIZE', '50'))
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS: int = int(os.environ.get('NOTIFICATION_OUTBOX_MAX_ATTEMPTS', '8'))
+
+# Свертка истории статистики размещений по часам и дням, отставание отметки свертки для
+# опоздавших замеров (минуты), сроки хранения (дни)
+STATS_ROLLUP_INTERVAL_MINUTES: int = int(os.environ.get('STATS_ROLLUP_INTERVAL_MINUTES', '15'))
+STATS_ROLLUP_GRACE_MINUTES: int = int(os.environ.get('STATS_ROLLUP_GRACE_MINUTES', '60'))
+STATS_RAW_TTL_DAYS: int = int(os.environ.get('STATS_RAW_TTL_DAYS', '7'))
+STATS_HOURLY_TTL_DAYS: int = int(os.environ.get('STATS_HOURLY_TTL_DAYS', '30'))
+
+# Очистка и архивирование старых данных порциями
+RETENTION_CHUNK_SIZE: int = int(os.environ.get('RETENTION_CHUNK_SIZE', '500'))
+RETENTION_CHUNK_PAUSE_MS: int = int(os.environ.get('RETENTION_CHUNK_PAUSE_MS', '50'))
+RETENTION_VACUUM_PAGES: int = int(os.environ.get('RETENTION_VACUUM_PAGES', '1000'))
+RETENTION_ARCHIVE_DB_PATH: str = os.environ.get('RETENTION_ARCHIVE_DB_PATH', os.path.join(PROJECT_ROOT, 'telegram_mini_app_archive.db'))
+
+# Несколько экземпляров планировщика: аренда лидера и heartbeat (секунды)
+SCHEDULER_LEASE_TTL_SECONDS: int = int(os.environ.get('SCHEDULER_LEASE_TTL_SECONDS', '60'))
+SCHEDULER_HEARTBEAT_SECONDS: int = int(os.environ.get('SCHEDULER_HEARTBEAT_SECONDS', '15'))
+
 # Константы для безопасности
 REQUEST_LIMIT: int = int(os.environ.get('REQUEST_LIMIT', '100'))
 TIME_WINDOW: int = int(os.environ.get('TIME_WINDOW', '3600'))
 
+# Аудит безопасности: буфер фоновой записи и пакетная вставка
+AUDIT_BUFFER_SIZE: int = int(os.environ.get('AUDIT_BUFFER_SIZE', '10000'))
+AUDIT_BATCH_SIZE: int = int(os.environ.get('AUDIT_BATCH_SIZE', '200'))
+AUDIT_FLUSH_INTERVAL_SECONDS: float = float(os.environ.get('AUDIT_FLUSH_INTERVAL_SECONDS', '2'))
+
+# Кэш соответствия telegram_id -> пользователь БД для авторизации
+AUTH_IDENTITY_CACHE_SIZE: int = int(os.environ.get('AUTH_IDENTITY_CACHE_SIZE', '10000'))
+AUTH_IDENTITY_CACHE_TTL_SECONDS: int = int(os.environ.get('AUTH_IDENTITY_CACHE_TTL_SECONDS', '600'))
+
+# Проверка подписи initData Telegram WebApp: срок действия auth_date и кэш проверенных строк
+INIT_DATA_MAX_AGE_SECONDS: int = int(os.environ.get('INIT_DATA_MAX_AGE_SECONDS', '86400'))
+INIT_DATA_CACHE_SIZE: int = int(os.environ.get('INIT_DATA_CACHE_SIZE', '10000'))
+
+# Кэш метрик дашборда аналитики (пользователей в памяти процесса)
+USER_METRICS_CACHE_SIZE: int = int(os.environ.get('USER_METRICS_CACHE_SIZE', '5000'))
+
+# Сверка счетчиков user_counters с пересчетом по исходным таблицам (часы)
+USER_COUNTERS_RECONCILE_INTERVAL_HOURS: int = int(os.environ.get('USER_COUNTERS_RECONCILE_INTERVAL_HOURS', '6'))
+
+# Снимок БД для отчетов: файл, период обновления, допустимый возраст (минуты), страниц за шаг копирования
+ANALYTICS_SNAPSHOT_PATH: str = os.environ.get('ANALYTICS_SNAPSHOT_PATH', os.path.join(PROJECT_ROOT, 'telegram_mini_app_analytics.db'))
+ANALYTICS_SNAPSHOT_INTERVAL_MINUTES: int = int(os.environ.get('ANALYTICS_SNAPSHOT_INTERVAL_MINUTES', '15'))
+ANALYTICS_SNAPSHOT_MAX_AGE_MINUTES: int = int(os.environ.get('ANALYTICS_SNAPSHOT_MAX_AGE_MINUTES', '60'))
+ANALYTICS_SNAPSHOT_BACKUP_PAGES: int = int(os.environ.get('ANALYTICS_SNAPSHOT_BACKUP_PAGES', '1000'))
+
+# Реплика БД для тяжелых чтений: файл, допустимое отставание (секунды), страниц за шаг копирования и пауза между шагами
+READ_REPLICA_ENABLED: bool = os.environ.get('READ_REPLICA_ENABLED', 'True').lower() == 'true'
+READ_REPLICA_PATH: str = os.environ.get('READ_REPLICA_PATH', os.path.join(PROJECT_ROOT, 'telegram_mini_app_replica.db'))
+READ_REPLICA_MAX_STALENESS_SECONDS: int = int(os.environ.get('READ_REPLICA_MAX_STALENESS_SECONDS', '60'))
+READ_REPLICA_BACKUP_PAGES: int = int(os.environ.get('READ_REPLICA_BACKUP_PAGES', '256'))
+READ_REPLICA_STEP_PAUSE_MS: int = int(os.environ.get('READ_REPLICA_STEP_PAUSE_MS', '5'))
+
+# Keyset-пагинация списков: время жизни (секунды) и размер кэша общего количества строк
+PAGINATION_TOTAL_CACHE_SECONDS: int = int(os.environ.get('PAGINATION_TOTAL_CACHE_SECONDS', '60'))
+PAGINATION_TOTAL_CACHE_SIZE: int = int(os.environ.get('PAGINATION_TOTAL_CACHE_SIZE', '1000'))
+
 # === КЛАССЫ СТАТУСОВ ===
 
 class ChannelCategories:
@@ -274,6 +352,12 @@ class AppConfig:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     JSON_SORT_KEYS = False
     JSONIFY_PRETTYPRINT_REGULAR = DEBUG
+    # Отключенные стадии конвейера запросов через запятую (например, "audit,performance_monitor")
+    REQUEST_PIPELINE_DISABLED_STAGES = [
+        stage.strip() for stage in os.environ.get('REQUEST_PIPELINE_DISABLED_STAGES', '').split(',') if stage.strip()
+    ]
+    # Число доверенных reverse proxy перед приложением: только тогда IP клиента берется из X-Forwarded-For
+    TRUSTED_PROXY_COUNT: int = int(os.environ.get('TRUSTED_PROXY_COUNT', '0'))
 
     # === ФУНКЦИОНАЛЬНОСТЬ СИСТЕМЫ ===
     TELEGRAM_INTEGRATION: bool = os.environ.get('TELEGRAM_INTEGRATION', 'True').lower() == 'true'
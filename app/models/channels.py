@@ -13,6 +13,7 @@ from typing import Optional, Dict, Any, List, Tuple
 from enum import Enum
 
 from .database import db_manager
+from .read_replica import read_heavy
 from ..utils.exceptions import ChannelError, ValidationError, TelegramAPIError
 from ..config.telegram_config import TELEGRAM_BOT_TOKEN, TELEGRAM_API_TIMEOUT, MAX_CHANNELS_PER_USER
 
@@ -634,27 +635,28 @@ class ChannelStatistics:
     """Класс для работы со статистикой каналов"""
 
     @staticmethod
+    @read_heavy()
     def get_platform_stats() -> Dict[str, Any]:
-        """Получение общей статистики платформы"""
+        """Получение общей статистики платформы (по реплике БД)"""
         try:
             # Общее количество каналов
             total_channels = db_manager.execute_query(
-                "SELECT COUNT(*) FROM channels WHERE is_active = 1",
+                "SELECT COUNT(*) as count FROM channels WHERE is_active = 1",
                 fetch_one=True
-            )[0]
+            )['count']
 
             # Верифицированные каналы
             verified_channels = db_manager.execute_query(
-                "SELECT COUNT(*) FROM channels WHERE is_active = 1 AND is_verified = 1",
+                "SELECT COUNT(*) as count FROM channels WHERE is_active = 1 AND is_verified = 1",
                 fetch_one=True
-            )[0]
+            )['count']
 
             # Статистика подписчиков
             subscribers_stats = db_manager.execute_query(
                 """
-                SELECT SUM(subscribers_count) as total_subscribers,
-                       AVG(subscribers_count) as avg_subscribers,
-                       MAX(subscribers_count) as max_subscribers
+                SELECT SUM(subscriber_count) as total_subscribers,
+                       AVG(subscriber_count) as avg_subscribers,
+                       MAX(subscriber_count) as max_subscribers
                 FROM channels
                 WHERE is_active = 1
                   AND is_verified = 1
@@ -696,17 +698,17 @@ class ChannelStatistics:
                     'verification_rate': (verified_channels / total_channels * 100) if total_channels > 0 else 0
                 },
                 'subscribers': {
-                    'total': int(subscribers_stats[0] or 0),
-                    'average': int(subscribers_stats[1] or 0),
-                    'maximum': int(subscribers_stats[2] or 0)
+                    'total': int(subscribers_stats['total_subscribers'] or 0),
+                    'average': int(subscribers_stats['avg_subscribers'] or 0),
+                    'maximum': int(subscribers_stats['max_subscribers'] or 0)
                 },
                 'pricing': {
-                    'average': round(float(price_stats[0] or 0), 2),
-                    'minimum': round(float(price_stats[1] or 0), 2),
-                    'maximum': round(float(price_stats[2] or 0), 2)
+                    'average': round(float(price_stats['avg_price'] or 0), 2),
+                    'minimum': round(float(price_stats['min_price'] or 0), 2),
+                    'maximum': round(float(price_stats['max_price'] or 0), 2)
                 },
                 'top_categories': [
-                    {'category': row[0], 'count': row[1]}
+                    {'category': row['category'], 'count': row['count']}
                     for row in top_categories
                 ] if top_categories else []
             }
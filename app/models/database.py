@@ -8,6 +8,7 @@ import datetime
 from typing import Optional, Dict, Any, List, Union
 from flask import request
 from app.config.telegram_config import AppConfig
+from app.models.read_replica import connect_routed
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +22,8 @@ class DatabaseManager:
     def get_connection(self) -> sqlite3.Connection:
         """Получение подключения к SQLite"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            # Внутри @read_heavy - реплика только для чтения
+            conn = connect_routed() or sqlite3.connect(self.db_path)
             conn.row_factory = sqlite3.Row  # Для возврата словарей
             conn.execute('PRAGMA foreign_keys = ON')  # Включаем foreign keys
             return conn
@@ -217,6 +219,9 @@ class UserManager:
                         WHERE telegram_id = ?
                     ''', (username, first_name, datetime.datetime.now().isoformat(), telegram_id))
 
+                    from app.services.auth_service import invalidate_user_identity
+                    invalidate_user_identity(telegram_id=telegram_id)
+
                 return user['id']
 
         except Exception as e:
@@ -284,7 +289,8 @@ def get_user_id_from_request():
 def execute_db_query(query: str, params: tuple = (), fetch_one: bool = False, fetch_all: bool = False):
     """Универсальная функция для работы с БД"""
     try:
-        conn = sqlite3.connect(AppConfig.DATABASE_PATH)
+        # Внутри @read_heavy - реплика только для чтения
+        conn = connect_routed() or sqlite3.connect(AppConfig.DATABASE_PATH)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
 
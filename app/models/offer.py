@@ -687,97 +687,21 @@ class Offer:
 
 
 class OfferAnalytics:
-    """Класс для аналитики офферов"""
+    """
+    Класс для аналитики офферов
+
+    Агрегаты считаются по снимку БД (app.analytics.snapshot), а не по
+    рабочей базе: отчеты не конкурируют с записью веб-запросов.
+    """
 
     @staticmethod
     def get_platform_offer_stats() -> Dict[str, Any]:
         """Получение общей статистики офферов на платформе"""
-        try:
-            # Общее количество офферов
-            total_offers = db_manager.execute_query(
-                "SELECT COUNT(*) FROM offers",
-                fetch_one=True
-            )[0]
-
-            # Активные офферы
-            active_offers = db_manager.execute_query(
-                "SELECT COUNT(*) FROM offers WHERE status = 'active'",
-                fetch_one=True
-            )[0]
-
-            # Завершенные офферы
-            completed_offers = db_manager.execute_query(
-                "SELECT COUNT(*) FROM offers WHERE status = 'completed'",
-                fetch_one=True
-            )[0]
-
-            # Статистика бюджетов
-            budget_stats = db_manager.execute_query(
-                """
-                SELECT SUM(budget) as total_budget,
-                       AVG(budget) as avg_budget,
-                       MAX(budget) as max_budget,
-                       MIN(budget) as min_budget
-                FROM offers
-                WHERE status IN ('active', 'completed')
-                """,
-                fetch_one=True
-            )
+        from ..analytics.snapshot import analytics_snapshot
+        from ..analytics.offline_reports import platform_offer_stats
 
-            # Статистика откликов
-            response_stats = db_manager.execute_query(
-                """
-                SELECT COUNT(*)                                             as total_responses,
-                       SUM(CASE WHEN status = 'accepted' THEN 1 ELSE 0 END) as accepted,
-                       SUM(CASE WHEN status = 'rejected' THEN 1 ELSE 0 END) as rejected,
-                       SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END)  as pending
-                FROM offer_responses
-                """,
-                fetch_one=True
-            )
-
-            # Топ категории
-            top_categories = db_manager.execute_query(
-                """
-                SELECT category, COUNT(*) as count, AVG(budget) as avg_budget
-                FROM offers
-                WHERE status IN ('active', 'completed') AND category IS NOT NULL
-                GROUP BY category
-                ORDER BY count DESC
-                    LIMIT 5
-                """,
-                fetch_all=True
-            )
-
-            return {
-                'offers': {
-                    'total': total_offers,
-                    'active': active_offers,
-                    'completed': completed_offers,
-                    'completion_rate': (completed_offers / total_offers * 100) if total_offers > 0 else 0
-                },
-                'budget': {
-                    'total': float(budget_stats[0] or 0),
-                    'average': round(float(budget_stats[1] or 0), 2),
-                    'maximum': float(budget_stats[2] or 0),
-                    'minimum': float(budget_stats[3] or 0)
-                },
-                'responses': {
-                    'total': response_stats[0],
-                    'accepted': response_stats[1],
-                    'rejected': response_stats[2],
-                    'pending': response_stats[3],
-                    'acceptance_rate': (response_stats[1] / response_stats[0] * 100) if response_stats[0] > 0 else 0
-                },
-                'top_categories': [
-                    {
-                        'category': row[0],
-                        'count': row[1],
-                        'avg_budget': round(float(row[2] or 0), 2)
-                    }
-                    for row in top_categories
-                ] if top_categories else []
-            }
+        try:
+            return platform_offer_stats(analytics_snapshot.get())
 
         except Exception as e:
             raise OfferError(f"Ошибка получения статистики офферов: {str(e)}")
@@ -785,57 +709,11 @@ class OfferAnalytics:
     @staticmethod
     def get_advertiser_performance(advertiser_id: int, days: int = 30) -> Dict[str, Any]:
         """Получение статистики производительности рекламодателя"""
-        try:
-            cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
-
-            # Статистика офферов рекламодателя
-            offer_stats = db_manager.execute_query(
-                """
-                SELECT COUNT(*)                                              as total_offers,
-                       SUM(budget)                                           as total_budget,
-                       AVG(budget)                                           as avg_budget,
-                       SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed_offers
-                FROM offers
-                WHERE advertiser_id = ?
-                  AND created_at >= ?
-                """,
-                (advertiser_id, cutoff_date),
-                fetch_one=True
-            )
-
-            # Статистика откликов
-            response_stats = db_manager.execute_query(
-                """
-                SELECT COUNT(or1.id)                                            as total_responses,
-                       SUM(CASE WHEN or1.status = 'accepted' THEN 1 ELSE 0 END) as accepted_responses,
-                       AVG(or1.price)                                           as avg_response_price
-                FROM offer_responses or1
-                         JOIN offers o ON or1.offer_id = o.id
-                WHERE o.advertiser_id = ?
-                  AND or1.created_at >= ?
-                """,
-                (advertiser_id, cutoff_date),
-                fetch_one=True
-            )
+        from ..analytics.snapshot import analytics_snapshot
+        from ..analytics.offline_reports import advertiser_performance
 
-            return {
-                'period_days': days,
-                'offers': {
-                    'total': offer_stats[0],
-                    'completed': offer_stats[3],
-                    'completion_rate': (offer_stats[3] / offer_stats[0] * 100) if offer_stats[0] > 0 else 0
-                },
-                'budget': {
-                    'total_allocated': float(offer_stats[1] or 0),
-                    'average_per_offer': round(float(offer_stats[2] or 0), 2)
-                },
-                'responses': {
-                    'total_received': response_stats[0],
-                    'accepted': response_stats[1],
-                    'acceptance_rate': (response_stats[1] / response_stats[0] * 100) if response_stats[0] > 0 else 0,
-                    'avg_price': round(float(response_stats[2] or 0), 2)
-                }
-            }
+        try:
+            return advertiser_performance(analytics_snapshot.get(), advertiser_id, days)
 
         except Exception as e:
             raise OfferError(f"Ошибка получения статистики рекламодателя: {str(e)}")
@@ -0,0 +1,236 @@
+# app/models/read_replica.py
+"""
+Реплика базы данных только для чтения
+Тяжелые чтения (админ-статистика, статистика платформы и офферов)
+выполняются по копии рабочей БД, которая обновляется через backup API
+SQLite порциями страниц. Функции, помеченные @read_heavy, получают
+соединения с репликой, пока ее отставание в пределах допустимого; иначе
+чтение идет в рабочую БД, а реплика обновляется в фоне
+"""
+
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from app.config.telegram_config import (
+    AppConfig, READ_REPLICA_ENABLED, READ_REPLICA_PATH, READ_REPLICA_MAX_STALENESS_SECONDS,
+    READ_REPLICA_BACKUP_PAGES, READ_REPLICA_STEP_PAUSE_MS
+)
+
+logger = logging.getLogger(__name__)
+
+# Таблица копии с моментом среза (общая для процессов, использующих файл)
+_META_TABLE = '_replica_meta'
+
+
+def backup_database(source_path: str, target_path: str, pages: int = READ_REPLICA_BACKUP_PAGES,
+                    pause_seconds: float = 0.0) -> float:
+    """
+    Копирует БД через backup API и атомарно заменяет target_path
+
+    Копирование идет шагами по pages страниц с паузой между ними. Источник
+    все это время держит одну транзакцию чтения: копия согласована на
+    момент ее начала, а запись других соединений не перезапускает
+    копирование (в режиме WAL писатели при этом не блокируются).
+    Возвращает момент среза (time.time()).
+    """
+    tmp_path = f"{target_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    def pause(status, remaining, total):
+        if pause_seconds > 0 and remaining:
+            time.sleep(pause_seconds)
+
+    source = sqlite3.connect(source_path, timeout=30, isolation_level=None)
+    target = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        snapshot_at = time.time()
+        try:
+            source.backup(target, pages=pages, progress=pause)
+        finally:
+            source.execute("COMMIT")
+
+        # Копия открывается только на чтение - без WAL она не требует -shm файла
+        target.execute("PRAGMA journal_mode = DELETE")
+        target.execute(f"CREATE TABLE IF NOT EXISTS {_META_TABLE} (snapshot_at REAL NOT NULL)")
+        target.execute(f"DELETE FROM {_META_TABLE}")
+        target.execute(f"INSERT INTO {_META_TABLE} (snapshot_at) VALUES (?)", (snapshot_at,))
+    except Exception:
+        target.close()
+        os.remove(tmp_path)
+        raise
+    finally:
+        target.close()
+        source.close()
+
+    os.replace(tmp_path, target_path)
+    return snapshot_at
+
+
+def read_snapshot_time(path: str) -> Optional[float]:
+    """Момент среза копии, сделанной backup_database (None - копии нет)"""
+    if not os.path.exists(path):
+        return None
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=5)
+        try:
+            row = conn.execute(f"SELECT MAX(snapshot_at) FROM {_META_TABLE}").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+
+class ReadReplicaManager:
+    """
+    Реплика рабочей БД с ограничением отставания
+
+    Реплика обновляется в фоне, когда отставание превышает половину
+    допустимого, поэтому при постоянной нагрузке чтения не переключаются
+    на рабочую БД. Файл реплики общий для процессов: перед обновлением
+    проверяется, не обновил ли его другой процесс.
+    """
+
+    def __init__(self, replica_path: str = READ_REPLICA_PATH,
+                 max_staleness_seconds: float = READ_REPLICA_MAX_STALENESS_SECONDS,
+                 pages: int = READ_REPLICA_BACKUP_PAGES, pause_seconds: float = READ_REPLICA_STEP_PAUSE_MS / 1000,
+                 enabled: bool = READ_REPLICA_ENABLED, db_path: str = None):
+        self.replica_path = replica_path
+        self.max_staleness_seconds = max_staleness_seconds
+        self.pages = pages
+        self.pause_seconds = pause_seconds
+        self.enabled = enabled
+        self.db_path = db_path
+        self._snapshot_at: Optional[float] = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self.stats = {'replica_reads': 0, 'primary_reads': 0, 'refreshes': 0, 'failures': 0, 'last_duration_ms': 0}
+
+    def staleness(self) -> Optional[float]:
+        """Отставание реплики в секундах (None - реплики нет)"""
+        if self._snapshot_at is None:
+            return None
+        return time.time() - self._snapshot_at
+
+    def refresh(self) -> float:
+        """Обновляет реплику и возвращает момент среза"""
+        started = time.time()
+        try:
+            snapshot_at = backup_database(
+                self.db_path or AppConfig.DATABASE_PATH, self.replica_path, self.pages, self.pause_seconds
+            )
+        except Exception:
+            self.stats['failures'] += 1
+            raise
+
+        self._snapshot_at = snapshot_at
+        self.stats['refreshes'] += 1
+        self.stats['last_duration_ms'] = int((time.time() - started) * 1000)
+        logger.debug(f"🔁 Реплика БД обновлена за {self.stats['last_duration_ms']} мс")
+        return snapshot_at
+
+    def _refresh_in_background(self):
+        try:
+            # Реплику мог уже обновить другой процесс
+            snapshot_at = read_snapshot_time(self.replica_path)
+            if snapshot_at is not None and (self._snapshot_at is None or snapshot_at > self._snapshot_at):
+                self._snapshot_at = snapshot_at
+            staleness = self.staleness()
+            if staleness is None or staleness > self.max_staleness_seconds / 2:
+                self.refresh()
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось обновить реплику БД: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def schedule_refresh(self):
+        """Запускает обновление в фоне (не более одного одновременно)"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+    def connect(self, max_staleness_seconds: float = None) -> Optional[sqlite3.Connection]:
+        """
+        Соединение с репликой только для чтения или None
+
+        None - реплика отключена, еще не создана или отстает больше
+        max_staleness_seconds; тогда читать нужно из рабочей БД.
+        """
+        if not self.enabled:
+            return None
+
+        bound = self.max_staleness_seconds if max_staleness_seconds is None else max_staleness_seconds
+        staleness = self.staleness()
+        if staleness is None or staleness > self.max_staleness_seconds / 2:
+            self.schedule_refresh()
+
+        if staleness is None or staleness > bound:
+            self.stats['primary_reads'] += 1
+            return None
+
+        try:
+            conn = sqlite3.connect(f"file:{self.replica_path}?mode=ro", uri=True, timeout=30)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Реплика БД недоступна: {e}")
+            self.stats['primary_reads'] += 1
+            return None
+
+        conn.row_factory = sqlite3.Row
+        self.stats['replica_reads'] += 1
+        return conn
+
+    def get_stats(self) -> Dict[str, Any]:
+        staleness = self.staleness()
+        return dict(
+            self.stats,
+            enabled=self.enabled,
+            staleness_seconds=round(staleness, 1) if staleness is not None else None
+        )
+
+
+# Глобальный экземпляр
+read_replica = ReadReplicaManager()
+
+# Допустимое отставание для текущего вызова @read_heavy (None - читать из рабочей БД)
+_read_heavy_bound: ContextVar[Optional[float]] = ContextVar('read_heavy_bound', default=None)
+
+
+def read_heavy(max_staleness_seconds: float = None) -> Callable:
+    """
+    Помечает функцию как тяжелое чтение: ее запросы идут в реплику
+
+    Действует на соединения execute_db_query, DatabaseManager и
+    get_db_connection модулей API. Внутри такой функции нельзя писать в
+    БД - соединение с репликой только для чтения.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = read_replica.max_staleness_seconds if max_staleness_seconds is None else max_staleness_seconds
+            token = _read_heavy_bound.set(bound)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _read_heavy_bound.reset(token)
+        return wrapper
+    return decorator
+
+
+def connect_routed() -> Optional[sqlite3.Connection]:
+    """Соединение с репликой внутри @read_heavy, иначе None"""
+    bound = _read_heavy_bound.get()
+    if bound is None:
+        return None
+    return read_replica.connect(bound)
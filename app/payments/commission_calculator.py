@@ -5,7 +5,7 @@
 """
 
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List
 from decimal import Decimal
 
 logger = logging.getLogger(__name__)
@@ -37,6 +37,24 @@ class CommissionCalculator:
             logger.error(f"❌ Ошибка расчета комиссии: {e}")
             return {'gross_amount': 0, 'commission': 0, 'net_amount': 0}
     
+    def calculate_placement_commissions(self, amounts: List[Decimal]) -> List[Dict[str, Any]]:
+        """Расчет комиссий для пакета размещений (суммы округляются до копеек)"""
+        rate = Decimal(str(self.commission_rates['placement']))
+        cent = Decimal('0.01')
+        results = []
+        
+        for amount in amounts:
+            amount = Decimal(str(amount or 0))
+            commission = (amount * rate).quantize(cent)
+            results.append({
+                'gross_amount': float(amount),
+                'commission': float(commission),
+                'net_amount': float(amount - commission),
+                'commission_rate': self.commission_rates['placement']
+            })
+        
+        return results
+    
     def calculate_withdrawal_fee(self, amount: Decimal) -> Dict[str, Any]:
         """Расчет комиссии за вывод"""
         try:
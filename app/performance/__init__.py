@@ -7,6 +7,7 @@
 from .caching import setup_caching, cached, cache_manager
 from .monitoring import setup_performance_monitoring, monitor_performance
 from .database_optimizer import DatabaseOptimizer, optimize_query, setup_database_optimization
+from .request_pipeline import RequestPipeline, get_request_pipeline, get_request_context
 
 __all__ = [
     'setup_caching',
@@ -16,5 +17,8 @@ __all__ = [
     'monitor_performance',
     'DatabaseOptimizer',
     'optimize_query',
-    'setup_database_optimization'
+    'setup_database_optimization',
+    'RequestPipeline',
+    'get_request_pipeline',
+    'get_request_context'
 ]
\ No newline at end of file
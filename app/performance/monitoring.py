@@ -52,9 +52,9 @@ class PerformanceMonitor:
         """Инициализация системы мониторинга"""
         self.app = app
         
-        # Добавляем middleware для отслеживания запросов
-        app.before_request(self._before_request)
-        app.after_request(self._after_request)
+        # Добавляем стадию учета запросов в конвейер (время начала замеряет конвейер)
+        from app.performance.request_pipeline import get_request_pipeline
+        get_request_pipeline(app).add_after('performance_monitor', self._after_request)
         
         # Периодическая очистка старых метрик
         self._schedule_cleanup()
@@ -62,23 +62,19 @@ class PerformanceMonitor:
         app.extensions['performance_monitor'] = self
         logger.info("✅ Performance Monitor initialized")
     
-    def _before_request(self):
-        """Обработка начала запроса"""
-        g.start_time = time.time()
-        g.request_id = f"{int(time.time())}-{hash(request.path + str(time.time()))}"
-        
-        # Увеличиваем счетчик запросов
-        with self.metrics_lock:
-            self.current_period['requests_count'] += 1
-    
     def _after_request(self, response):
         """Обработка завершения запроса"""  
         try:
-            if not hasattr(g, 'start_time'):
+            ctx = g.get('request_context')
+            if ctx is None:
                 return response
             
+            # Увеличиваем счетчик запросов
+            with self.metrics_lock:
+                self.current_period['requests_count'] += 1
+            
             # Вычисляем время выполнения
-            execution_time = time.time() - g.start_time
+            execution_time = ctx.elapsed
             endpoint = request.endpoint or request.path
             method = request.method
             status_code = response.status_code
@@ -439,6 +435,28 @@ def setup_performance_monitoring(app: Flask) -> PerformanceMonitor:
             logger.error(f"Metrics reset error: {e}")
             return {'success': False, 'error': str(e)}, 500
     
+    @app.route('/api/monitoring/jobs', methods=['GET'])
+    def scheduler_job_metrics():
+        """Метрики фоновых задач планировщика"""
+        user_id = request.headers.get('X-Telegram-User-Id')
+
+        if user_id != '373086959':
+            return {'error': 'Access denied'}, 403
+
+        try:
+            from app.tasks.monitoring_scheduler import get_scheduler
+            scheduler = get_scheduler()
+            return {
+                'success': True,
+                'running': scheduler.running,
+                'coordination': scheduler.get_coordination_status(),
+                'jobs': scheduler.get_job_metrics(),
+                'retention': scheduler.get_retention_progress()
+            }
+        except Exception as e:
+            logger.error(f"Job metrics error: {e}")
+            return {'success': False, 'error': str(e)}, 500
+
     logger.info("✅ Performance monitoring configured")
     return monitor
 
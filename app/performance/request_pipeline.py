@@ -0,0 +1,235 @@
+# app/performance/request_pipeline.py
+"""
+Единый конвейер обработки запросов для Telegram Mini App
+
+Вместо отдельных before_request/after_request у каждого модуля (CSRF,
+rate limiting, аудит, мониторинг) приложение регистрирует один обработчик.
+Он один раз вычисляет контекст запроса (идентификатор пользователя, IP
+клиента, время начала), затем выполняет включенные стадии по порядку с
+ранним выходом и учитывает стоимость каждой стадии
+"""
+
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import Flask, Response, g, request
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RequestContext:
+    """Данные запроса, вычисляемые один раз для всех стадий"""
+
+    __slots__ = (
+        'started_at', 'start_time', 'request_id', 'client_ip', 'forwarded_ip',
+        'telegram_user_id', 'identity', 'is_api', 'is_static', 'device_info'
+    )
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.start_time = time.time()
+        self.request_id = f"{int(self.start_time * 1000)}-{id(request)}"
+
+        # IP для решений безопасности (rate limiting, сигналы атак) - адрес соединения;
+        # за доверенным proxy его подставляет ProxyFix (AppConfig.TRUSTED_PROXY_COUNT)
+        self.client_ip = request.remote_addr or 'unknown'
+
+        # IP из proxy заголовков (X-Forwarded-For > X-Real-IP) подделывается клиентом - только для логов
+        forwarded_for = request.headers.get('X-Forwarded-For')
+        if forwarded_for:
+            self.forwarded_ip = forwarded_for.split(',')[0].strip()
+        else:
+            self.forwarded_ip = request.headers.get('X-Real-IP') or self.client_ip
+
+        # Приоритет идентификации: Telegram User ID > IP адрес
+        self.telegram_user_id = request.headers.get('X-Telegram-User-Id')
+        if self.telegram_user_id:
+            self.identity = f"telegram:{self.telegram_user_id}"
+        else:
+            self.identity = f"ip:{self.client_ip}"
+
+        self.is_api = request.path.startswith('/api/')
+        self.is_static = bool(request.endpoint and request.endpoint.startswith('static'))
+        self.device_info = None  # Заполняется лениво (WebAppOptimizer.get_device_info)
+
+    @property
+    def elapsed(self) -> float:
+        """Секунды с начала обработки запроса"""
+        return time.perf_counter() - self.started_at
+
+
+def get_request_context() -> Optional[RequestContext]:
+    """Контекст текущего запроса (None вне конвейера)"""
+    return g.get('request_context')
+
+
+class _Stage:
+    """Стадия конвейера и ее накопленная стоимость"""
+
+    __slots__ = ('name', 'func', 'order', 'seq', 'calls', 'total_time', 'max_time', 'short_circuits', 'errors')
+
+    def __init__(self, name: str, func: Callable, order: int, seq: int):
+        self.name = name
+        self.func = func
+        self.order = order
+        self.seq = seq
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.short_circuits = 0
+        self.errors = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'calls': self.calls,
+            'total_ms': round(self.total_time * 1000, 3),
+            'avg_us': round(self.total_time / self.calls * 1_000_000, 1) if self.calls else 0,
+            'max_ms': round(self.max_time * 1000, 3),
+            'short_circuits': self.short_circuits,
+            'errors': self.errors
+        }
+
+
+class RequestPipeline:
+    """
+    Конвейер стадий запроса
+
+    before-стадии - функции без аргументов; ответ (не None) прерывает
+    конвейер, как и в before_request. Они упорядочены по order, при равном
+    order - по порядку регистрации. after-стадии принимают и возвращают
+    response и выполняются в обратном порядке, как after_request во Flask.
+    """
+
+    def __init__(self, app: Flask = None, disabled_stages: List[str] = None):
+        self.app = app
+        self.disabled_stages = set(disabled_stages or [])
+        self._before: List[_Stage] = []
+        self._after: List[_Stage] = []
+        self._seq = itertools.count()
+        self._stats_lock = threading.Lock()
+        self.requests_count = 0
+        self.total_time = 0.0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        """Регистрирует единственную пару обработчиков конвейера"""
+        self.app = app
+        self.disabled_stages |= set(app.config.get('REQUEST_PIPELINE_DISABLED_STAGES') or [])
+        app.extensions['request_pipeline'] = self
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+        logger.info("✅ Request Pipeline initialized")
+
+    def add_before(self, name: str, func: Callable[[], Optional[Any]], order: int = 100):
+        """Добавляет проверку до обработки запроса"""
+        self._add(self._before, name, func, order)
+
+    def add_after(self, name: str, func: Callable[[Response], Response], order: int = 100):
+        """Добавляет обработку ответа"""
+        self._add(self._after, name, func, order)
+
+    def _add(self, stages: List[_Stage], name: str, func: Callable, order: int):
+        if name in self.disabled_stages:
+            logger.info(f"⏭️ Стадия конвейера запросов отключена: {name}")
+            return
+        stages.append(_Stage(name, func, order, next(self._seq)))
+        stages.sort(key=lambda stage: (stage.order, stage.seq))
+
+    def _record(self, stage: _Stage, duration: float, short_circuit: bool = False, error: bool = False):
+        with self._stats_lock:
+            stage.calls += 1
+            stage.total_time += duration
+            if duration > stage.max_time:
+                stage.max_time = duration
+            if short_circuit:
+                stage.short_circuits += 1
+            if error:
+                stage.errors += 1
+
+    def _before_request(self):
+        """Контекст запроса и before-стадии с ранним выходом"""
+        ctx = RequestContext()
+        g.request_context = ctx
+
+        # Совместимость с кодом, читающим прежние атрибуты g
+        g.request_start_time = ctx.start_time
+        g.start_time = ctx.start_time
+        g.request_id = ctx.request_id
+        g.ip_address = ctx.client_ip
+
+        for stage in self._before:
+            started = time.perf_counter()
+            try:
+                result = stage.func()
+            except Exception:
+                self._record(stage, time.perf_counter() - started, error=True)
+                raise
+            self._record(stage, time.perf_counter() - started, short_circuit=result is not None)
+            if result is not None:
+                g.pipeline_stopped_at = stage.name
+                return result
+
+    def _after_request(self, response: Response) -> Response:
+        """after-стадии; ошибка стадии логируется и не ломает ответ"""
+        for stage in reversed(self._after):
+            started = time.perf_counter()
+            try:
+                response = stage.func(response)
+                self._record(stage, time.perf_counter() - started)
+            except Exception as e:
+                self._record(stage, time.perf_counter() - started, error=True)
+                logger.error(f"Request pipeline stage {stage.name} failed: {e}")
+
+        ctx = get_request_context()
+        if ctx is not None:
+            with self._stats_lock:
+                self.requests_count += 1
+                self.total_time += ctx.elapsed
+
+        return response
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Стоимость стадий конвейера (для дашборда производительности)"""
+        with self._stats_lock:
+            before = [stage.to_dict() for stage in self._before]
+            after = [stage.to_dict() for stage in reversed(self._after)]
+            overhead = sum(stage.total_time for stage in itertools.chain(self._before, self._after))
+            requests_count = self.requests_count
+            total_time = self.total_time
+
+        return {
+            'requests': requests_count,
+            'before_stages': before,
+            'after_stages': after,
+            'avg_overhead_us': round(overhead / requests_count * 1_000_000, 1) if requests_count else 0,
+            'avg_request_ms': round(total_time / requests_count * 1000, 3) if requests_count else 0,
+            'disabled_stages': sorted(self.disabled_stages)
+        }
+
+    def reset_stats(self):
+        """Сброс накопленной статистики стадий"""
+        with self._stats_lock:
+            for stage in itertools.chain(self._before, self._after):
+                stage.calls = 0
+                stage.total_time = 0.0
+                stage.max_time = 0.0
+                stage.short_circuits = 0
+                stage.errors = 0
+            self.requests_count = 0
+            self.total_time = 0.0
+
+
+def get_request_pipeline(app: Flask) -> RequestPipeline:
+    """Конвейер приложения (создается при первом обращении)"""
+    pipeline = app.extensions.get('request_pipeline')
+    if pipeline is None:
+        pipeline = RequestPipeline(app)
+    return pipeline
@@ -8,7 +8,7 @@ API маршрутизатор для Telegram Mini App
 
 import time
 from flask import Blueprint, request, jsonify, current_app, g
-from app.services.auth_service import AuthService
+from app.services.auth_service import auth_service
 from .middleware import (
     require_telegram_auth, 
     cache_response, 
@@ -33,7 +33,7 @@ def auth_status():
         import sqlite3
         from app.config.telegram_config import AppConfig
         
-        telegram_id = AuthService.get_current_user_id()
+        telegram_id = auth_service.get_current_user_id()
         
         if not telegram_id:
             return jsonify({
@@ -42,7 +42,7 @@ def auth_status():
             })
         
         # Проверяем существование пользователя в БД
-        user_db_id = AuthService.ensure_user_exists(telegram_id)
+        user_db_id = auth_service.ensure_user_exists()
         
         if not user_db_id:
             return jsonify({
@@ -110,29 +110,18 @@ def telegram_login():
         
         init_data = data['init_data']
         
-        # Валидируем данные от Telegram
-        if not AuthService.validate_telegram_data(init_data):
+        # Валидируем подпись данных от Telegram
+        verified = auth_service.authenticate_init_data(init_data)
+        if not verified:
             return jsonify({
                 'success': False,
                 'error': 'Invalid Telegram data'
             }), 401
         
-        # Извлекаем user_id из init_data (упрощенная версия)
-        import urllib.parse
-        parsed_data = urllib.parse.parse_qs(init_data)
-        
-        # В реальном приложении нужно парсить user JSON
-        # Пока используем заголовки
-        telegram_id = request.headers.get('X-Telegram-User-Id')
-        
-        if not telegram_id:
-            return jsonify({
-                'success': False,
-                'error': 'Telegram user ID not found'
-            }), 400
+        telegram_id = verified.user_id
         
         # Создаем или обновляем пользователя
-        user_db_id = AuthService.ensure_user_exists(telegram_id)
+        user_db_id = auth_service.ensure_user_exists(verified.username, verified.first_name)
         
         if not user_db_id:
             return jsonify({
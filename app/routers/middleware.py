@@ -6,10 +6,12 @@
 безопасности, аутентификации и мониторинга производительности.
 """
 
+import re
 import time
 import json
-from typing import Optional, Dict, Any, Tuple
-from app.services.auth_service import AuthService
+from typing import Optional, Dict, Any, Iterable, Tuple
+from app.services.auth_service import auth_service
+from app.performance.request_pipeline import get_request_context, get_request_pipeline
 from functools import wraps
 from flask import (
     request, jsonify, current_app, g, session,
@@ -26,12 +28,108 @@ SUSPICIOUS_PATTERNS = [
     '../', '..\\', '<script', 'javascript:',
     'eval(', 'exec(', 'system('
 ]
+SUSPICIOUS_SCAN_MAX_BYTES = 1024 * 1024  # Сканируем не больше 1MB тела запроса
+SUSPICIOUS_SCAN_CHUNK_BYTES = 64 * 1024  # Большие тела - порциями с перекрытием
 
 # Глобальные кэши
 rate_limit_cache = {}
 security_events = []
 
 
+def _trie_pattern(patterns: Iterable[str]) -> str:
+    """Регулярное выражение-префиксное дерево: общие префиксы шаблонов проверяются один раз"""
+    trie: Dict[str, Any] = {}
+    for pattern in patterns:
+        node = trie
+        for char in pattern:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+class SuspiciousContentMatcher:
+    """
+    Поиск всех подозрительных шаблонов за один проход
+
+    Шаблоны один раз компилируются в общее регулярное выражение в виде
+    префиксного дерева (версии для str и bytes), поэтому строка проверяется
+    одним проходом вместо цикла по шаблонам. Шаблоны - ASCII, поэтому тело
+    запроса сканируется как есть, в байтах, с приведением к нижнему регистру
+    только ASCII, без декодирования и json.dumps. Большие тела сканируются
+    порциями с перекрытием на длину самого длинного шаблона и не дальше
+    max_scan_bytes.
+    """
+
+    def __init__(self, patterns: Iterable[str], max_scan_bytes: int = SUSPICIOUS_SCAN_MAX_BYTES,
+                 chunk_size: int = SUSPICIOUS_SCAN_CHUNK_BYTES):
+        patterns = sorted(set(pattern.lower() for pattern in patterns))
+        if not all(pattern.isascii() for pattern in patterns):
+            raise ValueError("Suspicious patterns must be ASCII")
+
+        expression = _trie_pattern(patterns)
+        self._text_re = re.compile(expression)
+        self._bytes_re = re.compile(expression.encode('ascii'))
+        self.max_scan_bytes = max_scan_bytes
+        self.chunk_size = chunk_size
+        self.overlap = max(len(pattern) for pattern in patterns) - 1
+
+    def search_text(self, text: str) -> Optional[str]:
+        """Найденный шаблон в строке или None"""
+        match = self._text_re.search(text.lower())
+        return match.group(0) if match else None
+
+    def search_bytes(self, data: bytes) -> Optional[str]:
+        """Найденный шаблон в байтах (первые max_scan_bytes) или None"""
+        if len(data) <= self.chunk_size:
+            match = self._bytes_re.search(bytes(data).lower())
+            return match.group(0).decode('ascii') if match else None
+
+        view = memoryview(data)[:self.max_scan_bytes]
+        return self.search_chunks(
+            view[offset:offset + self.chunk_size] for offset in range(0, len(view), self.chunk_size)
+        )
+
+    def search_chunks(self, chunks: Iterable[bytes]) -> Optional[str]:
+        """Потоковый поиск по порциям; хвост предыдущей порции ловит шаблон на границе"""
+        tail = b''
+        scanned = 0
+        for chunk in chunks:
+            if scanned >= self.max_scan_bytes:
+                break
+            chunk = bytes(chunk[:self.max_scan_bytes - scanned]).lower()
+            scanned += len(chunk)
+
+            match = self._bytes_re.search(tail + chunk)
+            if match:
+                return match.group(0).decode('ascii')
+            tail = chunk[-self.overlap:] if self.overlap else b''
+        return None
+
+
+# Компилируется один раз при загрузке модуля
+suspicious_matcher = SuspiciousContentMatcher(SUSPICIOUS_PATTERNS)
+
+
+def _client_ip() -> str:
+    """IP клиента из контекста конвейера (адрес соединения, для решений безопасности)"""
+    ctx = get_request_context()
+    return ctx.client_ip if ctx is not None else request.remote_addr
+
+
+def _forwarded_ip() -> str:
+    """IP из proxy заголовков (только для логов)"""
+    ctx = get_request_context()
+    return ctx.forwarded_ip if ctx is not None else request.remote_addr
+
+
 class SecurityLogger:
     """Класс для логирования событий безопасности"""
 
@@ -41,7 +139,8 @@ class SecurityLogger:
         event = {
             'timestamp': time.time(),
             'type': event_type,
-            'ip': request.remote_addr,
+            'ip': _client_ip(),
+            'forwarded_ip': _forwarded_ip(),
             'user_agent': request.headers.get('User-Agent'),
             'path': request.path,
             'method': request.method,
@@ -88,7 +187,7 @@ class SecurityValidator:
     @staticmethod
     def validate_rate_limit() -> Optional[Tuple[Dict, int]]:
         """Простая проверка rate limiting"""
-        client_ip = request.remote_addr
+        client_ip = _client_ip()
         current_time = time.time()
 
         # Очистка старых записей
@@ -117,40 +216,46 @@ class SecurityValidator:
 
     @staticmethod
     def check_suspicious_content() -> Optional[Tuple[Dict, int]]:
-        """Проверка на подозрительный контент"""
+        """Проверка на подозрительный контент (один проход по каждой части запроса)"""
         try:
             # Проверяем URL
-            for pattern in SUSPICIOUS_PATTERNS:
-                if pattern.lower() in request.path.lower():
-                    SecurityLogger.log_security_event('SUSPICIOUS_URL', {
-                        'pattern': pattern,
-                        'url': request.path
-                    })
-                    return {'error': 'Suspicious request detected'}, 400
+            pattern = suspicious_matcher.search_text(request.path)
+            if pattern:
+                SecurityLogger.log_security_event('SUSPICIOUS_URL', {
+                    'pattern': pattern,
+                    'url': request.path
+                })
+                return {'error': 'Suspicious request detected'}, 400
 
             # Проверяем параметры запроса
             for key, value in request.args.items():
                 if isinstance(value, str):
-                    for pattern in SUSPICIOUS_PATTERNS:
-                        if pattern.lower() in value.lower():
-                            SecurityLogger.log_security_event('SUSPICIOUS_PARAM', {
-                                'pattern': pattern,
-                                'param': key,
-                                'value': value[:100]  # Ограничиваем длину для логов
-                            })
-                            return {'error': 'Suspicious request detected'}, 400
-
-            # Проверяем JSON данные
+                    pattern = suspicious_matcher.search_text(value)
+                    if pattern:
+                        SecurityLogger.log_security_event('SUSPICIOUS_PARAM', {
+                            'pattern': pattern,
+                            'param': key,
+                            'value': value[:100]  # Ограничиваем длину для логов
+                        })
+                        return {'error': 'Suspicious request detected'}, 400
+
+            # Проверяем JSON данные: сырое тело без разбора и json.dumps
+            # (get_data кэширует тело, маршрут разбирает его как обычно)
             if request.is_json:
-                data = request.get_json(silent=True)
-                if data:
-                    data_str = json.dumps(data).lower()
-                    for pattern in SUSPICIOUS_PATTERNS:
-                        if pattern in data_str:
-                            SecurityLogger.log_security_event('SUSPICIOUS_JSON', {
-                                'pattern': pattern
-                            })
-                            return {'error': 'Suspicious request detected'}, 400
+                body = request.get_data(cache=True)
+                pattern = suspicious_matcher.search_bytes(body)
+
+                # Экранированные \uXXXX символы видны только после разбора JSON
+                if not pattern and body.find(b'\\u', 0, SUSPICIOUS_SCAN_MAX_BYTES) != -1:
+                    data = request.get_json(silent=True)
+                    if data:
+                        pattern = suspicious_matcher.search_text(json.dumps(data, ensure_ascii=False))
+
+                if pattern:
+                    SecurityLogger.log_security_event('SUSPICIOUS_JSON', {
+                        'pattern': pattern
+                    })
+                    return {'error': 'Suspicious request detected'}, 400
 
         except Exception as e:
             current_app.logger.error(f"Error checking suspicious content: {e}")
@@ -163,7 +268,9 @@ class PerformanceMonitor:
 
     @staticmethod
     def start_timing():
-        """Начало замера времени выполнения"""
+        """Начало замера времени выполнения (в конвейере уже выполнено)"""
+        if get_request_context() is not None:
+            return
         g.request_start_time = time.time()
         g.request_id = f"{int(time.time() * 1000)}-{id(request)}"
 
@@ -171,13 +278,14 @@ class PerformanceMonitor:
     def log_slow_requests(response: Response) -> Response:
         """Логирование медленных запросов"""
         if hasattr(g, 'request_start_time'):
-            duration = time.time() - g.request_start_time
+            ctx = get_request_context()
+            duration = ctx.elapsed if ctx is not None else time.time() - g.request_start_time
 
             # Логируем медленные запросы (>1 секунды)
             if duration > 1.0:
                 current_app.logger.warning(
                     f"Slow request [{g.request_id}]: {request.method} {request.path} "
-                    f"took {duration:.2f}s from {request.remote_addr}"
+                    f"took {duration:.2f}s from {_client_ip()}"
                 )
 
             # Добавляем заголовки с метриками производительности
@@ -235,7 +343,7 @@ def security_middleware():
     if request.path.startswith('/api/'):
         current_app.logger.info(
             f"API Access [{g.request_id}]: {request.method} {request.path} "
-            f"from {request.remote_addr} "
+            f"from {_client_ip()} "
             f"User-Agent: {request.headers.get('User-Agent', 'Unknown')[:100]}"
         )
 
@@ -283,11 +391,11 @@ def telegram_auth_middleware():
         return
 
     try:
-        telegram_id = AuthService.get_current_user_id()
+        telegram_id = auth_service.get_current_user_id()
 
         if not telegram_id:
             current_app.logger.warning(
-                f"Unauthorized access attempt to {request.path} from {request.remote_addr}"
+                f"Unauthorized access attempt to {request.path} from {_client_ip()}"
             )
             SecurityLogger.log_security_event('UNAUTHORIZED_ACCESS', {
                 'path': request.path,
@@ -306,7 +414,7 @@ def telegram_auth_middleware():
                 return redirect(url_for('main.index'))
 
         # Убеждаемся что пользователь существует в БД
-        user_db_id = AuthService.ensure_user_exists(telegram_id)
+        user_db_id = auth_service.ensure_user_exists()
 
         if user_db_id:
             # Сохраняем информацию о пользователе в g для использования в маршрутах
@@ -341,56 +449,47 @@ def telegram_auth_middleware():
             }), 500
 
 
-def performance_middleware():
+def performance_middleware(response: Response) -> Response:
     """
     Middleware для мониторинга производительности
 
-    Настраивает after_request обработчики для логирования
-    времени выполнения запросов.
+    Стадия обработки ответа: логирует медленные запросы и добавляет
+    заголовки времени выполнения.
     """
-
-    # Регистрируем after_request обработчик для текущего запроса
-    @current_app.after_request
-    def log_request_performance(response):
-        """Логирование производительности после выполнения запроса"""
-        return PerformanceMonitor.log_slow_requests(response)
+    return PerformanceMonitor.log_slow_requests(response)
 
 
-def cors_middleware():
+def cors_middleware(response: Response) -> Response:
     """
     Middleware для обработки CORS (Cross-Origin Resource Sharing)
 
-    Настраивает заголовки для безопасной работы с фронтендом
+    Стадия обработки ответа: заголовки для безопасной работы с фронтендом
     """
 
-    @current_app.after_request
-    def add_cors_headers(response):
-        """Добавление CORS заголовков"""
-
-        # Разрешенные домены (в продакшене ограничить)
-        allowed_origins = current_app.config.get('ALLOWED_ORIGINS', [
-            'https://web.telegram.org',
-            'https://k.web.telegram.org'
-        ])
-
-        origin = request.headers.get('Origin')
-        if origin in allowed_origins or current_app.debug:
-            response.headers['Access-Control-Allow-Origin'] = origin or '*'
-            response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-            response.headers['Access-Control-Allow-Headers'] = (
-                'Content-Type, Authorization, X-Requested-With, '
-                'X-Telegram-User-Id, X-Telegram-Username, '
-                'X-Telegram-First-Name, X-Telegram-Last-Name'
-            )
-            response.headers['Access-Control-Allow-Credentials'] = 'true'
-            response.headers['Access-Control-Max-Age'] = '86400'  # 24 часа
+    # Разрешенные домены (в продакшене ограничить)
+    allowed_origins = current_app.config.get('ALLOWED_ORIGINS', [
+        'https://web.telegram.org',
+        'https://k.web.telegram.org'
+    ])
+
+    origin = request.headers.get('Origin')
+    if origin in allowed_origins or current_app.debug:
+        response.headers['Access-Control-Allow-Origin'] = origin or '*'
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = (
+            'Content-Type, Authorization, X-Requested-With, '
+            'X-Telegram-User-Id, X-Telegram-Username, '
+            'X-Telegram-First-Name, X-Telegram-Last-Name'
+        )
+        response.headers['Access-Control-Allow-Credentials'] = 'true'
+        response.headers['Access-Control-Max-Age'] = '86400'  # 24 часа
 
-        # Безопасность заголовки
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        response.headers['X-Frame-Options'] = 'SAMEORIGIN'
-        response.headers['X-XSS-Protection'] = '1; mode=block'
+    # Безопасность заголовки
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['X-Frame-Options'] = 'SAMEORIGIN'
+    response.headers['X-XSS-Protection'] = '1; mode=block'
 
-        return response
+    return response
 
 
 # === ДЕКОРАТОРЫ ===
@@ -407,7 +506,7 @@ def require_telegram_auth(f):
 
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        telegram_id = AuthService.get_current_user_id()
+        telegram_id = auth_service.get_current_user_id()
 
         if not telegram_id:
             if request.path.startswith('/api/'):
@@ -420,7 +519,7 @@ def require_telegram_auth(f):
                 return redirect(url_for('main.index'))
 
         # Проверяем существование пользователя в БД
-        user_db_id = AuthService.ensure_user_exists(telegram_id)
+        user_db_id = auth_service.ensure_user_exists()
         if not user_db_id:
             return jsonify({
                 'error': 'User registration failed'
@@ -553,17 +652,17 @@ def rate_limit_decorator(max_requests=10, window=60):
 
 def init_middleware(app):
     """
-    Инициализация всех middleware
+    Инициализация всех middleware как стадий единого конвейера запросов
 
     Args:
         app: Экземпляр Flask приложения
     """
 
-    # Регистрируем before_request middleware
-    app.before_request(security_middleware)
-    app.before_request(telegram_auth_middleware)
-    app.before_request(performance_middleware)
-    app.before_request(cors_middleware)
+    pipeline = get_request_pipeline(app)
+    pipeline.add_before('security', security_middleware)
+    pipeline.add_before('telegram_auth', telegram_auth_middleware)
+    pipeline.add_after('request_timing', performance_middleware)
+    pipeline.add_after('cors', cors_middleware)
 
     app.logger.info("✅ Middleware инициализированы")
 
@@ -613,5 +712,8 @@ __all__ = [
     'init_middleware',
     'get_security_stats',
     'SecurityLogger',
+    'SecurityValidator',
+    'SuspiciousContentMatcher',
+    'suspicious_matcher',
     'PerformanceMonitor'
 ]
\ No newline at end of file
@@ -9,6 +9,7 @@ from .rate_limiting import setup_rate_limiting
 from .input_validation import InputValidator, validate_json
 from .security_headers import setup_security_headers
 from .audit_logger import SecurityAuditLogger
+from .init_data_validator import InitDataValidator, init_data_validator
 
 __all__ = [
     'setup_csrf_protection',
@@ -16,5 +17,7 @@ __all__ = [
     'InputValidator',
     'validate_json',
     'setup_security_headers',
-    'SecurityAuditLogger'
+    'SecurityAuditLogger',
+    'InitDataValidator',
+    'init_data_validator'
 ]
\ No newline at end of file
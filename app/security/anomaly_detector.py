@@ -0,0 +1,169 @@
+# app/security/anomaly_detector.py
+"""
+Детектор подозрительной активности на скользящих окнах
+Для каждого пользователя и сигнала (запрос, ответ 401, неудачная
+аутентификация) хранится кольцо счетчиков по интервалам времени, поэтому
+память на ключ постоянна, а проверка правила - O(1) независимо от трафика.
+Неактивные ключи вытесняются
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingWindowCounter:
+    """
+    Счетчик событий за последние window_seconds
+
+    Окно разбито на кольцо из window_seconds / bucket_seconds интервалов.
+    При продвижении времени обнуляются только пройденные интервалы, поэтому
+    стоимость add/count амортизированно постоянна.
+    """
+
+    __slots__ = ('bucket_seconds', 'buckets', 'last_index', 'total')
+
+    def __init__(self, window_seconds: int, bucket_seconds: int = 1):
+        self.bucket_seconds = bucket_seconds
+        self.buckets = [0] * max(1, window_seconds // bucket_seconds)
+        self.last_index = None
+        self.total = 0
+
+    def _advance(self, now: float) -> int:
+        index = int(now // self.bucket_seconds)
+        if self.last_index is None:
+            self.last_index = index
+        elif index > self.last_index:
+            size = len(self.buckets)
+            if index - self.last_index >= size:
+                self.buckets = [0] * size
+                self.total = 0
+            else:
+                for stale in range(self.last_index + 1, index + 1):
+                    slot = stale % size
+                    self.total -= self.buckets[slot]
+                    self.buckets[slot] = 0
+            self.last_index = index
+        return index
+
+    def add(self, now: float, amount: int = 1) -> int:
+        """Учитывает событие и возвращает число событий в окне"""
+        index = self._advance(now)
+        self.buckets[index % len(self.buckets)] += amount
+        self.total += amount
+        return self.total
+
+    def count(self, now: float) -> int:
+        """Число событий в окне на момент now"""
+        self._advance(now)
+        return self.total
+
+
+class AnomalyRule:
+    """Правило: не меньше threshold сигналов signal за window_seconds"""
+
+    def __init__(self, name: str, signal: str, threshold: int, window_seconds: int,
+                 bucket_seconds: int = 1, severity: str = 'medium', cooldown_seconds: int = None,
+                 description: str = '{count} events in {window}s', evidence_key: str = 'count'):
+        self.name = name
+        self.signal = signal
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.severity = severity
+        # Повторно отмечаем тот же ключ не чаще раза в окно
+        self.cooldown_seconds = window_seconds if cooldown_seconds is None else cooldown_seconds
+        self.description = description
+        self.evidence_key = evidence_key
+
+
+class _KeyState:
+    __slots__ = ('counters', 'flagged_at', 'last_seen')
+
+    def __init__(self):
+        self.counters: Dict[str, SlidingWindowCounter] = {}
+        self.flagged_at: Dict[str, float] = {}
+        self.last_seen = 0.0
+
+
+class AnomalyDetector:
+    """
+    Многосигнальный детектор с вытеснением неактивных ключей
+
+    record() учитывает сигнал и проверяет только правила этого сигнала.
+    Возвращает сработавшие правила как (правило, счетчик) - запись в БД
+    остается вызывающему коду.
+    """
+
+    def __init__(self, rules: List[AnomalyRule], idle_ttl_seconds: int = None, max_keys: int = 100000):
+        self.rules_by_signal: Dict[str, List[AnomalyRule]] = {}
+        for rule in rules:
+            self.rules_by_signal.setdefault(rule.signal, []).append(rule)
+
+        # Ключ без событий дольше самого длинного окна ничего не помнит
+        self.idle_ttl_seconds = idle_ttl_seconds or max(rule.window_seconds for rule in rules)
+        self.max_keys = max_keys
+        self._states: 'OrderedDict[str, _KeyState]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def record(self, key: str, signal: str, now: Optional[float] = None) -> List[Tuple[AnomalyRule, int]]:
+        """Учитывает сигнал ключа и возвращает сработавшие правила"""
+        rules = self.rules_by_signal.get(signal)
+        if not key or not rules:
+            return []
+
+        now = time.time() if now is None else now
+        triggered = []
+
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = _KeyState()
+                self._states[key] = state
+            else:
+                self._states.move_to_end(key)
+            state.last_seen = now
+
+            for rule in rules:
+                counter = state.counters.get(rule.name)
+                if counter is None:
+                    counter = SlidingWindowCounter(rule.window_seconds, rule.bucket_seconds)
+                    state.counters[rule.name] = counter
+                count = counter.add(now)
+
+                if count >= rule.threshold:
+                    flagged_at = state.flagged_at.get(rule.name)
+                    if flagged_at is None or now - flagged_at >= rule.cooldown_seconds:
+                        state.flagged_at[rule.name] = now
+                        triggered.append((rule, count))
+
+            self._evict(now)
+
+        return triggered
+
+    def count(self, key: str, rule_name: str, now: Optional[float] = None) -> int:
+        """Текущее значение счетчика правила для ключа"""
+        now = time.time() if now is None else now
+        with self._lock:
+            state = self._states.get(key)
+            counter = state.counters.get(rule_name) if state else None
+            return counter.count(now) if counter else 0
+
+    def _evict(self, now: float):
+        """Удаляет неактивные ключи с начала очереди (порядок - по последнему событию)"""
+        cutoff = now - self.idle_ttl_seconds
+        while self._states:
+            key, state = next(iter(self._states.items()))
+            if state.last_seen >= cutoff and len(self._states) <= self.max_keys:
+                break
+            del self._states[key]
+            self.evicted += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'tracked_keys': len(self._states), 'evicted_keys': self.evicted}
@@ -4,8 +4,8 @@
 Трекинг безопасности и мониторинг подозрительной активности
 """
 
+import atexit
 import json
-import time
 from datetime import datetime
 from typing import Any, Dict, Optional, List
 from flask import Flask, request, g, session
@@ -15,8 +15,141 @@ import sqlite3
 import threading
 from collections import defaultdict, deque
 
+from app.config.telegram_config import AUDIT_BUFFER_SIZE, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL_SECONDS
+from app.security.anomaly_detector import AnomalyDetector, AnomalyRule
+
 logger = logging.getLogger(__name__)
 
+# Вставки для пакетной записи (порядок колонок совпадает с кортежами строк)
+_AUDIT_INSERTS = {
+    'security_audit_logs': '''
+        INSERT INTO security_audit_logs 
+        (timestamp, user_id, session_id, ip_address, user_agent, action, 
+         resource, method, status_code, risk_level, details)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+    'suspicious_activity': '''
+        INSERT INTO suspicious_activity 
+        (user_id, ip_address, activity_type, severity, description, evidence)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''',
+}
+
+MAX_USER_AGENT_LENGTH = 200
+
+
+class AuditWriter:
+    """
+    Фоновая пакетная запись аудита
+    
+    Запрос только кладет готовую строку в ограниченный буфер, а фоновый
+    поток пишет накопленное одной транзакцией - при наборе batch_size строк
+    или раз в flush_interval секунд. При переполнении буфера новые строки
+    отбрасываются и учитываются в dropped, чтобы всплеск атаки не
+    превращался в поток записей в БД.
+    """
+    
+    def __init__(self, db_path: str, buffer_size: int = AUDIT_BUFFER_SIZE,
+                 batch_size: int = AUDIT_BATCH_SIZE, flush_interval: float = AUDIT_FLUSH_INTERVAL_SECONDS):
+        self.db_path = db_path
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+    
+    def submit(self, table: str, row: tuple) -> bool:
+        """Ставит строку в буфер; False - буфер переполнен, строка отброшена"""
+        with self._cond:
+            if len(self._buffer) >= self.buffer_size:
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    logger.warning(f"⚠️ Буфер аудита переполнен, отброшено записей: {self.dropped}")
+                return False
+            
+            self._buffer.append((table, row))
+            if self._thread is None and not self._stopping:
+                self._start()
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        return True
+    
+    def _start(self):
+        """Запускает фоновый поток (вызывается под self._cond)"""
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stopping or len(self._buffer) >= self.batch_size,
+                    timeout=self.flush_interval
+                )
+                if self._stopping:
+                    return
+            self.flush()
+    
+    def flush(self) -> int:
+        """Записывает все накопленное сейчас (в том числе из запроса или при остановке)"""
+        with self._write_lock:
+            with self._cond:
+                batch = list(self._buffer)
+                self._buffer.clear()
+            if not batch:
+                return 0
+            
+            rows_by_table = defaultdict(list)
+            for table, row in batch:
+                rows_by_table[table].append(row)
+            
+            try:
+                conn = sqlite3.connect(self.db_path, timeout=30)
+                try:
+                    with conn:
+                        for table, rows in rows_by_table.items():
+                            conn.executemany(_AUDIT_INSERTS[table], rows)
+                finally:
+                    conn.close()
+                self.written += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error(f"Failed to write audit batch ({len(batch)} rows): {e}")
+                return 0
+            
+            return len(batch)
+    
+    def shutdown(self, timeout: float = 5.0):
+        """Останавливает фоновый поток и дописывает остаток буфера"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self.flush()
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Состояние буфера аудита"""
+        with self._cond:
+            pending = len(self._buffer)
+        return {
+            'pending': pending,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'buffer_size': self.buffer_size
+        }
+
+
 class SecurityAuditLogger:
     """
     Класс для аудита действий пользователей и безопасности
@@ -25,22 +158,45 @@ class SecurityAuditLogger:
     def __init__(self, app: Flask = None, db_path: str = None):
         self.app = app
         self.db_path = db_path or 'telegram_mini_app.db'
-        self.suspicious_activity = defaultdict(list)
-        self.rate_tracking = defaultdict(lambda: deque(maxlen=100))
-        self.lock = threading.Lock()
+        self.writer = AuditWriter(self.db_path)
         
         # Пороги для определения подозрительной активности
         self.thresholds = {
             'failed_auth_attempts': 5,      # За 15 минут
             'rapid_requests': 50,           # За минуту
+            'repeated_unauthorized': 10,    # Ответов 401 за 5 минут
             'data_breach_attempts': 3,      # За час
             'permission_escalation': 1,     # За день
             'unusual_patterns': 10          # За час
         }
+        self.detector = AnomalyDetector(self._build_anomaly_rules())
         
         if app is not None:
             self.init_app(app)
     
+    def _build_anomaly_rules(self) -> List[AnomalyRule]:
+        """Правила детектора по порогам (окна, интервалы счетчиков и тексты событий)"""
+        return [
+            AnomalyRule(
+                'rapid_requests', signal='request',
+                threshold=self.thresholds['rapid_requests'] + 1,  # Больше порога
+                window_seconds=60, bucket_seconds=1, severity='high',
+                description='User made {count} requests in 1 minute', evidence_key='requests_count'
+            ),
+            AnomalyRule(
+                'repeated_unauthorized', signal='http_401',
+                threshold=self.thresholds['repeated_unauthorized'],
+                window_seconds=300, bucket_seconds=5, severity='medium',
+                description='Repeated unauthorized responses: {count}', evidence_key='responses'
+            ),
+            AnomalyRule(
+                'multiple_failed_auth', signal='auth_failure',
+                threshold=self.thresholds['failed_auth_attempts'],
+                window_seconds=900, bucket_seconds=15, severity='high',
+                description='Multiple failed authentication attempts: {count}', evidence_key='attempts'
+            ),
+        ]
+    
     def init_app(self, app: Flask):
         """Инициализация аудит логгера"""
         self.app = app
@@ -49,12 +205,18 @@ class SecurityAuditLogger:
         # Создаем таблицы для аудита
         self._create_audit_tables()
         
-        # Добавляем middleware для трекинга запросов
-        app.before_request(self._track_request)
-        app.after_request(self._track_response)
+        # Добавляем стадии трекинга запросов в конвейер
+        from app.performance.request_pipeline import get_request_pipeline
+        pipeline = get_request_pipeline(app)
+        pipeline.add_before('audit', self._track_request)
+        pipeline.add_after('audit', self._track_response)
         
         logger.info("✅ Security Audit Logger initialized")
     
+    def shutdown(self):
+        """Дописывает буфер аудита в БД (вызывать при остановке приложения)"""
+        self.writer.shutdown()
+    
     def _create_audit_tables(self):
         """Создание таблиц для аудита в базе данных"""
         try:
@@ -127,20 +289,23 @@ class SecurityAuditLogger:
             logger.error(f"❌ Failed to create audit tables: {e}")
     
     def _track_request(self):
-        """Трекинг входящих запросов"""
-        g.request_start_time = time.time()
-        g.user_id = request.headers.get('X-Telegram-User-Id')
-        g.ip_address = self._get_client_ip()
+        """Трекинг входящих запросов (время и IP уже в контексте конвейера)"""
+        g.user_id = g.request_context.telegram_user_id
         g.session_id = session.get('session_id') if 'session_id' in session else None
         
         # Трекинг частоты запросов
         if g.user_id:
-            self._track_request_rate(g.user_id)
+            self._record_signal(g.user_id, 'request')
     
     def _track_response(self, response):
         """Трекинг ответов сервера"""
         try:
-            request_time = time.time() - g.get('request_start_time', time.time())
+            ctx = g.get('request_context')
+            request_time = ctx.elapsed if ctx is not None else 0.0
+            
+            # Повторные 401 - по пользователю, а без него по IP
+            if response.status_code == 401:
+                self._record_signal(g.get('user_id') or f"ip:{g.get('ip_address')}", 'http_401')
             
             # Логируем подозрительные статус коды
             if response.status_code in [401, 403, 429, 500]:
@@ -151,9 +316,8 @@ class SecurityAuditLogger:
                     status_code=response.status_code,
                     risk_level='medium' if response.status_code in [401, 403, 429] else 'high',
                     details={
-                        'response_time': request_time,
-                        'content_length': response.content_length,
-                        'headers': dict(request.headers)
+                        'response_time': round(request_time, 3),
+                        'content_length': response.content_length
                     }
                 )
             
@@ -165,7 +329,7 @@ class SecurityAuditLogger:
                     method=request.method,
                     status_code=response.status_code,
                     risk_level='low',
-                    details={'response_time': request_time}
+                    details={'response_time': round(request_time, 3)}
                 )
             
         except Exception as e:
@@ -173,67 +337,35 @@ class SecurityAuditLogger:
         
         return response
     
-    def _get_client_ip(self) -> str:
-        """Получение IP адреса клиента"""
-        # Проверяем заголовки proxy
-        forwarded_for = request.headers.get('X-Forwarded-For')
-        if forwarded_for:
-            return forwarded_for.split(',')[0].strip()
-        
-        real_ip = request.headers.get('X-Real-IP')
-        if real_ip:
-            return real_ip
-        
-        return request.remote_addr or 'unknown'
-    
-    def _track_request_rate(self, user_id: str):
-        """Трекинг частоты запросов пользователя"""
-        current_time = time.time()
-        
-        with self.lock:
-            self.rate_tracking[user_id].append(current_time)
-            
-            # Проверяем превышение лимитов
-            recent_requests = [t for t in self.rate_tracking[user_id] if current_time - t < 60]
-            
-            if len(recent_requests) > self.thresholds['rapid_requests']:
-                self._flag_suspicious_activity(
-                    user_id=user_id,
-                    activity_type='rapid_requests',
-                    severity='high',
-                    description=f'User made {len(recent_requests)} requests in 1 minute',
-                    evidence={'requests_count': len(recent_requests), 'time_window': 60}
-                )
+    def _record_signal(self, user_id: str, signal: str):
+        """Учитывает сигнал в детекторе и отмечает сработавшие правила"""
+        for rule, count in self.detector.record(user_id, signal):
+            self._flag_suspicious_activity(
+                user_id=user_id,
+                activity_type=rule.name,
+                severity=rule.severity,
+                description=rule.description.format(count=count, window=rule.window_seconds),
+                evidence={rule.evidence_key: count, 'time_window': rule.window_seconds}
+            )
     
     def _log_security_event(self, action: str, resource: str = None, method: str = None,
                           status_code: int = None, risk_level: str = 'low', details: Dict = None):
-        """Логирование события безопасности"""
+        """Логирование события безопасности (строка уходит в фоновую запись)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO security_audit_logs 
-                (timestamp, user_id, session_id, ip_address, user_agent, action, 
-                 resource, method, status_code, risk_level, details)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+            self.writer.submit('security_audit_logs', (
                 datetime.utcnow().isoformat(),
                 g.get('user_id'),
                 g.get('session_id'),
                 g.get('ip_address'),
-                request.headers.get('User-Agent', ''),
+                request.headers.get('User-Agent', '')[:MAX_USER_AGENT_LENGTH],
                 action,
                 resource,
                 method,
                 status_code,
                 risk_level,
-                json.dumps(details) if details else None
+                json.dumps(details, separators=(',', ':'), default=str) if details else None
             ))
             
-            conn.commit()
-            conn.close()
-            
             # Дополнительное логирование для высокорисковых событий
             if risk_level in ['high', 'critical']:
                 logger.warning(f"🚨 Security Event: {action} - User: {g.get('user_id')} - IP: {g.get('ip_address')}")
@@ -243,27 +375,17 @@ class SecurityAuditLogger:
     
     def _flag_suspicious_activity(self, user_id: str, activity_type: str, severity: str,
                                 description: str, evidence: Dict = None):
-        """Отметка подозрительной активности"""
+        """Отметка подозрительной активности (строка уходит в фоновую запись)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO suspicious_activity 
-                (user_id, ip_address, activity_type, severity, description, evidence)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
+            self.writer.submit('suspicious_activity', (
                 user_id,
                 g.get('ip_address'),
                 activity_type,
                 severity,
                 description,
-                json.dumps(evidence) if evidence else None
+                json.dumps(evidence, separators=(',', ':'), default=str) if evidence else None
             ))
             
-            conn.commit()
-            conn.close()
-            
             logger.warning(f"🚨 Suspicious Activity: {activity_type} - User: {user_id} - {description}")
             
             # Уведомление администратора при критических событиях
@@ -327,34 +449,12 @@ class SecurityAuditLogger:
     
     def _track_failed_auth(self, user_id: str):
         """Трекинг неудачных попыток аутентификации"""
-        current_time = time.time()
-        
-        with self.lock:
-            if user_id not in self.suspicious_activity:
-                self.suspicious_activity[user_id] = []
-            
-            # Добавляем текущую неудачную попытку
-            self.suspicious_activity[user_id].append(current_time)
-            
-            # Удаляем старые записи (старше 15 минут)
-            cutoff_time = current_time - 900  # 15 минут
-            self.suspicious_activity[user_id] = [
-                t for t in self.suspicious_activity[user_id] if t > cutoff_time
-            ]
-            
-            # Проверяем превышение порога
-            if len(self.suspicious_activity[user_id]) >= self.thresholds['failed_auth_attempts']:
-                self._flag_suspicious_activity(
-                    user_id=user_id,
-                    activity_type='multiple_failed_auth',
-                    severity='high',
-                    description=f'Multiple failed authentication attempts: {len(self.suspicious_activity[user_id])}',
-                    evidence={'attempts': len(self.suspicious_activity[user_id]), 'time_window': 900}
-                )
+        self._record_signal(user_id, 'auth_failure')
     
     def get_user_activity_summary(self, user_id: str, hours: int = 24) -> Dict:
         """Получение сводки активности пользователя"""
         try:
+            self.writer.flush()
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
@@ -406,6 +506,7 @@ class SecurityAuditLogger:
     def get_security_dashboard_data(self) -> Dict:
         """Получение данных для дашборда безопасности"""
         try:
+            self.writer.flush()
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
@@ -465,6 +566,8 @@ class SecurityAuditLogger:
                 'top_ip_addresses': [
                     {'ip': row[0], 'requests': row[1]} for row in top_ips
                 ],
+                'audit_writer': self.writer.get_stats(),
+                'anomaly_detector': self.detector.get_stats(),
                 'generated_at': datetime.utcnow().isoformat()
             }
             
@@ -34,8 +34,9 @@ class TelegramCSRFProtection:
         
         app.extensions['csrf'] = self
         
-        # Добавляем middleware для проверки CSRF токенов
-        app.before_request(self._check_csrf_token)
+        # Добавляем стадию проверки CSRF токенов в конвейер запросов
+        from app.performance.request_pipeline import get_request_pipeline
+        get_request_pipeline(app).add_before('csrf', self._check_csrf_token)
     
     def _check_csrf_token(self):
         """Проверка CSRF токена для защищенных endpoints"""
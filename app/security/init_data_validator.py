@@ -0,0 +1,165 @@
+# app/security/init_data_validator.py
+"""
+Проверка подписи initData Telegram WebApp
+Полная проверка HMAC-SHA256 по алгоритму Telegram выполняется один раз
+для строки initData. Результат кэшируется по SHA-256 строки до истечения
+auth_date, поэтому повторные запросы сессии не разбирают строку и не
+считают подпись заново
+"""
+
+import hashlib
+import hmac
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl
+import logging
+
+from app.config.telegram_config import AppConfig, INIT_DATA_MAX_AGE_SECONDS, INIT_DATA_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class VerifiedInitData:
+    """Проверенные данные initData"""
+
+    __slots__ = ('user_id', 'user', 'auth_date', 'query_id', 'start_param', 'expires_at', 'signed')
+
+    def __init__(self, user: Dict[str, Any], auth_date: int, query_id: Optional[str],
+                 start_param: Optional[str], expires_at: float, signed: bool = True):
+        self.user = user
+        self.user_id = int(user['id'])
+        self.auth_date = auth_date
+        self.query_id = query_id
+        self.start_param = start_param
+        self.expires_at = expires_at
+        self.signed = signed
+
+    @property
+    def username(self) -> Optional[str]:
+        return self.user.get('username')
+
+    @property
+    def first_name(self) -> Optional[str]:
+        return self.user.get('first_name')
+
+
+class InitDataValidator:
+    """
+    Проверка initData с кэшем проверенных строк
+
+    В кэш попадают только строки с верной подписью; запись живет до
+    auth_date + max_age_seconds. Без BOT_TOKEN подпись проверить нельзя:
+    в режиме DEBUG данные принимаются без подписи (signed=False), иначе
+    отклоняются.
+    """
+
+    def __init__(self, bot_token: str = None, max_age_seconds: int = INIT_DATA_MAX_AGE_SECONDS,
+                 cache_size: int = INIT_DATA_CACHE_SIZE):
+        self.bot_token = bot_token
+        self.max_age_seconds = max_age_seconds
+        self.cache_size = cache_size
+        self._secret_key: Optional[bytes] = None
+        self._secret_for: Optional[str] = None
+        self._cache: 'OrderedDict[bytes, VerifiedInitData]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'verified': 0, 'rejected': 0, 'expired': 0}
+
+    def _get_secret_key(self) -> Optional[bytes]:
+        """secret_key = HMAC_SHA256("WebAppData", bot_token), вычисляется один раз"""
+        bot_token = self.bot_token or AppConfig.BOT_TOKEN
+        if not bot_token or bot_token == 'your-bot-token':
+            return None
+        if self._secret_for != bot_token:
+            self._secret_key = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+            self._secret_for = bot_token
+        return self._secret_key
+
+    def validate(self, init_data: str) -> Optional[VerifiedInitData]:
+        """Проверенные данные или None, если подпись неверна или срок истек"""
+        if not init_data:
+            return None
+
+        now = time.time()
+        cache_key = hashlib.sha256(init_data.encode()).digest()
+
+        with self._lock:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                if cached.expires_at > now:
+                    self._cache.move_to_end(cache_key)
+                    self.stats['hits'] += 1
+                    return cached
+                del self._cache[cache_key]
+                self.stats['expired'] += 1
+                return None
+
+        verified = self._verify(init_data, now)
+        if verified is None:
+            with self._lock:
+                self.stats['rejected'] += 1
+            return None
+
+        with self._lock:
+            self.stats['verified'] += 1
+            self._cache[cache_key] = verified
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return verified
+
+    def _verify(self, init_data: str, now: float) -> Optional[VerifiedInitData]:
+        """Разбор и проверка подписи по алгоритму Telegram WebApp"""
+        try:
+            fields = dict(parse_qsl(init_data, keep_blank_values=True, strict_parsing=True))
+        except ValueError:
+            return None
+
+        received_hash = fields.pop('hash', None)
+        if not received_hash or 'user' not in fields:
+            return None
+
+        secret_key = self._get_secret_key()
+        if secret_key is not None:
+            data_check_string = '\n'.join(f"{key}={fields[key]}" for key in sorted(fields))
+            expected_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+            if not hmac.compare_digest(expected_hash, received_hash):
+                logger.warning("⚠️ Неверная подпись initData")
+                return None
+        elif not AppConfig.DEBUG:
+            logger.warning("⚠️ BOT_TOKEN не настроен - initData отклонена")
+            return None
+
+        try:
+            auth_date = int(fields.get('auth_date', 0))
+            user = json.loads(fields['user'])
+            int(user['id'])
+        except (ValueError, TypeError, KeyError):
+            return None
+
+        expires_at = auth_date + self.max_age_seconds
+        if expires_at <= now:
+            logger.info("⏰ initData устарела")
+            return None
+
+        return VerifiedInitData(
+            user=user,
+            auth_date=auth_date,
+            query_id=fields.get('query_id'),
+            start_param=fields.get('start_param'),
+            expires_at=expires_at,
+            signed=secret_key is not None
+        )
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, cached=len(self._cache))
+
+
+# Глобальный экземпляр
+init_data_validator = InitDataValidator()
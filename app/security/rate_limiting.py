@@ -2,10 +2,15 @@
 """
 Rate Limiting для Telegram Mini App
 Защита от DDoS атак и чрезмерного использования API
+
+Лимиты считаются по GCRA (эквивалент token bucket): на ключ хранится одно
+число - теоретическое время прихода следующего запроса (TAT), поэтому
+проверка занимает O(1) по памяти и времени независимо от трафика
 """
 
+import threading
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 
 # Опциональный импорт Redis
 try:
@@ -20,6 +25,81 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Атомарная проверка GCRA в Redis: TAT хранится строкой с TTL до момента,
+# когда ключ снова эквивалентен пустому. Время берется с сервера Redis,
+# чтобы воркеры с разными часами видели одинаковое состояние
+GCRA_LUA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local consume = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval
+if new_tat - now > window then
+    return {0, tostring(new_tat - now - window)}
+end
+if consume == 1 then
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+end
+return {1, '0'}
+"""
+
+
+def gcra_update(tat: Optional[float], now: float, limit: int, window: int) -> Tuple[bool, float, float]:
+    """
+    Один шаг GCRA
+    
+    Допускает до limit запросов подряд и далее один запрос в window / limit
+    секунд. Возвращает (разрешен, новый TAT, через сколько секунд повторить).
+    """
+    interval = window / limit
+    tat = now if tat is None else max(tat, now)
+    new_tat = tat + interval
+    if new_tat - now > window:
+        return False, tat, new_tat - now - window
+    return True, new_tat, 0.0
+
+
+class StripedGCRAStore:
+    """
+    In-memory хранилище TAT с разбиением блокировок на полосы
+    
+    Ключ попадает в полосу по хэшу, у каждой полосы свой lock и словарь,
+    поэтому потоки с разными ключами почти не конкурируют. Истекшие ключи
+    (TAT в прошлом - состояние совпадает с отсутствующим) удаляются
+    периодически по одной полосе.
+    """
+    
+    def __init__(self, stripes: int = 64, cleanup_interval: int = 300):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._tats = [{} for _ in range(stripes)]
+        self._last_cleanup = [time.monotonic()] * stripes
+        self.cleanup_interval = cleanup_interval
+    
+    def acquire(self, key: str, limit: int, window: int, consume: bool = True) -> Tuple[bool, float]:
+        """Проверяет, прошел бы запрос, и при consume расходует лимит ключа"""
+        stripe = hash(key) % len(self._locks)
+        now = time.monotonic()
+        with self._locks[stripe]:
+            tats = self._tats[stripe]
+            if now - self._last_cleanup[stripe] > self.cleanup_interval:
+                for expired in [k for k, tat in tats.items() if tat <= now]:
+                    del tats[expired]
+                self._last_cleanup[stripe] = now
+            
+            allowed, new_tat, retry_after = gcra_update(tats.get(key), now, limit, window)
+            if allowed and consume:
+                tats[key] = new_tat
+        return allowed, retry_after
+    
+    def __len__(self) -> int:
+        return sum(len(tats) for tats in self._tats)
+
+
 class RateLimiter:
     """
     Rate Limiter с поддержкой Redis и in-memory storage
@@ -28,9 +108,8 @@ class RateLimiter:
     def __init__(self, app: Flask = None, redis_client=None):
         self.app = app
         self.redis_client = redis_client
-        self.in_memory_cache = {}  # Fallback для случаев без Redis
-        self.cleanup_interval = 300  # Очистка кэша каждые 5 минут
-        self.last_cleanup = time.time()
+        self.memory_store = StripedGCRAStore(cleanup_interval=300)  # Fallback для случаев без Redis
+        self._gcra_script = None
         
         if app is not None:
             self.init_app(app)
@@ -52,26 +131,33 @@ class RateLimiter:
             logger.warning("⚠️ Redis module not installed, using in-memory cache")
             self.redis_client = None
         
+        if self.redis_client is not None and self._gcra_script is None:
+            self._gcra_script = self.redis_client.register_script(GCRA_LUA_SCRIPT)
+        
         app.extensions['rate_limiter'] = self
         
-        # Добавляем middleware
-        app.before_request(self._check_rate_limits)
+        # Добавляем стадию в конвейер запросов
+        from app.performance.request_pipeline import get_request_pipeline
+        get_request_pipeline(app).add_before('rate_limit', self._check_rate_limits)
     
     def _check_rate_limits(self):
         """Проверка rate limits для входящих запросов"""
+        from app.performance.request_pipeline import get_request_context
+        ctx = get_request_context()
+        
         # Пропускаем статические файлы
-        if request.endpoint and request.endpoint.startswith('static'):
+        if ctx.is_static:
             return
         
-        # Получаем идентификатор пользователя
-        user_id = self._get_user_identifier()
+        # Идентификатор пользователя уже вычислен конвейером
+        user_id = ctx.identity
         
         # Проверяем глобальные лимиты
         if not self._check_limit(f"global:{user_id}", 200, 3600):  # 200 req/hour globally
             return self._rate_limit_exceeded("Too many requests per hour")
         
         # Проверяем лимиты для API endpoints
-        if request.path.startswith('/api/'):
+        if ctx.is_api:
             if not self._check_limit(f"api:{user_id}", 100, 300):  # 100 req/5min for API
                 return self._rate_limit_exceeded("Too many API requests")
         
@@ -89,19 +175,20 @@ class RateLimiter:
     
     def _get_user_identifier(self) -> str:
         """Получение идентификатора пользователя для rate limiting"""
+        from app.performance.request_pipeline import get_request_context
+        ctx = get_request_context()
+        if ctx is not None:
+            return ctx.identity
+        
         # Приоритет: Telegram User ID > IP адрес
         user_id = request.headers.get('X-Telegram-User-Id')
         if user_id:
             return f"telegram:{user_id}"
         
-        # Fallback на IP адрес
-        ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
-        if ip:
-            # Берем первый IP из списка (в случае proxy)
-            ip = ip.split(',')[0].strip()
-        return f"ip:{ip or 'unknown'}"
+        # Fallback на IP адрес соединения (X-Forwarded-For учитывает ProxyFix за доверенным proxy)
+        return f"ip:{request.remote_addr or 'unknown'}"
     
-    def _check_limit(self, key: str, limit: int, window: int) -> bool:
+    def _check_limit(self, key: str, limit: int, window: int, consume: bool = True) -> bool:
         """
         Проверка лимита запросов
         
@@ -109,82 +196,30 @@ class RateLimiter:
             key: Ключ для идентификации пользователя/операции
             limit: Максимальное количество запросов
             window: Временное окно в секундах
+            consume: Расходовать ли лимит (False - только узнать состояние)
         """
-        current_time = int(time.time())
-        
         if self.redis_client:
-            return self._check_limit_redis(key, limit, window, current_time)
+            allowed, _ = self._check_limit_redis(key, limit, window, consume)
         else:
-            return self._check_limit_memory(key, limit, window, current_time)
+            allowed, _ = self._check_limit_memory(key, limit, window, consume)
+        return allowed
     
-    def _check_limit_redis(self, key: str, limit: int, window: int, current_time: int) -> bool:
-        """Проверка лимита через Redis"""
+    def _check_limit_redis(self, key: str, limit: int, window: int, consume: bool) -> Tuple[bool, float]:
+        """Проверка лимита через Redis (Lua-скрипт GCRA, один ключ-число)"""
         try:
-            pipe = self.redis_client.pipeline()
-            
-            # Sliding window log
-            window_start = current_time - window
-            
-            # Удаляем устаревшие записи
-            pipe.zremrangebyscore(key, 0, window_start)
-            
-            # Добавляем текущий запрос
-            pipe.zadd(key, {str(current_time): current_time})
-            
-            # Получаем количество запросов в окне
-            pipe.zcard(key)
-            
-            # Устанавливаем TTL
-            pipe.expire(key, window)
-            
-            results = pipe.execute()
-            request_count = results[2]  # Результат zcard
-            
-            return request_count <= limit
+            allowed, retry_after = self._gcra_script(
+                keys=[f"rl:{key}"], args=[window / limit, window, int(consume)]
+            )
+            return bool(allowed), float(retry_after)
             
         except Exception as e:
             logger.error(f"Redis rate limiting error: {e}")
             # Fallback на in-memory при ошибке Redis
-            return self._check_limit_memory(key, limit, window, current_time)
+            return self._check_limit_memory(key, limit, window, consume)
     
-    def _check_limit_memory(self, key: str, limit: int, window: int, current_time: int) -> bool:
+    def _check_limit_memory(self, key: str, limit: int, window: int, consume: bool) -> Tuple[bool, float]:
         """Проверка лимита через in-memory cache (fallback)"""
-        # Периодическая очистка кэша
-        if current_time - self.last_cleanup > self.cleanup_interval:
-            self._cleanup_memory_cache(current_time)
-            self.last_cleanup = current_time
-        
-        if key not in self.in_memory_cache:
-            self.in_memory_cache[key] = []
-        
-        requests = self.in_memory_cache[key]
-        window_start = current_time - window
-        
-        # Удаляем устаревшие запросы
-        requests[:] = [req_time for req_time in requests if req_time > window_start]
-        
-        # Добавляем текущий запрос
-        requests.append(current_time)
-        
-        return len(requests) <= limit
-    
-    def _cleanup_memory_cache(self, current_time: int):
-        """Очистка устаревших записей из in-memory cache"""
-        keys_to_remove = []
-        
-        for key, requests in self.in_memory_cache.items():
-            # Удаляем записи старше 1 часа
-            cutoff_time = current_time - 3600
-            requests[:] = [req_time for req_time in requests if req_time > cutoff_time]
-            
-            # Удаляем пустые ключи
-            if not requests:
-                keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            del self.in_memory_cache[key]
-        
-        logger.debug(f"Cleaned up {len(keys_to_remove)} expired rate limit keys")
+        return self.memory_store.acquire(key, limit, window, consume)
     
     def _rate_limit_exceeded(self, message: str):
         """Ответ при превышении лимита"""
@@ -210,9 +245,9 @@ def setup_rate_limiting(app: Flask) -> RateLimiter:
         
         # Проверяем различные лимиты
         limits = {
-            'global': rate_limiter._check_limit(f"global:{user_id}", 200, 3600),
-            'api': rate_limiter._check_limit(f"api:{user_id}", 100, 300),
-            'sensitive': rate_limiter._check_limit(f"sensitive:{user_id}", 20, 300)
+            'global': rate_limiter._check_limit(f"global:{user_id}", 200, 3600, consume=False),
+            'api': rate_limiter._check_limit(f"api:{user_id}", 100, 300, consume=False),
+            'sensitive': rate_limiter._check_limit(f"sensitive:{user_id}", 20, 300, consume=False)
         }
         
         return jsonify({
@@ -24,8 +24,9 @@ class SecurityHeaders:
         """Инициализация модуля заголовков безопасности"""
         app.extensions['security_headers'] = self
         
-        # Добавляем middleware для заголовков
-        app.after_request(self._add_security_headers)
+        # Добавляем стадию заголовков в конвейер запросов
+        from app.performance.request_pipeline import get_request_pipeline
+        get_request_pipeline(app).add_after('security_headers', self._add_security_headers)
         
         logger.info("✅ Security Headers initialized")
     
@@ -144,10 +145,12 @@ class SecurityHeaders:
 
 def setup_security_headers(app: Flask) -> SecurityHeaders:
     """Настройка заголовков безопасности для приложения"""
+    from app.performance.request_pipeline import get_request_pipeline
+    
     security_headers = SecurityHeaders(app)
+    pipeline = get_request_pipeline(app)
     
     # Добавляем обработчик для OPTIONS запросов (CORS preflight)
-    @app.before_request
     def handle_preflight():
         if request.method == 'OPTIONS':
             response = app.make_default_options_response()
@@ -170,8 +173,9 @@ def setup_security_headers(app: Flask) -> SecurityHeaders:
             
             return response
     
+    pipeline.add_before('cors_preflight', handle_preflight)
+    
     # Middleware для удаления чувствительных заголовков сервера
-    @app.after_request
     def remove_server_headers(response):
         # Удаляем заголовки, которые могут раскрыть информацию о сервере
         headers_to_remove = ['Server', 'X-Powered-By', 'X-AspNet-Version', 'X-AspNetMvc-Version']
@@ -180,6 +184,8 @@ def setup_security_headers(app: Flask) -> SecurityHeaders:
         
         return response
     
+    pipeline.add_after('remove_server_headers', remove_server_headers)
+    
     logger.info("✅ Security Headers configured")
     return security_headers
 
@@ -2,49 +2,182 @@
 # ЕДИНАЯ СИСТЕМА АВТОРИЗАЦИИ - АДЕКВАТНАЯ ВЕРСИЯ
 
 import os
-import json
+import time
+import threading
 import logging
-from typing import Optional
-from urllib.parse import unquote
-from flask import request, session
-from app.config.telegram_config import AppConfig
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+from flask import g, request, session
+from app.config.telegram_config import AppConfig, AUTH_IDENTITY_CACHE_SIZE, AUTH_IDENTITY_CACHE_TTL_SECONDS
+from app.security.init_data_validator import init_data_validator, VerifiedInitData
 
 logger = logging.getLogger(__name__)
 
+# Заголовки, в которых мини-приложение передает initData
+INIT_DATA_HEADERS = ('X-Telegram-Init-Data', 'X-Telegram-Web-App-Data')
+
+
+class CachedUser(NamedTuple):
+    """Запись пользователя, нужная авторизации"""
+    user_db_id: int
+    username: Optional[str]
+    first_name: Optional[str]
+
+
+class UserIdentityCache:
+    """
+    Процессный кэш telegram_id -> пользователь БД (LRU с TTL)
+
+    Соответствие telegram_id и id в БД не меняется, а имя и username
+    обновляются через ensure_user_exists или сбрасываются invalidate().
+    TTL ограничивает устаревание при записи из других процессов.
+    """
+
+    def __init__(self, max_size: int = AUTH_IDENTITY_CACHE_SIZE, ttl_seconds: int = AUTH_IDENTITY_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[int, tuple]' = OrderedDict()
+        self._by_db_id: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, telegram_id: int) -> Optional[CachedUser]:
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    self._remove(telegram_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(telegram_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, telegram_id: int, user: CachedUser):
+        with self._lock:
+            self._remove(telegram_id)
+            self._entries[telegram_id] = (user, time.monotonic() + self.ttl_seconds)
+            self._by_db_id[user.user_db_id] = telegram_id
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, telegram_id: int = None, user_db_id: int = None):
+        """Сбрасывает запись пользователя после изменения users"""
+        with self._lock:
+            if telegram_id is None and user_db_id is not None:
+                telegram_id = self._by_db_id.get(user_db_id)
+            if telegram_id is not None:
+                self._remove(telegram_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_db_id.clear()
+
+    def _remove(self, telegram_id: int):
+        entry = self._entries.pop(telegram_id, None)
+        if entry is not None:
+            self._by_db_id.pop(entry[0].user_db_id, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# Общий для всех экземпляров AuthService
+identity_cache = UserIdentityCache()
+
+
+def invalidate_user_identity(telegram_id: int = None, user_db_id: int = None):
+    """Вызывается кодом, изменяющим username/first_name или удаляющим пользователя"""
+    identity_cache.invalidate(telegram_id=telegram_id, user_db_id=user_db_id)
+
+
+class ResolvedIdentity:
+    """Личность пользователя, определенная один раз за запрос (хранится в g.auth_identity)"""
+
+    __slots__ = ('telegram_id', 'user', 'user_loaded', 'profile_synced')
+
+    def __init__(self, telegram_id: Optional[int]):
+        self.telegram_id = telegram_id
+        self.user: Optional[CachedUser] = None
+        self.user_loaded = False
+        self.profile_synced = False
+
+    @property
+    def user_db_id(self) -> Optional[int]:
+        return self.user.user_db_id if self.user else None
+
 
 class AuthService:
     """Единая система авторизации через Telegram"""
-    
-    def __init__(self):
-        self._request_cache = {}
-    
+
     def get_current_user_id(self) -> Optional[int]:
         """
         Получение текущего Telegram User ID - ЕДИНАЯ ТОЧКА ВХОДА
         
-        Кэширует результат в рамках одного запроса для оптимизации.
+        Источники разбираются один раз за запрос, результат хранится в g.
         Возвращает telegram_id (int) или None.
         """
-        
-        # Кэширование в рамках запроса с учетом заголовков авторизации
-        telegram_header = request.headers.get('X-Telegram-User-Id', '')
-        cache_key = f"{id(request)}_{request.method}_{request.path}_{telegram_header}"
-        if cache_key in self._request_cache:
-            return self._request_cache[cache_key]
-        
+        return self.get_identity().telegram_id
+
+    def get_identity(self) -> ResolvedIdentity:
+        """Личность текущего запроса (вычисляется при первом обращении)"""
+        identity = g.get('auth_identity')
+        if identity is not None:
+            return identity
+
         user_id = self._get_user_id_from_sources()
-        self._request_cache[cache_key] = user_id
-        
+        identity = ResolvedIdentity(user_id)
+        g.auth_identity = identity
+
         if user_id:
             logger.debug(f"✅ Авторизация успешна: telegram_id={user_id}")
         else:
             logger.debug(f"❌ Авторизация не найдена для {request.method} {request.path}")
-            
-        return user_id
-    
+
+        return identity
+
+    def _load_user(self, identity: ResolvedIdentity) -> Optional[CachedUser]:
+        """Пользователь БД для личности: кэш процесса или один SELECT за запрос"""
+        if identity.user_loaded:
+            return identity.user
+
+        user = identity_cache.get(identity.telegram_id)
+        if user is None:
+            # Ленивый импорт для избежания циклических зависимостей
+            from app.models.database import execute_db_query
+
+            row = execute_db_query(
+                'SELECT id, username, first_name FROM users WHERE telegram_id = ?',
+                (identity.telegram_id,),
+                fetch_one=True
+            )
+            if row:
+                user = CachedUser(row['id'], row['username'], row['first_name'])
+                identity_cache.put(identity.telegram_id, user)
+
+        identity.user = user
+        identity.user_loaded = True
+        return user
+
     def _get_user_id_from_sources(self) -> Optional[int]:
         """Получение User ID из различных источников по приоритету"""
         
+        # 0. Из подписанной initData Telegram WebApp. Если initData передана,
+        # но не прошла проверку (подделка или истек срок), запрос не авторизуется
+        # совсем - иначе неподписанные источники ниже обходили бы проверку
+        init_data = self._get_init_data()
+        if init_data is not None:
+            header, raw = init_data
+            verified = init_data_validator.validate(raw)
+            if not verified:
+                logger.warning(f"⚠️ initData в заголовке {header} не прошла проверку, запрос не авторизован")
+                return None
+            logger.debug(f"🔍 User ID найден в подписанной initData: {verified.user_id}")
+            return verified.user_id
+
         # 1. Из заголовков (основной способ для API)
         user_id = self._get_user_id_from_headers()
         if user_id:
@@ -76,6 +209,14 @@ class AuthService:
         self._log_missing_auth()
         return None
     
+    def _get_init_data(self) -> Optional[Tuple[str, str]]:
+        """(заголовок, initData) из первого заданного заголовка initData или None"""
+        for header in INIT_DATA_HEADERS:
+            init_data = request.headers.get(header)
+            if init_data:
+                return header, init_data
+        return None
+
     def _get_user_id_from_headers(self) -> Optional[int]:
         """Получение User ID из заголовков HTTP"""
         headers_to_check = [
@@ -163,28 +304,27 @@ class AuthService:
         return None
 
     def validate_telegram_data(self, init_data_raw: str) -> Optional[int]:
-        """Проверка подлинности данных от Telegram WebApp"""
+        """Проверка подлинности данных от Telegram WebApp (HMAC-SHA256)"""
         try:
-            # Простая проверка формата (в продакшене нужна полная валидация с HMAC)
-            if not init_data_raw or 'user=' not in init_data_raw:
-                return None
-
-            # Извлекаем user_id из initData
-            for param in init_data_raw.split('&'):
-                if param.startswith('user='):
-                    user_data = unquote(param[5:])
-                    try:
-                        user_info = json.loads(user_data)
-                        if 'id' in user_info:
-                            return int(user_info['id'])
-                    except:
-                        pass
-            return None
+            verified = init_data_validator.validate(init_data_raw)
+            return verified.user_id if verified else None
 
         except Exception as e:
             logger.error(f"Error validating Telegram data: {e}")
             return None
 
+    def authenticate_init_data(self, init_data_raw: str) -> Optional[VerifiedInitData]:
+        """
+        Авторизация текущего запроса по initData (вход в мини-приложение)
+
+        При верной подписи пользователь из initData становится личностью
+        запроса для get_current_user_id и ensure_user_exists.
+        """
+        verified = init_data_validator.validate(init_data_raw)
+        if verified:
+            g.auth_identity = ResolvedIdentity(verified.user_id)
+        return verified
+
     def log_user_access(self, telegram_id: int, endpoint: str, success: bool = True, error: str = None):
         """Логирование доступа пользователей для отладки"""
         log_entry = {
@@ -204,24 +344,16 @@ class AuthService:
 
     def get_user_db_id(self) -> Optional[int]:
         """Получение ID пользователя в базе данных"""
-        telegram_id = self.get_current_user_id()
-        if not telegram_id:
+        identity = self.get_identity()
+        if not identity.telegram_id:
             return None
             
         try:
-            # Ленивый импорт для избежания циклических зависимостей
-            from app.models.database import execute_db_query
-            
-            user = execute_db_query(
-                'SELECT id FROM users WHERE telegram_id = ?',
-                (telegram_id,),
-                fetch_one=True
-            )
-            
+            user = self._load_user(identity)
             if user:
-                return user['id']
+                return user.user_db_id
             else:
-                logger.warning(f"⚠️ Пользователь с telegram_id {telegram_id} не найден в БД")
+                logger.warning(f"⚠️ Пользователь с telegram_id {identity.telegram_id} не найден в БД")
                 return None
                 
         except Exception as e:
@@ -229,48 +361,64 @@ class AuthService:
             return None
     
     def ensure_user_exists(self, username: str = None, first_name: str = None) -> Optional[int]:
-        """Создание пользователя в БД если не существует"""
-        telegram_id = self.get_current_user_id()
+        """
+        Создание пользователя в БД если не существует
+
+        Профиль обновляется только если переданные данные отличаются от
+        сохраненных; повторный вызов в том же запросе не обращается к БД.
+        """
+        identity = self.get_identity()
+        telegram_id = identity.telegram_id
         if not telegram_id:
             return None
+        if identity.profile_synced and not (username or first_name):
+            return identity.user_db_id
             
         try:
             from app.models.database import execute_db_query
             from datetime import datetime
             
-            # Проверяем существование
-            user = execute_db_query(
-                'SELECT id FROM users WHERE telegram_id = ?',
-                (telegram_id,),
-                fetch_one=True
-            )
+            user = self._load_user(identity)
             
             if not user:
                 # Создаем нового пользователя
+                user = CachedUser(
+                    None,
+                    username or f'user_{telegram_id}',
+                    first_name or 'Telegram User'
+                )
                 user_id = execute_db_query(
                     '''INSERT INTO users (telegram_id, username, first_name, created_at, updated_at)
                        VALUES (?, ?, ?, ?, ?)''',
                     (
                         telegram_id,
-                        username or f'user_{telegram_id}',
-                        first_name or 'Telegram User',
+                        user.username,
+                        user.first_name,
                         datetime.now().isoformat(),
                         datetime.now().isoformat()
                     )
                 )
+                user = user._replace(user_db_id=user_id)
                 logger.info(f"✅ Создан новый пользователь: telegram_id={telegram_id}, db_id={user_id}")
-                return user_id
+            elif (username and username != user.username) or (first_name and first_name != user.first_name):
+                # Обновляем существующего только при реальном изменении
+                execute_db_query(
+                    '''UPDATE users SET username = COALESCE(?, username), 
+                                       first_name = COALESCE(?, first_name),
+                                       updated_at = ?
+                       WHERE telegram_id = ?''',
+                    (username, first_name, datetime.now().isoformat(), telegram_id)
+                )
+                user = user._replace(username=username or user.username, first_name=first_name or user.first_name)
             else:
-                # Обновляем существующего
-                if username or first_name:
-                    execute_db_query(
-                        '''UPDATE users SET username = COALESCE(?, username), 
-                                           first_name = COALESCE(?, first_name),
-                                           updated_at = ?
-                           WHERE telegram_id = ?''',
-                        (username, first_name, datetime.now().isoformat(), telegram_id)
-                    )
-                return user['id']
+                identity.profile_synced = True
+                return user.user_db_id
+
+            if user.user_db_id:
+                identity_cache.put(telegram_id, user)
+            identity.user = user
+            identity.profile_synced = True
+            return user.user_db_id
                 
         except Exception as e:
             logger.error(f"❌ Ошибка создания/обновления пользователя: {e}")
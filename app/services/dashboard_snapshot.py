@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+Снимки данных дашбордов
+Планировщик раз в 5 минут пересобирает агрегаты и сохраняет их в таблицы
+снимков, API отдает готовый снимок чтением одной строки по ключу.
+Снимок пересобирается, только если изменились исходные данные, а
+пользовательские снимки перезаписываются только для изменившихся пользователей
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from app.config.telegram_config import (
+    AppConfig, DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS, DASHBOARD_SNAPSHOT_FULL_REBUILD_MINUTES
+)
+
+logger = logging.getLogger(__name__)
+
+OVERVIEW_KEY = 'overview'
+LIVE_PLACEMENTS_KEY = 'live_active_placements'
+USER_DASHBOARDS_KEY = 'user_dashboards'
+
+_tables_ready = False
+
+
+def _ensure_tables():
+    global _tables_ready
+    if _tables_ready:
+        return
+    from app.models.database import execute_db_query
+
+    execute_db_query("""
+        CREATE TABLE IF NOT EXISTS dashboard_snapshots (
+            snapshot_key TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            fingerprint TEXT,
+            built_at TIMESTAMP NOT NULL
+        )
+    """)
+    execute_db_query("""
+        CREATE TABLE IF NOT EXISTS user_dashboard_snapshots (
+            user_id INTEGER PRIMARY KEY,
+            payload TEXT NOT NULL,
+            payload_hash TEXT NOT NULL,
+            built_at TIMESTAMP NOT NULL
+        )
+    """)
+    _tables_ready = True
+
+
+def _is_fresh(built_at: Optional[str]) -> bool:
+    if not built_at:
+        return False
+    try:
+        age = datetime.now() - datetime.fromisoformat(built_at)
+    except ValueError:
+        return False
+    return age.total_seconds() <= DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS
+
+
+# ===== РАСЧЕТ АГРЕГАТОВ =====
+
+def compute_period_statistics() -> Dict[str, Dict]:
+    """Статистика размещений за 7 и 30 дней"""
+    from app.models.database import execute_db_query
+    from app.services.placement_latest_stats import ensure_latest_stats_schema
+
+    ensure_latest_stats_schema()
+
+    result = {}
+    for period_name, days in (('7_days', 7), ('30_days', 30)):
+        stats = execute_db_query("""
+            SELECT
+                COUNT(*) as total,
+                COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed,
+                AVG(COALESCE(ls.views_count, 0)) as avg_views,
+                AVG(COALESCE(ls.clicks, 0)) as avg_clicks
+            FROM offer_placements p
+            LEFT JOIN placement_latest_stats ls ON ls.placement_id = p.id
+            WHERE p.created_at >= datetime('now', ?)
+        """, (f'-{days} days',), fetch_one=True)
+
+        result[period_name] = {
+            'total_placements': stats['total'] or 0,
+            'completed_placements': stats['completed'] or 0,
+            'avg_views': round(stats['avg_views'] or 0),
+            'avg_clicks': round(stats['avg_clicks'] or 0),
+            'success_rate': round((stats['completed'] or 0) / max(stats['total'] or 1, 1) * 100, 2)
+        }
+
+    return result
+
+
+def compute_overview() -> Dict[str, Any]:
+    """Общая статистика по размещениям за 30 дней, периоды и топ каналов"""
+    from app.models.database import execute_db_query
+    from app.services.placement_latest_stats import ensure_latest_stats_schema
+
+    ensure_latest_stats_schema()
+
+    overview = execute_db_query("""
+        SELECT
+            COUNT(*) as total_placements,
+            COUNT(CASE WHEN status = 'active' THEN 1 END) as active_placements,
+            COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed_placements,
+            COUNT(CASE WHEN status = 'expired' THEN 1 END) as expired_placements,
+            SUM(CASE WHEN status IN ('active', 'completed') THEN funds_reserved ELSE 0 END) as total_revenue
+        FROM offer_placements
+        WHERE created_at >= datetime('now', '-30 days')
+    """, fetch_one=True)
+
+    top_channels = execute_db_query("""
+        SELECT
+            r.channel_title,
+            r.channel_username,
+            COUNT(*) as placements_count,
+            AVG(COALESCE(ls.views_count, 0)) as avg_views,
+            AVG(COALESCE(ls.clicks, 0)) as avg_clicks
+        FROM offer_placements p
+        JOIN offer_responses r ON p.response_id = r.id
+        LEFT JOIN placement_latest_stats ls ON ls.placement_id = p.id
+        WHERE p.status IN ('active', 'completed')
+        AND p.created_at >= datetime('now', '-30 days')
+        GROUP BY r.channel_id
+        ORDER BY placements_count DESC, avg_views DESC
+        LIMIT 10
+    """, fetch_all=True)
+
+    return {
+        'overview': {
+            'total_placements': overview['total_placements'] or 0,
+            'active_placements': overview['active_placements'] or 0,
+            'completed_placements': overview['completed_placements'] or 0,
+            'expired_placements': overview['expired_placements'] or 0,
+            'total_revenue': overview['total_revenue'] or 0,
+            'success_rate': round((overview['completed_placements'] or 0) / max(overview['total_placements'] or 1, 1) * 100, 2)
+        },
+        'period_stats': compute_period_statistics(),
+        'top_channels': [
+            {
+                'title': channel['channel_title'],
+                'username': channel['channel_username'],
+                'placements_count': channel['placements_count'],
+                'avg_views': round(channel['avg_views'] or 0),
+                'avg_clicks': round(channel['avg_clicks'] or 0)
+            }
+            for channel in top_channels
+        ]
+    }
+
+
+def compute_live_active_placements() -> List[Dict]:
+    """Ожидающие и активные размещения с последними просмотрами и кликами"""
+    from app.models.database import execute_db_query
+    from app.services.placement_latest_stats import ensure_latest_stats_schema
+
+    ensure_latest_stats_schema()
+
+    placements = execute_db_query("""
+        SELECT
+            p.id,
+            p.status,
+            p.post_url,
+            p.placement_start,
+            p.deadline,
+            o.title as offer_title,
+            r.channel_title,
+            r.channel_username,
+            COALESCE(ls.views_count, 0) as current_views,
+            COALESCE(ls.clicks, 0) as current_clicks
+        FROM offer_placements p
+        JOIN offer_responses r ON p.response_id = r.id
+        JOIN offers o ON r.offer_id = o.id
+        LEFT JOIN placement_latest_stats ls ON ls.placement_id = p.id
+        WHERE p.status IN ('pending_placement', 'active')
+        ORDER BY p.deadline ASC
+    """, fetch_all=True)
+
+    return [
+        {
+            'id': placement['id'],
+            'status': placement['status'],
+            'title': placement['offer_title'],
+            'channel': {
+                'title': placement['channel_title'],
+                'username': placement['channel_username']
+            },
+            'post_url': placement['post_url'],
+            'placement_start': placement['placement_start'],
+            'deadline': placement['deadline'],
+            'stats': {
+                'views': placement['current_views'],
+                'clicks': placement['current_clicks']
+            }
+        }
+        for placement in placements
+    ]
+
+
+def apply_urgency(placements: List[Dict], now: datetime = None) -> List[Dict]:
+    """
+    Срочность по дедлайну на момент чтения (снимок может быть старше)
+
+    Порядок как в прежнем запросе: просроченные, срочные (< 2 ч), остальные,
+    внутри группы - по дедлайну.
+    """
+    # CURRENT_TIMESTAMP в SQLite - UTC, дедлайны хранятся в том же формате
+    now = now or datetime.utcnow()
+    now_text = now.strftime('%Y-%m-%d %H:%M:%S')
+    urgent_text = (now + timedelta(hours=2)).strftime('%Y-%m-%d %H:%M:%S')
+    order = {'overdue': 1, 'urgent': 2, 'normal': 3}
+
+    result = []
+    for placement in placements:
+        deadline = placement.get('deadline')
+        if deadline is not None and str(deadline) < now_text:
+            urgency = 'overdue'
+        elif deadline is not None and str(deadline) < urgent_text:
+            urgency = 'urgent'
+        else:
+            urgency = 'normal'
+        result.append({**placement, 'urgency': urgency})
+
+    # NULL-дедлайны в SQLite идут первыми при ORDER BY ASC
+    result.sort(key=lambda p: (order[p['urgency']], p['deadline'] is not None, str(p['deadline'] or '')))
+    return result
+
+
+def compute_user_dashboards(user_ids: Optional[List[int]] = None) -> Dict[int, Dict]:
+    """
+    Статистика дашборда пользователей группировкой по пользователю
+
+    Все пользователи считаются за пять запросов вместо пяти запросов на каждого.
+    """
+    from app.models.database import execute_db_query
+
+    params: tuple = ()
+    filters = {'offers': '', 'proposals': '', 'channels': '', 'incoming': ''}
+    if user_ids is not None:
+        placeholders = ','.join('?' * len(user_ids))
+        params = tuple(user_ids)
+        filters = {
+            'offers': f"WHERE created_by IN ({placeholders})",
+            'proposals': f"WHERE o.created_by IN ({placeholders})",
+            'channels': f"WHERE owner_id IN ({placeholders})",
+            'incoming': f"WHERE c.owner_id IN ({placeholders})"
+        }
+
+    offers = execute_db_query(f"""
+        SELECT created_by as user_id,
+               COUNT(*) as total_offers,
+               SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed_offers,
+               SUM(CASE WHEN status = 'in_progress' THEN 1 ELSE 0 END) as active_offers,
+               SUM(budget) as total_budget
+        FROM offers
+        {filters['offers']}
+        GROUP BY created_by
+    """, params, fetch_all=True)
+
+    proposals = execute_db_query(f"""
+        SELECT o.created_by as user_id,
+               COUNT(*) as total_proposals,
+               SUM(CASE WHEN op.status = 'accepted' THEN 1 ELSE 0 END) as accepted_proposals,
+               SUM(CASE WHEN op.status = 'rejected' THEN 1 ELSE 0 END) as rejected_proposals
+        FROM offer_proposals op
+        JOIN offers o ON op.offer_id = o.id
+        {filters['proposals']}
+        GROUP BY o.created_by
+    """, params, fetch_all=True)
+
+    placements = execute_db_query(f"""
+        SELECT o.created_by as user_id,
+               COUNT(*) as total_placements,
+               SUM(CASE WHEN opl.status = 'completed' THEN 1 ELSE 0 END) as completed_placements,
+               SUM(opl.final_views_count) as total_views
+        FROM offer_placements opl
+        JOIN offer_proposals op ON opl.proposal_id = op.id
+        JOIN offers o ON op.offer_id = o.id
+        {filters['proposals']}
+        GROUP BY o.created_by
+    """, params, fetch_all=True)
+
+    channels = execute_db_query(f"""
+        SELECT owner_id as user_id,
+               COUNT(*) as total_channels,
+               SUM(CASE WHEN is_verified = 1 THEN 1 ELSE 0 END) as verified_channels,
+               SUM(subscriber_count) as total_subscribers
+        FROM channels
+        {filters['channels']}
+        GROUP BY owner_id
+    """, params, fetch_all=True)
+
+    incoming = execute_db_query(f"""
+        SELECT c.owner_id as user_id,
+               COUNT(*) as total_incoming,
+               SUM(CASE WHEN op.status = 'sent' THEN 1 ELSE 0 END) as pending_proposals
+        FROM offer_proposals op
+        JOIN channels c ON op.channel_id = c.id
+        {filters['incoming']}
+        GROUP BY c.owner_id
+    """, params, fetch_all=True)
+
+    by_user: Dict[int, Dict[str, Dict]] = {}
+    for section, rows in (('offers', offers), ('proposals', proposals), ('placements', placements),
+                          ('channels', channels), ('incoming', incoming)):
+        for row in rows:
+            if row['user_id'] is not None:
+                by_user.setdefault(row['user_id'], {})[section] = row
+
+    user_ids = user_ids if user_ids is not None else list(by_user)
+    return {user_id: format_user_dashboard(by_user.get(user_id, {})) for user_id in user_ids}
+
+
+def format_user_dashboard(sections: Dict[str, Dict]) -> Dict[str, Any]:
+    """Ответ дашборда пользователя из агрегатов (отсутствующие секции - нули)"""
+    offers = sections.get('offers', {})
+    proposals = sections.get('proposals', {})
+    placements = sections.get('placements', {})
+    channels = sections.get('channels', {})
+    incoming = sections.get('incoming', {})
+
+    total_proposals = proposals.get('total_proposals') or 0
+    accepted_proposals = proposals.get('accepted_proposals') or 0
+    total_placements = placements.get('total_placements') or 0
+    completed_placements = placements.get('completed_placements') or 0
+
+    return {
+        'offers': {
+            'total': offers.get('total_offers') or 0,
+            'completed': offers.get('completed_offers') or 0,
+            'active': offers.get('active_offers') or 0,
+            'total_budget': offers.get('total_budget') or 0
+        },
+        'proposals': {
+            'total': total_proposals,
+            'accepted': accepted_proposals,
+            'rejected': proposals.get('rejected_proposals') or 0,
+            'acceptance_rate': round(accepted_proposals / max(total_proposals, 1) * 100, 2)
+        },
+        'placements': {
+            'total': total_placements,
+            'completed': completed_placements,
+            'total_views': placements.get('total_views') or 0,
+            'completion_rate': round(completed_placements / max(total_placements, 1) * 100, 2)
+        },
+        'channels': {
+            'total': channels.get('total_channels') or 0,
+            'verified': channels.get('verified_channels') or 0,
+            'total_subscribers': channels.get('total_subscribers') or 0
+        },
+        'incoming': {
+            'total': incoming.get('total_incoming') or 0,
+            'pending': incoming.get('pending_proposals') or 0
+        }
+    }
+
+
+# ===== ПЕРЕСБОРКА СНИМКОВ =====
+
+def _placements_fingerprint() -> str:
+    """Признак изменения данных размещений и их статистики"""
+    from app.models.database import execute_db_query
+
+    row = execute_db_query("""
+        SELECT
+            (SELECT COUNT(*) FROM offer_placements) as placements_count,
+            (SELECT MAX(updated_at) FROM offer_placements) as placements_updated,
+            (SELECT MAX(id) FROM placement_statistics) as last_stats_id,
+            (SELECT MAX(id) FROM ereit_statistics) as last_ereit_id
+    """, fetch_one=True)
+    return json.dumps(row, sort_keys=True, default=str)
+
+
+def _needs_rebuild(stored: Optional[Dict], fingerprint: str) -> bool:
+    if not stored or stored['fingerprint'] != fingerprint:
+        return True
+    # Окна "за 30 дней" сдвигаются со временем - периодически пересчитываем полностью
+    built_at = datetime.fromisoformat(stored['built_at'])
+    return datetime.now() - built_at > timedelta(minutes=DASHBOARD_SNAPSHOT_FULL_REBUILD_MINUTES)
+
+
+def _save_snapshot(key: str, payload: Any, fingerprint: Optional[str] = None):
+    from app.models.database import execute_db_query
+
+    execute_db_query("""
+        INSERT INTO dashboard_snapshots (snapshot_key, payload, fingerprint, built_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(snapshot_key) DO UPDATE SET
+            payload = excluded.payload,
+            fingerprint = excluded.fingerprint,
+            built_at = excluded.built_at
+    """, (key, json.dumps(payload, ensure_ascii=False, default=str), fingerprint, datetime.now().isoformat()))
+
+
+def _touch_snapshot(key: str):
+    from app.models.database import execute_db_query
+
+    execute_db_query("UPDATE dashboard_snapshots SET built_at = ? WHERE snapshot_key = ?",
+                     (datetime.now().isoformat(), key))
+
+
+def _save_user_dashboards(dashboards: Dict[int, Dict]) -> int:
+    """Перезаписывает снимки только изменившихся пользователей, возвращает их число"""
+    from app.models.database import execute_db_query
+
+    stored = {
+        row['user_id']: row['payload_hash']
+        for row in execute_db_query("SELECT user_id, payload_hash FROM user_dashboard_snapshots", fetch_all=True)
+    }
+
+    built_at = datetime.now().isoformat()
+    changed = []
+    for user_id, dashboard in dashboards.items():
+        payload = json.dumps(dashboard, ensure_ascii=False, sort_keys=True, default=str)
+        payload_hash = hashlib.sha1(payload.encode('utf-8')).hexdigest()
+        if stored.get(user_id) != payload_hash:
+            changed.append((user_id, payload, payload_hash, built_at))
+
+    removed = [(user_id,) for user_id in stored if user_id not in dashboards]
+
+    if changed or removed:
+        conn = sqlite3.connect(AppConfig.DATABASE_PATH, timeout=30)
+        try:
+            with conn:
+                conn.executemany("""
+                    INSERT INTO user_dashboard_snapshots (user_id, payload, payload_hash, built_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        payload = excluded.payload,
+                        payload_hash = excluded.payload_hash,
+                        built_at = excluded.built_at
+                """, changed)
+                conn.executemany("DELETE FROM user_dashboard_snapshots WHERE user_id = ?", removed)
+        finally:
+            conn.close()
+
+    return len(changed) + len(removed)
+
+
+def rebuild_dashboard_snapshots(force: bool = False) -> Dict[str, Any]:
+    """Пересобирает снимки дашбордов, неизменившиеся данные не пересчитываются"""
+    from app.models.database import execute_db_query
+
+    _ensure_tables()
+    stored = {
+        row['snapshot_key']: row
+        for row in execute_db_query("SELECT snapshot_key, fingerprint, built_at FROM dashboard_snapshots",
+                                    fetch_all=True)
+    }
+    result = {'rebuilt': [], 'unchanged': []}
+
+    fingerprint = _placements_fingerprint()
+    for key, compute in ((OVERVIEW_KEY, compute_overview), (LIVE_PLACEMENTS_KEY, compute_live_active_placements)):
+        if force or _needs_rebuild(stored.get(key), fingerprint):
+            _save_snapshot(key, compute(), fingerprint)
+            result['rebuilt'].append(key)
+        else:
+            _touch_snapshot(key)
+            result['unchanged'].append(key)
+
+    result['users_changed'] = _save_user_dashboards(compute_user_dashboards())
+    _save_snapshot(USER_DASHBOARDS_KEY, {'users': result['users_changed']})
+
+    return result
+
+
+# ===== ЧТЕНИЕ СНИМКОВ =====
+
+def get_snapshot(key: str) -> Optional[Dict[str, Any]]:
+    """Свежий снимок по ключу или None (тогда вызывающий считает данные сам)"""
+    from app.models.database import execute_db_query
+
+    try:
+        _ensure_tables()
+        row = execute_db_query(
+            "SELECT payload, built_at FROM dashboard_snapshots WHERE snapshot_key = ?", (key,), fetch_one=True
+        )
+    except Exception as e:
+        logger.error(f"❌ Ошибка чтения снимка дашборда {key}: {e}")
+        return None
+
+    if not row or not _is_fresh(row['built_at']):
+        return None
+    return {'data': json.loads(row['payload']), 'built_at': row['built_at']}
+
+
+def get_user_dashboard(user_id: int) -> Dict[str, Any]:
+    """Статистика дашборда пользователя: из снимка, если он свежий, иначе расчетом"""
+    from app.models.database import execute_db_query
+
+    if get_snapshot(USER_DASHBOARDS_KEY):
+        row = execute_db_query(
+            "SELECT payload FROM user_dashboard_snapshots WHERE user_id = ?", (user_id,), fetch_one=True
+        )
+        # Пользователя нет в свежем снимке - у него нет ни офферов, ни каналов
+        return json.loads(row['payload']) if row else format_user_dashboard({})
+
+    return compute_user_dashboards([user_id])[user_id]
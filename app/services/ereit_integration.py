@@ -168,6 +168,7 @@ class EREITIntegration:
     async def _save_ereit_stats(self, placement_id: int, ereit_token: str, stats: Dict):
         """Сохраняет статистику eREIT в базу данных"""
         from app.models.database import execute_db_query
+        from app.services.placement_latest_stats import ensure_latest_stats_schema
         
         try:
             # Создаем таблицу для eREIT статистики, если её нет
@@ -196,6 +197,9 @@ class EREITIntegration:
                 )
             """)
             
+            # Триггер последней статистики (таблица только что могла появиться)
+            ensure_latest_stats_schema()
+            
             # Сохраняем статистику
             execute_db_query("""
                 INSERT INTO ereit_statistics (
@@ -285,23 +289,11 @@ class EREITIntegration:
     
     async def get_aggregated_stats(self, placement_id: int) -> Optional[Dict]:
         """Получает агрегированную статистику для размещения"""
-        from app.models.database import execute_db_query
+        from app.services.placement_latest_stats import get_latest_stats
         
         try:
             # Получаем последнюю статистику из разных источников
-            ereit_stats = execute_db_query("""
-                SELECT * FROM ereit_statistics 
-                WHERE placement_id = ? 
-                ORDER BY collected_at DESC 
-                LIMIT 1
-            """, (placement_id,), fetch_one=True)
-            
-            telegram_stats = execute_db_query("""
-                SELECT * FROM placement_statistics 
-                WHERE placement_id = ? 
-                ORDER BY collected_at DESC 
-                LIMIT 1
-            """, (placement_id,), fetch_one=True)
+            telegram_stats, ereit_stats = get_latest_stats(placement_id)
             
             # Объединяем статистику
             aggregated = {
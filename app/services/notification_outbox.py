@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Исходящие уведомления через outbox
+Сообщение записывается в notification_outbox в той же транзакции, что и
+изменение данных, о котором оно сообщает, а отправляется позже отдельным
+проходом с повторами. Ключ dedup_key не дает поставить одно уведомление дважды
+"""
+
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from app.config.telegram_config import AppConfig, NOTIFICATION_OUTBOX_BATCH_SIZE, NOTIFICATION_OUTBOX_MAX_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+# Сообщение в статусе sending дольше этого срока считается брошенным (упавший процесс)
+SENDING_TIMEOUT_SECONDS = 300
+MAX_RETRY_DELAY_MINUTES = 60
+
+
+def ensure_outbox_table(conn: sqlite3.Connection):
+    """
+    Создает таблицу outbox (на соединении вызывающего кода)
+
+    Выполняется при каждом вызове, без флага в процессе: таблица может
+    создаваться внутри транзакции вызывающего кода, и ее откат откатывает
+    и создание. CREATE ... IF NOT EXISTS для существующей таблицы дешев.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dedup_key TEXT NOT NULL UNIQUE,
+            chat_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            parse_mode TEXT DEFAULT 'HTML',
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at TIMESTAMP,
+            locked_until TIMESTAMP,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notification_outbox_status
+        ON notification_outbox(status, next_attempt_at)
+    """)
+
+
+def enqueue_notification(conn: sqlite3.Connection, dedup_key: str, chat_id: int, text: str,
+                         parse_mode: str = 'HTML') -> bool:
+    """
+    Ставит уведомление в outbox в текущей транзакции conn
+
+    Возвращает False, если уведомление с таким ключом уже было поставлено.
+    """
+    if not chat_id:
+        return False
+    ensure_outbox_table(conn)
+    cursor = conn.execute("""
+        INSERT OR IGNORE INTO notification_outbox (dedup_key, chat_id, text, parse_mode, next_attempt_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, (dedup_key, chat_id, text, parse_mode, datetime.now().isoformat()))
+    return cursor.rowcount == 1
+
+
+def _claim_batch(limit: int):
+    """Забирает готовые к отправке сообщения, помечая их sending"""
+    now = datetime.now()
+    conn = sqlite3.connect(AppConfig.DATABASE_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        ensure_outbox_table(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("""
+                SELECT id, chat_id, text, parse_mode, attempts
+                FROM notification_outbox
+                WHERE (status = 'pending' AND next_attempt_at <= ?)
+                   OR (status = 'sending' AND locked_until < ?)
+                ORDER BY id
+                LIMIT ?
+            """, (now.isoformat(), now.isoformat(), limit)).fetchall()
+            if rows:
+                locked_until = (now + timedelta(seconds=SENDING_TIMEOUT_SECONDS)).isoformat()
+                conn.executemany(
+                    "UPDATE notification_outbox SET status = 'sending', locked_until = ? WHERE id = ?",
+                    [(locked_until, row['id']) for row in rows]
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def _record_results(results):
+    """Сохраняет итоги отправки: sent, повтор с backoff или failed после последней попытки"""
+    now = datetime.now()
+    updates = []
+    for message, result in results:
+        attempts = message['attempts'] + 1
+        if result.get('success'):
+            updates.append(('sent', attempts, None, now.isoformat(), None, message['id']))
+        elif attempts >= NOTIFICATION_OUTBOX_MAX_ATTEMPTS:
+            updates.append(('failed', attempts, None, None, result.get('error'), message['id']))
+        else:
+            delay = timedelta(minutes=min(2 ** attempts, MAX_RETRY_DELAY_MINUTES))
+            updates.append(('pending', attempts, (now + delay).isoformat(), None, result.get('error'), message['id']))
+
+    conn = sqlite3.connect(AppConfig.DATABASE_PATH, timeout=30)
+    try:
+        with conn:
+            conn.executemany("""
+                UPDATE notification_outbox
+                SET status = ?, attempts = ?, next_attempt_at = COALESCE(?, next_attempt_at),
+                    sent_at = ?, last_error = ?, locked_until = NULL
+                WHERE id = ?
+            """, updates)
+    finally:
+        conn.close()
+
+
+async def dispatch_pending_notifications(limit: int = NOTIFICATION_OUTBOX_BATCH_SIZE) -> Dict[str, Any]:
+    """Отправляет накопившиеся уведомления (доставка не реже одного раза)"""
+    from app.services.telegram_service import TelegramService
+
+    messages = _claim_batch(limit)
+    if not messages:
+        return {'claimed': 0, 'sent': 0, 'failed': 0}
+
+    telegram_service = TelegramService()
+    results = []
+    for message in messages:
+        try:
+            result = await telegram_service.send_message(
+                chat_id=message['chat_id'],
+                text=message['text'],
+                parse_mode=message['parse_mode']
+            )
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        results.append((message, result))
+
+    _record_results(results)
+
+    sent = sum(1 for _, result in results if result.get('success'))
+    if sent < len(results):
+        logger.warning(f"⚠️ Outbox: отправлено {sent}/{len(results)} уведомлений, остальные будут повторены")
+    return {'claimed': len(messages), 'sent': sent, 'failed': len(results) - sent}
+
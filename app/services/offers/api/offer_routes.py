@@ -52,6 +52,8 @@ def get_available_offers():
             message="Доступные офферы получены"
         )
         
+    except ValueError as e:
+        return error_response(str(e), 400)
     except Exception as e:
         logger.error(f"Ошибка получения доступных офферов: {e}")
         return error_response("Внутренняя ошибка сервера", 500)
@@ -11,131 +11,98 @@ from typing import Dict, List, Optional, Any, Tuple
 from app.models.database import execute_db_query
 from app.models.offer import Offer, OfferStatus
 from app.config.telegram_config import AppConfig
+from app.utils.pagination import KeysetPaginator, Page
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Списки офферов: новые первыми, id различает офферы с одинаковым временем создания
+_USER_OFFERS_PAGINATOR = KeysetPaginator(
+    'user_offers', ("COALESCE(o.created_at, '')", 'o.id'),
+    indexes=("CREATE INDEX IF NOT EXISTS idx_offers_creator_created_keyset "
+             "ON offers(created_by, COALESCE(created_at, ''), id)",)
+)
+_AVAILABLE_OFFERS_PAGINATOR = KeysetPaginator(
+    'available_offers', ("COALESCE(o.created_at, '')", 'o.id'),
+    indexes=("CREATE INDEX IF NOT EXISTS idx_offers_status_created_keyset "
+             "ON offers(status, COALESCE(created_at, ''), id)",)
+)
+
 
 class OfferRepository:
     """Централизованный репозиторий для работы с офферами"""
     
     @staticmethod
-    def get_user_offers(user_db_id: int, filters: Dict[str, Any] = None) -> Tuple[List[Dict], int]:
-        """Получение офферов пользователя с фильтрами и пагинацией"""
+    def get_user_offers(user_db_id: int, filters: Dict[str, Any] = None) -> Page:
+        """Получение офферов пользователя с фильтрами и пагинацией (page или cursor)"""
         filters = filters or {}
         
-        page = filters.get('page', 1)
-        limit = filters.get('limit', 50)
-        offset = (page - 1) * limit
-        
-        # Строим базовый запрос
-        base_query = """
-            SELECT o.id, o.title, o.description, o.content, o.price, o.currency,
-                   o.category, o.status, o.created_at, o.updated_at,
-                   o.target_audience, o.requirements, o.deadline, o.budget_total,
-                   o.duration_days, o.min_subscribers, o.max_subscribers, o.metadata,
-                   u.username as creator_username, u.first_name as creator_name,
-                   u.telegram_id as creator_telegram_id, o.created_by as creator_db_id,
-                   o.rejection_reason
-            FROM offers o
-            JOIN users u ON o.created_by = u.id
-            WHERE o.created_by = ?
-        """
-        
-        count_query = "SELECT COUNT(*) as total FROM offers o WHERE o.created_by = ?"
+        conditions = ["o.created_by = ?"]
         params = [user_db_id]
         
         # Добавляем фильтры
         if filters.get('status'):
-            base_query += " AND o.status = ?"
-            count_query += " AND o.status = ?"
+            conditions.append("o.status = ?")
             params.append(filters['status'])
             
         if filters.get('search'):
-            base_query += " AND (o.title LIKE ? OR o.description LIKE ?)"
-            count_query += " AND (o.title LIKE ? OR o.description LIKE ?)"
+            conditions.append("(o.title LIKE ? OR o.description LIKE ?)")
             search_term = f"%{filters['search']}%"
             params.extend([search_term, search_term])
             
         if filters.get('category'):
-            base_query += " AND o.category = ?"
-            count_query += " AND o.category = ?"
+            conditions.append("o.category = ?")
             params.append(filters['category'])
         
-        # Получаем общее количество
-        total_count = execute_db_query(count_query, tuple(params), fetch_one=True)['total']
-        
-        # Добавляем сортировку и пагинацию
-        base_query += " ORDER BY o.created_at DESC LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
-        
-        # Получаем офферы
-        offers = execute_db_query(base_query, tuple(params), fetch_all=True)
-        
-        return [dict(offer) for offer in offers], total_count
+        return _USER_OFFERS_PAGINATOR.paginate(
+            """o.id, o.title, o.description, o.content, o.price, o.currency,
+               o.category, o.status, o.created_at, o.updated_at,
+               o.target_audience, o.requirements, o.deadline, o.budget_total,
+               o.duration_days, o.min_subscribers, o.max_subscribers, o.metadata,
+               u.username as creator_username, u.first_name as creator_name,
+               u.telegram_id as creator_telegram_id, o.created_by as creator_db_id,
+               o.rejection_reason""",
+            "offers o JOIN users u ON o.created_by = u.id", conditions, params,
+            limit=filters.get('limit', 50), cursor=filters.get('cursor'), page=filters.get('page', 1),
+            with_total=True, count_from="offers o"
+        )
     
     @staticmethod
-    def get_available_offers(user_db_id: Optional[int] = None, filters: Dict[str, Any] = None) -> Tuple[List[Dict], int]:
-        """Получение доступных офферов для владельцев каналов"""
+    def get_available_offers(user_db_id: Optional[int] = None, filters: Dict[str, Any] = None) -> Page:
+        """Получение доступных офферов для владельцев каналов (page или cursor)"""
         filters = filters or {}
         
-        page = filters.get('page', 1) 
-        limit = filters.get('limit', 10)
-        offset = (page - 1) * limit
-        
-        base_query = """
-            SELECT o.*, u.username as creator_username, u.first_name as creator_name
-            FROM offers o
-            JOIN users u ON o.created_by = u.id
-            WHERE 1=1
-        """
-        
-        count_query = """
-            SELECT COUNT(*) as total
-            FROM offers o
-            JOIN users u ON o.created_by = u.id  
-            WHERE 1=1
-        """
-        
+        conditions = []
         params = []
         
         # Фильтр по статусу (по умолчанию только активные)
         status_filter = filters.get('status', 'active')
         if status_filter:
-            base_query += " AND o.status = ?"
-            count_query += " AND o.status = ?"
+            conditions.append("o.status = ?")
             params.append(status_filter)
         
         # Исключаем собственные офферы
         if user_db_id:
-            base_query += " AND o.created_by != ?"
-            count_query += " AND o.created_by != ?"
+            conditions.append("o.created_by != ?")
             params.append(user_db_id)
         
         # Фильтр по поиску
         if filters.get('search'):
-            base_query += " AND (o.title LIKE ? OR o.description LIKE ?)"
-            count_query += " AND (o.title LIKE ? OR o.description LIKE ?)"
+            conditions.append("(o.title LIKE ? OR o.description LIKE ?)")
             search_term = f"%{filters['search']}%"
             params.extend([search_term, search_term])
         
         # Фильтр по категории
         if filters.get('category'):
-            base_query += " AND o.category = ?"
-            count_query += " AND o.category = ?"
+            conditions.append("o.category = ?")
             params.append(filters['category'])
         
-        # Получаем общее количество
-        total_count = execute_db_query(count_query, tuple(params), fetch_one=True)['total']
-        
-        # Добавляем сортировку и пагинацию
-        base_query += " ORDER BY o.created_at DESC LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
-        
-        # Получаем офферы
-        offers = execute_db_query(base_query, tuple(params), fetch_all=True)
-        
-        return [dict(offer) for offer in offers], total_count
+        return _AVAILABLE_OFFERS_PAGINATOR.paginate(
+            "o.*, u.username as creator_username, u.first_name as creator_name",
+            "offers o JOIN users u ON o.created_by = u.id", conditions, params,
+            limit=filters.get('limit', 10), cursor=filters.get('cursor'), page=filters.get('page', 1),
+            with_total=True
+        )
     
     @staticmethod
     def get_offer_by_id(offer_id: int, user_db_id: Optional[int] = None) -> Optional[Dict]:
@@ -39,7 +39,8 @@ class OfferService:
             raise ValueError("Пользователь не найден")
         
         # Получаем офферы и общее количество
-        offers, total_count = self.repository.get_user_offers(user_db_id, filters or {})
+        result = self.repository.get_user_offers(user_db_id, filters or {})
+        offers, total_count = result.items, result.total
         
         if not offers:
             return {
@@ -47,8 +48,9 @@ class OfferService:
                 'offers': [],
                 'count': 0,
                 'total_count': total_count,
-                'page': filters.get('page', 1) if filters else 1,
+                'page': result.page,
                 'total_pages': 0,
+                'next_cursor': None,
                 'user_db_id': user_db_id
             }
         
@@ -75,16 +77,14 @@ class OfferService:
         total_accepted = sum(stats.get('accepted_count', 0) for stats in response_stats.values())
         total_pending = sum(stats.get('pending_count', 0) for stats in response_stats.values())
         
-        page = filters.get('page', 1) if filters else 1
-        limit = filters.get('limit', 50) if filters else 50
-        
         return {
             'success': True,
             'offers': formatted_offers,
             'count': len(formatted_offers),
             'total_count': total_count,
-            'page': page,
-            'total_pages': (total_count + limit - 1) // limit,
+            'page': result.page,
+            'total_pages': (total_count + result.limit - 1) // result.limit,
+            'next_cursor': result.next_cursor,
             'user_db_id': user_db_id,
             'telegram_id': telegram_id,
             'summary': {
@@ -107,24 +107,22 @@ class OfferService:
             user_db_id = auth_service.get_user_db_id()
         
         # Получаем офферы
-        offers, total_count = self.repository.get_available_offers(user_db_id, filters or {})
+        result = self.repository.get_available_offers(user_db_id, filters or {})
         
         # Форматируем офферы
         formatted_offers = []
-        for offer in offers:
+        for offer in result.items:
             formatted_offer = self.formatter.format_offer_for_public(offer)
             formatted_offers.append(formatted_offer)
         
-        page = filters.get('page', 1) if filters else 1
-        limit = filters.get('limit', 10) if filters else 10
-        
         return {
             'success': True,
             'offers': formatted_offers,
             'count': len(formatted_offers),
-            'total_count': total_count,
-            'page': page,
-            'total_pages': (total_count + limit - 1) // limit
+            'total_count': result.total,
+            'page': result.page,
+            'total_pages': (result.total + result.limit - 1) // result.limit,
+            'next_cursor': result.next_cursor
         }
     
     def create_offer(self, offer_data: Dict[str, Any]) -> Dict[str, Any]:
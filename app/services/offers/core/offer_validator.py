@@ -205,6 +205,11 @@ class OfferValidator:
         except (ValueError, TypeError):
             cleaned_filters['limit'] = 50
         
+        # Курсор следующей страницы (next_cursor), проверяется при выборке
+        cursor = filters.get('cursor')
+        if cursor and isinstance(cursor, str) and len(cursor) <= 512:
+            cleaned_filters['cursor'] = cursor
+        
         # Валидация статуса
         status = filters.get('status')
         valid_statuses = ['active', 'draft', 'paused', 'completed', 'cancelled', 'expired']
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Адаптивное расписание проверок размещений
+Для каждого размещения и типа проверки хранится время следующей проверки,
+которое зависит от возраста поста, скорости набора просмотров, близости
+окончания размещения и риска удаления поста каналом
+"""
+
+import heapq
+import logging
+import math
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from app.config.telegram_config import (
+    AppConfig, PLACEMENT_CHECK_MIN_INTERVAL_MINUTES, PLACEMENT_CHECK_MAX_INTERVAL_MINUTES,
+    PLACEMENT_CHECK_MAX_PER_TICK
+)
+
+logger = logging.getLogger(__name__)
+
+CHECK_TYPE_STATS = 'stats'
+CHECK_TYPE_DELETION = 'deletion'
+
+# Базовый интервал (минуты) по возрасту поста: свежие посты меняются быстро,
+# недельные - почти не меняются
+_AGE_INTERVALS = (
+    (1, 10),
+    (3, 20),
+    (12, 45),
+    (24, 90),
+    (72, 180),
+)
+_OLD_POST_INTERVAL_MINUTES = 360
+
+# Длительность размещения по умолчанию (как в PostDeletionMonitor.calculate_placement_end_time)
+DEFAULT_PLACEMENT_DURATION_HOURS = 24
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', ''))
+    except ValueError:
+        return None
+
+
+def deletion_risk(early_deletions: int, reliability_rating: float) -> float:
+    """Риск удаления поста каналом от 0 до 1 по истории канала"""
+    early_deletions = early_deletions or 0
+    reliability = 100 if reliability_rating is None else reliability_rating
+    return min(1.0, early_deletions * 0.2 + max(0.0, 100 - reliability) / 100)
+
+
+def compute_check_interval(check_type: str, age_hours: float, views_per_hour: float = 0.0,
+                           hours_to_end: Optional[float] = None, risk: float = 0.0) -> float:
+    """
+    Интервал до следующей проверки в минутах
+
+    - возраст поста задает базовый интервал;
+    - быстрый рост просмотров учащает сбор статистики (до 3 раз);
+    - риск удаления учащает проверку доступности (до 4 раз);
+    - перед окончанием размещения проверка делается не позже середины
+      оставшегося времени, чтобы успеть зафиксировать итог или удаление.
+    """
+    interval = _OLD_POST_INTERVAL_MINUTES
+    for max_age_hours, minutes in _AGE_INTERVALS:
+        if age_hours < max_age_hours:
+            interval = minutes
+            break
+
+    if check_type == CHECK_TYPE_STATS and views_per_hour > 0:
+        interval /= 1 + min(math.log10(1 + views_per_hour) / 1.5, 2.0)
+    elif check_type == CHECK_TYPE_DELETION:
+        interval *= 1 - 0.75 * min(max(risk, 0.0), 1.0)
+
+    if hours_to_end is not None:
+        if hours_to_end > 0:
+            interval = min(interval, hours_to_end * 60 / 2)
+        elif check_type == CHECK_TYPE_DELETION:
+            # Размещение отработало срок - удаление уже не нарушение
+            interval = PLACEMENT_CHECK_MAX_INTERVAL_MINUTES
+
+    return min(max(interval, PLACEMENT_CHECK_MIN_INTERVAL_MINUTES), PLACEMENT_CHECK_MAX_INTERVAL_MINUTES)
+
+
+class PlacementCheckPlanner:
+    """Очередь проверок размещений с приоритетом по времени следующей проверки"""
+
+    _table_ready = False
+
+    def __init__(self, check_type: str, max_per_tick: int = PLACEMENT_CHECK_MAX_PER_TICK,
+                 shard: Optional[Tuple[int, int]] = None):
+        self.check_type = check_type
+        self.max_per_tick = max_per_tick
+        self.shard = shard  # (номер, количество) - доля размещений этого экземпляра планировщика
+        self._schedule: Dict[int, Dict] = {}
+        self._risks: Dict[int, float] = {}
+        self._ensure_table()
+
+    @classmethod
+    def _ensure_table(cls):
+        if cls._table_ready:
+            return
+        from app.models.database import execute_db_query
+
+        execute_db_query("""
+            CREATE TABLE IF NOT EXISTS placement_check_schedule (
+                placement_id INTEGER NOT NULL,
+                check_type TEXT NOT NULL,
+                next_check_at TIMESTAMP NOT NULL,
+                last_checked_at TIMESTAMP,
+                last_views INTEGER DEFAULT 0,
+                views_per_hour REAL DEFAULT 0,
+                interval_minutes REAL,
+                PRIMARY KEY (placement_id, check_type),
+                FOREIGN KEY (placement_id) REFERENCES offer_placements(id)
+            )
+        """)
+        execute_db_query("""
+            CREATE INDEX IF NOT EXISTS idx_placement_check_schedule_next
+            ON placement_check_schedule(check_type, next_check_at)
+        """)
+        cls._table_ready = True
+
+    def _load(self, placements: List[Dict]):
+        """Загружает расписание и риск удаления для переданных размещений"""
+        from app.models.database import execute_db_query
+
+        self._schedule = {}
+        self._risks = {}
+        if not placements:
+            return
+
+        rows = execute_db_query("""
+            SELECT placement_id, check_type, next_check_at, last_checked_at,
+                   last_views, views_per_hour
+            FROM placement_check_schedule
+            WHERE check_type IN (?, ?)
+        """, (self.check_type, CHECK_TYPE_STATS), fetch_all=True)
+
+        ids = {p['id'] for p in placements}
+        velocities = {}
+        for row in rows:
+            if row['placement_id'] not in ids:
+                continue
+            if row['check_type'] == self.check_type:
+                self._schedule[row['placement_id']] = row
+            if row['check_type'] == CHECK_TYPE_STATS:
+                velocities[row['placement_id']] = row['views_per_hour'] or 0.0
+
+        # Скорость просмотров известна из расписания сбора статистики
+        for placement_id, velocity in velocities.items():
+            self._schedule.setdefault(placement_id, {})['known_velocity'] = velocity
+
+        if self.check_type == CHECK_TYPE_DELETION:
+            response_ids = sorted({p['response_id'] for p in placements if p.get('response_id')})
+            if response_ids:
+                placeholders = ','.join('?' * len(response_ids))
+                risk_rows = execute_db_query(f"""
+                    SELECT r.id as response_id, c.early_deletions, c.reliability_rating
+                    FROM offer_responses r
+                    LEFT JOIN channels c ON c.id = r.channel_id
+                    WHERE r.id IN ({placeholders})
+                """, tuple(response_ids), fetch_all=True)
+                risk_by_response = {
+                    row['response_id']: deletion_risk(row['early_deletions'], row['reliability_rating'])
+                    for row in risk_rows
+                }
+                for placement in placements:
+                    self._risks[placement['id']] = risk_by_response.get(placement.get('response_id'), 0.0)
+
+    def select_due(self, placements: List[Dict], now: datetime = None) -> List[Dict]:
+        """
+        Размещения, которым пора на проверку, в порядке приоритета
+
+        Новые размещения (без записи в расписании) проверяются сразу.
+        За один запуск берется не больше max_per_tick самых просроченных.
+        При заданном шарде рассматриваются только размещения этого шарда.
+        """
+        from app.tasks.scheduler_lease import placement_in_shard
+
+        now = now or datetime.now()
+        placements = [p for p in placements if placement_in_shard(p['id'], self.shard)]
+        self._load(placements)
+
+        queue = []
+        for placement in placements:
+            next_check_at = _parse_timestamp(self._schedule.get(placement['id'], {}).get('next_check_at'))
+            due_at = next_check_at or datetime.min
+            if due_at <= now:
+                heapq.heappush(queue, (due_at, placement['id'], placement))
+
+        due = [heapq.heappop(queue)[2] for _ in range(min(len(queue), self.max_per_tick))]
+
+        if len(due) < len(placements):
+            logger.info(f"🗓️ Проверка '{self.check_type}': к проверке {len(due)} из {len(placements)} размещений")
+        return due
+
+    def _placement_timing(self, placement: Dict, now: datetime):
+        """Возраст поста и время до окончания размещения в часах"""
+        start = _parse_timestamp(placement.get('placement_start')) or _parse_timestamp(placement.get('created_at'))
+        age_hours = (now - start).total_seconds() / 3600 if start else 0.0
+
+        end = _parse_timestamp(placement.get('placement_end'))
+        if not end and start:
+            end = start + timedelta(hours=DEFAULT_PLACEMENT_DURATION_HOURS)
+        hours_to_end = (end - now).total_seconds() / 3600 if end else None
+
+        return max(age_hours, 0.0), hours_to_end
+
+    def plan_next(self, placement: Dict, views: Optional[int] = None, now: datetime = None) -> Dict:
+        """Рассчитывает следующую проверку размещения после текущей"""
+        now = now or datetime.now()
+        previous = self._schedule.get(placement['id'], {})
+
+        views_per_hour = previous.get('views_per_hour') or previous.get('known_velocity') or 0.0
+        last_views = previous.get('last_views') or 0
+        last_checked_at = _parse_timestamp(previous.get('last_checked_at'))
+
+        if views is not None:
+            if last_checked_at and views >= last_views:
+                elapsed_hours = (now - last_checked_at).total_seconds() / 3600
+                if elapsed_hours > 0:
+                    views_per_hour = (views - last_views) / elapsed_hours
+            last_views = views
+
+        age_hours, hours_to_end = self._placement_timing(placement, now)
+        interval = compute_check_interval(
+            self.check_type, age_hours, views_per_hour, hours_to_end, self._risks.get(placement['id'], 0.0)
+        )
+
+        return {
+            'placement_id': placement['id'],
+            'next_check_at': (now + timedelta(minutes=interval)).isoformat(),
+            'last_checked_at': now.isoformat(),
+            'last_views': last_views,
+            'views_per_hour': round(views_per_hour, 2),
+            'interval_minutes': round(interval, 1)
+        }
+
+    def record_checks(self, plans: List[Dict]):
+        """Сохраняет рассчитанные проверки одной транзакцией"""
+        if not plans:
+            return
+
+        conn = sqlite3.connect(AppConfig.DATABASE_PATH)
+        try:
+            with conn:
+                conn.executemany("""
+                    INSERT INTO placement_check_schedule (
+                        placement_id, check_type, next_check_at, last_checked_at,
+                        last_views, views_per_hour, interval_minutes
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(placement_id, check_type) DO UPDATE SET
+                        next_check_at = excluded.next_check_at,
+                        last_checked_at = excluded.last_checked_at,
+                        last_views = excluded.last_views,
+                        views_per_hour = excluded.views_per_hour,
+                        interval_minutes = excluded.interval_minutes
+                """, [(
+                    plan['placement_id'], self.check_type, plan['next_check_at'], plan['last_checked_at'],
+                    plan['last_views'], plan['views_per_hour'], plan['interval_minutes']
+                ) for plan in plans])
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения расписания проверок: {e}")
+        finally:
+            conn.close()
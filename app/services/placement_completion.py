@@ -1,26 +1,47 @@
 #!/usr/bin/env python3
 """
 Сервис завершения размещений через 24 часа с финальной статистикой и выплатами
+Размещения завершаются пакетами: финальная статистика собирается параллельно
+с ограничением, выплаты считаются пакетом, а статусы, платежи, балансы,
+эскроу, отчеты и уведомления (через outbox) пишутся одной транзакцией на пакет
 """
 
 import logging
 import asyncio
+import sqlite3
 from datetime import datetime, timedelta
+from decimal import Decimal
 from typing import Dict, List, Optional, Tuple
 import json
 
+from app.config.telegram_config import AppConfig, COMPLETION_BATCH_SIZE, COMPLETION_STATS_CONCURRENCY
+
 logger = logging.getLogger(__name__)
 
+# Бонус владельцу канала за эффективность (доля от суммы размещения)
+PERFORMANCE_BONUS_RATES = {
+    'excellent': Decimal('0.02'),  # 2% бонус за отличную работу
+    'good': Decimal('0.01'),       # 1% бонус за хорошую работу
+}
+
+PLATFORM_USER_ID = 1  # Платформа как получатель комиссии
+
 
 class PlacementCompletionService:
     """Сервис автоматического завершения размещений"""
     
-    def __init__(self):
-        self.platform_commission_rate = 0.05  # 5% комиссия платформы
+    def __init__(self, batch_size: int = COMPLETION_BATCH_SIZE,
+                 stats_concurrency: int = COMPLETION_STATS_CONCURRENCY):
+        from app.payments.commission_calculator import CommissionCalculator
+        
+        self.commission_calculator = CommissionCalculator()
+        self.batch_size = batch_size
+        self.stats_concurrency = stats_concurrency
         
     async def check_placements_for_completion(self) -> List[Dict]:
         """Проверяет размещения готовые к завершению (через 24+ часов)"""
         from app.models.database import execute_db_query
+        from app.services.notification_outbox import dispatch_pending_notifications
         
         logger.info("🏁 Проверка размещений готовых к завершению...")
         
@@ -46,77 +67,91 @@ class PlacementCompletionService:
             AND p.placement_start IS NOT NULL
             AND p.placement_start <= ?
             AND p.post_url IS NOT NULL
+            ORDER BY p.id
         """, (completion_time.isoformat(),), fetch_all=True)
         
         results = []
         
-        for placement in ready_placements:
+        for start in range(0, len(ready_placements), self.batch_size):
+            batch = ready_placements[start:start + self.batch_size]
+            results.extend(await self.complete_batch(batch))
+        
+        if results:
+            logger.info(f"🏁 Завершено размещений: {len([r for r in results if r['status'] == 'completed_successfully'])}/{len(results)}")
+            
+            # Уведомления уже в outbox; отправляем сразу, остальное досылает планировщик
             try:
-                logger.info(f"🏁 Завершение размещения {placement['id']} - {placement['offer_title']}")
-                
-                # 1. Финальный сбор статистики
-                final_stats = await self.collect_final_statistics(placement)
-                
-                # 2. Расчет выплаты с комиссией
-                payout_details = await self.calculate_payout(placement, final_stats)
-                
-                # 3. Выполнение выплаты
-                payment_result = await self.process_payout(placement, payout_details)
-                
-                # 4. Обновление статуса размещения
-                await self.mark_placement_completed(placement, final_stats, payout_details)
-                
-                # 5. Генерация итогового отчета
-                final_report = await self.generate_final_report(placement, final_stats, payout_details)
-                
-                # 6. Отправка уведомлений
-                await self.send_completion_notifications(placement, final_stats, payout_details, final_report)
-                
+                await dispatch_pending_notifications()
+            except Exception as e:
+                logger.error(f"❌ Ошибка отправки уведомлений из outbox: {e}")
+        
+        return results
+    
+    async def complete_batch(self, placements: List[Dict]) -> List[Dict]:
+        """
+        Завершает пакет размещений
+        
+        Повторный запуск безопасен: размещение меняет статус только из active,
+        и только для таких размещений в той же транзакции создаются платежи
+        (с детерминированными id), начисления и уведомления. Сбой посреди
+        пакета откатывает пакет целиком.
+        """
+        # 1. Финальный сбор статистики (параллельно, с ограничением)
+        stats_list = await self.collect_final_statistics_batch(placements)
+        
+        # 2. Расчет выплат с комиссией пакетом
+        payouts = self.calculate_payouts(placements, stats_list)
+        
+        # 3. Итоговые отчеты
+        reports = [
+            self.build_final_report(placement, final_stats, payout_details)
+            for placement, final_stats, payout_details in zip(placements, stats_list, payouts)
+        ]
+        
+        # 4. Статусы, платежи, балансы, эскроу, отчеты и уведомления - одной транзакцией
+        try:
+            completed_ids = self.commit_batch(list(zip(placements, stats_list, payouts, reports)))
+        except Exception as e:
+            logger.error(f"❌ Ошибка завершения пакета размещений {[p['id'] for p in placements]}: {e}")
+            return [
+                {'placement_id': placement['id'], 'status': 'completion_error', 'error': str(e)}
+                for placement in placements
+            ]
+        
+        results = []
+        for placement, final_stats, payout_details in zip(placements, stats_list, payouts):
+            if placement['id'] in completed_ids:
+                logger.info(f"✅ Размещение {placement['id']} успешно завершено")
                 results.append({
                     'placement_id': placement['id'],
                     'status': 'completed_successfully',
                     'final_stats': final_stats,
-                    'payout_details': payout_details,
-                    'payment_result': payment_result
+                    'payout_details': payout_details
                 })
-                
-                logger.info(f"✅ Размещение {placement['id']} успешно завершено")
-                
-            except Exception as e:
-                logger.error(f"❌ Ошибка завершения размещения {placement['id']}: {e}")
-                results.append({
-                    'placement_id': placement['id'],
-                    'status': 'completion_error',
-                    'error': str(e)
-                })
-        
-        if results:
-            logger.info(f"🏁 Завершено размещений: {len([r for r in results if r['status'] == 'completed_successfully'])}/{len(results)}")
+            else:
+                results.append({'placement_id': placement['id'], 'status': 'already_completed'})
         
         return results
     
+    async def collect_final_statistics_batch(self, placements: List[Dict]) -> List[Dict]:
+        """Собирает финальную статистику пакета не более чем stats_concurrency запросами одновременно"""
+        semaphore = asyncio.Semaphore(self.stats_concurrency)
+        
+        async def collect(placement: Dict) -> Dict:
+            async with semaphore:
+                return await self.collect_final_statistics(placement)
+        
+        return await asyncio.gather(*(collect(placement) for placement in placements))
+    
     async def collect_final_statistics(self, placement: Dict) -> Dict:
         """Собирает финальную статистику из всех источников"""
-        from app.models.database import execute_db_query
+        from app.services.placement_latest_stats import get_latest_stats
         
         try:
             placement_id = placement['id']
             
-            # Получаем последнюю статистику Telegram
-            telegram_stats = execute_db_query("""
-                SELECT * FROM placement_statistics 
-                WHERE placement_id = ? 
-                ORDER BY collected_at DESC 
-                LIMIT 1
-            """, (placement_id,), fetch_one=True)
-            
-            # Получаем последнюю статистику eREIT
-            ereit_stats = execute_db_query("""
-                SELECT * FROM ereit_statistics 
-                WHERE placement_id = ? 
-                ORDER BY collected_at DESC 
-                LIMIT 1
-            """, (placement_id,), fetch_one=True)
+            # Получаем последнюю статистику Telegram и eREIT
+            telegram_stats, ereit_stats = get_latest_stats(placement_id)
             
             # Пытаемся собрать дополнительную статистику в режиме реального времени
             try:
@@ -137,7 +172,7 @@ class PlacementCompletionService:
                     if final_telegram_stats:
                         await stats_collector.save_stats_to_db(placement_id, final_telegram_stats)
                         # Обновляем данные только если получили новые
-                        if final_telegram_stats.get('views', 0) > telegram_stats.get('views_count', 0):
+                        if final_telegram_stats.get('views', 0) > (telegram_stats or {}).get('views_count', 0):
                             telegram_stats = {
                                 'views_count': final_telegram_stats.get('views', 0),
                                 'reactions_count': final_telegram_stats.get('reactions', 0),
@@ -153,7 +188,7 @@ class PlacementCompletionService:
                         placement_id
                     )
                     
-                    if final_ereit_stats and final_ereit_stats.get('clicks', 0) > ereit_stats.get('clicks', 0):
+                    if final_ereit_stats and final_ereit_stats.get('clicks', 0) > (ereit_stats or {}).get('clicks', 0):
                         ereit_stats = final_ereit_stats
                         
             except Exception as e:
@@ -255,224 +290,49 @@ class PlacementCompletionService:
         except Exception as e:
             return {'error': str(e)}
     
-    async def calculate_payout(self, placement: Dict, final_stats: Dict) -> Dict:
-        """Рассчитывает детали выплаты с учетом комиссии"""
-        try:
-            base_amount = float(placement.get('funds_reserved', 0))
-            commission_amount = base_amount * self.platform_commission_rate
-            payout_amount = base_amount - commission_amount
-            
-            # Бонусы за высокую эффективность
-            performance_bonus = 0
+    def calculate_payouts(self, placements: List[Dict], stats_list: List[Dict]) -> List[Dict]:
+        """Рассчитывает выплаты пакета с учетом комиссии (CommissionCalculator) и бонусов"""
+        cent = Decimal('0.01')
+        amounts = [Decimal(str(placement.get('funds_reserved') or 0)) for placement in placements]
+        commissions = self.commission_calculator.calculate_placement_commissions(amounts)
+        calculated_at = datetime.now().isoformat()
+        
+        payouts = []
+        for base_amount, commission, final_stats in zip(amounts, commissions, stats_list):
             performance_rating = final_stats.get('performance', {}).get('performance_rating', 'average')
-            
-            if performance_rating == 'excellent':
-                performance_bonus = base_amount * 0.02  # 2% бонус за отличную работу
-            elif performance_rating == 'good':
-                performance_bonus = base_amount * 0.01  # 1% бонус за хорошую работу
-            
-            final_payout = payout_amount + performance_bonus
-            
-            payout_details = {
-                'base_amount': base_amount,
-                'commission_rate': self.platform_commission_rate,
-                'commission_amount': round(commission_amount, 2),
-                'performance_bonus': round(performance_bonus, 2),
+            performance_bonus = (base_amount * PERFORMANCE_BONUS_RATES.get(performance_rating, Decimal('0'))).quantize(cent)
+            final_payout = Decimal(str(commission['net_amount'])) + performance_bonus
+            
+            payouts.append({
+                'base_amount': float(base_amount),
+                'commission_rate': commission['commission_rate'],
+                'commission_amount': commission['commission'],
+                'performance_bonus': float(performance_bonus),
                 'performance_rating': performance_rating,
-                'net_payout': round(final_payout, 2),
-                'calculated_at': datetime.now().isoformat()
-            }
-            
-            logger.info(f"💰 Выплата рассчитана: {final_payout:.2f} руб. (база: {base_amount}, комиссия: {commission_amount:.2f}, бонус: {performance_bonus:.2f})")
-            
-            return payout_details
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка расчета выплаты: {e}")
-            return {
-                'base_amount': 0,
-                'commission_amount': 0,
-                'net_payout': 0,
-                'error': str(e)
-            }
-    
-    async def process_payout(self, placement: Dict, payout_details: Dict) -> Dict:
-        """Обрабатывает выплату владельцу канала"""
-        from app.models.database import execute_db_query
+                'net_payout': float(final_payout),
+                'calculated_at': calculated_at
+            })
         
-        try:
-            payout_amount = payout_details['net_payout']
-            
-            if payout_amount <= 0:
-                return {'status': 'skipped', 'reason': 'zero_amount'}
-            
-            # Генерируем уникальные ID для платежей
-            import random
-            timestamp = int(datetime.now().timestamp())
-            random_suffix = random.randint(1000, 9999)
-            
-            payout_payment_id = f"COMPLETION_{placement['id']}_{timestamp}_{random_suffix}"
-            commission_payment_id = f"COMMISSION_{placement['id']}_{timestamp}_{random_suffix}"
-            
-            # Создаем запись о выплате
-            payment_id = execute_db_query("""
-                INSERT INTO payments (
-                    id,
-                    contract_id,
-                    placement_id,
-                    publisher_id,
-                    advertiser_id,
-                    amount,
-                    status,
-                    payment_method,
-                    created_at,
-                    processed_at,
-                    completed_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                payout_payment_id,
-                f"COMPLETION_CONTRACT_{placement['id']}_{random_suffix}",
-                placement['id'],
-                placement['channel_owner_id'],
-                placement['advertiser_id'],
-                payout_amount,
-                'completed',
-                'completion_payout',
-                datetime.now().isoformat(),
-                datetime.now().isoformat(),
-                datetime.now().isoformat()
-            ))
-            
-            # Также создаем запись о комиссии платформы
-            commission_payment_result = execute_db_query("""
-                INSERT INTO payments (
-                    id,
-                    contract_id,
-                    placement_id,
-                    publisher_id,
-                    advertiser_id,
-                    amount,
-                    status,
-                    payment_method,
-                    created_at,
-                    processed_at,
-                    completed_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                commission_payment_id,
-                f"COMMISSION_CONTRACT_{placement['id']}_{random_suffix}",
-                placement['id'],
-                1,  # Платформа как получатель
-                placement['advertiser_id'],
-                payout_details['commission_amount'],
-                'completed',
-                'platform_commission',
-                datetime.now().isoformat(),
-                datetime.now().isoformat(),
-                datetime.now().isoformat()
-            ))
-            
-            logger.info(f"💰 Выплата обработана: {payout_amount:.2f} руб. владельцу канала {placement['channel_owner_id']}")
-            
-            return {
-                'status': 'completed',
-                'payment_id': payout_payment_id,
-                'commission_payment_id': commission_payment_id,
-                'amount': payout_amount,
-                'processed_at': datetime.now().isoformat()
-            }
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка обработки выплаты: {e}")
-            return {
-                'status': 'failed',
-                'error': str(e)
-            }
-    
-    async def mark_placement_completed(self, placement: Dict, final_stats: Dict, payout_details: Dict):
-        """Обновляет статус размещения на завершенный"""
-        from app.models.database import execute_db_query
+        total = sum(payout['net_payout'] for payout in payouts)
+        logger.info(f"💰 Рассчитано выплат: {len(payouts)} на сумму {total:.2f} руб.")
         
-        try:
-            execute_db_query("""
-                UPDATE offer_placements 
-                SET status = 'completed',
-                    actual_end_time = CURRENT_TIMESTAMP,
-                    final_stats = ?,
-                    final_payout = ?,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (
-                json.dumps(final_stats),
-                payout_details['net_payout'],
-                placement['id']
-            ))
-            
-            # Обновляем статистику канала
-            execute_db_query("""
-                UPDATE channels 
-                SET completed_placements = COALESCE(completed_placements, 0) + 1,
-                    total_earned = COALESCE(total_earned, 0) + ?,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = (
-                    SELECT r.channel_id 
-                    FROM offer_responses r 
-                    WHERE r.id = ?
-                )
-            """, (payout_details['net_payout'], placement['proposal_id']))
-            
-            logger.info(f"✅ Размещение {placement['id']} помечено как завершенное")
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка обновления статуса размещения: {e}")
+        return payouts
     
-    async def generate_final_report(self, placement: Dict, final_stats: Dict, payout_details: Dict) -> Dict:
-        """Генерирует итоговый отчет по размещению"""
+    def commit_batch(self, items: List[Tuple[Dict, Dict, Dict, Dict]]) -> set:
+        """
+        Записывает завершение пакета одной транзакцией
+        
+        items - (размещение, финальная статистика, выплата, отчет).
+        Возвращает id размещений, завершенных этим вызовом.
+        """
+        from app.services.notification_outbox import enqueue_notification
+        
+        if not items:
+            return set()
+        
+        conn = sqlite3.connect(AppConfig.DATABASE_PATH, timeout=30, isolation_level=None)
         try:
-            telegram_stats = final_stats.get('telegram', {})
-            ereit_stats = final_stats.get('ereit', {})
-            performance = final_stats.get('performance', {})
-            duration = final_stats.get('placement_duration', {})
-            
-            report = {
-                'placement_info': {
-                    'id': placement['id'],
-                    'title': placement['offer_title'],
-                    'channel': f"@{placement['channel_username']}",
-                    'channel_title': placement['channel_title'],
-                    'post_url': placement['post_url'],
-                    'duration': duration.get('duration_text', 'Неизвестно')
-                },
-                'statistics': {
-                    'views': telegram_stats.get('views', 0),
-                    'reactions': telegram_stats.get('reactions', 0),
-                    'shares': telegram_stats.get('shares', 0),
-                    'comments': telegram_stats.get('comments', 0),
-                    'clicks': ereit_stats.get('clicks', 0),
-                    'unique_clicks': ereit_stats.get('unique_clicks', 0),
-                    'conversions': ereit_stats.get('conversions', 0)
-                },
-                'performance_metrics': {
-                    'ctr': performance.get('click_through_rate', 0),
-                    'engagement_rate': performance.get('engagement_rate', 0),
-                    'conversion_rate': performance.get('conversion_rate', 0),
-                    'cost_per_click': performance.get('cost_per_click', 0),
-                    'cost_per_view': performance.get('cost_per_view', 0),
-                    'performance_rating': performance.get('performance_rating', 'average')
-                },
-                'financial': {
-                    'total_cost': payout_details['base_amount'],
-                    'commission': payout_details['commission_amount'],
-                    'performance_bonus': payout_details.get('performance_bonus', 0),
-                    'net_payout': payout_details['net_payout']
-                },
-                'generated_at': datetime.now().isoformat()
-            }
-            
-            # Сохраняем отчет в базу данных
-            from app.models.database import execute_db_query
-            
-            execute_db_query("""
+            conn.execute("""
                 CREATE TABLE IF NOT EXISTS placement_reports (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     placement_id INTEGER NOT NULL,
@@ -481,54 +341,172 @@ class PlacementCompletionService:
                     FOREIGN KEY (placement_id) REFERENCES offer_placements(id)
                 )
             """)
+            has_escrow = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'escrow_holds'"
+            ).fetchone() is not None
             
-            execute_db_query("""
-                INSERT INTO placement_reports (placement_id, report_data)
-                VALUES (?, ?)
-            """, (placement['id'], json.dumps(report)))
-            
-            logger.info(f"📋 Итоговый отчет сгенерирован для размещения {placement['id']}")
-            
-            return report
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка генерации отчета: {e}")
-            return {'error': str(e)}
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Под блокировкой записи: завершаем только еще активные размещения
+                ids = [placement['id'] for placement, _, _, _ in items]
+                placeholders = ','.join('?' * len(ids))
+                active_ids = {row[0] for row in conn.execute(
+                    f"SELECT id FROM offer_placements WHERE id IN ({placeholders}) AND status = 'active'", ids
+                )}
+                items = [item for item in items if item[0]['id'] in active_ids]
+                
+                now = datetime.now().isoformat()
+                paid = [item for item in items if item[2]['net_payout'] > 0]
+                
+                conn.executemany("""
+                    UPDATE offer_placements 
+                    SET status = 'completed',
+                        actual_end_time = CURRENT_TIMESTAMP,
+                        final_stats = ?,
+                        final_payout = ?,
+                        payment_status = ?,
+                        payment_amount = ?,
+                        commission_rate = ?,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'active'
+                """, [(
+                    json.dumps(final_stats),
+                    payout['net_payout'],
+                    # 'completed' - как у payments; по нему отбирает аналитика доходов
+                    'completed' if payout['net_payout'] > 0 else 'skipped',
+                    payout['net_payout'],
+                    payout['commission_rate'],
+                    placement['id']
+                ) for placement, final_stats, payout, _ in items])
+                
+                # Выплата владельцу канала и комиссия платформы (id платежей детерминированы)
+                conn.executemany("""
+                    INSERT OR IGNORE INTO payments (
+                        id, contract_id, placement_id, publisher_id, advertiser_id, amount,
+                        status, payment_method, created_at, processed_at, completed_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, 'completed', ?, ?, ?, ?)
+                """, [row for placement, _, payout, _ in paid for row in (
+                    (f"COMPLETION_{placement['id']}", f"COMPLETION_CONTRACT_{placement['id']}", placement['id'],
+                     placement['channel_owner_id'], placement['advertiser_id'], payout['net_payout'],
+                     'completion_payout', now, now, now),
+                    (f"COMMISSION_{placement['id']}", f"COMMISSION_CONTRACT_{placement['id']}", placement['id'],
+                     PLATFORM_USER_ID, placement['advertiser_id'], payout['commission_amount'],
+                     'platform_commission', now, now, now),
+                )])
+                
+                conn.executemany("""
+                    UPDATE users SET balance = COALESCE(balance, 0) + ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, [(payout['net_payout'], placement['channel_owner_id']) for placement, _, payout, _ in paid])
+                
+                if has_escrow:
+                    conn.executemany("""
+                        UPDATE escrow_holds SET status = 'released', released_at = ?
+                        WHERE placement_id = ? AND status = 'active'
+                    """, [(now, placement['id']) for placement, _, _, _ in items])
+                
+                # Обновляем статистику канала
+                conn.executemany("""
+                    UPDATE channels 
+                    SET completed_placements = COALESCE(completed_placements, 0) + 1,
+                        total_earned = COALESCE(total_earned, 0) + ?,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = (
+                        SELECT r.channel_id 
+                        FROM offer_responses r 
+                        WHERE r.id = ?
+                    )
+                """, [(payout['net_payout'], placement['proposal_id']) for placement, _, payout, _ in items])
+                
+                conn.executemany("""
+                    INSERT INTO placement_reports (placement_id, report_data)
+                    VALUES (?, ?)
+                """, [(placement['id'], json.dumps(report)) for placement, _, _, report in items])
+                
+                for placement, _, payout, report in items:
+                    enqueue_notification(
+                        conn, f"placement_completed:{placement['id']}:advertiser",
+                        placement['advertiser_telegram_id'],
+                        self.advertiser_completion_message(placement, report)
+                    )
+                    enqueue_notification(
+                        conn, f"placement_completed:{placement['id']}:channel_owner",
+                        placement['channel_owner_telegram_id'],
+                        self.channel_owner_payout_message(placement, payout, report)
+                    )
+                
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        
+        if len(items) < len(ids):
+            logger.info(f"ℹ️ Уже завершены ранее: {sorted(set(ids) - active_ids)}")
+        
+        return {placement['id'] for placement, _, _, _ in items}
     
-    async def send_completion_notifications(self, placement: Dict, final_stats: Dict, payout_details: Dict, final_report: Dict):
-        """Отправляет уведомления о завершении размещения"""
-        try:
-            # Уведомление рекламодателю
-            await self.notify_advertiser_completion(placement, final_stats, final_report)
-            
-            # Уведомление владельцу канала
-            await self.notify_channel_owner_payout(placement, final_stats, payout_details, final_report)
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка отправки уведомлений: {e}")
+    def build_final_report(self, placement: Dict, final_stats: Dict, payout_details: Dict) -> Dict:
+        """Формирует итоговый отчет по размещению (сохраняется в commit_batch)"""
+        telegram_stats = final_stats.get('telegram', {})
+        ereit_stats = final_stats.get('ereit', {})
+        performance = final_stats.get('performance', {})
+        duration = final_stats.get('placement_duration', {})
+        
+        return {
+            'placement_info': {
+                'id': placement['id'],
+                'title': placement['offer_title'],
+                'channel': f"@{placement['channel_username']}",
+                'channel_title': placement['channel_title'],
+                'post_url': placement['post_url'],
+                'duration': duration.get('duration_text', 'Неизвестно')
+            },
+            'statistics': {
+                'views': telegram_stats.get('views', 0),
+                'reactions': telegram_stats.get('reactions', 0),
+                'shares': telegram_stats.get('shares', 0),
+                'comments': telegram_stats.get('comments', 0),
+                'clicks': ereit_stats.get('clicks', 0),
+                'unique_clicks': ereit_stats.get('unique_clicks', 0),
+                'conversions': ereit_stats.get('conversions', 0)
+            },
+            'performance_metrics': {
+                'ctr': performance.get('click_through_rate', 0),
+                'engagement_rate': performance.get('engagement_rate', 0),
+                'conversion_rate': performance.get('conversion_rate', 0),
+                'cost_per_click': performance.get('cost_per_click', 0),
+                'cost_per_view': performance.get('cost_per_view', 0),
+                'performance_rating': performance.get('performance_rating', 'average')
+            },
+            'financial': {
+                'total_cost': payout_details['base_amount'],
+                'commission': payout_details['commission_amount'],
+                'performance_bonus': payout_details.get('performance_bonus', 0),
+                'net_payout': payout_details['net_payout']
+            },
+            'generated_at': datetime.now().isoformat()
+        }
     
-    async def notify_advertiser_completion(self, placement: Dict, final_stats: Dict, final_report: Dict):
-        """Уведомляет рекламодателя о завершении размещения"""
-        try:
-            from app.services.telegram_service import TelegramService
-            telegram_service = TelegramService()
-            
-            stats = final_report.get('statistics', {})
-            metrics = final_report.get('performance_metrics', {})
-            
-            ctr_text = f"{metrics.get('ctr', 0)}%" if metrics.get('ctr') else "н/д"
-            cost_per_click = metrics.get('cost_per_click', 0)
-            performance_rating = metrics.get('performance_rating', 'average')
-            
-            # Эмодзи в зависимости от результата
-            rating_emoji = {
-                'excellent': '🌟',
-                'good': '👍',
-                'average': '👌',
-                'poor': '😐'
-            }.get(performance_rating, '📊')
-            
-            message = f"""✅ <b>Размещение завершено!</b>
+    def advertiser_completion_message(self, placement: Dict, final_report: Dict) -> str:
+        """Текст уведомления рекламодателю о завершении размещения"""
+        stats = final_report.get('statistics', {})
+        metrics = final_report.get('performance_metrics', {})
+        
+        ctr_text = f"{metrics.get('ctr', 0)}%" if metrics.get('ctr') else "н/д"
+        cost_per_click = metrics.get('cost_per_click', 0)
+        performance_rating = metrics.get('performance_rating', 'average')
+        
+        # Эмодзи в зависимости от результата
+        rating_emoji = {
+            'excellent': '🌟',
+            'good': '👍',
+            'average': '👌',
+            'poor': '😐'
+        }.get(performance_rating, '📊')
+        
+        return f"""✅ <b>Размещение завершено!</b>
 
 📺 <b>Канал:</b> @{placement['channel_username']}
 📋 <b>Оффер:</b> {placement['offer_title']}
@@ -549,39 +527,24 @@ class PlacementCompletionService:
 📈 <b>Подробный отчет доступен в приложении</b>
 
 🎯 <b>Хотите разместить еще?</b> /create_offer"""
-            
-            await telegram_service.send_message(
-                chat_id=placement['advertiser_telegram_id'],
-                text=message,
-                parse_mode='HTML'
-            )
-            
-            logger.info(f"📤 Уведомление о завершении отправлено рекламодателю {placement['advertiser_telegram_id']}")
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка уведомления рекламодателя: {e}")
     
-    async def notify_channel_owner_payout(self, placement: Dict, final_stats: Dict, payout_details: Dict, final_report: Dict):
-        """Уведомляет владельца канала о выплате"""
-        try:
-            from app.services.telegram_service import TelegramService
-            telegram_service = TelegramService()
-            
-            stats = final_report.get('statistics', {})
-            metrics = final_report.get('performance_metrics', {})
-            
-            ctr = metrics.get('ctr', 0)
-            payout_amount = payout_details['net_payout']
-            commission_amount = payout_details['commission_amount']
-            base_amount = payout_details['base_amount']
-            performance_bonus = payout_details.get('performance_bonus', 0)
-            
-            # Определяем качество работы
-            ctr_rating = "отличный" if ctr > 2.0 else "хороший" if ctr > 1.0 else "средний"
-            
-            bonus_text = f"\n🎁 <b>Бонус за качество:</b> +{performance_bonus:.2f} руб." if performance_bonus > 0 else ""
-            
-            message = f"""💰 <b>Выплата произведена!</b>
+    def channel_owner_payout_message(self, placement: Dict, payout_details: Dict, final_report: Dict) -> str:
+        """Текст уведомления владельцу канала о выплате"""
+        stats = final_report.get('statistics', {})
+        metrics = final_report.get('performance_metrics', {})
+        
+        ctr = metrics.get('ctr', 0)
+        payout_amount = payout_details['net_payout']
+        commission_amount = payout_details['commission_amount']
+        base_amount = payout_details['base_amount']
+        performance_bonus = payout_details.get('performance_bonus', 0)
+        
+        # Определяем качество работы
+        ctr_rating = "отличный" if ctr > 2.0 else "хороший" if ctr > 1.0 else "средний"
+        
+        bonus_text = f"\n🎁 <b>Бонус за качество:</b> +{performance_bonus:.2f} руб." if performance_bonus > 0 else ""
+        
+        return f"""💰 <b>Выплата произведена!</b>
 
 📺 <b>За размещение в</b> @{placement['channel_username']}
 📋 <b>Оффер:</b> {placement['offer_title']}
@@ -598,17 +561,6 @@ class PlacementCompletionService:
 
 🎯 <b>Новые офферы:</b> /find_offers
 📈 <b>Статистика канала:</b> /my_stats"""
-            
-            await telegram_service.send_message(
-                chat_id=placement['channel_owner_telegram_id'],
-                text=message,
-                parse_mode='HTML'
-            )
-            
-            logger.info(f"📤 Уведомление о выплате отправлено владельцу канала {placement['channel_owner_telegram_id']}")
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка уведомления владельца канала: {e}")
 
 
 # Функция для планировщика
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Последняя статистика размещений
+Таблица placement_latest_stats хранит по одной строке на размещение со
+ссылками на последние записи placement_statistics и ereit_statistics и их
+основными счетчиками. Строку обновляют триггеры AFTER INSERT, поэтому она
+актуальна для любого кода, пишущего статистику, а чтение последней
+статистики - поиск по первичному ключу вместо сортировки истории
+"""
+
+import logging
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple
+
+from app.config.telegram_config import AppConfig
+
+logger = logging.getLogger(__name__)
+
+# Последней считается запись с наибольшим collected_at (как в прежних
+# запросах ORDER BY collected_at DESC); без collected_at - время вставки
+_TELEGRAM_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS trg_placement_statistics_latest
+    AFTER INSERT ON placement_statistics
+    BEGIN
+        INSERT INTO placement_latest_stats (
+            placement_id, stats_id, views_count, reactions_count, shares_count,
+            comments_count, collected_at, updated_at
+        ) VALUES (
+            NEW.placement_id, NEW.id, NEW.views_count, NEW.reactions_count, NEW.shares_count,
+            NEW.comments_count, COALESCE(NEW.collected_at, NEW.created_at), CURRENT_TIMESTAMP
+        )
+        ON CONFLICT(placement_id) DO UPDATE SET
+            stats_id = excluded.stats_id,
+            views_count = excluded.views_count,
+            reactions_count = excluded.reactions_count,
+            shares_count = excluded.shares_count,
+            comments_count = excluded.comments_count,
+            collected_at = excluded.collected_at,
+            updated_at = excluded.updated_at
+        WHERE placement_latest_stats.stats_id IS NULL
+           OR excluded.collected_at >= COALESCE(placement_latest_stats.collected_at, '');
+    END
+"""
+
+_EREIT_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS trg_ereit_statistics_latest
+    AFTER INSERT ON ereit_statistics
+    BEGIN
+        INSERT INTO placement_latest_stats (
+            placement_id, ereit_stats_id, clicks, unique_clicks, impressions, ctr,
+            ereit_collected_at, updated_at
+        ) VALUES (
+            NEW.placement_id, NEW.id, NEW.clicks, NEW.unique_clicks, NEW.impressions, NEW.ctr,
+            COALESCE(NEW.collected_at, NEW.created_at), CURRENT_TIMESTAMP
+        )
+        ON CONFLICT(placement_id) DO UPDATE SET
+            ereit_stats_id = excluded.ereit_stats_id,
+            clicks = excluded.clicks,
+            unique_clicks = excluded.unique_clicks,
+            impressions = excluded.impressions,
+            ctr = excluded.ctr,
+            ereit_collected_at = excluded.ereit_collected_at,
+            updated_at = excluded.updated_at
+        WHERE placement_latest_stats.ereit_stats_id IS NULL
+           OR excluded.ereit_collected_at >= COALESCE(placement_latest_stats.ereit_collected_at, '');
+    END
+"""
+
+# Первичное заполнение из уже накопленной истории (одна последняя запись на размещение)
+_TELEGRAM_BACKFILL = """
+    INSERT INTO placement_latest_stats (
+        placement_id, stats_id, views_count, reactions_count, shares_count,
+        comments_count, collected_at, updated_at
+    )
+    SELECT placement_id, id, views_count, reactions_count, shares_count,
+           comments_count, latest_at, CURRENT_TIMESTAMP
+    FROM (
+        SELECT ps.*, COALESCE(ps.collected_at, ps.created_at) as latest_at,
+               ROW_NUMBER() OVER (
+                   PARTITION BY ps.placement_id
+                   ORDER BY COALESCE(ps.collected_at, ps.created_at) DESC, ps.id DESC
+               ) as rn
+        FROM placement_statistics ps
+    )
+    WHERE rn = 1
+    ON CONFLICT(placement_id) DO UPDATE SET
+        stats_id = excluded.stats_id,
+        views_count = excluded.views_count,
+        reactions_count = excluded.reactions_count,
+        shares_count = excluded.shares_count,
+        comments_count = excluded.comments_count,
+        collected_at = excluded.collected_at
+"""
+
+_EREIT_BACKFILL = """
+    INSERT INTO placement_latest_stats (
+        placement_id, ereit_stats_id, clicks, unique_clicks, impressions, ctr,
+        ereit_collected_at, updated_at
+    )
+    SELECT placement_id, id, clicks, unique_clicks, impressions, ctr,
+           latest_at, CURRENT_TIMESTAMP
+    FROM (
+        SELECT es.*, COALESCE(es.collected_at, es.created_at) as latest_at,
+               ROW_NUMBER() OVER (
+                   PARTITION BY es.placement_id
+                   ORDER BY COALESCE(es.collected_at, es.created_at) DESC, es.id DESC
+               ) as rn
+        FROM ereit_statistics es
+    )
+    WHERE rn = 1
+    ON CONFLICT(placement_id) DO UPDATE SET
+        ereit_stats_id = excluded.ereit_stats_id,
+        clicks = excluded.clicks,
+        unique_clicks = excluded.unique_clicks,
+        impressions = excluded.impressions,
+        ctr = excluded.ctr,
+        ereit_collected_at = excluded.ereit_collected_at
+"""
+
+# Покрывающие индексы для чтения временных рядов: история размещения
+# читается из индекса без обращения к строкам таблицы. Они заменяют
+# одноколоночные индексы по placement_id (их префикс), которые иначе
+# перехватывают план запроса и требуют отдельной сортировки
+_SERIES_INDEXES = {
+    'placement_statistics': ("""
+        CREATE INDEX IF NOT EXISTS idx_placement_stats_series
+        ON placement_statistics(placement_id, collected_at, views_count, reactions_count,
+                                shares_count, comments_count)
+    """, 'idx_placement_stats_placement_id'),
+    'ereit_statistics': ("""
+        CREATE INDEX IF NOT EXISTS idx_ereit_stats_series
+        ON ereit_statistics(placement_id, collected_at, clicks, unique_clicks, impressions)
+    """, 'idx_ereit_stats_placement_id'),
+}
+
+_SOURCES = (
+    ('placement_statistics', 'trg_placement_statistics_latest', _TELEGRAM_TRIGGER, _TELEGRAM_BACKFILL),
+    ('ereit_statistics', 'trg_ereit_statistics_latest', _EREIT_TRIGGER, _EREIT_BACKFILL),
+)
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_latest_stats_schema():
+    """
+    Создает таблицу последней статистики, триггеры и покрывающие индексы
+
+    Для каждой таблицы статистики триггер создается в одной транзакции с
+    заполнением из истории, чтобы не потерять записи, вставленные между ними.
+    ereit_statistics создается лениво при первом сохранении, поэтому функция
+    повторяет попытку, пока триггеры не появятся на обеих таблицах.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+
+        conn = sqlite3.connect(AppConfig.DATABASE_PATH, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS placement_latest_stats (
+                        placement_id INTEGER PRIMARY KEY,
+                        stats_id INTEGER,
+                        views_count INTEGER DEFAULT 0,
+                        reactions_count INTEGER DEFAULT 0,
+                        shares_count INTEGER DEFAULT 0,
+                        comments_count INTEGER DEFAULT 0,
+                        collected_at TIMESTAMP,
+                        ereit_stats_id INTEGER,
+                        clicks INTEGER DEFAULT 0,
+                        unique_clicks INTEGER DEFAULT 0,
+                        impressions INTEGER DEFAULT 0,
+                        ctr REAL DEFAULT 0.0,
+                        ereit_collected_at TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (placement_id) REFERENCES offer_placements(id)
+                    )
+                """)
+
+                existing = {row[0] for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"
+                )}
+                ready = True
+                for table, trigger_name, trigger_sql, backfill_sql in _SOURCES:
+                    if table not in existing:
+                        ready = False
+                        continue
+                    index_sql, replaced_index = _SERIES_INDEXES[table]
+                    conn.execute(index_sql)
+                    conn.execute(f"DROP INDEX IF EXISTS {replaced_index}")
+                    if trigger_name not in existing:
+                        conn.execute(trigger_sql)
+                        conn.execute(backfill_sql)
+                        logger.info(f"✅ Последняя статистика {table} перенесена в placement_latest_stats")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания placement_latest_stats: {e}")
+            return
+        finally:
+            conn.close()
+
+        _schema_ready = ready
+
+
+def get_latest_stats(placement_id: int) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """Последние записи (telegram, ereit) размещения поиском по первичным ключам"""
+    from app.models.database import execute_db_query
+
+    ensure_latest_stats_schema()
+
+    latest = execute_db_query("""
+        SELECT stats_id, ereit_stats_id FROM placement_latest_stats WHERE placement_id = ?
+    """, (placement_id,), fetch_one=True)
+    if not latest:
+        return None, None
+
+    telegram_stats = None
+    if latest['stats_id'] is not None:
+        telegram_stats = execute_db_query(
+            "SELECT * FROM placement_statistics WHERE id = ?", (latest['stats_id'],), fetch_one=True
+        )
+
+    ereit_stats = None
+    if latest['ereit_stats_id'] is not None:
+        ereit_stats = execute_db_query(
+            "SELECT * FROM ereit_statistics WHERE id = ?", (latest['ereit_stats_id'],), fetch_one=True
+        )
+
+    return telegram_stats, ereit_stats
+
@@ -6,6 +6,8 @@
 import logging
 import asyncio
 import aiohttp
+import re
+import requests
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import json
@@ -19,9 +21,16 @@ class PostDeletionMonitor:
     def __init__(self):
         self.session = None
         
-    async def check_active_posts_availability(self) -> List[Dict]:
-        """Проверяет доступность всех активных постов"""
+    async def check_active_posts_availability(self, adaptive: bool = False, shard: Optional[tuple] = None) -> List[Dict]:
+        """
+        Проверяет доступность активных постов
+        
+        adaptive=True - только посты, которым пора на проверку
+        по адаптивному расписанию (PlacementCheckPlanner); shard - доля
+        размещений текущего экземпляра планировщика
+        """
         from app.models.database import execute_db_query
+        from app.services.placement_check_planner import PlacementCheckPlanner, CHECK_TYPE_DELETION
         
         logger.info("🔍 Проверка доступности активных постов...")
         
@@ -45,8 +54,16 @@ class PostDeletionMonitor:
             AND p.placement_start IS NOT NULL
         """, fetch_all=True)
         
+        planner = None
+        if adaptive:
+            planner = PlacementCheckPlanner(CHECK_TYPE_DELETION, shard=shard)
+            active_placements = planner.select_due(active_placements)
+        
         results = []
         
+        # Пакетная проверка: одна страница канала покрывает ~20 постов
+        snapshots = await self.collect_preview_snapshots(active_placements)
+        
         async with aiohttp.ClientSession() as session:
             self.session = session
             
@@ -54,8 +71,13 @@ class PostDeletionMonitor:
                 try:
                     logger.debug(f"🔍 Проверяем пост для размещения {placement['id']}: {placement['post_url']}")
                     
-                    # Проверяем доступность поста
-                    is_available = await self.check_post_availability(placement['post_url'])
+                    # Пост найден на странице канала - он доступен. Отсутствие поста
+                    # перепроверяем точечно, т.к. за этим следуют штрафы
+                    snapshot = snapshots.get(self._parse_post_key(placement['post_url']))
+                    if snapshot and snapshot.exists:
+                        is_available = True
+                    else:
+                        is_available = await self.check_post_availability(placement['post_url'])
                     
                     if not is_available:
                         # Пост удален - обрабатываем ситуацию
@@ -83,6 +105,13 @@ class PostDeletionMonitor:
                         'error': str(e)
                     })
         
+        if planner:
+            # Удаленные посты выходят из статуса active и в выборку больше не попадут
+            planner.record_checks([
+                planner.plan_next(placement) for placement, result in zip(active_placements, results)
+                if result['status'] != 'deleted'
+            ])
+        
         available_count = len([r for r in results if r['status'] == 'available'])
         deleted_count = len([r for r in results if r['status'] == 'deleted'])
         
@@ -91,41 +120,67 @@ class PostDeletionMonitor:
         
         return results
     
+    @staticmethod
+    def _parse_post_key(post_url: str) -> Optional[Tuple[str, int]]:
+        """Пара (канал, id сообщения) из ссылки на пост"""
+        match = re.match(r'https://t\.me/([^/?]+)/(\d+)', post_url or '')
+        if not match or match.group(1) in ('s', 'c'):
+            return None
+        return match.group(1), int(match.group(2))
+    
+    async def collect_preview_snapshots(self, placements: List[Dict]) -> Dict:
+        """Пакетно получает состояние постов со страниц предпросмотра каналов"""
+        from app.telegram.telegram_preview_extractor import ChannelPreviewBatchExtractor
+        
+        posts = [key for key in (self._parse_post_key(p['post_url']) for p in placements) if key]
+        if not posts:
+            return {}
+        
+        try:
+            return await ChannelPreviewBatchExtractor().aextract(posts)
+        except Exception as e:
+            logger.error(f"❌ Ошибка пакетной проверки постов: {e}")
+            return {}
+    
     async def check_post_availability(self, post_url: str) -> bool:
         """Проверяет доступность конкретного поста"""
+        from app.telegram.telegram_web_fetcher import get_web_fetcher, build_post_embed_url
+        
         try:
             # Пытаемся получить пост через веб-интерфейс Telegram
-            if not post_url.startswith('https://t.me/'):
+            match = re.match(r'https://t\.me/([^/?]+)/(\d+)', post_url)
+            if not match:
                 return False
             
-            # Конвертируем в веб-версию для проверки
-            web_url = post_url.replace('https://t.me/', 'https://t.me/s/')
+            # Embed-страница поста - та же, что используют сбор статистики и парсер,
+            # поэтому одна загрузка из общего кэша обслуживает все проверки
+            web_url = build_post_embed_url(match.group(1), match.group(2))
             
-            async with self.session.get(web_url, timeout=10) as response:
-                if response.status == 200:
-                    html_content = await response.text()
-                    
-                    # Проверяем индикаторы удаленного поста
-                    deletion_indicators = [
-                        'Post not found',
-                        'This post was deleted',
-                        'Message not found',
-                        'tgme_widget_message_error',
-                        'Channel not found'
-                    ]
-                    
-                    content_lower = html_content.lower()
-                    for indicator in deletion_indicators:
-                        if indicator.lower() in content_lower:
-                            return False
-                    
-                    # Если найдено содержимое поста, он доступен
-                    return 'tgme_widget_message' in html_content
-                else:
-                    # Статус 404 или другие ошибки обычно означают удаление
-                    return response.status not in [404, 403, 410]
+            page = await get_web_fetcher().afetch(web_url, timeout=10)
+            if page.status == 200:
+                html_content = page.text
+                
+                # Проверяем индикаторы удаленного поста
+                deletion_indicators = [
+                    'Post not found',
+                    'This post was deleted',
+                    'Message not found',
+                    'tgme_widget_message_error',
+                    'Channel not found'
+                ]
+                
+                content_lower = html_content.lower()
+                for indicator in deletion_indicators:
+                    if indicator.lower() in content_lower:
+                        return False
+                
+                # Если найдено содержимое поста, он доступен
+                return 'tgme_widget_message' in html_content
+            else:
+                # Статус 404 или другие ошибки обычно означают удаление
+                return page.status not in [404, 403, 410]
                     
-        except asyncio.TimeoutError:
+        except requests.Timeout:
             logger.warning(f"⏱️ Таймаут при проверке поста: {post_url}")
             return True  # Считаем доступным при таймауте
         except Exception as e:
@@ -355,10 +410,10 @@ class PostDeletionMonitor:
 
 
 # Функция для планировщика
-async def monitor_post_deletions():
+async def monitor_post_deletions(adaptive: bool = False, shard: Optional[tuple] = None):
     """Основная функция мониторинга удаления постов"""
     monitor = PostDeletionMonitor()
-    results = await monitor.check_active_posts_availability()
+    results = await monitor.check_active_posts_availability(adaptive=adaptive, shard=shard)
     return results
 
 
@@ -11,6 +11,8 @@ import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
+from app.telegram.telegram_html_parser import extract_post_stats, extract_metadata_stats, parse_count
+
 logger = logging.getLogger(__name__)
 
 
@@ -20,9 +22,16 @@ class StatsCollector:
     def __init__(self):
         self.session = None
         
-    async def collect_placement_stats(self) -> List[Dict]:
-        """Собирает статистику для всех активных размещений"""
+    async def collect_placement_stats(self, adaptive: bool = False, shard: Optional[tuple] = None) -> List[Dict]:
+        """
+        Собирает статистику для активных размещений
+        
+        adaptive=True - только для размещений, которым пора на проверку
+        по адаптивному расписанию (PlacementCheckPlanner); shard - доля
+        размещений текущего экземпляра планировщика
+        """
         from app.models import execute_db_query
+        from app.services.placement_check_planner import PlacementCheckPlanner, CHECK_TYPE_STATS
         
         # Получаем активные размещения
         active_placements = execute_db_query("""
@@ -37,7 +46,16 @@ class StatsCollector:
             AND p.post_url IS NOT NULL
         """, fetch_all=True)
         
+        planner = None
+        if adaptive:
+            planner = PlacementCheckPlanner(CHECK_TYPE_STATS, shard=shard)
+            active_placements = planner.select_due(active_placements)
+        
         results = []
+        plans = []
+        
+        # Просмотры и реакции всех постов одним проходом по страницам каналов
+        snapshots = await self.collect_preview_snapshots(active_placements)
         
         async with aiohttp.ClientSession() as session:
             self.session = session
@@ -46,7 +64,7 @@ class StatsCollector:
                 try:
                     logger.info(f"📊 Собираем статистику для размещения {placement['id']}")
                     
-                    stats = await self.collect_post_stats(placement)
+                    stats = await self.collect_post_stats(placement, snapshots)
                     
                     if stats:
                         # Сохраняем статистику в БД
@@ -56,6 +74,8 @@ class StatsCollector:
                             'stats': stats,
                             'status': 'success'
                         })
+                        if planner:
+                            plans.append(planner.plan_next(placement, views=stats.get('views', 0)))
                     else:
                         results.append({
                             'placement_id': placement['id'],
@@ -70,9 +90,34 @@ class StatsCollector:
                         'error': str(e)
                     })
         
+        if planner:
+            # Неудачные попытки тоже переносятся, чтобы не повторять их каждый запуск
+            planned_ids = {plan['placement_id'] for plan in plans}
+            plans.extend(planner.plan_next(p) for p in active_placements if p['id'] not in planned_ids)
+            planner.record_checks(plans)
+        
         return results
     
-    async def collect_post_stats(self, placement: Dict) -> Optional[Dict]:
+    async def collect_preview_snapshots(self, placements: List[Dict]) -> Dict:
+        """Пакетно получает состояние постов со страниц предпросмотра каналов"""
+        from app.telegram.telegram_preview_extractor import ChannelPreviewBatchExtractor
+        
+        posts = []
+        for placement in placements:
+            url_info = self.parse_post_url(placement.get('post_url') or '')
+            if url_info and url_info['channel'] != 'c':  # приватные каналы без предпросмотра
+                posts.append((url_info['channel'], url_info['message_id']))
+        
+        if not posts:
+            return {}
+        
+        try:
+            return await ChannelPreviewBatchExtractor().aextract(posts)
+        except Exception as e:
+            logger.error(f"❌ Ошибка пакетного сбора статистики: {e}")
+            return {}
+    
+    async def collect_post_stats(self, placement: Dict, snapshots: Optional[Dict] = None) -> Optional[Dict]:
         """Собирает статистику конкретного поста"""
         post_url = placement.get('post_url')
         if not post_url:
@@ -96,8 +141,15 @@ class StatsCollector:
             'source': 'telegram_web'
         }
         
-        # Получаем статистику через веб-интерфейс Telegram
-        web_stats = await self.get_telegram_web_stats(channel_username, message_id)
+        # Сначала используем данные пакетной проверки страницы канала,
+        # отдельная загрузка поста нужна только если пост там не найден
+        snapshot = (snapshots or {}).get((channel_username, message_id))
+        if snapshot and snapshot.exists:
+            web_stats = {'views': snapshot.views, 'reactions': snapshot.reactions}
+            stats['source'] = 'telegram_preview'
+        else:
+            web_stats = await self.get_telegram_web_stats(channel_username, message_id)
+        
         if web_stats:
             stats.update(web_stats)
         
@@ -127,18 +179,19 @@ class StatsCollector:
     
     async def get_telegram_web_stats(self, channel_username: str, message_id: int) -> Optional[Dict]:
         """Получает статистику через веб-интерфейс Telegram"""
+        from app.telegram.telegram_web_fetcher import get_web_fetcher, build_post_embed_url
+        
         try:
-            url = f"https://t.me/{channel_username}/{message_id}?embed=1"
+            url = build_post_embed_url(channel_username, message_id)
             
-            async with self.session.get(url) as response:
-                if response.status != 200:
-                    return None
-                
-                html = await response.text()
-                
-                # Парсим HTML для извлечения статистики
-                stats = self.parse_telegram_html_stats(html)
-                return stats
+            # Страница берется из общего кэша t.me (ее же используют проверки удаления)
+            page = await get_web_fetcher().afetch(url)
+            if page.status != 200:
+                return None
+            
+            # Парсим HTML для извлечения статистики
+            stats = self.parse_telegram_html_stats(page.text)
+            return stats
                 
         except Exception as e:
             logger.error(f"❌ Ошибка получения веб-статистики для @{channel_username}/{message_id}: {e}")
@@ -154,69 +207,10 @@ class StatsCollector:
         }
         
         try:
-            # Улучшенный поиск количества просмотров с различными форматами
-            views_patterns = [
-                r'(\d+(?:[\.,]\d+)?[KMB]?)\s*(?:views?|просмотр)',
-                r'tgme_widget_message_views[^>]*>([^<]+)',
-                r'message_views[^>]*>.*?(\d+(?:[\.,]\d+)?[KMB]?)',
-                r'data-views="(\d+)"'
-            ]
-            
-            for pattern in views_patterns:
-                views_match = re.search(pattern, html, re.IGNORECASE)
-                if views_match:
-                    views_text = views_match.group(1).strip()
-                    stats['views'] = self.parse_number_with_suffix(views_text)
-                    break
-            
-            # Улучшенный поиск реакций
-            reactions_patterns = [
-                r'(\d+)\s*(?:reactions?|реакц)',
-                r'tgme_widget_message_reactions[^>]*>.*?(\d+)',
-                r'reactions_count[^>]*>(\d+)',
-                r'emoji_button[^>]*>.*?(\d+)'
-            ]
-            
-            for pattern in reactions_patterns:
-                reactions_match = re.search(pattern, html, re.IGNORECASE)
-                if reactions_match:
-                    stats['reactions'] = int(reactions_match.group(1))
-                    break
-            
-            # Улучшенный поиск репостов/пересылок
-            shares_patterns = [
-                r'(\d+)\s*(?:shares?|forwards?|репост|пересыл)',
-                r'tgme_widget_message_forwarded[^>]*>.*?(\d+)',
-                r'forwards_count[^>]*>(\d+)',
-                r'share_button[^>]*>.*?(\d+)'
-            ]
-            
-            for pattern in shares_patterns:
-                shares_match = re.search(pattern, html, re.IGNORECASE)
-                if shares_match:
-                    stats['shares'] = int(shares_match.group(1))
-                    break
-            
-            # Улучшенный поиск комментариев
-            comments_patterns = [
-                r'(\d+)\s*(?:comments?|коммент|ответ)',
-                r'tgme_widget_message_reply[^>]*>.*?(\d+)',
-                r'comments_count[^>]*>(\d+)',
-                r'reply_button[^>]*>.*?(\d+)'
-            ]
-            
-            for pattern in comments_patterns:
-                comments_match = re.search(pattern, html, re.IGNORECASE)
-                if comments_match:
-                    stats['comments'] = int(comments_match.group(1))
-                    break
-            
-            # Дополнительное извлечение из JSON-LD или meta-данных
-            additional_stats = self.parse_metadata_stats(html)
-            if additional_stats:
-                for key, value in additional_stats.items():
-                    if value > stats.get(key, 0):
-                        stats[key] = value
+            # Виджет поста и метаданные разбираются предкомпилированными XPath
+            post_stats = extract_post_stats(html)
+            for key in stats:
+                stats[key] = post_stats.get(key, 0)
                 
         except Exception as e:
             logger.error(f"❌ Ошибка парсинга HTML статистики: {e}")
@@ -225,78 +219,15 @@ class StatsCollector:
     
     def parse_metadata_stats(self, html: str) -> Dict:
         """Извлекает статистику из метаданных страницы"""
-        stats = {}
-        
         try:
-            # Поиск JSON-LD данных
-            json_ld_pattern = r'<script type="application/ld\+json">(.*?)</script>'
-            json_matches = re.findall(json_ld_pattern, html, re.DOTALL)
-            
-            for json_text in json_matches:
-                try:
-                    data = json.loads(json_text)
-                    if isinstance(data, dict):
-                        # Ищем статистику в структурированных данных
-                        if 'interactionStatistic' in data:
-                            interaction_stats = data['interactionStatistic']
-                            if isinstance(interaction_stats, list):
-                                for stat in interaction_stats:
-                                    if stat.get('@type') == 'InteractionCounter':
-                                        interaction_type = stat.get('interactionType', {}).get('@type', '')
-                                        count = stat.get('userInteractionCount', 0)
-                                        
-                                        if 'ViewAction' in interaction_type:
-                                            stats['views'] = max(stats.get('views', 0), int(count))
-                                        elif 'LikeAction' in interaction_type:
-                                            stats['reactions'] = max(stats.get('reactions', 0), int(count))
-                                        elif 'ShareAction' in interaction_type:
-                                            stats['shares'] = max(stats.get('shares', 0), int(count))
-                                        elif 'CommentAction' in interaction_type:
-                                            stats['comments'] = max(stats.get('comments', 0), int(count))
-                except json.JSONDecodeError:
-                    continue
-            
-            # Поиск Open Graph метаданных
-            og_patterns = {
-                'views': r'<meta property="og:views" content="(\d+)"',
-                'reactions': r'<meta property="og:reactions" content="(\d+)"',
-                'shares': r'<meta property="og:shares" content="(\d+)"',
-                'comments': r'<meta property="og:comments" content="(\d+)"'
-            }
-            
-            for stat_type, pattern in og_patterns.items():
-                match = re.search(pattern, html, re.IGNORECASE)
-                if match:
-                    stats[stat_type] = max(stats.get(stat_type, 0), int(match.group(1)))
-            
-            # Поиск Twitter Card данных
-            twitter_patterns = {
-                'views': r'<meta name="twitter:views" content="(\d+)"',
-                'reactions': r'<meta name="twitter:reactions" content="(\d+)"'
-            }
-            
-            for stat_type, pattern in twitter_patterns.items():
-                match = re.search(pattern, html, re.IGNORECASE)
-                if match:
-                    stats[stat_type] = max(stats.get(stat_type, 0), int(match.group(1)))
-                    
+            return extract_metadata_stats(html)
         except Exception as e:
             logger.error(f"❌ Ошибка парсинга метаданных: {e}")
-        
-        return stats
+            return {}
     
     def parse_number_with_suffix(self, number_str: str) -> int:
         """Парсит числа с суффиксами K, M, B"""
-        number_str = number_str.upper().strip()
-        
-        if number_str.endswith('K'):
-            return int(float(number_str[:-1]) * 1000)
-        elif number_str.endswith('M'):
-            return int(float(number_str[:-1]) * 1000000)
-        elif number_str.endswith('B'):
-            return int(float(number_str[:-1]) * 1000000000)
-        else:
-            return int(float(number_str))
+        return parse_count(number_str)
     
     async def get_alternative_stats(self, channel_username: str, message_id: int) -> Optional[Dict]:
         """Получает статистику из альтернативных источников"""
@@ -333,8 +264,11 @@ class StatsCollector:
     async def save_stats_to_db(self, placement_id: int, stats: Dict):
         """Сохраняет статистику в базу данных"""
         from app.models import execute_db_query
+        from app.services.placement_latest_stats import ensure_latest_stats_schema
         
         try:
+            ensure_latest_stats_schema()
+            
             # Создаем запись статистики
             execute_db_query("""
                 INSERT INTO placement_statistics (
@@ -437,17 +371,15 @@ def create_stats_tables():
         )
     """)
     
-    # Индекс для быстрого поиска
-    execute_db_query("""
-        CREATE INDEX IF NOT EXISTS idx_placement_stats_placement_id 
-        ON placement_statistics(placement_id)
-    """)
-    
     # Индекс по времени сбора
     execute_db_query("""
         CREATE INDEX IF NOT EXISTS idx_placement_stats_collected_at 
         ON placement_statistics(collected_at)
     """)
+    
+    # Последняя статистика размещений и покрывающий индекс истории по placement_id
+    from app.services.placement_latest_stats import ensure_latest_stats_schema
+    ensure_latest_stats_schema()
 
 
 if __name__ == "__main__":
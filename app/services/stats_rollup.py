@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Свертка истории статистики размещений
+Сырые замеры (placement_statistics и placement_checks) сворачиваются в
+часовые и дневные интервалы: число замеров, минимум, максимум, последнее
+значение и прирост просмотров, реакций и репостов. Сырые замеры и часовые
+интервалы удаляются движком хранения (см. data_retention) после свертки,
+дневные хранятся постоянно. Графики берут разрешение по длине периода
+"""
+
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from app.config.telegram_config import (
+    AppConfig, STATS_RAW_TTL_DAYS, STATS_HOURLY_TTL_DAYS, STATS_ROLLUP_GRACE_MINUTES
+)
+
+logger = logging.getLogger(__name__)
+
+RESOLUTION_RAW = 'raw'
+RESOLUTION_HOUR = 'hour'
+RESOLUTION_DAY = 'day'
+
+SOURCE_STATS = 'stats'
+SOURCE_CHECKS = 'checks'
+
+# Источники сырых замеров: таблица и выражения времени и счетчиков.
+# Время замера берется в UTC, как у отметок свертки: collected_at пишется
+# по местным часам сервера, поэтому замеры раскладываются по created_at
+ROLLUP_SOURCES = {
+    SOURCE_STATS: {
+        'table': 'placement_statistics',
+        'time': 'created_at',
+        'views': 'COALESCE(views_count, 0)',
+        'reactions': 'COALESCE(reactions_count, 0)',
+        'shares': 'COALESCE(shares_count, 0)',
+    },
+    SOURCE_CHECKS: {
+        'table': 'placement_checks',
+        'time': 'check_time',
+        'views': 'COALESCE(views_count, 0)',
+        'reactions': '0',
+        'shares': '0',
+    },
+}
+
+METRICS = ('views', 'reactions', 'shares')
+
+# Максимальная длина периода графика для сырых замеров и часовых интервалов
+SERIES_RAW_MAX_HOURS = 48
+SERIES_HOURLY_MAX_HOURS = 14 * 24
+
+_EPOCH = '1970-01-01 00:00:00'
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_METRIC_COLUMNS = ', '.join(
+    f'{metric}_min, {metric}_max, {metric}_last, {metric}_delta' for metric in METRICS
+)
+_METRIC_UPDATES = ',\n'.join(
+    f'{metric}_{part} = excluded.{metric}_{part}'
+    for metric in METRICS for part in ('min', 'max', 'last', 'delta')
+)
+
+_tables_ready = False
+
+
+def _ensure_tables(conn: sqlite3.Connection):
+    global _tables_ready
+    if _tables_ready:
+        return
+
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS placement_stats_rollups (
+            id INTEGER PRIMARY KEY,
+            placement_id INTEGER NOT NULL,
+            source TEXT NOT NULL,
+            resolution TEXT NOT NULL,
+            bucket_start TIMESTAMP NOT NULL,
+            samples INTEGER DEFAULT 0,
+            views_sum INTEGER DEFAULT 0,
+            {', '.join(f'{m}_min INTEGER, {m}_max INTEGER, {m}_last INTEGER, {m}_delta INTEGER DEFAULT 0' for m in METRICS)},
+            first_at TIMESTAMP,
+            last_at TIMESTAMP,
+            UNIQUE (placement_id, source, resolution, bucket_start)
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_placement_stats_rollups_bucket
+        ON placement_stats_rollups(resolution, bucket_start)
+    """)
+    # Докуда свернуты сырые данные (часы) и часовые интервалы (дни)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stats_rollup_state (
+            source TEXT NOT NULL,
+            resolution TEXT NOT NULL,
+            watermark TIMESTAMP NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (source, resolution)
+        )
+    """)
+    # Счетчики проверок по статусам за все время (сырые проверки удаляются по сроку)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS placement_check_totals (
+            placement_id INTEGER NOT NULL,
+            check_status TEXT NOT NULL,
+            checks_count INTEGER DEFAULT 0,
+            views_sum INTEGER DEFAULT 0,
+            PRIMARY KEY (placement_id, check_status)
+        )
+    """)
+    _tables_ready = True
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(AppConfig.DATABASE_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _db_now(conn: sqlite3.Connection) -> datetime:
+    """Текущее время по часам SQLite (UTC, как CURRENT_TIMESTAMP в замерах)"""
+    return datetime.strptime(conn.execute("SELECT datetime('now')").fetchone()[0], _TIME_FORMAT)
+
+
+def _get_watermark(conn: sqlite3.Connection, source: str, resolution: str) -> str:
+    row = conn.execute(
+        "SELECT watermark FROM stats_rollup_state WHERE source = ? AND resolution = ?", (source, resolution)
+    ).fetchone()
+    return row['watermark'] if row else _EPOCH
+
+
+def _set_watermark(conn: sqlite3.Connection, source: str, resolution: str, watermark: str):
+    conn.execute("""
+        INSERT INTO stats_rollup_state (source, resolution, watermark, updated_at)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(source, resolution) DO UPDATE SET
+            watermark = excluded.watermark,
+            updated_at = excluded.updated_at
+    """, (source, resolution, watermark))
+
+
+def _rollup_hourly(conn: sqlite3.Connection, source: str, window_start: str) -> int:
+    """
+    Пересчитывает часовые интервалы начиная с window_start по сырым замерам
+
+    Прирост считается от предыдущего замера размещения, а для первого замера
+    окна - от последнего значения уже свернутого интервала, поэтому сумма
+    приростов по любым интервалам равна полному приросту.
+    """
+    config = ROLLUP_SOURCES[source]
+    lag_columns = ',\n'.join(f"""
+        {metric} - COALESCE(
+            LAG({metric}) OVER w,
+            (SELECT r.{metric}_last FROM placement_stats_rollups r
+             WHERE r.placement_id = s.placement_id AND r.source = :source
+               AND r.resolution = 'hour' AND r.bucket_start < :window_start
+             ORDER BY r.bucket_start DESC LIMIT 1),
+            0
+        ) as {metric}_delta""" for metric in METRICS)
+    aggregates = ',\n'.join(f"""
+        MIN({metric}), MAX({metric}), MAX(CASE WHEN rn_last = 1 THEN {metric} END), SUM({metric}_delta)"""
+        for metric in METRICS)
+
+    changes_before = conn.total_changes
+    conn.execute(f"""
+        WITH samples AS (
+            SELECT id, placement_id, datetime({config['time']}) as ts,
+                   {config['views']} as views, {config['reactions']} as reactions, {config['shares']} as shares
+            FROM {config['table']}
+            WHERE datetime({config['time']}) >= :window_start
+        ),
+        ordered AS (
+            SELECT s.*,
+                   strftime('%Y-%m-%d %H:00:00', s.ts) as bucket,
+                   {lag_columns},
+                   ROW_NUMBER() OVER (
+                       PARTITION BY s.placement_id, strftime('%Y-%m-%d %H', s.ts) ORDER BY s.ts DESC, s.id DESC
+                   ) as rn_last
+            FROM samples s
+            WINDOW w AS (PARTITION BY s.placement_id ORDER BY s.ts, s.id)
+        )
+        INSERT INTO placement_stats_rollups (
+            placement_id, source, resolution, bucket_start, samples, views_sum,
+            {_METRIC_COLUMNS}, first_at, last_at
+        )
+        SELECT placement_id, :source, 'hour', bucket, COUNT(*), SUM(views),
+               {aggregates}, MIN(ts), MAX(ts)
+        FROM ordered
+        WHERE true
+        GROUP BY placement_id, bucket
+        ON CONFLICT(placement_id, source, resolution, bucket_start) DO UPDATE SET
+            samples = excluded.samples,
+            views_sum = excluded.views_sum,
+            {_METRIC_UPDATES},
+            first_at = excluded.first_at,
+            last_at = excluded.last_at
+    """, {'source': source, 'window_start': window_start})
+    # rowcount для INSERT ... SELECT с ON CONFLICT не заполняется
+    return conn.total_changes - changes_before
+
+
+def _rollup_daily(conn: sqlite3.Connection, source: str, day_start: str) -> int:
+    """Пересчитывает дневные интервалы начиная с day_start по часовым"""
+    aggregates = ',\n'.join(f"""
+        MIN({metric}_min), MAX({metric}_max), MAX(CASE WHEN rn_last = 1 THEN {metric}_last END), SUM({metric}_delta)"""
+        for metric in METRICS)
+
+    changes_before = conn.total_changes
+    conn.execute(f"""
+        WITH hours AS (
+            SELECT r.*,
+                   date(r.bucket_start) || ' 00:00:00' as day,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY r.placement_id, date(r.bucket_start) ORDER BY r.bucket_start DESC
+                   ) as rn_last
+            FROM placement_stats_rollups r
+            WHERE r.source = :source AND r.resolution = 'hour' AND r.bucket_start >= :day_start
+        )
+        INSERT INTO placement_stats_rollups (
+            placement_id, source, resolution, bucket_start, samples, views_sum,
+            {_METRIC_COLUMNS}, first_at, last_at
+        )
+        SELECT placement_id, :source, 'day', day, SUM(samples), SUM(views_sum),
+               {aggregates}, MIN(first_at), MAX(last_at)
+        FROM hours
+        WHERE true
+        GROUP BY placement_id, day
+        ON CONFLICT(placement_id, source, resolution, bucket_start) DO UPDATE SET
+            samples = excluded.samples,
+            views_sum = excluded.views_sum,
+            {_METRIC_UPDATES},
+            first_at = excluded.first_at,
+            last_at = excluded.last_at
+    """, {'source': source, 'day_start': day_start})
+    # rowcount для INSERT ... SELECT с ON CONFLICT не заполняется
+    return conn.total_changes - changes_before
+
+
+def _accumulate_check_totals(conn: sqlite3.Connection, window_start: str, window_end: str):
+    """Добавляет к счетчикам проверок полностью свернутые часы [window_start, window_end)"""
+    conn.execute("""
+        INSERT INTO placement_check_totals (placement_id, check_status, checks_count, views_sum)
+        SELECT placement_id, COALESCE(check_status, 'unknown'), COUNT(*), SUM(COALESCE(views_count, 0))
+        FROM placement_checks
+        WHERE datetime(check_time) >= ? AND datetime(check_time) < ?
+        GROUP BY placement_id, COALESCE(check_status, 'unknown')
+        ON CONFLICT(placement_id, check_status) DO UPDATE SET
+            checks_count = checks_count + excluded.checks_count,
+            views_sum = views_sum + excluded.views_sum
+    """, (window_start, window_end))
+
+
+def rollup_statistics(now: datetime = None) -> Dict[str, Any]:
+    """
+    Сворачивает новые сырые замеры в часовые и дневные интервалы
+
+    Каждый источник обрабатывается одной транзакцией. Пересчитываются
+    интервалы начиная с отметки прошлого запуска, текущий незавершенный час
+    тоже попадает в свертку и будет пересчитан следующим запуском. Время
+    берется по часам SQLite (UTC, как у замеров), а отметка отстает от него
+    на STATS_ROLLUP_GRACE_MINUTES: замеры, записанные с опозданием, еще
+    попадают в пересчет, а не остаются за отметкой (после нее их удалит
+    движок хранения).
+    """
+    report: Dict[str, Any] = {}
+
+    conn = _connect()
+    try:
+        _ensure_tables(conn)
+        settled = (now or _db_now(conn)) - timedelta(minutes=STATS_ROLLUP_GRACE_MINUTES)
+        hour_mark = settled.replace(minute=0, second=0, microsecond=0).strftime(_TIME_FORMAT)
+        day_mark = settled.strftime('%Y-%m-%d 00:00:00')
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+        for source, config in ROLLUP_SOURCES.items():
+            if config['table'] not in tables:
+                report[source] = {'status': 'skipped', 'reason': 'table not found'}
+                continue
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                hourly_mark = _get_watermark(conn, source, RESOLUTION_HOUR)
+                daily_mark = _get_watermark(conn, source, RESOLUTION_DAY)
+
+                hourly = _rollup_hourly(conn, source, hourly_mark)
+                daily = _rollup_daily(conn, source, daily_mark[:10] + ' 00:00:00')
+                if source == SOURCE_CHECKS and hourly_mark < hour_mark:
+                    _accumulate_check_totals(conn, hourly_mark, hour_mark)
+
+                _set_watermark(conn, source, RESOLUTION_HOUR, max(hourly_mark, hour_mark))
+                _set_watermark(conn, source, RESOLUTION_DAY, max(daily_mark, day_mark))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            report[source] = {'status': 'completed', 'hourly_buckets': hourly, 'daily_buckets': daily}
+    finally:
+        conn.close()
+
+    return report
+
+
+# ===== ЧТЕНИЕ ГРАФИКОВ =====
+
+def pick_resolution(range_hours: float, now: datetime = None, min_resolution: str = RESOLUTION_RAW) -> str:
+    """
+    Разрешение графика по длине периода
+
+    Сырые замеры - для коротких периодов в пределах срока их хранения,
+    часовые интервалы - до двух недель, дальше - дневные.
+    """
+    if min_resolution == RESOLUTION_RAW and range_hours <= min(SERIES_RAW_MAX_HOURS, STATS_RAW_TTL_DAYS * 24):
+        return RESOLUTION_RAW
+    if min_resolution != RESOLUTION_DAY and range_hours <= min(SERIES_HOURLY_MAX_HOURS, STATS_HOURLY_TTL_DAYS * 24):
+        return RESOLUTION_HOUR
+    return RESOLUTION_DAY
+
+
+def _metric_point(row: Dict, metric: str) -> Dict[str, Any]:
+    return {
+        'min': row[f'{metric}_min'],
+        'max': row[f'{metric}_max'],
+        'last': row[f'{metric}_last'],
+        'delta': row[f'{metric}_delta']
+    }
+
+
+def _raw_series(conn: sqlite3.Connection, placement_id: int, source: str, since: str) -> List[Dict]:
+    config = ROLLUP_SOURCES[source]
+    rows = conn.execute(f"""
+        SELECT datetime({config['time']}) as ts,
+               {config['views']} as views, {config['reactions']} as reactions, {config['shares']} as shares
+        FROM {config['table']}
+        WHERE placement_id = ? AND datetime({config['time']}) >= ?
+        ORDER BY ts, id
+    """, (placement_id, since)).fetchall()
+
+    points = []
+    previous = None
+    for row in rows:
+        point = {'time': row['ts'], 'samples': 1}
+        for metric in METRICS:
+            value = row[metric]
+            delta = value - previous[metric] if previous else 0
+            point[metric] = {'min': value, 'max': value, 'last': value, 'delta': delta}
+        points.append(point)
+        previous = row
+    return points
+
+
+def get_placement_series(placement_id: int, range_hours: float, source: str = SOURCE_STATS,
+                         now: datetime = None) -> Dict[str, Any]:
+    """История просмотров, реакций и репостов размещения за последние range_hours часов"""
+    conn = _connect()
+    try:
+        _ensure_tables(conn)
+        now = now or _db_now(conn)
+        resolution = pick_resolution(range_hours, now)
+        since = (now - timedelta(hours=range_hours)).strftime(_TIME_FORMAT)
+
+        if resolution == RESOLUTION_RAW:
+            points = _raw_series(conn, placement_id, source, since)
+        else:
+            since_bucket = since[:10] + ' 00:00:00' if resolution == RESOLUTION_DAY else since[:13] + ':00:00'
+            rows = conn.execute("""
+                SELECT * FROM placement_stats_rollups
+                WHERE placement_id = ? AND source = ? AND resolution = ? AND bucket_start >= ?
+                ORDER BY bucket_start
+            """, (placement_id, source, resolution, since_bucket)).fetchall()
+            points = [
+                {'time': row['bucket_start'], 'samples': row['samples'],
+                 **{metric: _metric_point(row, metric) for metric in METRICS}}
+                for row in rows
+            ]
+    finally:
+        conn.close()
+
+    return {'resolution': resolution, 'range_hours': range_hours, 'source': source, 'points': points}
+
+
+def get_placements_views_series(placement_ids: List[int], range_hours: float, source: str = SOURCE_STATS,
+                                now: datetime = None) -> Dict[str, Any]:
+    """
+    Суммарный прирост просмотров группы размещений (например, оффера) по интервалам
+
+    Сумма последних значений разных размещений в одном интервале неточна
+    (не у всех есть замер), поэтому для группы отдается прирост.
+    """
+    resolution = pick_resolution(range_hours, now, min_resolution=RESOLUTION_HOUR)
+
+    points = []
+    if placement_ids:
+        conn = _connect()
+        try:
+            _ensure_tables(conn)
+            since = ((now or _db_now(conn)) - timedelta(hours=range_hours)).strftime(_TIME_FORMAT)
+            since_bucket = since[:10] + ' 00:00:00' if resolution == RESOLUTION_DAY else since[:13] + ':00:00'
+            placeholders = ','.join('?' * len(placement_ids))
+            rows = conn.execute(f"""
+                SELECT bucket_start, SUM(samples) as samples, SUM(views_delta) as views_gained
+                FROM placement_stats_rollups
+                WHERE placement_id IN ({placeholders}) AND source = ? AND resolution = ? AND bucket_start >= ?
+                GROUP BY bucket_start
+                ORDER BY bucket_start
+            """, (*placement_ids, source, resolution, since_bucket)).fetchall()
+        finally:
+            conn.close()
+        points = [dict(row) for row in rows]
+
+    return {'resolution': resolution, 'range_hours': range_hours, 'source': source, 'points': points}
+
+
+def get_check_status_totals(placement_ids: List[int]) -> Dict[str, Dict[str, Any]]:
+    """
+    Число проверок и средние просмотры по статусам за все время
+
+    Свернутая часть берется из placement_check_totals, еще не свернутая -
+    из сырых проверок после отметки свертки.
+    """
+    if not placement_ids:
+        return {}
+
+    conn = _connect()
+    try:
+        _ensure_tables(conn)
+        watermark = _get_watermark(conn, SOURCE_CHECKS, RESOLUTION_HOUR)
+        placeholders = ','.join('?' * len(placement_ids))
+        rows = conn.execute(f"""
+            SELECT check_status, SUM(checks_count) as count, SUM(views_sum) as views_sum
+            FROM (
+                SELECT check_status, checks_count, views_sum
+                FROM placement_check_totals
+                WHERE placement_id IN ({placeholders})
+                UNION ALL
+                SELECT COALESCE(check_status, 'unknown'), 1, COALESCE(views_count, 0)
+                FROM placement_checks
+                WHERE placement_id IN ({placeholders}) AND datetime(check_time) >= ?
+            )
+            GROUP BY check_status
+        """, (*placement_ids, *placement_ids, watermark)).fetchall()
+    finally:
+        conn.close()
+
+    return {
+        row['check_status']: {
+            'count': row['count'],
+            'avg_views': round(row['views_sum'] / row['count'], 2) if row['count'] else 0
+        }
+        for row in rows
+    }
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Счетчики пользователя
+Таблица user_counters хранит по одной строке на пользователя с готовыми
+агрегатами: каналы, офферы и предложения по статусам, отклики, размещения,
+просмотры, доход, расходы и изменения баланса. Строки обновляют триггеры в
+той же транзакции, что и запись исходных данных, поэтому дашборды читают
+статистику одним поиском по первичному ключу. Задача сверки пересчитывает
+счетчики из исходных таблиц и исправляет расхождения (каскадные удаления,
+смена владельца канала, ручные правки БД)
+"""
+
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from app.config.telegram_config import AppConfig
+
+logger = logging.getLogger(__name__)
+
+
+def _flag(condition: str) -> str:
+    return f"CASE WHEN {condition} THEN 1 ELSE 0 END"
+
+
+def _status_flags(prefix: str, statuses: List[str]) -> Dict[str, str]:
+    return {f"{prefix}_{status}": _flag(f"{{row}}.status = '{status}'") for status in statuses}
+
+
+class CounterSource(NamedTuple):
+    """
+    Источник счетчиков: вклад строки table в счетчики ее владельца
+
+    owner и выражения columns используют {row} (NEW, OLD или псевдоним
+    таблицы при сверке).
+    """
+    name: str
+    table: str
+    watch: str
+    owner: str
+    columns: Dict[str, str]
+
+
+_CHANNEL_OWNER = "(SELECT owner_id FROM channels WHERE id = {row}.channel_id)"
+_PROPOSAL_OWNER = ("(SELECT c.owner_id FROM offer_proposals p JOIN channels c ON c.id = p.channel_id"
+                   " WHERE p.id = {row}.proposal_id)")
+_PLACEMENT_OWNER = ("(SELECT c.owner_id FROM offer_placements pl"
+                    " JOIN offer_proposals p ON p.id = pl.proposal_id"
+                    " JOIN channels c ON c.id = p.channel_id WHERE pl.id = {row}.placement_id)")
+_COMPLETED_AMOUNT = "CASE WHEN {row}.status = 'completed' THEN COALESCE({row}.amount, 0) ELSE 0 END"
+
+COUNTER_SOURCES = (
+    CounterSource('channels', 'channels', 'owner_id, is_active, is_verified, subscriber_count', '{row}.owner_id', {
+        'channels_active': _flag("{row}.is_active = 1"),
+        'channels_verified': _flag("{row}.is_active = 1 AND {row}.is_verified = 1"),
+        'subscribers_total': "CASE WHEN {row}.is_active = 1 THEN COALESCE({row}.subscriber_count, 0) ELSE 0 END",
+    }),
+    # Офферы рекламодателя (created_by, как в OfferRepository)
+    CounterSource('offers', 'offers', 'created_by, status, price, budget_total', '{row}.created_by', {
+        'offers_total': '1',
+        **_status_flags('offers', ['draft', 'active', 'paused', 'completed', 'cancelled', 'expired']),
+        'offers_budget_total': "CASE WHEN {row}.price > 0 THEN {row}.price ELSE COALESCE({row}.budget_total, 0) END",
+    }),
+    # Предложения, полученные каналами пользователя
+    CounterSource('proposals', 'offer_proposals', 'channel_id, status', _CHANNEL_OWNER, {
+        'proposals_total': '1',
+        **_status_flags('proposals', ['sent', 'accepted', 'rejected', 'expired', 'cancelled']),
+    }),
+    # Отклики на офферы пользователя
+    CounterSource('responses', 'offer_responses', 'offer_id, status',
+                  "(SELECT created_by FROM offers WHERE id = {row}.offer_id)", {
+        'responses_total': '1',
+        'responses_accepted': _flag("{row}.status = 'accepted'"),
+    }),
+    # Отклики от каналов пользователя
+    CounterSource('channel_responses', 'offer_responses', 'channel_id, status', _CHANNEL_OWNER, {
+        'channel_responses_total': '1',
+        **_status_flags('channel_responses', ['pending', 'accepted', 'rejected']),
+    }),
+    CounterSource('placements', 'offer_placements', 'proposal_id, status', _PROPOSAL_OWNER, {
+        'placements_total': '1',
+        'placements_completed': _flag("{row}.status = 'completed'"),
+    }),
+    CounterSource('placement_views', 'placement_statistics', 'placement_id, views_count, reactions_count',
+                  _PLACEMENT_OWNER, {
+        'views_total': "COALESCE({row}.views_count, 0)",
+        'reactions_total': "COALESCE({row}.reactions_count, 0)",
+    }),
+    CounterSource('campaigns', 'campaigns', 'created_by, status', '{row}.created_by', {
+        'campaigns_total': '1',
+        'campaigns_active': _flag("{row}.status = 'active'"),
+    }),
+    # Доход и расходы - завершенные платежи
+    CounterSource('revenue', 'payments', 'publisher_id, status, amount', '{row}.publisher_id', {
+        'revenue_total': _COMPLETED_AMOUNT,
+    }),
+    CounterSource('spend', 'payments', 'advertiser_id, status, amount', '{row}.advertiser_id', {
+        'spend_total': _COMPLETED_AMOUNT,
+    }),
+)
+
+# Счетчики, которые можно пересчитать из исходных таблиц
+DERIVED_COLUMNS = [column for source in COUNTER_SOURCES for column in source.columns]
+
+# Изменения баланса копятся триггером на users.balance; истории изменений
+# в БД нет, поэтому сверка их не трогает
+BALANCE_COLUMNS = ['balance_credited', 'balance_debited', 'balance_changes']
+
+_MONEY_COLUMNS = {'offers_budget_total', 'revenue_total', 'spend_total', 'balance_credited', 'balance_debited'}
+
+_BALANCE_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS trg_user_counters_balance
+    AFTER UPDATE OF balance ON users
+    WHEN NEW.balance IS NOT OLD.balance
+    BEGIN
+        INSERT INTO user_counters (user_id, balance_credited, balance_debited, balance_changes)
+        SELECT NEW.id,
+               MAX(COALESCE(NEW.balance, 0) - COALESCE(OLD.balance, 0), 0),
+               MAX(COALESCE(OLD.balance, 0) - COALESCE(NEW.balance, 0), 0),
+               1
+        WHERE 1
+        ON CONFLICT(user_id) DO UPDATE SET
+            balance_credited = balance_credited + excluded.balance_credited,
+            balance_debited = balance_debited + excluded.balance_debited,
+            balance_changes = balance_changes + 1,
+            updated_at = CURRENT_TIMESTAMP;
+    END
+"""
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _apply_sql(source: CounterSource, row: str, sign: str) -> str:
+    """Прибавление (sign='+') или вычитание вклада строки row у ее владельца"""
+    columns = list(source.columns)
+    values = ', '.join(f"{sign}({source.columns[column].format(row=row)})" for column in columns)
+    updates = ', '.join(f"{column} = {column} + excluded.{column}" for column in columns)
+    return f"""
+        INSERT INTO user_counters (user_id, {', '.join(columns)})
+        SELECT owner_id, {values} FROM (SELECT {source.owner.format(row=row)} as owner_id)
+        WHERE owner_id IS NOT NULL
+        ON CONFLICT(user_id) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP;
+    """
+
+
+def _source_triggers(source: CounterSource) -> List[str]:
+    prefix = f"trg_user_counters_{source.name}"
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {prefix}_insert AFTER INSERT ON {source.table}
+            BEGIN {_apply_sql(source, 'NEW', '+')} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {prefix}_delete AFTER DELETE ON {source.table}
+            BEGIN {_apply_sql(source, 'OLD', '-')} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {prefix}_update AFTER UPDATE OF {source.watch} ON {source.table}
+            BEGIN {_apply_sql(source, 'OLD', '-')} {_apply_sql(source, 'NEW', '+')} END""",
+    ]
+
+
+def _install(conn: sqlite3.Connection) -> bool:
+    """
+    Создает таблицу и недостающие триггеры (в транзакции conn)
+
+    Возвращает True, если триггеры появились впервые - тогда счетчики нужно
+    заполнить сверкой в той же транзакции.
+    """
+    column_defs = ',\n'.join(
+        f"{column} {'REAL' if column in _MONEY_COLUMNS else 'INTEGER'} NOT NULL DEFAULT 0"
+        for column in DERIVED_COLUMNS + BALANCE_COLUMNS
+    )
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS user_counters (
+            user_id INTEGER PRIMARY KEY,
+            {column_defs},
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+    created = False
+    for source in COUNTER_SOURCES:
+        if source.table not in existing or f"trg_user_counters_{source.name}_update" in existing:
+            continue
+        for trigger_sql in _source_triggers(source):
+            conn.execute(trigger_sql)
+        created = True
+    if 'trg_user_counters_balance' not in existing:
+        conn.execute(_BALANCE_TRIGGER)
+    return created
+
+
+def _expected_counters(conn: sqlite3.Connection) -> Dict[int, Dict[str, float]]:
+    """Счетчики, пересчитанные из исходных таблиц"""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    expected: Dict[int, Dict[str, float]] = {}
+    for source in COUNTER_SOURCES:
+        if source.table not in tables:
+            continue
+        columns = list(source.columns)
+        sums = ', '.join(f"SUM({source.columns[column].format(row='t')})" for column in columns)
+        rows = conn.execute(f"""
+            SELECT {source.owner.format(row='t')} as counter_owner, {sums}
+            FROM {source.table} t
+            GROUP BY counter_owner
+        """).fetchall()
+        for row in rows:
+            if row[0] is None:
+                continue
+            counters = expected.setdefault(row[0], {})
+            for column, value in zip(columns, row[1:]):
+                counters[column] = counters.get(column, 0) + (value or 0)
+    return expected
+
+
+def _reconcile(conn: sqlite3.Connection, repair: bool = True) -> Dict[str, Any]:
+    """Сверка сохраненных счетчиков с исходными таблицами (в транзакции conn)"""
+    expected = _expected_counters(conn)
+    stored = {
+        row[0]: dict(zip(DERIVED_COLUMNS, row[1:]))
+        for row in conn.execute(f"SELECT user_id, {', '.join(DERIVED_COLUMNS)} FROM user_counters")
+    }
+
+    drifted = {}
+    for user_id in expected.keys() | stored.keys():
+        target = {column: expected.get(user_id, {}).get(column, 0) for column in DERIVED_COLUMNS}
+        current = stored.get(user_id)
+        if current is None:
+            if any(target.values()):
+                drifted[user_id] = target
+            continue
+        for column in DERIVED_COLUMNS:
+            if round(float(current[column] or 0) - float(target[column]), 2) != 0:
+                drifted[user_id] = target
+                break
+
+    if repair and drifted:
+        updates = ', '.join(f"{column} = excluded.{column}" for column in DERIVED_COLUMNS)
+        placeholders = ', '.join('?' for _ in DERIVED_COLUMNS)
+        conn.executemany(f"""
+            INSERT INTO user_counters (user_id, {', '.join(DERIVED_COLUMNS)})
+            VALUES (?, {placeholders})
+            ON CONFLICT(user_id) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP
+        """, [(user_id, *(target[column] for column in DERIVED_COLUMNS)) for user_id, target in drifted.items()])
+
+    return {
+        'checked': len(expected.keys() | stored.keys()),
+        'drifted': len(drifted),
+        'repaired': len(drifted) if repair else 0,
+        'drifted_users': sorted(drifted)[:20]
+    }
+
+
+def ensure_user_counters_schema():
+    """Создает user_counters и триггеры; при первом создании заполняет счетчики"""
+    global _schema_ready
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+
+        conn = sqlite3.connect(AppConfig.DATABASE_PATH, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if _install(conn):
+                    result = _reconcile(conn)
+                    logger.info(f"✅ Счетчики пользователей заполнены: {result['repaired']} пользователей")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания user_counters: {e}")
+            return
+        finally:
+            conn.close()
+
+        _schema_ready = True
+
+
+def reconcile_user_counters(repair: bool = True) -> Dict[str, Any]:
+    """
+    Проверяет счетчики всех пользователей и исправляет расхождения
+
+    Пересчет и исправление идут под блокировкой записи, поэтому триггеры
+    параллельных транзакций не теряются между ними.
+    """
+    ensure_user_counters_schema()
+
+    conn = sqlite3.connect(AppConfig.DATABASE_PATH, timeout=30, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Триггеры для таблиц, созданных после запуска
+            _install(conn)
+            result = _reconcile(conn, repair=repair)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+    if result['drifted']:
+        logger.warning(
+            f"⚠️ Расхождение счетчиков у {result['drifted']} пользователей "
+            f"(исправлено: {result['repaired']}), например: {result['drifted_users'][:5]}"
+        )
+    return result
+
+
+def get_user_counters(user_id: int) -> Optional[Dict[str, Any]]:
+    """Баланс и счетчики пользователя одним поиском по ключу (None - нет пользователя)"""
+    from app.models.database import execute_db_query
+
+    ensure_user_counters_schema()
+
+    row = execute_db_query(f"""
+        SELECT u.balance, {', '.join(f'uc.{column}' for column in DERIVED_COLUMNS + BALANCE_COLUMNS)}
+        FROM users u LEFT JOIN user_counters uc ON uc.user_id = u.id
+        WHERE u.id = ?
+    """, (user_id,), fetch_one=True)
+    if not row:
+        return None
+
+    return {column: value or 0 for column, value in row.items()}
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Метрики пользователя для дашборда аналитики
+Метрики берутся из счетчиков user_counters, ряды графиков считаются одним
+запросом с CTE, результат кэшируется в процессе по пользователю. Кэш
+сверяется с версией данных пользователя в user_data_versions: ее
+увеличивают триггеры на таблицах, из которых строятся метрики, поэтому
+любая запись (API, бот, планировщик) делает кэш устаревшим без явной
+инвалидации, а проверка актуальности - поиск по первичному ключу
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.config.telegram_config import AppConfig, USER_METRICS_CACHE_SIZE
+from app.services.user_counters import get_user_counters
+
+logger = logging.getLogger(__name__)
+
+# Таблица -> (столбцы для UPDATE OF, выражение пользователя-владельца строки)
+# {row} заменяется на NEW или OLD
+_VERSION_SOURCES = (
+    ('users', 'balance', "{row}.id"),
+    ('channels', 'owner_id, subscriber_count, is_verified, is_active', "{row}.owner_id"),
+    ('offers', 'created_by, status, price, budget_total, category', "{row}.created_by"),
+    ('offer_proposals', 'channel_id, status',
+     "(SELECT owner_id FROM channels WHERE id = {row}.channel_id)"),
+    ('offer_responses', 'offer_id, status',
+     "(SELECT created_by FROM offers WHERE id = {row}.offer_id)"),
+    ('offer_placements', 'proposal_id, status',
+     "(SELECT c.owner_id FROM offer_proposals p JOIN channels c ON c.id = p.channel_id"
+     " WHERE p.id = {row}.proposal_id)"),
+    ('placement_statistics', 'placement_id, views_count, reactions_count, collected_at',
+     "(SELECT c.owner_id FROM offer_placements pl"
+     " JOIN offer_proposals p ON p.id = pl.proposal_id"
+     " JOIN channels c ON c.id = p.channel_id WHERE pl.id = {row}.placement_id)"),
+    ('campaigns', 'created_by, status, budget_limit, created_at', "{row}.created_by"),
+)
+
+_BUMP_SQL = """
+    INSERT INTO user_data_versions (user_id, version)
+    SELECT owner_id, 1 FROM ({owners}) WHERE owner_id IS NOT NULL
+    ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+"""
+
+# Индексы для выборок дашборда по владельцу
+_METRICS_INDEXES = (
+    ('offers', "CREATE INDEX IF NOT EXISTS idx_offers_created_by ON offers(created_by, status)"),
+    ('offer_placements', "CREATE INDEX IF NOT EXISTS idx_offer_placements_proposal_id ON offer_placements(proposal_id)"),
+)
+
+# Счетчики метрик берутся из user_counters; запрос считает только ряды графиков
+CHARTS_QUERY = """
+    WITH
+    placements AS (
+        SELECT pl.id
+        FROM offer_placements pl
+        JOIN offer_proposals pr ON pl.proposal_id = pr.id
+        JOIN channels ch ON pr.channel_id = ch.id
+        WHERE ch.owner_id = :user_id
+    ),
+    views_by_day AS (
+        SELECT json_group_array(json_array(day, views)) as views_series
+        FROM (
+            SELECT DATE(ps.collected_at) as day, SUM(ps.views_count) as views
+            FROM placement_statistics ps JOIN placements pl ON ps.placement_id = pl.id
+            WHERE ps.collected_at >= DATE('now', '-30 days')
+            GROUP BY DATE(ps.collected_at)
+            ORDER BY day DESC
+            LIMIT 7
+        )
+    ),
+    spending_by_day AS (
+        SELECT json_group_array(json_array(day, spending)) as spending_series
+        FROM (
+            SELECT DATE(created_at) as day, SUM(budget_limit) as spending
+            FROM campaigns
+            WHERE created_by = :user_id AND created_at >= DATE('now', '-7 days')
+            GROUP BY DATE(created_at)
+        )
+    ),
+    offers_by_category AS (
+        SELECT json_group_array(json_array(category, count)) as category_series
+        FROM (
+            SELECT COALESCE(category, 'general') as category, COUNT(*) as count
+            FROM offers
+            WHERE created_by = :user_id
+            GROUP BY category
+            ORDER BY count DESC, category
+            LIMIT 5
+        )
+    )
+    SELECT * FROM views_by_day CROSS JOIN spending_by_day CROSS JOIN offers_by_category
+"""
+
+WEEKDAY_LABELS = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _trigger_sql(table: str, event: str, columns: str, owner_expr: str) -> str:
+    if event == 'insert':
+        owners = f"SELECT {owner_expr.format(row='NEW')} as owner_id"
+        timing = 'AFTER INSERT'
+    elif event == 'delete':
+        owners = f"SELECT {owner_expr.format(row='OLD')} as owner_id"
+        timing = 'AFTER DELETE'
+    else:
+        # При смене владельца строки устаревают метрики обоих пользователей
+        owners = (f"SELECT {owner_expr.format(row='NEW')} as owner_id"
+                  f" UNION SELECT {owner_expr.format(row='OLD')}")
+        timing = f'AFTER UPDATE OF {columns}'
+
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_user_data_version_{table}_{event}
+        {timing} ON {table}
+        BEGIN
+            {_BUMP_SQL.format(owners=owners).strip()}
+        END
+    """
+
+
+def ensure_user_metrics_schema():
+    """Создает user_data_versions, триггеры версий и индексы дашборда"""
+    global _schema_ready
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+
+        conn = sqlite3.connect(AppConfig.DATABASE_PATH, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS user_data_versions (
+                        user_id INTEGER PRIMARY KEY,
+                        version INTEGER NOT NULL DEFAULT 1
+                    )
+                """)
+                tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                for table, columns, owner_expr in _VERSION_SOURCES:
+                    if table not in tables:
+                        continue
+                    for event in ('insert', 'update', 'delete'):
+                        conn.execute(_trigger_sql(table, event, columns, owner_expr))
+                for table, index_sql in _METRICS_INDEXES:
+                    if table in tables:
+                        conn.execute(index_sql)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except Exception as e:
+            logger.error(f"❌ Ошибка создания user_data_versions: {e}")
+            return
+        finally:
+            conn.close()
+
+        _schema_ready = True
+
+
+def get_user_data_version(user_id: int) -> int:
+    """Текущая версия данных пользователя (0 - изменений еще не было)"""
+    from app.models.database import execute_db_query
+
+    row = execute_db_query(
+        "SELECT version FROM user_data_versions WHERE user_id = ?", (user_id,), fetch_one=True
+    )
+    return row['version'] if row else 0
+
+
+def bump_user_data_version(user_id: int):
+    """Явно помечает метрики пользователя устаревшими (для записей в обход триггеров)"""
+    from app.models.database import execute_db_query
+
+    ensure_user_metrics_schema()
+    execute_db_query("""
+        INSERT INTO user_data_versions (user_id, version) VALUES (?, 1)
+        ON CONFLICT(user_id) DO UPDATE SET version = version + 1
+    """, (user_id,))
+
+
+def _series(raw: Optional[str]) -> list:
+    return json.loads(raw) if raw else []
+
+
+def _percent(part: float, total: float) -> float:
+    return round(part / total * 100, 2) if total > 0 else 0
+
+
+def build_dashboard(counters: Dict[str, Any], series: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Метрики из счетчиков пользователя и графики из строки CHARTS_QUERY"""
+    total_views = counters['views_total']
+    total_proposals = counters['proposals_total']
+
+    metrics = {
+        'total_views': total_views,
+        'click_rate': _percent(counters['reactions_total'], total_views),
+        'total_revenue': counters['balance'],  # Используем баланс пользователя
+        'conversion_rate': _percent(counters['placements_completed'], total_proposals),
+        'channels_count': counters['channels_active'],
+        'subscribers_count': counters['subscribers_total'],
+        'offers_count': counters['offers_total'],
+        'campaigns_count': counters['campaigns_total'],
+        'proposals_count': total_proposals,
+        'responses_count': counters['responses_total'],
+        'verified_channels': counters['channels_verified'],
+        'active_offers': counters['offers_active'],
+        'active_campaigns': counters['campaigns_active'],
+        'acceptance_rate': _percent(counters['proposals_accepted'], total_proposals),
+        'response_rate': _percent(counters['responses_accepted'], counters['responses_total'])
+    }
+
+    views = sorted(_series(series['views_series']))
+    spending = sorted(_series(series['spending_series']))
+    categories = sorted(_series(series['category_series']), key=lambda item: item[1], reverse=True)
+
+    charts = {
+        'views_by_day': {
+            'labels': [day for day, _ in views] if views else ['Нет данных'],
+            'values': [value for _, value in views] if views else [0]
+        },
+        'proposals_stats': {
+            'accepted': counters['proposals_accepted'],
+            'rejected': counters['proposals_rejected'],
+            'pending': counters['proposals_sent'] + counters['proposals_expired']
+        },
+        'spending_by_day': {
+            'labels': [day for day, _ in spending] if spending else list(WEEKDAY_LABELS),
+            'values': [float(value or 0) for _, value in spending] if spending else [0] * len(WEEKDAY_LABELS)
+        },
+        # Эффективность (расчетные показатели)
+        'efficiency_stats': {
+            'cpm': min(metrics['click_rate'] * 10, 100),  # Примерный CPM
+            'ctr': metrics['click_rate'],
+            'conversion': metrics['conversion_rate'],
+            'roi': min(metrics['acceptance_rate'], 100),
+            'reach': min(metrics['subscribers_count'] / 1000, 100) if metrics['subscribers_count'] > 0 else 0
+        },
+        'offers_by_category': {
+            'labels': [category for category, _ in categories],
+            'values': [count for _, count in categories]
+        }
+    }
+
+    return {'metrics': metrics, 'charts': charts}
+
+
+class UserMetricsCache:
+    """LRU кэш дашбордов: user_id -> (версия данных, дашборд)"""
+
+    def __init__(self, max_size: int = USER_METRICS_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[int, Tuple[int, Dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, version: int) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: int, version: int, dashboard: Dict):
+        with self._lock:
+            self._entries[user_id] = (version, dashboard)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+metrics_cache = UserMetricsCache()
+
+
+def get_user_dashboard(user_id: int) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Метрики и графики пользователя: {'metrics': ..., 'charts': ...}
+
+    Версия читается до расчета: запись во время расчета увеличит ее, и
+    следующий запрос пересчитает дашборд. None - пользователь не найден.
+    """
+    from app.models.database import execute_db_query
+
+    ensure_user_metrics_schema()
+
+    version = get_user_data_version(user_id)
+    dashboard = metrics_cache.get(user_id, version)
+    if dashboard is not None:
+        return dashboard
+
+    counters = get_user_counters(user_id)
+    if not counters:
+        return None
+
+    series = execute_db_query(CHARTS_QUERY, {'user_id': user_id}, fetch_one=True)
+    dashboard = build_dashboard(counters, series)
+    metrics_cache.put(user_id, version, dashboard)
+    return dashboard
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Очистка и архивирование старых данных порциями
+Строки выбираются по возрастанию id (keyset) небольшими порциями, каждая
+порция - отдельная короткая транзакция с паузой после нее, чтобы веб-запросы
+не ждали блокировку БД. Архивные строки переносятся в отдельный файл БД
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config.telegram_config import (
+    AppConfig, RETENTION_CHUNK_SIZE, RETENTION_CHUNK_PAUSE_MS, RETENTION_VACUUM_PAGES,
+    RETENTION_ARCHIVE_DB_PATH, STATS_RAW_TTL_DAYS, STATS_HOURLY_TTL_DAYS
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SCHEMA = 'archive'
+
+
+@dataclass
+class RetentionPolicy:
+    """Правило хранения для одной таблицы"""
+    name: str
+    table: str
+    max_age_days: int
+    age_column: str = 'created_at'
+    action: str = 'delete'  # 'delete' или 'archive'
+    condition: str = ''  # дополнительное условие отбора (SQL)
+    # archive: связанные строки (таблица, колонка ссылки) переносятся в архив вместе с основной
+    children: Tuple[Tuple[str, str], ...] = ()
+    # archive: если задано, основная строка не удаляется, а обновляется (SET ...)
+    keep_with_update: str = ''
+    # таблицы, на которые ссылается condition; без них правило пропускается
+    depends_on: Tuple[str, ...] = ()
+
+
+DEFAULT_POLICIES = [
+    RetentionPolicy('notifications', 'notifications', 30),
+    RetentionPolicy('error_logs', 'error_logs', 7),
+    # Завершенные размещения остаются в основной БД со статусом archived (на них ссылаются
+    # платежи и отчеты), а их статистика уезжает в архивный файл
+    RetentionPolicy(
+        'placements', 'offer_placements', 90, age_column='updated_at', action='archive',
+        condition="status = 'completed'",
+        children=(('placement_statistics', 'placement_id'), ('ereit_statistics', 'placement_id')),
+        keep_with_update="status = 'archived', updated_at = CURRENT_TIMESTAMP"
+    ),
+    # Сырые замеры удаляются только после свертки в часовые интервалы (см. stats_rollup);
+    # последняя запись размещения остается - на нее ссылается placement_latest_stats
+    RetentionPolicy(
+        'placement_statistics_raw', 'placement_statistics', STATS_RAW_TTL_DAYS,
+        condition=(
+            "datetime(created_at) < (SELECT watermark FROM stats_rollup_state "
+            "WHERE source = 'stats' AND resolution = 'hour') "
+            "AND id NOT IN (SELECT stats_id FROM placement_latest_stats WHERE stats_id IS NOT NULL)"
+        ),
+        depends_on=('stats_rollup_state', 'placement_latest_stats')
+    ),
+    RetentionPolicy(
+        'placement_checks_raw', 'placement_checks', STATS_RAW_TTL_DAYS, age_column='check_time',
+        condition=(
+            "datetime(check_time) < (SELECT watermark FROM stats_rollup_state "
+            "WHERE source = 'checks' AND resolution = 'hour') "
+            "AND id < (SELECT MAX(pc.id) FROM placement_checks pc WHERE pc.placement_id = placement_checks.placement_id)"
+        ),
+        depends_on=('stats_rollup_state',)
+    ),
+    # Часовые интервалы нужны только для графиков за последние недели, дальше - дневные
+    RetentionPolicy(
+        'placement_stats_hourly', 'placement_stats_rollups', STATS_HOURLY_TTL_DAYS, age_column='bucket_start',
+        condition=(
+            "resolution = 'hour' AND bucket_start < (SELECT r.watermark FROM stats_rollup_state r "
+            "WHERE r.source = placement_stats_rollups.source AND r.resolution = 'day')"
+        ),
+        depends_on=('stats_rollup_state',)
+    ),
+]
+
+
+@dataclass
+class PolicyProgress:
+    """Ход выполнения одного правила"""
+    status: str = 'pending'
+    processed: int = 0
+    children_archived: int = 0
+    chunks: int = 0
+    last_id: int = 0
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    error: Optional[str] = None
+    details: Dict[str, Any] = field(default_factory=dict)
+
+
+class RetentionEngine:
+    """Порционная очистка и архивирование по набору правил"""
+
+    def __init__(self, policies: List[RetentionPolicy] = None, db_path: str = None,
+                 archive_path: str = RETENTION_ARCHIVE_DB_PATH, chunk_size: int = RETENTION_CHUNK_SIZE,
+                 pause_seconds: float = RETENTION_CHUNK_PAUSE_MS / 1000):
+        self.policies = policies if policies is not None else DEFAULT_POLICIES
+        self.db_path = db_path or AppConfig.DATABASE_PATH
+        self.archive_path = archive_path
+        self.chunk_size = chunk_size
+        self.pause_seconds = pause_seconds
+        self.progress: Dict[str, PolicyProgress] = {}
+        self.vacuum: Dict[str, Any] = {}
+        self.last_run_at: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (self.archive_path,))
+        return conn
+
+    @staticmethod
+    def _table_exists(conn: sqlite3.Connection, table: str, schema: str = 'main') -> bool:
+        return conn.execute(
+            f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone() is not None
+
+    @staticmethod
+    def _columns(conn: sqlite3.Connection, table: str, schema: str = 'main') -> List[Tuple[str, str]]:
+        return [(row[1], row[2]) for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+    def _ensure_archive_table(self, conn: sqlite3.Connection, table: str) -> List[str]:
+        """
+        Таблица в архивной БД с той же схемой (включая первичный ключ)
+
+        Столбцы, добавленные в рабочую таблицу после создания архивной
+        (ALTER TABLE ... ADD COLUMN), добавляются и в архив. Возвращает
+        столбцы рабочей таблицы - строки переносятся по явному списку.
+        """
+        columns = self._columns(conn, table)
+        if not self._table_exists(conn, table, ARCHIVE_SCHEMA):
+            ddl = conn.execute(
+                "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()[0]
+            ddl = re.sub(r'^\s*CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?["`\[]?\w+["`\]]?',
+                         f'CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.{table}', ddl, count=1, flags=re.IGNORECASE)
+            conn.execute(ddl)
+        else:
+            archived = {name for name, _ in self._columns(conn, table, ARCHIVE_SCHEMA)}
+            for name, column_type in columns:
+                if name not in archived:
+                    # Без ограничений и значения по умолчанию: в архив строки пишутся целиком
+                    conn.execute(f'ALTER TABLE {ARCHIVE_SCHEMA}.{table} ADD COLUMN "{name}" {column_type}')
+                    logger.info(f"🗄️ В архивную таблицу {table} добавлен столбец {name}")
+        return [name for name, _ in columns]
+
+    def run(self) -> Dict[str, Any]:
+        """Выполняет все правила и шаг инкрементального VACUUM"""
+        if not self._lock.acquire(blocking=False):
+            return {'success': False, 'error': 'retention already running'}
+
+        try:
+            self.last_run_at = datetime.now().isoformat()
+            self.progress = {policy.name: PolicyProgress() for policy in self.policies}
+            conn = self._connect()
+            try:
+                for policy in self.policies:
+                    self._run_policy(conn, policy)
+                self.vacuum = self._incremental_vacuum(conn)
+            finally:
+                conn.close()
+            return {'success': True, **self.get_progress()}
+        finally:
+            self._lock.release()
+
+    def _run_policy(self, conn: sqlite3.Connection, policy: RetentionPolicy):
+        progress = self.progress[policy.name]
+        progress.status = 'running'
+        progress.started_at = datetime.now().isoformat()
+
+        try:
+            missing = [t for t in (policy.table, *policy.depends_on) if not self._table_exists(conn, t)]
+            if missing:
+                progress.status = 'skipped'
+                progress.details['reason'] = f"table not found: {', '.join(missing)}"
+                return
+
+            children = [(t, c) for t, c in policy.children if self._table_exists(conn, t)]
+            columns = {}
+            if policy.action == 'archive':
+                for table in (policy.table, *(child_table for child_table, _ in children)):
+                    columns[table] = self._ensure_archive_table(conn, table)
+
+            condition = f"AND ({policy.condition})" if policy.condition else ''
+            select_chunk = f"""
+                SELECT id FROM main.{policy.table}
+                WHERE id > ? AND {policy.age_column} < datetime('now', ?) {condition}
+                ORDER BY id LIMIT ?
+            """
+            age = f'-{policy.max_age_days} days'
+
+            while True:
+                ids = [row[0] for row in conn.execute(select_chunk, (progress.last_id, age, self.chunk_size))]
+                if not ids:
+                    break
+
+                if policy.action == 'archive' and children:
+                    progress.children_archived += self._archive_children(conn, children, columns, ids)
+
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if policy.action == 'archive':
+                        progress.children_archived += self._archive_chunk(conn, policy, children, columns, ids)
+                    else:
+                        placeholders = ','.join('?' * len(ids))
+                        conn.execute(f"DELETE FROM main.{policy.table} WHERE id IN ({placeholders})", ids)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+
+                progress.processed += len(ids)
+                progress.chunks += 1
+                progress.last_id = ids[-1]
+
+                if len(ids) < self.chunk_size:
+                    break
+                # Пауза отдает блокировку записи веб-запросам
+                time.sleep(self.pause_seconds)
+
+            progress.status = 'completed'
+        except Exception as e:
+            progress.status = 'failed'
+            progress.error = str(e)
+            logger.error(f"❌ Ошибка правила хранения {policy.name}: {e}")
+        finally:
+            progress.finished_at = datetime.now().isoformat()
+
+    @staticmethod
+    def _move_to_archive(conn: sqlite3.Connection, table: str, columns: List[str], key: str, values: List[int]) -> int:
+        """Копирует строки с key IN values в архивную БД и удаляет их из рабочей"""
+        placeholders = ','.join('?' * len(values))
+        column_list = ', '.join(f'"{name}"' for name in columns)
+        conn.execute(f"""
+            INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.{table} ({column_list})
+            SELECT {column_list} FROM main.{table} WHERE {key} IN ({placeholders})
+        """, values)
+        return conn.execute(f"DELETE FROM main.{table} WHERE {key} IN ({placeholders})", values).rowcount
+
+    def _archive_children(self, conn: sqlite3.Connection, children: List[Tuple[str, str]],
+                          columns: Dict[str, List[str]], ids: List[int]) -> int:
+        """
+        Перенос связанных строк порции до основных строк
+
+        Связанных строк на одну основную может быть сколько угодно (сотни
+        замеров на размещение), поэтому они переносятся подпорциями по
+        chunk_size, каждая - своей короткой транзакцией с паузой после нее.
+        """
+        placeholders = ','.join('?' * len(ids))
+        moved = 0
+        for child_table, column in children:
+            child_ids = [row[0] for row in conn.execute(
+                f"SELECT id FROM main.{child_table} WHERE {column} IN ({placeholders}) ORDER BY id", ids
+            )]
+            for start in range(0, len(child_ids), self.chunk_size):
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    moved += self._move_to_archive(conn, child_table, columns[child_table], 'id',
+                                                   child_ids[start:start + self.chunk_size])
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                time.sleep(self.pause_seconds)
+        return moved
+
+    def _archive_chunk(self, conn: sqlite3.Connection, policy: RetentionPolicy,
+                       children: List[Tuple[str, str]], columns: Dict[str, List[str]], ids: List[int]) -> int:
+        """
+        Перенос порции основных строк в архивную БД (по списку столбцов columns)
+
+        Связанные строки к этому моменту уже перенесены _archive_children;
+        здесь в той же транзакции дочищаются только записанные после этого.
+        """
+        placeholders = ','.join('?' * len(ids))
+        moved_children = 0
+
+        for child_table, column in children:
+            moved_children += self._move_to_archive(conn, child_table, columns[child_table], column, ids)
+
+        if policy.keep_with_update:
+            conn.execute(f"UPDATE main.{policy.table} SET {policy.keep_with_update} WHERE id IN ({placeholders})", ids)
+
+        # Копия строки в архиве - в конечном состоянии (после обновления статуса)
+        column_list = ', '.join(f'"{name}"' for name in columns[policy.table])
+        conn.execute(f"""
+            INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.{policy.table} ({column_list})
+            SELECT {column_list} FROM main.{policy.table} WHERE id IN ({placeholders})
+        """, ids)
+
+        if not policy.keep_with_update:
+            conn.execute(f"DELETE FROM main.{policy.table} WHERE id IN ({placeholders})", ids)
+
+        return moved_children
+
+    def _incremental_vacuum(self, conn: sqlite3.Connection) -> Dict[str, Any]:
+        """
+        Возврат свободных страниц файлу БД шагами по RETENTION_VACUUM_PAGES
+
+        Работает, только если в БД включен auto_vacuum = INCREMENTAL
+        (см. enable_incremental_vacuum).
+        """
+        mode = conn.execute("PRAGMA main.auto_vacuum").fetchone()[0]
+        free_before = conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+        result = {'auto_vacuum': mode, 'free_pages_before': free_before, 'free_pages_after': free_before}
+
+        if mode != 2:
+            result['status'] = 'skipped'
+            result['reason'] = 'auto_vacuum is not INCREMENTAL'
+            return result
+
+        while conn.execute("PRAGMA main.freelist_count").fetchone()[0] > 0:
+            conn.execute(f"PRAGMA main.incremental_vacuum({RETENTION_VACUUM_PAGES})").fetchall()
+            time.sleep(self.pause_seconds)
+
+        result['free_pages_after'] = conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+        result['status'] = 'completed'
+        return result
+
+    def enable_incremental_vacuum(self):
+        """
+        Однократный перевод БД в режим auto_vacuum = INCREMENTAL
+
+        Требует полного VACUUM, который блокирует БД на время перестроения,
+        поэтому запускается вручную в окно обслуживания.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+        logger.info("✅ Включен режим инкрементального VACUUM")
+
+    def get_progress(self) -> Dict[str, Any]:
+        """Ход последнего запуска по каждому правилу"""
+        return {
+            'running': self._lock.locked(),
+            'last_run_at': self.last_run_at,
+            'policies': {name: vars(progress).copy() for name, progress in self.progress.items()},
+            'vacuum': self.vacuum
+        }
+
+
+# Глобальный экземпляр
+_retention_engine = None
+
+
+def get_retention_engine() -> RetentionEngine:
+    """Получает экземпляр движка хранения (синглтон)"""
+    global _retention_engine
+    if _retention_engine is None:
+        _retention_engine = RetentionEngine()
+    return _retention_engine
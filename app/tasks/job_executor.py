@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Исполнитель фоновых задач планировщика
+Асинхронные задачи выполняются в постоянном event loop отдельного потока,
+синхронные - в пуле потоков. Для каждой задачи действуют ограничение
+одновременных запусков, таймаут и случайная задержка старта (jitter)
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_TIMEOUT_SECONDS = 600
+DEFAULT_SYNC_WORKERS = 4
+
+
+@dataclass
+class JobSpec:
+    """Описание задачи планировщика"""
+    name: str
+    func: Callable
+    is_async: bool = False
+    timeout: float = DEFAULT_JOB_TIMEOUT_SECONDS
+    max_instances: int = 1  # сколько запусков задачи может идти одновременно
+    jitter: float = 0.0  # максимальная случайная задержка старта, секунды
+
+
+class JobMetrics:
+    """Счетчики выполнения одной задачи"""
+
+    def __init__(self):
+        self.runs = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.skipped = 0
+        self.running = 0
+        self.last_started_at: Optional[str] = None
+        self.last_finished_at: Optional[str] = None
+        self.last_duration: Optional[float] = None
+        self.last_outcome: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        finished = self.succeeded + self.failed + self.timed_out
+        return {
+            'runs': self.runs,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'timed_out': self.timed_out,
+            'skipped': self.skipped,
+            'running': self.running,
+            'last_started_at': self.last_started_at,
+            'last_finished_at': self.last_finished_at,
+            'last_duration': round(self.last_duration, 3) if self.last_duration is not None else None,
+            'avg_duration': round(self.total_duration / finished, 3) if finished else None,
+            'max_duration': round(self.max_duration, 3),
+            'last_outcome': self.last_outcome,
+            'last_error': self.last_error
+        }
+
+
+class JobExecutor:
+    """Параллельное выполнение задач с защитой от наложения запусков"""
+
+    def __init__(self, max_workers: int = DEFAULT_SYNC_WORKERS):
+        self.jobs: Dict[str, JobSpec] = {}
+        self.metrics: Dict[str, JobMetrics] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scheduler-job')
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+
+    def register(self, spec: JobSpec):
+        """Регистрирует задачу"""
+        self.jobs[spec.name] = spec
+        self.metrics.setdefault(spec.name, JobMetrics())
+
+    def start(self):
+        """Запускает постоянный event loop для асинхронных задач"""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, name='scheduler-loop', daemon=True)
+        self._loop_thread.start()
+
+    def shutdown(self, wait: bool = False):
+        """Останавливает event loop и пул потоков"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            if wait and self._loop_thread:
+                self._loop_thread.join(timeout=5)
+            self._loop = None
+        self._pool.shutdown(wait=wait)
+
+    def submit(self, name: str) -> bool:
+        """
+        Запускает задачу без ожидания результата
+
+        Возвращает False, если задача пропущена из-за уже идущих запусков.
+        """
+        spec = self.jobs[name]
+        metrics = self.metrics[name]
+
+        with self._lock:
+            if metrics.running >= spec.max_instances:
+                metrics.skipped += 1
+                logger.warning(f"⏭️ Задача {name} пропущена: предыдущий запуск еще выполняется")
+                return False
+            metrics.running += 1
+
+        if self._loop is None:
+            self.start()
+        asyncio.run_coroutine_threadsafe(self._execute(spec), self._loop)
+        return True
+
+    async def _execute(self, spec: JobSpec):
+        """Выполнение задачи с jitter, таймаутом и учетом метрик"""
+        if spec.jitter > 0:
+            await asyncio.sleep(random.uniform(0, spec.jitter))
+
+        logger.debug(f"▶️ Запуск задачи {spec.name}")
+        metrics = self.metrics[spec.name]
+        with self._lock:
+            metrics.runs += 1
+            metrics.last_started_at = datetime.now().isoformat()
+        started_at = time.monotonic()
+
+        outcome, error = 'success', None
+        release_later = False
+        try:
+            if spec.is_async:
+                await asyncio.wait_for(spec.func(), timeout=spec.timeout)
+            else:
+                future = asyncio.get_running_loop().run_in_executor(self._pool, spec.func)
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), timeout=spec.timeout)
+                except asyncio.TimeoutError:
+                    # Поток прервать нельзя: слот освобождается, когда он действительно завершится
+                    release_later = True
+                    future.add_done_callback(lambda _: self._release(spec.name))
+                    raise
+        except asyncio.TimeoutError:
+            outcome, error = 'timeout', f"превышен таймаут {spec.timeout} с"
+            logger.error(f"⏱️ Задача {spec.name} превысила таймаут {spec.timeout} с")
+        except Exception as e:
+            outcome, error = 'error', str(e)
+            logger.error(f"❌ Ошибка задачи {spec.name}: {e}")
+        finally:
+            self._finish(spec.name, outcome, error, time.monotonic() - started_at, release=not release_later)
+
+    def _release(self, name: str):
+        with self._lock:
+            self.metrics[name].running -= 1
+
+    def _finish(self, name: str, outcome: str, error: Optional[str], duration: float, release: bool = True):
+        with self._lock:
+            metrics = self.metrics[name]
+            if release:
+                metrics.running -= 1
+            metrics.last_finished_at = datetime.now().isoformat()
+            metrics.last_duration = duration
+            metrics.total_duration += duration
+            metrics.max_duration = max(metrics.max_duration, duration)
+            metrics.last_outcome = outcome
+            metrics.last_error = error
+            if outcome == 'success':
+                metrics.succeeded += 1
+            elif outcome == 'timeout':
+                metrics.timed_out += 1
+            else:
+                metrics.failed += 1
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Метрики всех зарегистрированных задач"""
+        with self._lock:
+            return {name: metrics.to_dict() for name, metrics in self.metrics.items()}
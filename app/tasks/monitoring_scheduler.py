@@ -3,16 +3,45 @@
 Планировщик задач для мониторинга постов и сбора статистики
 """
 
-import asyncio
 import logging
 import schedule
+import sqlite3
 import time
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict
 import threading
 
+from app.config.telegram_config import (
+    PLACEMENT_CHECK_TICK_MINUTES, STATS_ROLLUP_INTERVAL_MINUTES, USER_COUNTERS_RECONCILE_INTERVAL_HOURS,
+    ANALYTICS_SNAPSHOT_INTERVAL_MINUTES
+)
+from app.tasks.job_executor import JobExecutor, JobSpec
+from app.tasks.scheduler_lease import SchedulerCoordinator
+
 logger = logging.getLogger(__name__)
 
+# Задачи, которые выполняет каждый экземпляр планировщика для своего шарда размещений;
+# остальные задачи выполняет только лидер
+SHARDED_JOBS = {'stats_collection', 'deletion_monitoring'}
+
+PAYOUT_DELAY_DAYS = 3
+
+# Завершенные размещения без платежей; id платежа служит ключом идемпотентности
+_PLANNED_PAYMENTS_SELECT = """
+    SELECT 'PLANNED_' || p.id AS payment_id,
+           'PLANNED_CONTRACT_' || p.id AS contract_id,
+           p.id AS placement_id,
+           r.user_id AS publisher_id,
+           o.created_by AS advertiser_id,
+           COALESCE(p.funds_reserved, 0) AS amount,
+           ? AS scheduled_at
+    FROM offer_placements p
+    JOIN offer_responses r ON p.response_id = r.id
+    JOIN offers o ON r.offer_id = o.id
+    WHERE p.status = 'completed'
+    AND NOT EXISTS (SELECT 1 FROM payments pay WHERE pay.placement_id = p.id)
+"""
+
 
 class MonitoringScheduler:
     """Планировщик задач мониторинга"""
@@ -20,6 +49,8 @@ class MonitoringScheduler:
     def __init__(self):
         self.running = False
         self.tasks = []
+        self.executor = JobExecutor()
+        self.coordinator = None
         
     def start(self):
         """Запускает планировщик"""
@@ -30,8 +61,13 @@ class MonitoringScheduler:
         self.running = True
         logger.info("🚀 Запуск планировщика мониторинга...")
         
+        # Регистрируемся среди экземпляров планировщика (лидерство и шарды)
+        self.coordinator = SchedulerCoordinator()
+        self.coordinator.start()
+        
         # Настраиваем расписание задач
         self._setup_schedule()
+        self.executor.start()
         
         # Запускаем планировщик в отдельном потоке
         scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
@@ -42,63 +78,113 @@ class MonitoringScheduler:
     def stop(self):
         """Останавливает планировщик"""
         self.running = False
+        schedule.clear()
+        self.executor.shutdown()
+        self.executor = JobExecutor()
+        if self.coordinator:
+            self.coordinator.stop()
         logger.info("⏹️ Планировщик мониторинга остановлен")
     
+    def _register_jobs(self):
+        """Регистрирует задачи в исполнителе (таймауты и jitter в секундах)"""
+        tick_seconds = PLACEMENT_CHECK_TICK_MINUTES * 60
+        jobs = [
+            JobSpec('placement_monitoring', self._async_placement_monitoring, is_async=True, timeout=1500, jitter=30),
+            JobSpec('stats_collection', self._async_stats_collection, is_async=True, timeout=max(tick_seconds * 3, 600), jitter=15),
+            JobSpec('ereit_stats_collection', self._async_ereit_stats_collection, is_async=True, timeout=1500, jitter=30),
+            JobSpec('expiry_check', self._async_expiry_check, is_async=True, timeout=300, jitter=10),
+            JobSpec('deadline_monitoring', self._async_deadline_monitoring, is_async=True, timeout=600, jitter=10),
+            JobSpec('deletion_monitoring', self._async_deletion_monitoring, is_async=True, timeout=max(tick_seconds * 3, 600), jitter=15),
+            JobSpec('placement_completion', self._async_placement_completion, is_async=True, timeout=1800, jitter=30),
+            JobSpec('payment_planning', self._run_payment_planning, timeout=1800),
+            JobSpec('cleanup', self._run_cleanup, timeout=3600),
+            JobSpec('dashboard_cache_update', self._run_dashboard_cache_update, timeout=240, jitter=5),
+            JobSpec('stats_rollup', self._run_stats_rollup, timeout=600, jitter=10),
+            JobSpec('notification_outbox', self._async_notification_outbox, is_async=True, timeout=300, jitter=5),
+            JobSpec('user_counters_reconcile', self._run_user_counters_reconcile, timeout=1800, jitter=60),
+            JobSpec('analytics_snapshot', self._run_analytics_snapshot, timeout=900, jitter=30),
+        ]
+        for job in jobs:
+            self.executor.register(job)
+    
     def _setup_schedule(self):
         """Настраивает расписание задач"""
+        self._register_jobs()
+        submit = self._submit
         
         # Мониторинг размещений каждые 30 минут
-        schedule.every(30).minutes.do(self._run_placement_monitoring)
+        schedule.every(30).minutes.do(submit, 'placement_monitoring')
         
-        # Сбор статистики постов каждый час
-        schedule.every().hour.do(self._run_stats_collection)
+        # Сбор статистики постов: частый запуск, но каждое размещение проверяется
+        # по своему адаптивному расписанию (PlacementCheckPlanner)
+        schedule.every(PLACEMENT_CHECK_TICK_MINUTES).minutes.do(submit, 'stats_collection')
         
         # Сбор eREIT статистики каждые 30 минут
-        schedule.every(30).minutes.do(self._run_ereit_stats_collection)
+        schedule.every(30).minutes.do(submit, 'ereit_stats_collection')
         
         # Проверка просроченных размещений каждые 10 минут
-        schedule.every(10).minutes.do(self._run_expiry_check)
+        schedule.every(10).minutes.do(submit, 'expiry_check')
         
         # НОВОЕ: Контроль дедлайнов каждые 15 минут
-        schedule.every(15).minutes.do(self._run_deadline_monitoring)
+        schedule.every(15).minutes.do(submit, 'deadline_monitoring')
         
-        # НОВОЕ: Мониторинг удаления постов каждые 2 часа
-        schedule.every(2).hours.do(self._run_deletion_monitoring)
+        # НОВОЕ: Мониторинг удаления постов по адаптивному расписанию
+        schedule.every(PLACEMENT_CHECK_TICK_MINUTES).minutes.do(submit, 'deletion_monitoring')
         
         # НОВОЕ: Завершение размещений каждый час
-        schedule.every().hour.do(self._run_placement_completion)
+        schedule.every().hour.do(submit, 'placement_completion')
         
         # Планирование выплат каждый день в 9:00
-        schedule.every().day.at("09:00").do(self._run_payment_planning)
+        schedule.every().day.at("09:00").do(submit, 'payment_planning')
         
         # Очистка старых данных каждую неделю в воскресенье в 2:00
-        schedule.every().sunday.at("02:00").do(self._run_cleanup)
+        schedule.every().sunday.at("02:00").do(submit, 'cleanup')
         
         # Обновление кэша дашбордов каждые 5 минут
-        schedule.every(5).minutes.do(self._run_dashboard_cache_update)
+        schedule.every(5).minutes.do(submit, 'dashboard_cache_update')
+        
+        # Свертка истории статистики в часовые и дневные интервалы
+        schedule.every(STATS_ROLLUP_INTERVAL_MINUTES).minutes.do(submit, 'stats_rollup')
+        
+        # Досылка уведомлений из outbox (повторы с backoff)
+        schedule.every().minute.do(submit, 'notification_outbox')
+        
+        # Сверка счетчиков пользователей с исходными таблицами
+        schedule.every(USER_COUNTERS_RECONCILE_INTERVAL_HOURS).hours.do(submit, 'user_counters_reconcile')
+        
+        # Снимок БД для аналитических отчетов
+        schedule.every(ANALYTICS_SNAPSHOT_INTERVAL_MINUTES).minutes.do(submit, 'analytics_snapshot')
         
         logger.info("📅 Расписание задач настроено (включая контроль дедлайнов, удаления постов и обновление дашбордов)")
     
     def _run_scheduler(self):
-        """Основной цикл планировщика"""
+        """Основной цикл планировщика (задачи только ставятся в исполнитель и не блокируют цикл)"""
         while self.running:
             try:
                 schedule.run_pending()
-                time.sleep(60)  # Проверяем каждую минуту
+                idle_seconds = schedule.idle_seconds()
+                time.sleep(min(max(idle_seconds if idle_seconds is not None else 60, 1), 60))
             except Exception as e:
                 logger.error(f"❌ Ошибка в планировщике: {e}")
                 time.sleep(60)
     
-    def _run_placement_monitoring(self):
-        """Запускает мониторинг размещений"""
-        try:
-            logger.info("🔍 Запуск мониторинга размещений...")
-            
-            # Запускаем асинхронную задачу
-            asyncio.run(self._async_placement_monitoring())
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка мониторинга размещений: {e}")
+    def _submit(self, name: str) -> bool:
+        """Запуск задачи с учетом лидерства: общие задачи выполняет только лидер"""
+        if name not in SHARDED_JOBS and not (self.coordinator and self.coordinator.is_leader):
+            logger.debug(f"⏭️ Задача {name} пропущена: экземпляр не лидер")
+            return False
+        return self.executor.submit(name)
+    
+    def _current_shard(self):
+        return self.coordinator.shard() if self.coordinator else None
+    
+    def get_coordination_status(self) -> Dict:
+        """Лидерство и шард текущего экземпляра"""
+        return self.coordinator.get_status() if self.coordinator else {}
+    
+    def get_job_metrics(self) -> Dict[str, Dict]:
+        """Метрики выполнения задач: запуски, длительность, результат"""
+        return self.executor.get_metrics()
     
     async def _async_placement_monitoring(self):
         """Асинхронный мониторинг размещений"""
@@ -118,16 +204,6 @@ class MonitoringScheduler:
         
         return results
     
-    def _run_stats_collection(self):
-        """Запускает сбор статистики"""
-        try:
-            logger.info("📊 Запуск сбора статистики...")
-            
-            asyncio.run(self._async_stats_collection())
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка сбора статистики: {e}")
-    
     async def _async_stats_collection(self):
         """Асинхронный сбор статистики"""
         from app.services.stats_collector import StatsCollector
@@ -135,22 +211,13 @@ class MonitoringScheduler:
         collector = StatsCollector()
         
         # Собираем статистику для активных размещений
-        results = await collector.collect_placement_stats()
+        results = await collector.collect_placement_stats(adaptive=True, shard=self._current_shard())
         
-        logger.info(f"📈 Статистика собрана для {len(results)} размещений")
+        if results:
+            logger.info(f"📈 Статистика собрана для {len(results)} размещений")
         
         return results
     
-    def _run_expiry_check(self):
-        """Проверяет просроченные размещения"""
-        try:
-            logger.info("⏰ Проверка просроченных размещений...")
-            
-            asyncio.run(self._async_expiry_check())
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка проверки просроченных размещений: {e}")
-    
     async def _async_expiry_check(self):
         """Асинхронная проверка просроченных размещений"""
         from app.services.channel_monitor import ChannelMonitor
@@ -166,16 +233,6 @@ class MonitoringScheduler:
         
         return results
     
-    def _run_deadline_monitoring(self):
-        """Запускает мониторинг дедлайнов"""
-        try:
-            logger.info("⏰ Запуск мониторинга дедлайнов...")
-            
-            asyncio.run(self._async_deadline_monitoring())
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка мониторинга дедлайнов: {e}")
-    
     async def _async_deadline_monitoring(self):
         """Асинхронный мониторинг дедлайнов"""
         from app.services.deadline_monitor import monitor_deadlines
@@ -190,21 +247,11 @@ class MonitoringScheduler:
         
         return results
     
-    def _run_deletion_monitoring(self):
-        """Запускает мониторинг удаления постов"""
-        try:
-            logger.info("🔍 Запуск мониторинга удаления постов...")
-            
-            asyncio.run(self._async_deletion_monitoring())
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка мониторинга удаления постов: {e}")
-    
     async def _async_deletion_monitoring(self):
         """Асинхронный мониторинг удаления постов"""
         from app.services.post_deletion_monitor import monitor_post_deletions
         
-        results = await monitor_post_deletions()
+        results = await monitor_post_deletions(adaptive=True, shard=self._current_shard())
         
         deleted_count = len([r for r in results if r['status'] == 'deleted'])
         total_count = len(results)
@@ -214,16 +261,6 @@ class MonitoringScheduler:
         
         return results
     
-    def _run_ereit_stats_collection(self):
-        """Запускает сбор eREIT статистики"""
-        try:
-            logger.info("📊 Запуск сбора eREIT статистики...")
-            
-            asyncio.run(self._async_ereit_stats_collection())
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка сбора eREIT статистики: {e}")
-    
     async def _async_ereit_stats_collection(self):
         """Асинхронный сбор eREIT статистики"""
         from app.services.ereit_integration import collect_ereit_statistics
@@ -238,16 +275,6 @@ class MonitoringScheduler:
         
         return results
     
-    def _run_placement_completion(self):
-        """Запускает завершение размещений"""
-        try:
-            logger.info("🏁 Запуск завершения размещений...")
-            
-            asyncio.run(self._async_placement_completion())
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка завершения размещений: {e}")
-    
     async def _async_placement_completion(self):
         """Асинхронное завершение размещений"""
         from app.services.placement_completion import complete_placements
@@ -263,162 +290,146 @@ class MonitoringScheduler:
         return results
     
     def _run_payment_planning(self):
-        """Планирует выплаты"""
+        """Планирует выплаты (ошибки учитывает исполнитель задач)"""
+        logger.info("💰 Планирование выплат...")
+        
+        # Планируем выплаты для завершенных размещений
+        report = self._plan_payments()
+        
+        if report['planned_count']:
+            logger.info(f"💰 Запланировано выплат: {report['planned_count']} на сумму {report['total_amount']:.2f}")
+    
+    def _ensure_payment_planning_schema(self, conn: sqlite3.Connection):
+        """Колонка даты выплаты и индекс для анти-соединения по placement_id"""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(payments)")}
+        if 'scheduled_at' not in columns:
+            conn.execute("ALTER TABLE payments ADD COLUMN scheduled_at DATETIME")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_payments_placement_id ON payments(placement_id)")
+    
+    def _plan_payments(self, dry_run: bool = False) -> Dict:
+        """
+        Планирует выплаты владельцам каналов одной транзакцией
+        
+        Кандидаты - завершенные размещения без единого платежа (анти-соединение
+        NOT EXISTS по индексу payments.placement_id). Id платежа детерминирован
+        (PLANNED_<placement_id>), поэтому повторный запуск ничего не задвоит.
+        dry_run=True возвращает отчет без записи в БД.
+        """
+        from app.config.telegram_config import AppConfig
+        
+        scheduled_at = (datetime.now() + timedelta(days=PAYOUT_DELAY_DAYS)).isoformat()  # Выплата через 3 дня
+        
+        conn = sqlite3.connect(AppConfig.DATABASE_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
         try:
-            logger.info("💰 Планирование выплат...")
+            self._ensure_payment_planning_schema(conn)
             
-            # Планируем выплаты для завершенных размещений
-            planned_payments = self._plan_payments()
+            # Блокировка на запись с начала: между отбором и вставкой никто не вклинится
+            conn.execute("BEGIN IMMEDIATE")
             
-            if planned_payments:
-                logger.info(f"💰 Запланировано выплат: {len(planned_payments)}")
+            candidates = [dict(row) for row in conn.execute(
+                f"SELECT * FROM ({_PLANNED_PAYMENTS_SELECT}) ORDER BY placement_id", (scheduled_at,)
+            )]
+            report = {
+                'dry_run': dry_run,
+                'planned_count': len(candidates),
+                'total_amount': round(sum(float(c['amount'] or 0) for c in candidates), 2),
+                'scheduled_at': scheduled_at,
+                'payments': [{
+                    'payment_id': c['payment_id'],
+                    'placement_id': c['placement_id'],
+                    'amount': c['amount'],
+                    'channel_owner_id': c['publisher_id']
+                } for c in candidates]
+            }
             
-        except Exception as e:
-            logger.error(f"❌ Ошибка планирования выплат: {e}")
-    
-    def _plan_payments(self) -> List[Dict]:
-        """Планирует выплаты владельцам каналов"""
-        from app.models import execute_db_query
-        
-        # Находим завершенные размещения без запланированных выплат
-        completed_placements = execute_db_query("""
-            SELECT p.*, 
-                   r.user_id as channel_owner_id,
-                   r.channel_title,
-                   u.telegram_id as channel_owner_telegram_id
-            FROM offer_placements p
-            JOIN offer_responses r ON p.response_id = r.id
-            JOIN users u ON r.user_id = u.id
-            WHERE p.status = 'completed'
-            AND p.id NOT IN (SELECT placement_id FROM payments WHERE placement_id IS NOT NULL)
-        """, fetch_all=True)
-        
-        planned_payments = []
-        
-        for placement in completed_placements:
-            try:
-                # Создаем запись о планируемой выплате
-                payment_id = execute_db_query("""
-                    INSERT INTO payments (
-                        placement_id, 
-                        user_id, 
-                        amount, 
-                        currency, 
-                        status, 
-                        scheduled_at,
-                        created_at,
-                        updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                """, (
-                    placement['id'],
-                    placement['channel_owner_id'],
-                    placement['funds_reserved'],
-                    'RUB',
-                    'scheduled',
-                    (datetime.now() + timedelta(days=3)).isoformat()  # Выплата через 3 дня
-                ))
-                
-                planned_payments.append({
-                    'payment_id': payment_id,
-                    'placement_id': placement['id'],
-                    'amount': placement['funds_reserved'],
-                    'channel_owner_id': placement['channel_owner_id']
-                })
-                
-            except Exception as e:
-                logger.error(f"❌ Ошибка планирования выплаты для размещения {placement['id']}: {e}")
-        
-        return planned_payments
-    
-    def _run_cleanup(self):
-        """Очищает старые данные"""
-        try:
-            logger.info("🧹 Очистка старых данных...")
+            if dry_run or not candidates:
+                conn.execute("ROLLBACK")
+                return report
             
-            cleanup_results = self._cleanup_old_data()
+            cursor = conn.execute(f"""
+                INSERT OR IGNORE INTO payments (
+                    id, contract_id, placement_id, publisher_id, advertiser_id,
+                    amount, status, payment_method, scheduled_at, created_at
+                )
+                SELECT payment_id, contract_id, placement_id, publisher_id, advertiser_id,
+                       amount, 'pending', 'scheduled_payout', scheduled_at, CURRENT_TIMESTAMP
+                FROM ({_PLANNED_PAYMENTS_SELECT})
+            """, (scheduled_at,))
+            conn.execute("COMMIT")
             
-            logger.info(f"🧹 Очистка завершена: {cleanup_results}")
+            report['planned_count'] = cursor.rowcount
+            return report
             
-        except Exception as e:
-            logger.error(f"❌ Ошибка очистки данных: {e}")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+    
+    def _run_cleanup(self):
+        """Очищает старые данные (ошибки учитывает исполнитель задач)"""
+        logger.info("🧹 Очистка старых данных...")
+        
+        cleanup_results = self._cleanup_old_data()
+        
+        processed = {name: p['processed'] for name, p in cleanup_results.get('policies', {}).items()}
+        logger.info(f"🧹 Очистка завершена: {processed}")
     
     def _cleanup_old_data(self) -> Dict:
-        """Очищает старые данные из БД"""
-        from app.models import execute_db_query
-        
-        # Удаляем старые уведомления (старше 30 дней)
-        old_notifications = execute_db_query("""
-            DELETE FROM notifications 
-            WHERE created_at < datetime('now', '-30 days')
-        """)
-        
-        # Удаляем старые логи ошибок (старше 7 дней)
-        old_logs = execute_db_query("""
-            DELETE FROM error_logs 
-            WHERE created_at < datetime('now', '-7 days')
-        """)
-        
-        # Архивируем старые размещения (старше 90 дней)
-        old_placements = execute_db_query("""
-            UPDATE offer_placements 
-            SET status = 'archived'
-            WHERE status = 'completed' 
-            AND updated_at < datetime('now', '-90 days')
-        """)
-        
-        return {
-            'notifications_deleted': old_notifications or 0,
-            'logs_deleted': old_logs or 0,
-            'placements_archived': old_placements or 0
-        }
+        """Очищает и архивирует старые данные порциями (см. RetentionEngine)"""
+        from app.tasks.data_retention import get_retention_engine
+        
+        return get_retention_engine().run()
+    
+    def get_retention_progress(self) -> Dict:
+        """Ход последней очистки старых данных"""
+        from app.tasks.data_retention import get_retention_engine
+        
+        return get_retention_engine().get_progress()
     
     def _run_dashboard_cache_update(self):
-        """Обновляет кэш дашбордов"""
-        try:
-            logger.debug("📊 Обновление кэша дашбордов...")
-            
-            self._update_dashboard_cache()
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка обновления кэша дашбордов: {e}")
+        """Обновляет кэш дашбордов (ошибки учитывает исполнитель задач)"""
+        logger.debug("📊 Обновление кэша дашбордов...")
+        
+        self._update_dashboard_cache()
+    
+    def _run_stats_rollup(self):
+        """Сворачивает новые замеры статистики (ошибки учитывает исполнитель задач)"""
+        from app.services.stats_rollup import rollup_statistics
+        
+        result = rollup_statistics()
+        logger.debug(f"📉 Свертка статистики завершена: {result}")
+    
+    def _run_user_counters_reconcile(self):
+        """Сверяет и исправляет счетчики пользователей (ошибки учитывает исполнитель задач)"""
+        from app.services.user_counters import reconcile_user_counters
+        
+        result = reconcile_user_counters()
+        logger.debug(f"🔢 Сверка счетчиков пользователей: {result['checked']} проверено, "
+                     f"{result['drifted']} расхождений")
+    
+    def _run_analytics_snapshot(self):
+        """Обновляет снимок БД для отчетов (ошибки учитывает исполнитель задач)"""
+        from app.analytics.snapshot import analytics_snapshot
+        
+        analytics_snapshot.refresh().preload()
+    
+    async def _async_notification_outbox(self):
+        """Отправляет уведомления из outbox (ошибки учитывает исполнитель задач)"""
+        from app.services.notification_outbox import dispatch_pending_notifications
+        
+        result = await dispatch_pending_notifications()
+        if result['claimed']:
+            logger.debug(f"📨 Outbox: {result}")
     
     def _update_dashboard_cache(self):
-        """Обновляет кэшированные данные для дашбордов"""
-        from app.models.database import execute_db_query
+        """Пересобирает снимки дашбордов (только по изменившимся данным)"""
+        from app.services.dashboard_snapshot import rebuild_dashboard_snapshots
         
-        try:
-            # Кэшируем общую статистику
-            overview_stats = execute_db_query("""
-                SELECT 
-                    COUNT(*) as total_placements,
-                    COUNT(CASE WHEN status = 'active' THEN 1 END) as active_placements,
-                    COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed_placements,
-                    SUM(CASE WHEN status IN ('active', 'completed') THEN funds_reserved ELSE 0 END) as total_revenue
-                FROM offer_placements
-                WHERE created_at >= datetime('now', '-30 days')
-            """, fetch_one=True)
-            
-            # Обновляем кэш производительности активных размещений
-            execute_db_query("""
-                CREATE TEMPORARY TABLE IF NOT EXISTS dashboard_cache_temp AS
-                SELECT 
-                    p.id,
-                    p.status,
-                    COALESCE(ps.views_count, 0) as views,
-                    COALESCE(es.clicks, 0) as clicks,
-                    datetime('now') as cached_at
-                FROM offer_placements p
-                LEFT JOIN placement_statistics ps ON p.id = ps.placement_id 
-                    AND ps.id = (SELECT MAX(id) FROM placement_statistics WHERE placement_id = p.id)
-                LEFT JOIN ereit_statistics es ON p.id = es.placement_id 
-                    AND es.id = (SELECT MAX(id) FROM ereit_statistics WHERE placement_id = p.id)
-                WHERE p.status = 'active'
-            """)
-            
-            logger.debug("✅ Кэш дашбордов обновлен")
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка обновления кэша дашбордов: {e}")
+        result = rebuild_dashboard_snapshots()
+        logger.debug(f"✅ Кэш дашбордов обновлен: {result}")
 
 
 # Глобальный экземпляр планировщика
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Координация нескольких экземпляров планировщика через общую БД
+Один экземпляр держит аренду лидера (строка в scheduler_leases) и выполняет
+общие задачи; проверки размещений делятся между всеми живыми экземплярами
+по остатку от деления id размещения (шардирование)
+"""
+
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from app.config.telegram_config import AppConfig, SCHEDULER_LEASE_TTL_SECONDS, SCHEDULER_HEARTBEAT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+LEADER_LEASE_NAME = 'monitoring_scheduler'
+
+Shard = Tuple[int, int]  # (номер шарда, количество шардов)
+
+
+def placement_in_shard(placement_id: int, shard: Optional[Shard]) -> bool:
+    """Принадлежит ли размещение шарду текущего экземпляра"""
+    if not shard or shard[1] <= 1:
+        return True
+    return placement_id % shard[1] == shard[0]
+
+
+class SchedulerCoordinator:
+    """Аренда лидера с heartbeat и распределение шардов между экземплярами"""
+
+    def __init__(self, lease_ttl: float = SCHEDULER_LEASE_TTL_SECONDS,
+                 heartbeat_interval: float = SCHEDULER_HEARTBEAT_SECONDS,
+                 db_path: str = None):
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.db_path = db_path or AppConfig.DATABASE_PATH
+        self.is_leader = False
+        self._shard: Shard = (0, 1)
+        self._running = False
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ensure_tables()
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None - транзакции открываются явно через BEGIN IMMEDIATE
+        return sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+
+    def _ensure_tables(self):
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scheduler_leases (
+                    name TEXT PRIMARY KEY,
+                    holder TEXT NOT NULL,
+                    acquired_at REAL NOT NULL,
+                    heartbeat_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scheduler_members (
+                    instance_id TEXT PRIMARY KEY,
+                    started_at REAL NOT NULL,
+                    heartbeat_at REAL NOT NULL
+                )
+            """)
+        finally:
+            conn.close()
+
+    def start(self):
+        """Регистрирует экземпляр и запускает поток heartbeat"""
+        if self._running:
+            return
+        self._running = True
+        self._stop_event.clear()
+        self.heartbeat()
+        self._thread = threading.Thread(target=self._heartbeat_loop, name='scheduler-heartbeat', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Отдает аренду и снимает экземпляр с учета, чтобы шарды перераспределились сразу"""
+        self._running = False
+        self._stop_event.set()
+        # Дожидаемся heartbeat, уже начатого в потоке: иначе он мог бы вернуть строку
+        # экземпляра после удаления (ожидание блокировки БД - до 10 с, см. _connect)
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=15)
+        self._thread = None
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM scheduler_leases WHERE name = ? AND holder = ?",
+                         (LEADER_LEASE_NAME, self.instance_id))
+            conn.execute("DELETE FROM scheduler_members WHERE instance_id = ?", (self.instance_id,))
+            conn.execute("COMMIT")
+        except Exception as e:
+            logger.error(f"❌ Ошибка освобождения аренды планировщика: {e}")
+        finally:
+            conn.close()
+        self.is_leader = False
+        self._shard = (0, 1)
+
+    def _heartbeat_loop(self):
+        while not self._stop_event.wait(self.heartbeat_interval):
+            self.heartbeat()
+
+    def heartbeat(self):
+        """Продление членства и аренды лидера, пересчет шарда"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if not self._running:
+                # stop() уже снял экземпляр с учета (проверка под блокировкой записи)
+                conn.execute("ROLLBACK")
+                return
+            conn.execute("""
+                INSERT INTO scheduler_members (instance_id, started_at, heartbeat_at) VALUES (?, ?, ?)
+                ON CONFLICT(instance_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at
+            """, (self.instance_id, now, now))
+            conn.execute("DELETE FROM scheduler_members WHERE heartbeat_at < ?", (now - self.lease_ttl,))
+
+            leader = self._acquire_or_renew(conn, now)
+
+            members = [row[0] for row in conn.execute(
+                "SELECT instance_id FROM scheduler_members ORDER BY started_at, instance_id"
+            )]
+            conn.execute("COMMIT")
+        except Exception as e:
+            logger.error(f"❌ Ошибка heartbeat планировщика: {e}")
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            # Без подтвержденной аренды лидерские задачи не выполняем
+            leader = False
+            members = None
+        finally:
+            conn.close()
+
+        if leader != self.is_leader:
+            if leader:
+                logger.info(f"👑 Экземпляр {self.instance_id} стал лидером планировщика")
+            else:
+                logger.warning(f"⚠️ Экземпляр {self.instance_id} потерял лидерство планировщика")
+        self.is_leader = leader
+
+        if members is not None:
+            self._update_shard(members)
+
+    def _acquire_or_renew(self, conn: sqlite3.Connection, now: float) -> bool:
+        """Захват свободной или просроченной аренды, продление своей"""
+        row = conn.execute(
+            "SELECT holder, expires_at FROM scheduler_leases WHERE name = ?", (LEADER_LEASE_NAME,)
+        ).fetchone()
+
+        if row and row[0] != self.instance_id and row[1] > now:
+            return False
+
+        if row and row[0] == self.instance_id:
+            conn.execute("""
+                UPDATE scheduler_leases SET heartbeat_at = ?, expires_at = ?
+                WHERE name = ? AND holder = ?
+            """, (now, now + self.lease_ttl, LEADER_LEASE_NAME, self.instance_id))
+        else:
+            conn.execute("""
+                INSERT INTO scheduler_leases (name, holder, acquired_at, heartbeat_at, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    holder = excluded.holder,
+                    acquired_at = excluded.acquired_at,
+                    heartbeat_at = excluded.heartbeat_at,
+                    expires_at = excluded.expires_at
+            """, (LEADER_LEASE_NAME, self.instance_id, now, now, now + self.lease_ttl))
+        return True
+
+    def _update_shard(self, members: List[str]):
+        if self.instance_id not in members:
+            return
+        shard = (members.index(self.instance_id), len(members))
+        if shard != self._shard:
+            logger.info(f"🧩 Шард планировщика: {shard[0] + 1} из {shard[1]}")
+        self._shard = shard
+
+    def shard(self) -> Shard:
+        """Текущий шард (номер, количество)"""
+        return self._shard
+
+    def get_status(self) -> dict:
+        return {
+            'instance_id': self.instance_id,
+            'is_leader': self.is_leader,
+            'shard_index': self._shard[0],
+            'shard_count': self._shard[1]
+        }
@@ -393,41 +393,29 @@ class TelegramBotExtension:
                     'parse_mode': 'HTML'
                 }
             
-            conn = self.get_db_connection()
-            if not conn:
+            # Счетчики поддерживаются триггерами - один поиск по ключу вместо агрегатов
+            from app.services.user_counters import get_user_counters
+            counters = get_user_counters(user['id'])
+            if counters is None:
                 return {
                     'text': "❌ Ошибка подключения к базе данных.",
                     'parse_mode': 'HTML'
                 }
             
-            cursor = conn.cursor()
-            
-            # Статистика для владельцев каналов
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_proposals,
-                    COUNT(CASE WHEN r.status = 'pending' THEN 1 END) as pending_count,
-                    COUNT(CASE WHEN r.status = 'accepted' THEN 1 END) as accepted_count,
-                    COUNT(CASE WHEN r.status = 'rejected' THEN 1 END) as rejected_count
-                FROM offer_responses r
-                JOIN channels c ON r.channel_id = c.id
-                WHERE c.owner_id = ?
-            """, (user['id'],))
-            
-            stats = cursor.fetchone()
+            # Статистика для владельцев каналов (отклики их каналов)
+            stats = {
+                'total_proposals': counters['channel_responses_total'],
+                'pending_count': counters['channel_responses_pending'],
+                'accepted_count': counters['channel_responses_accepted'],
+                'rejected_count': counters['channel_responses_rejected']
+            }
             
             # Статистика по офферам (для рекламодателей)
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_offers,
-                    COUNT(CASE WHEN o.status = 'active' THEN 1 END) as active_offers,
-                    COUNT(CASE WHEN o.status = 'completed' THEN 1 END) as completed_offers
-                FROM offers o
-                WHERE o.advertiser_id = ?
-            """, (user['id'],))
-            
-            offer_stats = cursor.fetchone()
-            conn.close()
+            offer_stats = {
+                'total_offers': counters['offers_total'],
+                'active_offers': counters['offers_active'],
+                'completed_offers': counters['offers_completed']
+            }
             
             message = "📊 <b>Ваша статистика:</b>\n\n"
             
@@ -23,6 +23,8 @@ from urllib.parse import urlparse, parse_qs
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.config.telegram_config import AppConfig
+from app.telegram.telegram_web_fetcher import get_web_fetcher, build_post_embed_url
+from app.telegram.telegram_html_parser import extract_views, parse_count
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
@@ -310,16 +312,13 @@ class TelegramChannelParser:
         """Проверка поста через веб-скрейпинг"""
         try:
             # Формируем URL для предпросмотра
-            preview_url = f"https://t.me/{username}/{message_id}?embed=1"
+            preview_url = build_post_embed_url(username, message_id)
             
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            response = requests.get(preview_url, headers=headers, timeout=10)
+            # Страница берется из общего кэша t.me
+            page = get_web_fetcher().fetch(preview_url, timeout=10)
             
-            if response.status_code == 200:
-                content = response.text
+            if page.status == 200:
+                content = page.text
                 
                 # Проверяем наличие сообщения
                 if 'tgme_widget_message' in content:
@@ -344,7 +343,7 @@ class TelegramChannelParser:
                     result=CheckResult.NETWORK_ERROR,
                     post_exists=False,
                     views_count=0,
-                    error_message=f"HTTP {response.status_code}"
+                    error_message=f"HTTP {page.status}"
                 )
                 
         except Exception as e:
@@ -401,40 +400,14 @@ class TelegramChannelParser:
     def _extract_views_from_html(self, html_content: str) -> int:
         """Извлечение количества просмотров из HTML"""
         try:
-            # Ищем паттерн для просмотров
-            patterns = [
-                r'<span class="tgme_widget_message_views">(\d+(?:\.\d+)?[KM]?)</span>',
-                r'data-views="(\d+)"',
-                r'(\d+(?:\.\d+)?[KM]?)\s*views?'
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, html_content, re.IGNORECASE)
-                if match:
-                    views_str = match.group(1)
-                    return self._parse_views_string(views_str)
-            
-            return 0
-            
+            return extract_views(html_content)
         except Exception as e:
             logger.error(f"Ошибка извлечения просмотров из HTML: {e}")
             return 0
     
     def _parse_views_string(self, views_str: str) -> int:
         """Парсинг строки с количеством просмотров (например, '1.2K' -> 1200)"""
-        try:
-            views_str = views_str.strip().upper()
-            
-            if views_str.endswith('K'):
-                return int(float(views_str[:-1]) * 1000)
-            elif views_str.endswith('M'):
-                return int(float(views_str[:-1]) * 1000000)
-            else:
-                return int(float(views_str))
-                
-        except Exception as e:
-            logger.error(f"Ошибка парсинга просмотров: {e}")
-            return 0
+        return parse_count(views_str)
     
     def check_multiple_posts(self, urls: List[str]) -> List[PostCheckResult]:
         """Проверка нескольких постов с задержкой"""
@@ -459,15 +432,15 @@ class TelegramChannelParser:
             
             cursor = conn.cursor()
             
-            # Сохраняем результат проверки
+            # Сохраняем результат проверки (время - по часам SQLite в UTC, как
+            # у остальных записей placement_checks и у отметок свертки статистики)
             cursor.execute("""
                 INSERT INTO placement_checks (
                     placement_id, check_time, post_exists, views_count,
                     check_status, error_message, response_data
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                ) VALUES (?, CURRENT_TIMESTAMP, ?, ?, ?, ?, ?)
             """, (
                 placement_id,
-                result.check_time.isoformat(),
                 1 if result.post_exists else 0,
                 result.views_count,
                 result.result.value,
@@ -551,12 +524,44 @@ class PlacementMonitor:
             logger.error(f"Ошибка получения активных размещений: {e}")
             return []
     
-    def check_placement(self, placement_id: int, post_url: str) -> bool:
+    def collect_preview_snapshots(self, placements: List[Dict[str, Any]]) -> Dict:
+        """Пакетная проверка публичных постов через страницы предпросмотра каналов"""
+        from app.telegram.telegram_preview_extractor import ChannelPreviewBatchExtractor
+        
+        posts = []
+        for placement in placements:
+            parsed_url = self.parser.parse_telegram_url(placement['post_url'])
+            if parsed_url.get('is_valid') and parsed_url['type'] == 'public' and parsed_url['username'] != 'c':
+                posts.append((parsed_url['username'], int(parsed_url['message_id'])))
+        
+        if not posts:
+            return {}
+        
+        try:
+            return ChannelPreviewBatchExtractor().extract(posts)
+        except Exception as e:
+            logger.error(f"Ошибка пакетной проверки постов: {e}")
+            return {}
+    
+    def _result_from_snapshot(self, snapshot) -> Optional[PostCheckResult]:
+        """Результат проверки по данным страницы канала (только если пост найден)"""
+        if not snapshot or not snapshot.exists:
+            return None
+        
+        return PostCheckResult(
+            result=CheckResult.SUCCESS,
+            post_exists=True,
+            views_count=snapshot.views,
+            post_data={'method': 'channel_preview', 'reactions': snapshot.reactions}
+        )
+    
+    def check_placement(self, placement_id: int, post_url: str, snapshot=None) -> bool:
         """Проверка одного размещения"""
         try:
             logger.info(f"Проверка размещения {placement_id}: {post_url}")
             
-            result = self.parser.check_post_exists(post_url)
+            # Если пост найден пакетной проверкой, отдельный запрос не нужен
+            result = self._result_from_snapshot(snapshot) or self.parser.check_post_exists(post_url)
             self.parser.save_check_result(placement_id, result)
             
             # Логируем результат
@@ -585,21 +590,30 @@ class PlacementMonitor:
             
             logger.info(f"Начинаем проверку {len(active_placements)} размещений")
             
+            # Посты одного канала проверяются одной загрузкой страницы предпросмотра
+            snapshots = self.collect_preview_snapshots(active_placements)
+            
             checked = 0
             success = 0
             failed = 0
             
             for placement in active_placements:
                 try:
-                    if self.check_placement(placement['id'], placement['post_url']):
+                    parsed_url = self.parser.parse_telegram_url(placement['post_url'])
+                    snapshot = None
+                    if parsed_url.get('is_valid') and parsed_url['type'] == 'public':
+                        snapshot = snapshots.get((parsed_url['username'], int(parsed_url['message_id'])))
+                    
+                    if self.check_placement(placement['id'], placement['post_url'], snapshot):
                         success += 1
                     else:
                         failed += 1
                     
                     checked += 1
                     
-                    # Задержка между проверками
-                    time.sleep(self.parser.rate_limit_delay)
+                    # Задержка нужна только после индивидуальной проверки
+                    if not (snapshot and snapshot.exists):
+                        time.sleep(self.parser.rate_limit_delay)
                     
                 except Exception as e:
                     logger.error(f"Ошибка при проверке размещения {placement['id']}: {e}")
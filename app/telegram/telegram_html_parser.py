@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Быстрый разбор HTML страниц t.me и сервисов статистики
+Предкомпилированные XPath-выражения на lxml, частичный разбор документа
+и единый парсер счетчиков ('1.2K', '3,4M', '12 345')
+"""
+
+import json
+import re
+from functools import lru_cache
+from typing import Dict
+
+from lxml import etree
+from lxml import html as lxml_html
+
+# ===== ЧИСЛА =====
+
+_SUFFIX_MULTIPLIERS = {
+    'K': 1000, 'К': 1000,
+    'M': 1000000, 'М': 1000000,
+    'B': 1000000000
+}
+
+# Суффикс засчитывается, только если за ним не идет буква ('3 members' - не миллионы)
+_COUNT_RE = re.compile(r'(\d[\d\s.,]*)(?:([KMBКМ])(?![^\W\d_]))?', re.IGNORECASE)
+_PERCENT_RE = re.compile(r'(\d+(?:[.,]\d+)?)\s*%')
+_DECIMAL_COMMA_RE = re.compile(r'\d+,\d{1,2}')
+# Счетчик просмотров без разбора дерева; текст с HTML-сущностями разбирает lxml
+_VIEWS_SPAN_RE = re.compile(r'<span\b[^>]*\bclass="[^"]*\btgme_widget_message_views\b[^"]*"[^>]*>([^<&]*)<')
+
+
+def parse_count(text) -> int:
+    """
+    Разбор счетчика с суффиксами K/M/B (в т.ч. кириллическими К/М)
+
+    Запятая перед суффиксом или с 1-2 знаками после нее считается десятичной
+    ('1,2K', '3,5'), иначе - разделителем разрядов ('12,345'). Пробелы внутри
+    числа игнорируются. Нераспознанный текст дает 0.
+    """
+    if text is None:
+        return 0
+    if isinstance(text, (int, float)):
+        return int(text)
+
+    match = _COUNT_RE.search(str(text).replace('\xa0', ' '))
+    if not match:
+        return 0
+
+    number = re.sub(r'\s', '', match.group(1)).strip('.,')
+    multiplier = _SUFFIX_MULTIPLIERS.get((match.group(2) or '').upper(), 1)
+
+    if multiplier > 1 or _DECIMAL_COMMA_RE.fullmatch(number):
+        number = number.replace(',', '.')
+    else:
+        number = number.replace(',', '')
+
+    try:
+        return int(float(number) * multiplier)
+    except ValueError:
+        return 0
+
+
+def parse_percentage(text: str) -> float:
+    """Извлечение процента из текста ('5.3%' -> 5.3)"""
+    match = _PERCENT_RE.search(text or '')
+    if not match:
+        return 0.0
+    return float(match.group(1).replace(',', '.'))
+
+
+# ===== XPATH =====
+
+def _class_predicate(class_name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+_XP_MESSAGES = etree.XPath(f"//div[{_class_predicate('tgme_widget_message')}]")
+_XP_MESSAGES_WITH_POST = etree.XPath(f"//div[{_class_predicate('tgme_widget_message')}][@data-post]")
+# Пустой блок ошибки есть и на странице существующего поста, учитываем только с текстом
+_XP_MESSAGE_ERROR = etree.XPath(f"//*[{_class_predicate('tgme_widget_message_error')}][normalize-space()]")
+_XP_VIEWS = etree.XPath(f".//span[{_class_predicate('tgme_widget_message_views')}]/text()")
+_XP_REACTIONS = etree.XPath(f".//span[{_class_predicate('tgme_reaction')}]")
+_XP_OWN_TEXT = etree.XPath("./text()")
+_XP_REPLIES = etree.XPath(f".//*[{_class_predicate('tgme_widget_message_reply')}]//text()")
+_XP_DATA_VIEWS = etree.XPath(".//@data-views")
+_XP_META = etree.XPath("//meta[@content][@property or @name]")
+_XP_JSON_LD = etree.XPath("//script[@type='application/ld+json']/text()")
+
+# Метатеги со статистикой (Open Graph и Twitter Card)
+_META_STATS = {
+    'og:views': 'views',
+    'og:reactions': 'reactions',
+    'og:shares': 'shares',
+    'og:comments': 'comments',
+    'twitter:views': 'views',
+    'twitter:reactions': 'reactions'
+}
+
+# Типы InteractionCounter из JSON-LD
+_INTERACTION_STATS = (
+    ('ViewAction', 'views'),
+    ('LikeAction', 'reactions'),
+    ('ShareAction', 'shares'),
+    ('CommentAction', 'comments')
+)
+
+
+@lru_cache(maxsize=64)
+def class_text_xpath(class_name: str) -> etree.XPath:
+    """Скомпилированный XPath: текст первого элемента с классом class_name"""
+    return etree.XPath(f"(//*[{_class_predicate(class_name)}])[1]//text()")
+
+
+# ===== РАЗБОР ДОКУМЕНТОВ =====
+
+def parse_html(html_content: str):
+    """Полный разбор документа (для страниц внешних сервисов статистики)"""
+    return lxml_html.document_fromstring(html_content or '<html></html>')
+
+
+def first_class_text(tree, class_name: str) -> str:
+    """Текст первого элемента с указанным классом"""
+    return ''.join(class_text_xpath(class_name)(tree)).strip()
+
+
+def _parse_from_marker(html_content: str, marker: str):
+    """
+    Частичный разбор: документ строится начиная с тега, содержащего marker
+
+    Шапка страницы, стили и скрипты до виджета поста в дерево не попадают.
+    """
+    index = html_content.find(marker)
+    if index < 0:
+        return None
+    start = html_content.rfind('<', 0, index)
+    return lxml_html.document_fromstring(html_content[max(start, 0):])
+
+
+def _parse_head(html_content: str):
+    """Частичный разбор: только <head> (метатеги и JSON-LD)"""
+    end = html_content.find('</head>')
+    head = html_content[:end + len('</head>')] if end >= 0 else html_content
+    return lxml_html.document_fromstring(head or '<html></html>')
+
+
+def _reactions_total(node) -> int:
+    """Сумма счетчиков реакций (число идет текстом после эмодзи)"""
+    return sum(parse_count(''.join(_XP_OWN_TEXT(reaction))) for reaction in _XP_REACTIONS(node))
+
+
+def _views(node) -> int:
+    views_text = _XP_VIEWS(node)
+    if views_text:
+        return parse_count(views_text[0])
+    data_views = _XP_DATA_VIEWS(node)
+    return parse_count(data_views[0]) if data_views else 0
+
+
+def extract_metadata_stats(html_content: str) -> Dict[str, int]:
+    """Статистика из JSON-LD, Open Graph и Twitter Card метаданных"""
+    stats: Dict[str, int] = {}
+    if not html_content:
+        return stats
+
+    head = _parse_head(html_content)
+
+    for json_text in _XP_JSON_LD(head):
+        try:
+            data = json.loads(json_text)
+        except ValueError:
+            continue
+        if not isinstance(data, dict) or not isinstance(data.get('interactionStatistic'), list):
+            continue
+
+        for stat in data['interactionStatistic']:
+            if not isinstance(stat, dict) or stat.get('@type') != 'InteractionCounter':
+                continue
+            interaction_type = (stat.get('interactionType') or {}).get('@type', '')
+            count = parse_count(stat.get('userInteractionCount', 0))
+            for action, key in _INTERACTION_STATS:
+                if action in interaction_type:
+                    stats[key] = max(stats.get(key, 0), count)
+                    break
+
+    for meta in _XP_META(head):
+        key = _META_STATS.get((meta.get('property') or meta.get('name') or '').lower())
+        if key:
+            stats[key] = max(stats.get(key, 0), parse_count(meta.get('content')))
+
+    return stats
+
+
+def extract_post_stats(html_content: str) -> Dict[str, int]:
+    """
+    Статистика поста со страницы t.me/<channel>/<id>?embed=1
+
+    Возвращает views, reactions, shares, comments и признак exists.
+    Метаданные страницы учитываются, если дают большее значение.
+    """
+    stats = {'views': 0, 'reactions': 0, 'shares': 0, 'comments': 0, 'exists': False}
+    if not html_content:
+        return stats
+
+    tree = _parse_from_marker(html_content, 'tgme_widget_message')
+    if tree is not None and not _XP_MESSAGE_ERROR(tree):
+        messages = _XP_MESSAGES(tree)
+        if messages:
+            message = messages[0]
+            stats['exists'] = True
+            stats['views'] = _views(message)
+            stats['reactions'] = _reactions_total(message)
+            stats['comments'] = parse_count(''.join(_XP_REPLIES(message)))
+
+    for key, value in extract_metadata_stats(html_content).items():
+        if value > stats.get(key, 0):
+            stats[key] = value
+
+    return stats
+
+
+def extract_views(html_content: str) -> int:
+    """Количество просмотров поста (0, если не найдено)"""
+    if not html_content:
+        return 0
+
+    # Быстрый путь: счетчик берется регулярным выражением с тега, где
+    # впервые встречается класс (вызывается на каждой проверке поста)
+    index = html_content.find('tgme_widget_message_views')
+    if index >= 0:
+        match = _VIEWS_SPAN_RE.match(html_content, max(html_content.rfind('<', 0, index), 0))
+        if match and match.group(1).strip():
+            return parse_count(match.group(1))
+
+    # Достаточно разобрать фрагмент, начинающийся со счетчика просмотров
+    tree = _parse_from_marker(html_content, 'tgme_widget_message_views')
+    if tree is not None:
+        views_text = _XP_VIEWS(tree)
+        if views_text:
+            return parse_count(views_text[0])
+
+    tree = _parse_from_marker(html_content, 'tgme_widget_message')
+    if tree is None:
+        return 0
+    messages = _XP_MESSAGES(tree)
+    return _views(messages[0]) if messages else 0
+
+
+def parse_preview_page(html_content: str) -> Dict[int, Dict[str, int]]:
+    """
+    Разбор страницы t.me/s/<channel> за один проход lxml
+
+    Возвращает {message_id: {'views': ..., 'reactions': ...}} для всех постов страницы
+    """
+    if not html_content:
+        return {}
+
+    tree = _parse_from_marker(html_content, 'tgme_widget_message')
+    if tree is None:
+        return {}
+
+    posts = {}
+    for node in _XP_MESSAGES_WITH_POST(tree):
+        _, _, message_part = node.get('data-post', '').rpartition('/')
+        if not message_part.isdigit():
+            continue
+        posts[int(message_part)] = {
+            'views': _views(node),
+            'reactions': _reactions_total(node)
+        }
+
+    return posts
+
+
+def parse_channel_metrics(html_content: str, selectors: Dict[str, str]) -> Dict[str, str]:
+    """
+    Тексты метрик страницы внешнего сервиса по классам элементов
+
+    selectors: {'subscriber_count': 'subscribers-count', ...}
+    """
+    tree = parse_html(html_content)
+    return {key: first_class_text(tree, class_name) for key, class_name in selectors.items()}
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Пакетное извлечение статистики постов со страниц предпросмотра каналов
+Одна страница t.me/s/<channel> содержит ~20 последних постов с просмотрами,
+поэтому проверки группируются по каналу и загружается минимум страниц
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.telegram.telegram_html_parser import parse_preview_page
+from app.telegram.telegram_web_fetcher import get_web_fetcher, TelegramWebFetcher
+
+logger = logging.getLogger(__name__)
+
+PostKey = Tuple[str, int]
+
+# Ограничения, чтобы один канал не съедал весь бюджет запросов
+MAX_PAGES_PER_CHANNEL = 10
+MAX_CONCURRENT_CHANNELS = 5
+
+
+@dataclass
+class PostSnapshot:
+    """Состояние поста на странице предпросмотра канала"""
+    channel: str
+    message_id: int
+    exists: Optional[bool]  # None - определить не удалось
+    views: int = 0
+    reactions: int = 0
+    error: Optional[str] = None
+
+
+class ChannelPreviewBatchExtractor:
+    """Групповая проверка постов через страницы предпросмотра каналов"""
+
+    def __init__(self, fetcher: TelegramWebFetcher = None,
+                 max_pages_per_channel: int = MAX_PAGES_PER_CHANNEL):
+        self.fetcher = fetcher or get_web_fetcher()
+        self.max_pages_per_channel = max_pages_per_channel
+        self.pages_fetched = 0
+
+    @staticmethod
+    def build_page_url(channel: str, before: Optional[int] = None) -> str:
+        """URL страницы предпросмотра (before - посты с id строго меньше)"""
+        url = f"https://t.me/s/{channel}"
+        return f"{url}?before={before}" if before else url
+
+    @staticmethod
+    def _group_by_channel(posts: Iterable[PostKey]) -> Dict[str, List[PostKey]]:
+        """Группировка пар (канал, id) по каналу без учета регистра"""
+        grouped = defaultdict(list)
+        for channel, message_id in posts:
+            if not channel:
+                continue
+            grouped[channel.lower()].append((channel, int(message_id)))
+        return grouped
+
+    def _resolve_page(self, page_posts: Dict[int, Dict[str, int]], top_id: int,
+                      pending: List[PostKey], results: Dict[PostKey, PostSnapshot],
+                      channel: str) -> List[PostKey]:
+        """
+        Отмечает все цели, попавшие в диапазон страницы [min_id, top_id]
+
+        Пост из диапазона, которого нет на странице, удален или скрыт.
+        Возвращает цели, оставшиеся за пределами страницы.
+        """
+        lowest_id = min(page_posts)
+        remaining = []
+
+        for key in pending:
+            message_id = key[1]
+            if lowest_id <= message_id <= top_id:
+                post = page_posts.get(message_id)
+                if post:
+                    results[key] = PostSnapshot(channel, message_id, True, post['views'], post['reactions'])
+                else:
+                    results[key] = PostSnapshot(channel, message_id, False)
+            else:
+                remaining.append(key)
+
+        return remaining
+
+    def _mark_unknown(self, pending: List[PostKey], results: Dict[PostKey, PostSnapshot], error: str):
+        for key in pending:
+            results[key] = PostSnapshot(key[0], key[1], None, error=error)
+
+    def _next_page_url(self, channel: str, pending: List[PostKey]) -> Tuple[str, int]:
+        """Страница, которая начинается с самой новой из оставшихся целей"""
+        top_id = max(message_id for _, message_id in pending)
+        return self.build_page_url(channel, top_id + 1), top_id
+
+    def _extract_channel(self, channel: str, targets: List[PostKey]) -> Dict[PostKey, PostSnapshot]:
+        """Синхронная обработка одного канала"""
+        results: Dict[PostKey, PostSnapshot] = {}
+        pending = sorted(targets, key=lambda key: key[1], reverse=True)
+        pages = 0
+
+        while pending:
+            if pages >= self.max_pages_per_channel:
+                self._mark_unknown(pending, results, 'page limit reached')
+                break
+
+            url, top_id = self._next_page_url(channel, pending)
+            try:
+                page = self.fetcher.fetch(url, timeout=10)
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось загрузить {url}: {e}")
+                self._mark_unknown(pending, results, str(e))
+                break
+
+            pages += 1
+            self.pages_fetched += 1
+            pending = self._handle_page(channel, page.status, page.text, top_id, pending, results)
+
+        return results
+
+    async def _aextract_channel(self, channel: str, targets: List[PostKey],
+                                semaphore: asyncio.Semaphore) -> Dict[PostKey, PostSnapshot]:
+        """Асинхронная обработка одного канала"""
+        results: Dict[PostKey, PostSnapshot] = {}
+        pending = sorted(targets, key=lambda key: key[1], reverse=True)
+        pages = 0
+
+        async with semaphore:
+            while pending:
+                if pages >= self.max_pages_per_channel:
+                    self._mark_unknown(pending, results, 'page limit reached')
+                    break
+
+                url, top_id = self._next_page_url(channel, pending)
+                try:
+                    page = await self.fetcher.afetch(url, timeout=10)
+                except Exception as e:
+                    logger.warning(f"⚠️ Не удалось загрузить {url}: {e}")
+                    self._mark_unknown(pending, results, str(e))
+                    break
+
+                pages += 1
+                self.pages_fetched += 1
+                pending = self._handle_page(channel, page.status, page.text, top_id, pending, results)
+
+        return results
+
+    def _handle_page(self, channel: str, status: int, text: str, top_id: int,
+                     pending: List[PostKey], results: Dict[PostKey, PostSnapshot]) -> List[PostKey]:
+        """Разбор загруженной страницы, возвращает еще не найденные цели"""
+        if status != 200:
+            self._mark_unknown(pending, results, f"HTTP {status}")
+            return []
+
+        try:
+            page_posts = parse_preview_page(text)
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка разбора страницы @{channel}: {e}")
+            self._mark_unknown(pending, results, str(e))
+            return []
+
+        if not page_posts:
+            # Предпросмотр отключен или канал пуст - ничего не утверждаем
+            self._mark_unknown(pending, results, 'no posts on preview page')
+            return []
+
+        return self._resolve_page(page_posts, top_id, pending, results, channel)
+
+    def extract(self, posts: Iterable[PostKey]) -> Dict[PostKey, PostSnapshot]:
+        """Проверка набора постов (канал, id) минимальным числом страниц"""
+        results: Dict[PostKey, PostSnapshot] = {}
+        for targets in self._group_by_channel(posts).values():
+            results.update(self._extract_channel(targets[0][0], targets))
+        return results
+
+    async def aextract(self, posts: Iterable[PostKey],
+                       max_concurrent_channels: int = MAX_CONCURRENT_CHANNELS) -> Dict[PostKey, PostSnapshot]:
+        """Асинхронная проверка набора постов, каналы обрабатываются параллельно"""
+        semaphore = asyncio.Semaphore(max_concurrent_channels)
+        grouped = self._group_by_channel(posts)
+
+        channel_results = await asyncio.gather(*[
+            self._aextract_channel(targets[0][0], targets, semaphore)
+            for targets in grouped.values()
+        ])
+
+        results: Dict[PostKey, PostSnapshot] = {}
+        for channel_result in channel_results:
+            results.update(channel_result)
+
+        logger.info(f"📄 Пакетная проверка: {len(results)} постов из {len(grouped)} каналов, "
+                    f"загружено страниц: {self.pages_fetched}")
+        return results
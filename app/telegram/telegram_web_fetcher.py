@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Общий слой загрузки публичных страниц t.me
+Кэширует ответы в локальной SQLite по URL, поддерживает условные запросы
+(ETag / Last-Modified) и объединяет одновременные загрузки одного URL
+"""
+
+import asyncio
+import functools
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Any
+
+import requests
+
+from app.config.telegram_config import TME_PAGE_CACHE_TTL_SECONDS, TME_PAGE_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7'
+}
+
+# Статусы, которые имеет смысл кэшировать (404/410 - пост или канал удален)
+CACHEABLE_STATUSES = (200, 404, 410)
+
+
+@dataclass
+class FetchedPage:
+    """Загруженная (или взятая из кэша) страница"""
+    url: str
+    status: int
+    text: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+    from_cache: bool = False
+
+
+class _InflightFetch:
+    """Загрузка URL, которую ожидают другие потоки"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.page: Optional[FetchedPage] = None
+        self.error: Optional[BaseException] = None
+
+
+class TelegramWebFetcher:
+    """Кэширующий загрузчик страниц t.me с объединением одновременных запросов"""
+
+    def __init__(self, cache_path: str = None, ttl: int = None):
+        self.cache_path = cache_path or TME_PAGE_CACHE_PATH
+        self.ttl = ttl if ttl is not None else TME_PAGE_CACHE_TTL_SECONDS
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+
+        self._inflight: Dict[str, _InflightFetch] = {}
+        self._inflight_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._cache_available = True
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'revalidated': 0,
+            'coalesced': 0,
+            'errors': 0
+        }
+
+        self._init_cache()
+
+    # ===== КЭШ =====
+
+    def _get_cache_connection(self) -> sqlite3.Connection:
+        """Подключение к файлу кэша"""
+        conn = sqlite3.connect(self.cache_path, timeout=5)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_cache(self):
+        """Создает таблицу кэша, при ошибке работает без дискового кэша"""
+        try:
+            conn = self._get_cache_connection()
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tme_pages (
+                    url TEXT PRIMARY KEY,
+                    status INTEGER NOT NULL,
+                    body TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_tme_pages_fetched_at ON tme_pages(fetched_at)')
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Кэш страниц t.me недоступен ({self.cache_path}): {e}")
+            self._cache_available = False
+
+    def _read_cache(self, url: str) -> Optional[FetchedPage]:
+        """Чтение записи кэша"""
+        if not self._cache_available:
+            return None
+        try:
+            conn = self._get_cache_connection()
+            row = conn.execute('SELECT * FROM tme_pages WHERE url = ?', (url,)).fetchone()
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Ошибка чтения кэша t.me для {url}: {e}")
+            return None
+
+        if not row:
+            return None
+
+        return FetchedPage(
+            url=url,
+            status=row['status'],
+            text=row['body'] or '',
+            etag=row['etag'],
+            last_modified=row['last_modified'],
+            fetched_at=row['fetched_at'],
+            from_cache=True
+        )
+
+    def _write_cache(self, page: FetchedPage):
+        """Сохранение страницы в кэш"""
+        if not self._cache_available:
+            return
+        try:
+            with self._cache_lock:
+                conn = self._get_cache_connection()
+                conn.execute("""
+                    INSERT OR REPLACE INTO tme_pages (url, status, body, etag, last_modified, fetched_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (page.url, page.status, page.text, page.etag, page.last_modified, page.fetched_at))
+                conn.commit()
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Ошибка записи кэша t.me для {page.url}: {e}")
+
+    def _touch_cache(self, url: str, fetched_at: float):
+        """Продление свежести записи после ответа 304"""
+        if not self._cache_available:
+            return
+        try:
+            with self._cache_lock:
+                conn = self._get_cache_connection()
+                conn.execute('UPDATE tme_pages SET fetched_at = ? WHERE url = ?', (fetched_at, url))
+                conn.commit()
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Ошибка обновления кэша t.me для {url}: {e}")
+
+    def _is_fresh(self, page: Optional[FetchedPage], ttl: int) -> bool:
+        return page is not None and time.time() - page.fetched_at < ttl
+
+    def has_fresh(self, url: str, ttl: int = None) -> bool:
+        """Есть ли в кэше свежая копия страницы"""
+        return self._is_fresh(self._read_cache(url), self.ttl if ttl is None else ttl)
+
+    def prune(self, max_age_seconds: int = 86400) -> int:
+        """Удаляет из кэша записи старше max_age_seconds"""
+        if not self._cache_available:
+            return 0
+        try:
+            with self._cache_lock:
+                conn = self._get_cache_connection()
+                cursor = conn.execute('DELETE FROM tme_pages WHERE fetched_at < ?',
+                                      (time.time() - max_age_seconds,))
+                deleted = cursor.rowcount
+                conn.commit()
+                conn.close()
+            return deleted
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Ошибка очистки кэша t.me: {e}")
+            return 0
+
+    # ===== ЗАГРУЗКА =====
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None,
+              timeout: int = 10, ttl: int = None) -> FetchedPage:
+        """
+        Загрузка страницы с учетом кэша
+
+        Свежая копия отдается из кэша без сетевого запроса, устаревшая
+        перепроверяется условным запросом. Одновременные вызовы для одного URL
+        ждут единственную загрузку. Сетевые ошибки requests пробрасываются.
+        """
+        ttl = self.ttl if ttl is None else ttl
+
+        cached = self._read_cache(url)
+        if self._is_fresh(cached, ttl):
+            self.stats['hits'] += 1
+            return cached
+
+        with self._inflight_lock:
+            inflight = self._inflight.get(url)
+            is_leader = inflight is None
+            if is_leader:
+                inflight = _InflightFetch()
+                self._inflight[url] = inflight
+
+        if not is_leader:
+            self.stats['coalesced'] += 1
+            inflight.event.wait(timeout + 5)
+            if inflight.error is not None:
+                raise inflight.error
+            if inflight.page is not None:
+                return inflight.page
+            # Ведущая загрузка не успела - грузим сами
+            return self._fetch_from_network(url, cached, headers, timeout)
+
+        try:
+            inflight.page = self._fetch_from_network(url, cached, headers, timeout)
+            return inflight.page
+        except BaseException as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(url, None)
+            inflight.event.set()
+
+    def _fetch_from_network(self, url: str, cached: Optional[FetchedPage],
+                            headers: Optional[Dict[str, str]], timeout: int) -> FetchedPage:
+        """Сетевой запрос (условный, если есть валидаторы в кэше)"""
+        request_headers = dict(headers or {})
+        if cached:
+            if cached.etag:
+                request_headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                request_headers['If-Modified-Since'] = cached.last_modified
+
+        try:
+            response = self.session.get(url, headers=request_headers, timeout=timeout, allow_redirects=True)
+        except requests.RequestException:
+            self.stats['errors'] += 1
+            raise
+
+        now = time.time()
+
+        if response.status_code == 304 and cached:
+            self.stats['revalidated'] += 1
+            self._touch_cache(url, now)
+            cached.fetched_at = now
+            return cached
+
+        self.stats['misses'] += 1
+        page = FetchedPage(
+            url=url,
+            status=response.status_code,
+            text=response.text,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
+            fetched_at=now
+        )
+
+        if page.status in CACHEABLE_STATUSES:
+            self._write_cache(page)
+
+        return page
+
+    async def afetch(self, url: str, headers: Optional[Dict[str, str]] = None,
+                     timeout: int = 10, ttl: int = None) -> FetchedPage:
+        """Асинхронная обертка над fetch (загрузка выполняется в пуле потоков)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.fetch, url, headers=headers, timeout=timeout, ttl=ttl)
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика работы кэша"""
+        total = self.stats['hits'] + self.stats['misses'] + self.stats['revalidated']
+        served_without_body = self.stats['hits'] + self.stats['revalidated']
+        return {
+            'backend': 'sqlite' if self._cache_available else 'none',
+            'ttl_seconds': self.ttl,
+            'stats': self.stats.copy(),
+            'hit_rate': round(served_without_body / total * 100, 2) if total > 0 else 0
+        }
+
+
+def build_post_embed_url(channel_username: str, message_id) -> str:
+    """Канонический URL поста - общий ключ кэша для статистики и проверок"""
+    return f"https://t.me/{channel_username}/{message_id}?embed=1"
+
+
+# Глобальный экземпляр загрузчика
+_fetcher_instance = None
+_fetcher_lock = threading.Lock()
+
+
+def get_web_fetcher() -> TelegramWebFetcher:
+    """Получает общий экземпляр загрузчика (синглтон)"""
+    global _fetcher_instance
+    if _fetcher_instance is None:
+        with _fetcher_lock:
+            if _fetcher_instance is None:
+                _fetcher_instance = TelegramWebFetcher()
+    return _fetcher_instance
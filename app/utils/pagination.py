@@ -0,0 +1,224 @@
+# app/utils/pagination.py
+"""
+Keyset-пагинация списков
+Следующая страница выбирается условием по ключу сортировки последней
+строки предыдущей (курсор), а не через OFFSET, поэтому глубокие страницы
+выбираются так же быстро, как первая. Номера страниц поддерживаются для
+совместимости (через OFFSET), общее количество строк кэшируется на
+короткое время
+"""
+
+import base64
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.config.telegram_config import PAGINATION_TOTAL_CACHE_SECONDS, PAGINATION_TOTAL_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Префикс столбцов ключа сортировки в выборке (удаляются из результата)
+_KEY_ALIAS = '_keyset_'
+
+
+class Page(NamedTuple):
+    """Страница списка"""
+    items: List[Dict[str, Any]]
+    limit: int
+    next_cursor: Optional[str]
+    total: Optional[int] = None
+    page: Optional[int] = None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def pagination(self, has_prev: bool = None) -> Dict[str, Any]:
+        """Блок pagination для ответа API (прежние поля + next_cursor)"""
+        info = {
+            'page': self.page,
+            'limit': self.limit,
+            'has_next': self.has_next,
+            'has_prev': has_prev if has_prev is not None else bool(self.page and self.page > 1),
+            'next_cursor': self.next_cursor
+        }
+        if self.total is not None:
+            info['total'] = self.total
+            info['pages'] = (self.total + self.limit - 1) // self.limit
+        return info
+
+
+class TotalCountCache:
+    """LRU кэш COUNT(*) по запросу и параметрам с ограниченным временем жизни"""
+
+    def __init__(self, max_size: int = PAGINATION_TOTAL_CACHE_SIZE, ttl_seconds: int = PAGINATION_TOTAL_CACHE_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[Tuple, Tuple[float, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple, total: int):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, total)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+total_count_cache = TotalCountCache()
+
+
+class KeysetPaginator:
+    """
+    Пагинация одного списка по ключу сортировки
+
+    sort_key - SQL-выражения ключа сортировки в порядке приоритета,
+    последнее должно быть уникальным (обычно id). Выражения не должны
+    давать NULL (используйте COALESCE), иначе строки с NULL выпадут при
+    переходе по курсору. indexes - индексы под сортировку, создаются
+    один раз при первом запросе.
+    """
+
+    def __init__(self, scope: str, sort_key: Sequence[str], descending: bool = True,
+                 indexes: Sequence[str] = ()):
+        self.scope = scope
+        self.sort_key = list(sort_key)
+        self.descending = descending
+        self.indexes = list(indexes)
+        self._indexes_ready = not self.indexes
+        self._lock = threading.Lock()
+
+    def _ensure_indexes(self):
+        if self._indexes_ready:
+            return
+        with self._lock:
+            if self._indexes_ready:
+                return
+            from app.models.database import execute_db_query
+            for index_sql in self.indexes:
+                try:
+                    execute_db_query(index_sql)
+                except Exception as e:
+                    logger.warning(f"⚠️ Не удалось создать индекс для {self.scope}: {e}")
+            self._indexes_ready = True
+
+    # ===== КУРСОРЫ =====
+
+    def encode_cursor(self, values: Sequence[Any]) -> str:
+        payload = json.dumps({'s': self.scope, 'k': list(values)}, separators=(',', ':'), ensure_ascii=False)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: str) -> List[Any]:
+        """Значения ключа из курсора; ValueError - курсор поврежден или от другого списка"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            values = payload['k']
+        except Exception:
+            raise ValueError("Некорректный курсор пагинации")
+
+        if payload.get('s') != self.scope or not isinstance(values, list) or len(values) != len(self.sort_key):
+            raise ValueError("Курсор относится к другому списку")
+        if any(isinstance(value, (dict, list)) for value in values):
+            raise ValueError("Некорректный курсор пагинации")
+        return values
+
+    # ===== ВЫБОРКА =====
+
+    def paginate(self, select: str, from_clause: str, conditions: Sequence[str] = (), params: Sequence[Any] = (),
+                 limit: int = 50, cursor: Optional[str] = None, page: int = 1, group_by: str = '',
+                 with_total: bool = False, count_from: str = None) -> Page:
+        """
+        Страница списка: SELECT {select} FROM {from_clause} WHERE {conditions}
+
+        С курсором выбирается страница после него, без курсора - страница
+        page через OFFSET (совместимость с номерами страниц). with_total -
+        добавить общее количество (кэшируется на PAGINATION_TOTAL_CACHE_SECONDS).
+        """
+        from app.models.database import execute_db_query
+
+        self._ensure_indexes()
+
+        where = list(conditions)
+        query_params = list(params)
+        offset = 0
+        if cursor:
+            values = self.decode_cursor(cursor)
+            operator = '<' if self.descending else '>'
+            # Отдельное условие на первый ключ дает поиск по индексу: сравнение
+            # строк из выражений SQLite в диапазон индекса не переводит
+            where.append(f"{self.sort_key[0]} {operator}= ?")
+            where.append(f"({', '.join(self.sort_key)}) {operator} ({', '.join('?' * len(values))})")
+            query_params.append(values[0])
+            query_params.extend(values)
+            page = None
+        else:
+            page = max(int(page or 1), 1)
+            offset = (page - 1) * limit
+
+        direction = 'DESC' if self.descending else 'ASC'
+        key_select = ', '.join(f"{expression} AS {_KEY_ALIAS}{i}" for i, expression in enumerate(self.sort_key))
+        query = f"""
+            SELECT {select}, {key_select}
+            FROM {from_clause}
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+            {group_by}
+            ORDER BY {', '.join(f'{expression} {direction}' for expression in self.sort_key)}
+            LIMIT ? OFFSET ?
+        """
+        # Лишняя строка показывает, есть ли следующая страница
+        rows = execute_db_query(query, tuple(query_params + [limit + 1, offset]), fetch_all=True) or []
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            next_cursor = self.encode_cursor([last[f"{_KEY_ALIAS}{i}"] for i in range(len(self.sort_key))])
+
+        items = [
+            {column: value for column, value in row.items() if not column.startswith(_KEY_ALIAS)}
+            for row in rows
+        ]
+
+        total = None
+        if with_total:
+            total = self.count(count_from or from_clause, conditions, params)
+
+        return Page(items=items, limit=limit, next_cursor=next_cursor, total=total, page=page)
+
+    def count(self, from_clause: str, conditions: Sequence[str] = (), params: Sequence[Any] = ()) -> int:
+        """COUNT(*) списка с фильтрами (из кэша, если он свежий)"""
+        from app.models.database import execute_db_query
+
+        query = f"SELECT COUNT(*) as total FROM {from_clause} {'WHERE ' + ' AND '.join(conditions) if conditions else ''}"
+        key = (self.scope, query, tuple(params))
+        total = total_count_cache.get(key)
+        if total is None:
+            row = execute_db_query(query, tuple(params), fetch_one=True)
+            total = row['total'] if row else 0
+            total_count_cache.put(key, total)
+        return total
@@ -7,6 +7,7 @@ WebApp Optimizer для Telegram Mini App
 import json
 import gzip
 import hashlib
+import time
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify, g, current_app
@@ -41,13 +42,18 @@ class WebAppOptimizer:
         return any(indicator in user_agent for indicator in mobile_indicators)
     
     def get_device_info(self):
-        """Получение информации об устройстве"""
+        """Получение информации об устройстве (один разбор User-Agent на запрос)"""
         try:
+            ctx = g.get('request_context')
             user_agent = request.headers.get('User-Agent', '')
         except RuntimeError:
             # Если нет request context, используем базовые значения
+            ctx = None
             user_agent = ''
         
+        if ctx is not None and ctx.device_info is not None:
+            return ctx.device_info
+        
         device_info = {
             'is_mobile': self.is_mobile_request(user_agent),
             'is_telegram': 'telegram' in user_agent.lower(),
@@ -68,6 +74,8 @@ class WebAppOptimizer:
         elif 'linux' in ua_lower:
             device_info['platform'] = 'linux'
         
+        if ctx is not None:
+            ctx.device_info = device_info
         return device_info
     
     def compress_json_response(self, data):
@@ -370,14 +378,14 @@ def monitor_performance(f):
     """Декоратор для мониторинга производительности"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         device_info = webapp_optimizer.get_device_info()
         
         try:
             result = f(*args, **kwargs)
             return result
         finally:
-            duration = (datetime.now() - start_time).total_seconds()
+            duration = time.perf_counter() - start_time
             device_type = 'mobile' if device_info['is_mobile'] else 'desktop'
             performance_monitor.record_request_time(f.__name__, duration, device_type)
     
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк проверки подозрительного контента запросов
+Сравнивает прежний SecurityValidator.check_suspicious_content (нижний
+регистр, json.dumps тела и цикл по всем шаблонам) с SuspiciousContentMatcher
+на реалистичных телах создания оффера разного размера
+
+Запуск: python scripts/benchmark_content_scan.py [количество_итераций]
+"""
+
+import sys
+import os
+import json
+import timeit
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.routers.middleware import SUSPICIOUS_PATTERNS, suspicious_matcher
+
+
+# ===== ПРЕЖНЯЯ РЕАЛИЗАЦИЯ (для сравнения) =====
+
+def legacy_scan(path: str, args: dict, data) -> bool:
+    """Прежний check_suspicious_content без логирования (тело уже разобрано во Flask)"""
+    for pattern in SUSPICIOUS_PATTERNS:
+        if pattern.lower() in path.lower():
+            return True
+    for value in args.values():
+        for pattern in SUSPICIOUS_PATTERNS:
+            if pattern.lower() in value.lower():
+                return True
+    if data:
+        data_str = json.dumps(data).lower()
+        for pattern in SUSPICIOUS_PATTERNS:
+            if pattern in data_str:
+                return True
+    return False
+
+
+def current_scan(path: str, args: dict, body: bytes) -> bool:
+    """Новая проверка: один проход по пути, параметрам и сырому телу"""
+    if suspicious_matcher.search_text(path):
+        return True
+    for value in args.values():
+        if suspicious_matcher.search_text(value):
+            return True
+    return bool(suspicious_matcher.search_bytes(body))
+
+
+# ===== ТЕСТОВЫЕ ДАННЫЕ =====
+
+DESCRIPTION = (
+    "Ищем каналы о технологиях и стартапах для продвижения нового сервиса аналитики. "
+    "Пост должен содержать ссылку на лендинг, краткий обзор возможностей и промокод. "
+    "Публикация в рабочее время, без удаления минимум 24 часа. "
+)
+
+
+def offer_payload(channels: int, description_repeats: int) -> dict:
+    """Тело POST /api/offers/ как его отправляет мини-приложение"""
+    return {
+        'title': 'Продвижение сервиса аналитики Telegram-каналов',
+        'description': DESCRIPTION * description_repeats,
+        'category': 'tech',
+        'subcategory': 'startups',
+        'content_type': 'post',
+        'budget_total': 150000,
+        'price': 5000,
+        'currency': 'RUB',
+        'min_subscribers': 5000,
+        'target_audience': 'Предприниматели, маркетологи и разработчики 25-45 лет',
+        'posting_requirements': 'Без изменения текста, закреп на 2 часа, ссылка в первом абзаце',
+        'start_date': '2026-11-01',
+        'expires_at': '2026-12-01T00:00:00',
+        'auto_approve': False,
+        'selected_channels': [
+            {'channel_id': 1000 + i, 'username': f'tech_channel_{i}', 'price_per_post': 4000 + i * 10,
+             'scheduled_date': '2026-11-05', 'posting_time': '12:00'}
+            for i in range(channels)
+        ],
+    }
+
+
+def run_benchmark(iterations: int = 500):
+    path = '/api/offers/'
+    args = {'source': 'webapp', 'draft': 'false'}
+
+    malicious = offer_payload(20, 3)
+    malicious['posting_requirements'] += ' <script>alert(1)</script>'
+
+    cases = [
+        ('оффер, 3 канала', offer_payload(3, 1)),
+        ('оффер, 20 каналов', offer_payload(20, 3)),
+        ('оффер, 200 каналов', offer_payload(200, 10)),
+        ('оффер, 2000 каналов', offer_payload(2000, 10)),
+        ('шаблон в теле', malicious),
+    ]
+
+    print(f"{'Сценарий':<22} {'размер':>9} {'прежний, мкс':>13} {'новый, мкс':>11} {'ускорение':>10}")
+    print("-" * 70)
+    for title, data in cases:
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        assert legacy_scan(path, args, data) == current_scan(path, args, body)
+
+        legacy_us = timeit.timeit(lambda: legacy_scan(path, args, data), number=iterations) / iterations * 1e6
+        current_us = timeit.timeit(lambda: current_scan(path, args, body), number=iterations) / iterations * 1e6
+        print(f"{title:<22} {len(body):>8}B {legacy_us:>13.1f} {current_us:>11.1f} {legacy_us / current_us:>9.1f}x")
+
+    # Потоковый режим: шаблон на границе порций тоже находится
+    chunk = suspicious_matcher.chunk_size
+    body = b'a' * (chunk - 3) + b'<script' + b'b' * chunk
+    print()
+    print(f"Проверка границы порций: {suspicious_matcher.search_bytes(body)!r}")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
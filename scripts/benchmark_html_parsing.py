@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк разбора HTML страниц t.me и TGStat
+Сравнивает прежний путь (цепочки регулярных выражений и BeautifulSoup)
+с модулем app/telegram/telegram_html_parser.py на сохраненных страницах
+из tests/fixtures/telegram_html
+
+Запуск: python scripts/benchmark_html_parsing.py [количество_итераций]
+"""
+
+import sys
+import os
+import re
+import json
+import timeit
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.telegram.telegram_html_parser import (
+    extract_post_stats, extract_views, parse_preview_page, parse_channel_metrics
+)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures', 'telegram_html')
+
+
+# ===== ПРЕЖНИЕ РЕАЛИЗАЦИИ (для сравнения) =====
+
+def _legacy_suffix_number(text: str) -> int:
+    text = text.upper().strip()
+    for suffix, multiplier in (('K', 1000), ('M', 1000000), ('B', 1000000000)):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * multiplier)
+    return int(float(text))
+
+
+def legacy_post_stats(html: str) -> dict:
+    """Прежний StatsCollector.parse_telegram_html_stats + parse_metadata_stats"""
+    stats = {'views': 0, 'reactions': 0, 'shares': 0, 'comments': 0}
+    groups = {
+        'views': [r'(\d+(?:[\.,]\d+)?[KMB]?)\s*(?:views?|просмотр)', r'tgme_widget_message_views[^>]*>([^<]+)',
+                  r'message_views[^>]*>.*?(\d+(?:[\.,]\d+)?[KMB]?)', r'data-views="(\d+)"'],
+        'reactions': [r'(\d+)\s*(?:reactions?|реакц)', r'tgme_widget_message_reactions[^>]*>.*?(\d+)',
+                      r'reactions_count[^>]*>(\d+)', r'emoji_button[^>]*>.*?(\d+)'],
+        'shares': [r'(\d+)\s*(?:shares?|forwards?|репост|пересыл)', r'tgme_widget_message_forwarded[^>]*>.*?(\d+)',
+                   r'forwards_count[^>]*>(\d+)', r'share_button[^>]*>.*?(\d+)'],
+        'comments': [r'(\d+)\s*(?:comments?|коммент|ответ)', r'tgme_widget_message_reply[^>]*>.*?(\d+)',
+                     r'comments_count[^>]*>(\d+)', r'reply_button[^>]*>.*?(\d+)']
+    }
+    for key, patterns in groups.items():
+        for pattern in patterns:
+            match = re.search(pattern, html, re.IGNORECASE)
+            if match:
+                try:
+                    stats[key] = _legacy_suffix_number(match.group(1).strip())
+                except ValueError:
+                    pass
+                break
+
+    for json_text in re.findall(r'<script type="application/ld\+json">(.*?)</script>', html, re.DOTALL):
+        try:
+            json.loads(json_text)
+        except ValueError:
+            continue
+    for name in ('og:views', 'og:reactions', 'og:shares', 'og:comments'):
+        re.search(rf'<meta property="{name}" content="(\d+)"', html, re.IGNORECASE)
+    for name in ('twitter:views', 'twitter:reactions'):
+        re.search(rf'<meta name="{name}" content="(\d+)"', html, re.IGNORECASE)
+    return stats
+
+
+def legacy_views(html: str) -> int:
+    """Прежний TelegramChannelParser._extract_views_from_html"""
+    for pattern in (r'<span class="tgme_widget_message_views">(\d+(?:\.\d+)?[KM]?)</span>',
+                    r'data-views="(\d+)"', r'(\d+(?:\.\d+)?[KM]?)\s*views?'):
+        match = re.search(pattern, html, re.IGNORECASE)
+        if match:
+            return _legacy_suffix_number(match.group(1))
+    return 0
+
+
+def legacy_tgstat(html: str) -> dict:
+    """Прежний TelegramStatsParser._parse_tgstat поверх BeautifulSoup"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    result = {}
+    for key, class_name in (('subscriber_count', 'subscribers-count'), ('avg_views', 'avg-views'),
+                            ('engagement_rate', 'engagement-rate')):
+        elem = soup.find('div', class_=class_name)
+        result[key] = elem.get_text().strip() if elem else ''
+    return result
+
+
+TGSTAT_SELECTORS = {
+    'subscriber_count': 'subscribers-count',
+    'avg_views': 'avg-views',
+    'engagement_rate': 'engagement-rate'
+}
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def run_benchmark(iterations: int = 500):
+    post = load_fixture('post_embed.html')
+    deleted = load_fixture('post_embed_deleted.html')
+    preview = load_fixture('channel_preview.html')
+    tgstat = load_fixture('tgstat_channel.html')
+
+    cases = [
+        ('post stats (embed)', lambda: legacy_post_stats(post), lambda: extract_post_stats(post)),
+        ('post stats (deleted)', lambda: legacy_post_stats(deleted), lambda: extract_post_stats(deleted)),
+        ('views only (embed)', lambda: legacy_views(post), lambda: extract_views(post)),
+        ('channel preview, 20 posts', lambda: [legacy_post_stats(preview) for _ in range(20)],
+         lambda: parse_preview_page(preview)),
+    ]
+
+    try:
+        import bs4  # noqa: F401
+        cases.append(('tgstat channel page', lambda: legacy_tgstat(tgstat),
+                      lambda: parse_channel_metrics(tgstat, TGSTAT_SELECTORS)))
+    except ImportError:
+        print("⚠️ beautifulsoup4 не установлен - сравнение для TGStat пропущено")
+
+    print(f"{'Сценарий':<28} {'прежний, мс':>12} {'новый, мс':>10} {'ускорение':>10}")
+    print("-" * 64)
+    for title, legacy, current in cases:
+        legacy_ms = timeit.timeit(legacy, number=iterations) / iterations * 1000
+        current_ms = timeit.timeit(current, number=iterations) / iterations * 1000
+        print(f"{title:<28} {legacy_ms:>12.3f} {current_ms:>10.3f} {legacy_ms / current_ms:>9.1f}x")
+
+    print()
+    print(f"Проверка результатов: embed = {extract_post_stats(post)}")
+    print(f"                      deleted = {extract_post_stats(deleted)}")
+    print(f"                      preview = {len(parse_preview_page(preview))} постов")
+    print(f"                      tgstat = {parse_channel_metrics(tgstat, TGSTAT_SELECTORS)}")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -39,7 +39,8 @@ from app.security import (
 from app.performance import (
     setup_caching,
     setup_performance_monitoring,
-    DatabaseOptimizer
+    DatabaseOptimizer,
+    get_request_pipeline
 )
 
 try:
@@ -72,6 +73,10 @@ def create_app() -> Flask:
                 static_folder='app/static',
                 template_folder='templates')
     app.config.from_object(AppConfig)
+    if AppConfig.TRUSTED_PROXY_COUNT:
+        # За доверенным proxy remote_addr берется из X-Forwarded-For
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=AppConfig.TRUSTED_PROXY_COUNT)
     # Настройка JSON сериализации
     app.json.ensure_ascii = False
     app.json.sort_keys = AppConfig.JSON_SORT_KEYS
@@ -232,6 +237,7 @@ def register_performance(app: Flask) -> None:
                 dashboard_data = {
                     'cache_stats': cache_manager.get_stats(),
                     'performance_metrics': performance_monitor.get_current_metrics(),
+                    'request_pipeline': get_request_pipeline(app).get_stats(),
                     'slow_queries': db_optimizer.get_slow_queries_report()[:10],
                     'system_info': {
                         'cache_backend': 'redis' if cache_manager.redis_client else 'memory',
@@ -272,6 +278,7 @@ def register_performance(app: Flask) -> None:
                 
                 # Сбрасываем метрики производительности
                 performance_monitor.reset_current_period()
+                get_request_pipeline(app).reset_stats()
                 
                 return jsonify({
                     'success': True,
@@ -299,13 +306,13 @@ def register_performance(app: Flask) -> None:
 
 # === MIDDLEWARE ===
 def register_middleware(app: Flask) -> None:
-    """Регистрация middleware"""
+    """Регистрация middleware (стадии единого конвейера запросов)"""
+    pipeline = get_request_pipeline(app)
 
-    @app.before_request
     def security_middleware():
         if request.content_length and request.content_length > AppConfig.MAX_CONTENT_LENGTH:
             return jsonify({'error': 'Request too large'}), 413
-    @app.after_request
+
     def security_headers(response):
         response.headers.update({
             'X-Content-Type-Options': 'nosniff',
@@ -314,6 +321,10 @@ def register_middleware(app: Flask) -> None:
         })
         return response
 
+    # Самая дешевая проверка - первой
+    pipeline.add_before('request_size', security_middleware, order=0)
+    pipeline.add_after('base_security_headers', security_headers)
+
 
 # === ОБРАБОТЧИКИ ОШИБОК ===
 def register_error_handlers(app: Flask) -> None:
@@ -1090,6 +1101,11 @@ def main():
             logger.info("🛑 Планировщик мониторинга остановлен")
         except:
             pass
+        
+        # Дописываем буфер аудита безопасности
+        audit_logger = app.extensions.get('audit_logger')
+        if audit_logger:
+            audit_logger.shutdown()
             
     except Exception as e:
         logger.error(f"❌ Критическая ошибка: {e}")